@@ -0,0 +1,579 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Use the data collection app (its consumer, transaction processors, node connector and DB manager)
+DATA_COLLECTION_DIR = Path(__file__).parents[1] / "src" / "data_collection"
+sys.path.insert(0, str(DATA_COLLECTION_DIR))
+# Only warnings of the app (the results are printed to stdout)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from aiokafka.structs import ConsumerRecord, TopicPartition  # noqa: E402
+from synthetic_chain import SyntheticChain, SyntheticTransaction  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from app.consumer import DataConsumer, create_contract_metadata_cache  # noqa: E402
+from app.consumer.tx_data_loader import TransactionDataLoader  # noqa: E402
+from app.model import DataCollectionMode  # noqa: E402
+from app.model.abi import ContractABI  # noqa: E402
+from app.utils.data_collector import (  # noqa: E402
+    create_concurrency_limiter,
+    create_retry_controller,
+)
+
+TARGETS = ("consumer", "processor")
+"""`consumer`: `DataConsumer`s fed by Kafka, `processor`: the transaction processor of the mode called directly"""
+MODES = (DataCollectionMode.FULL.value, DataCollectionMode.PARTIAL.value)
+
+
+class InMemoryNode:
+    """Stand-in for the JSON-RPC client of the node connector (`NodeLoadBalancer`)"""
+
+    def __init__(self, transactions: List[SyntheticTransaction], latency: float):
+        self.by_hash = {tx.hash: tx for tx in transactions}
+        self.latency = latency
+        self.results = {
+            "eth_getTransactionByHash": lambda tx: tx.tx,
+            "eth_getTransactionReceipt": lambda tx: tx.receipt,
+            "trace_replayTransaction": lambda tx: tx.replayed_traces,
+        }
+
+    async def make_request(
+        self, method: str, params: Any, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        result = self.results[method](self.by_hash[params[0]])
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+    async def close(self):
+        pass
+
+
+class InMemoryConnection:
+    """Stand-in for an `asyncpg.Connection` discarding all the writes"""
+
+    async def execute(self, query: str, *args):
+        pass
+
+    async def fetch(self, query: str, *args) -> list:
+        return []
+
+    async def fetchrow(self, query: str, *args):
+        return None
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def close(self):
+        pass
+
+
+class InMemoryRedis:
+    """Stand-in for the `redis.asyncio.Redis` commands used by the app"""
+
+    def __init__(self):
+        self.values: Dict[str, str] = dict()
+        self.sorted_sets: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+    async def get(self, name: str) -> Optional[str]:
+        return self.values.get(name)
+
+    async def set(self, name: str, value: str):
+        self.values[name] = value
+
+    async def zincrby(self, name: str, amount: float, value: Any):
+        scores = self.sorted_sets[name]
+        scores[str(value)] = scores.get(str(value), 0) + amount
+
+    async def zrange(self, name: str, start: int, end: int, withscores=False):
+        items = sorted(self.sorted_sets[name].items(), key=lambda item: item[1])
+        items = items[start : None if end == -1 else end + 1]
+        return items if withscores else [value for value, _ in items]
+
+
+class InMemoryTopic:
+    """A Kafka topic (a single partition) shared by the consumers of a consumer group"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queue: asyncio.Queue[ConsumerRecord] = asyncio.Queue()
+        self._offset = 0
+
+    def send(self, value: bytes):
+        self.queue.put_nowait(
+            ConsumerRecord(
+                topic=self.name,
+                partition=0,
+                offset=self._offset,
+                timestamp=0,
+                timestamp_type=0,
+                key=None,
+                value=value,
+                checksum=None,
+                serialized_key_size=-1,
+                serialized_value_size=len(value),
+                headers=(),
+            )
+        )
+        self._offset += 1
+
+
+class InMemoryKafkaConsumer:
+    """Stand-in for an `AIOKafkaConsumer` reading from an in-memory topic"""
+
+    def __init__(self, topic: InMemoryTopic):
+        self.topic = topic
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def assignment(self):
+        return {TopicPartition(self.topic.name, 0)}
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ConsumerRecord:
+        # Like Kafka, wait for new events once the topic is drained
+        return await self.topic.queue.get()
+
+
+class InMemoryKafkaProducer:
+    """Stand-in for an `AIOKafkaProducer` keeping the sent messages"""
+
+    def __init__(self):
+        self.messages: List[tuple] = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def send_and_wait(self, topic: str, value: bytes, headers=None):
+        self.messages.append((topic, value, headers))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class StageTimer:
+    """Latencies of the stages (wrapped async methods) of processing transactions"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj: Any, method_name: str, stage: str):
+        """Measure the latency of every call of `obj.<method_name>` as `stage`"""
+        method = getattr(obj, method_name)
+        latencies = self.latencies[stage]
+
+        @wraps(method)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """The number of calls and the latency percentiles (in ms) of each stage"""
+        stages = dict()
+        for stage, latencies in sorted(self.latencies.items()):
+            if latencies:
+                latencies = sorted(latencies)
+                stages[stage] = {
+                    "count": len(latencies),
+                    "p50_ms": 1e3 * percentile(latencies, 0.5),
+                    "p99_ms": 1e3 * percentile(latencies, 0.99),
+                    "max_ms": 1e3 * latencies[-1],
+                }
+        return stages
+
+
+class AllocationTracer:
+    """Peak memory allocated (`tracemalloc`) by each call of a single stage
+
+    Note:
+        Calls must not overlap (a single consumer, no node latency), nested
+        stages can't be traced as each call resets the traced peak.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.peaks: List[int] = []
+
+    def wrap(self, obj: Any, method_name: str, stage: str):
+        if stage != self.stage:
+            return
+        method = getattr(obj, method_name)
+
+        @wraps(method)
+        async def traced(*args, **kwargs):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.peaks.append(tracemalloc.get_traced_memory()[1] - current)
+
+        setattr(obj, method_name, traced)
+
+
+class Scenario:
+    """Process synthetic transactions with in-memory stand-ins for Kafka, Redis, PostgreSQL and the node"""
+
+    def __init__(self, args: argparse.Namespace, target: str, mode: str) -> None:
+        self.args = args
+        self.target = target
+        self.mode = DataCollectionMode(mode)
+        chain = SyntheticChain(
+            seed=args.seed,
+            txs_per_block=args.txs_per_block,
+            logs_per_tx=args.logs_per_tx,
+            traces_per_tx=args.traces_per_tx,
+            tracked_share=args.tracked_share,
+        )
+        self.transactions: List[SyntheticTransaction] = []
+        number = args.start_block
+        while len(self.transactions) < args.n_transactions:
+            self.transactions.extend(chain.block(number).transactions)
+            number += 1
+        del self.transactions[args.n_transactions :]
+
+        self.config = Config(
+            node_url="http://node:8545",
+            db_dsn="postgresql://user:password@db:5432/db",
+            redis_url="redis://redis:6379",
+            kafka_url="kafka:9092",
+            kafka_topic="benchmark",
+            data_collection=[
+                {"mode": self.mode.value, "contracts": chain.contracts_config()}
+            ],
+            number_of_consumer_tasks=args.n_consumers,
+            web3_requests_timeout=30,
+            web3_requests_retry_limit=3,
+            web3_requests_retry_delay=1,
+            kafka_event_retrieval_timeout=3600,
+        )
+        self.contract_abi = ContractABI.parse_file(
+            DATA_COLLECTION_DIR / "etc" / "contract_abi.json"
+        )
+
+    async def _make_consumer(
+        self, node: InMemoryNode, topic: InMemoryTopic, shared: dict, measure
+    ) -> DataConsumer:
+        consumer = DataConsumer(self.config, self.contract_abi, **shared)
+        # The (never started) Kafka clients are replaced by the in-memory stand-ins
+        await consumer.kafka_manager._client.stop()
+        await consumer.retry_manager._client.stop()
+        consumer.node_connector.rpc = node
+        consumer.kafka_manager._client = InMemoryKafkaConsumer(topic)
+        consumer.kafka_manager.redis_manager.redis = InMemoryRedis()
+        consumer.retry_manager._client = InMemoryKafkaProducer()
+        consumer.retry_manager.redis_manager.redis = InMemoryRedis()
+
+        async def connect():
+            consumer.db_manager.db = InMemoryConnection()
+
+        consumer.db_manager.connect = connect
+
+        measure.wrap(consumer, "_on_kafka_event_with_retry", "event")
+        for tx_processor in consumer.tx_processors.values():
+            measure.wrap(tx_processor, "process_transaction", "process_transaction")
+        for name in (
+            "get_transaction_data",
+            "get_transaction_receipt_data",
+            "get_internal_transactions",
+        ):
+            measure.wrap(consumer.node_connector, name, f"node.{name}")
+        for name in dir(consumer.db_manager):
+            if name.startswith(("insert_", "delete_", "upsert_")):
+                measure.wrap(consumer.db_manager, name, f"db.{name}")
+        return consumer
+
+    async def _consume(self, consumers: List[DataConsumer], n_events: int):
+        """Consume `n_events` events with all the consumers (concurrently)"""
+        n_handled = 0
+
+        def stop_after_last_event(consumer: DataConsumer):
+            handle = consumer._on_kafka_event_with_retry
+
+            async def handle_and_count(event):
+                nonlocal n_handled
+                await handle(event)
+                n_handled += 1
+                if n_handled == n_events:
+                    for c in consumers:
+                        c.stop()
+
+            consumer._on_kafka_event_with_retry = handle_and_count
+
+        for consumer in consumers:
+            stop_after_last_event(consumer)
+            await consumer.__aenter__()
+        await asyncio.gather(*(c.start_consuming_data() for c in consumers))
+        for consumer in consumers:
+            await consumer.__aexit__(None, None, None)
+
+    async def run(
+        self, measure, n_transactions: int, n_consumers: int, node_latency: float
+    ) -> int:
+        """Process the first `n_transactions` transactions
+
+        Returns:
+            the number of processed (saved) transactions
+        """
+        transactions = self.transactions[:n_transactions]
+        node = InMemoryNode(transactions, node_latency)
+        topic = InMemoryTopic(self.config.kafka_topic)
+        # Shared by the consumers of a process (like in `app.consumer.supervisor`)
+        contract_metadata_cache = create_contract_metadata_cache(self.config)
+        contract_metadata_cache.redis_manager.redis = InMemoryRedis()
+        shared = dict(
+            contract_metadata_cache=contract_metadata_cache,
+            retry_controller=create_retry_controller(self.config),
+            concurrency_limiter=create_concurrency_limiter(self.config),
+        )
+        consumers = [
+            await self._make_consumer(node, topic, shared, measure)
+            for _ in range(n_consumers if self.target == "consumer" else 1)
+        ]
+
+        if self.target == "consumer":
+            for tx in transactions:
+                topic.send(consumers[0].encode_kafka_event(tx.hash, self.mode).encode())
+            await self._consume(consumers, len(transactions))
+            n_failed = sum(c._n_failed_txs for c in consumers)
+            if n_failed:
+                print(f"{n_failed} transactions failed", file=sys.stderr)
+            return sum(c._n_processed_txs for c in consumers)
+
+        consumer = consumers[0]
+        await consumer.db_manager.connect()
+        tx_processor = consumer.tx_processors[self.mode]
+        n_processed = 0
+        for tx in transactions:
+            n_processed += await tx_processor.process_transaction(
+                TransactionDataLoader(tx.hash, consumer.node_connector)
+            )
+        return n_processed
+
+    async def measure(self) -> dict:
+        args = self.args
+        # Warm-up (lazily created objects, caches)
+        await self.run(StageTimer(), min(args.n_transactions, 200), 1, 0)
+
+        timer = StageTimer()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        n_processed = await self.run(
+            timer, args.n_transactions, args.n_consumers, args.node_latency
+        )
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+
+        # Allocations of a separate (sequential) run, tracing allocations slows down processing
+        tracer = AllocationTracer("process_transaction")
+        n_alloc_transactions = min(args.n_transactions, args.n_alloc_transactions)
+        tracemalloc.start()
+        await self.run(tracer, n_alloc_transactions, 1, 0)
+        tracemalloc.stop()
+
+        return {
+            "target": self.target,
+            "mode": self.mode.value,
+            "n_transactions": len(self.transactions),
+            "n_processed": n_processed,
+            "n_consumers": args.n_consumers if self.target == "consumer" else 1,
+            "wall_time_s": wall_time,
+            "cpu_time_s": cpu_time,
+            "tx_per_s": len(self.transactions) / wall_time,
+            "cpu_us_per_tx": 1e6 * cpu_time / len(self.transactions),
+            "stages": timer.summary(),
+            "allocations": {
+                "n_transactions": len(tracer.peaks),
+                "peak_bytes_per_tx_mean": sum(tracer.peaks) / len(tracer.peaks),
+                "peak_bytes_per_tx_max": max(tracer.peaks),
+            },
+            # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (2**20 if sys.platform == "darwin" else 2**10),
+        }
+
+
+def run_scenario(args: argparse.Namespace, target: str, mode: str) -> dict:
+    return asyncio.run(Scenario(args, target, mode).measure())
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(results: List[dict], baseline: Optional[dict]):
+    """Print the results to stderr, add the throughput changes to the baseline (`tx_per_s_change`)"""
+    baseline_results = {
+        (r["target"], r["mode"]): r for r in (baseline or {}).get("results", [])
+    }
+    for result in results:
+        stage = "event" if result["target"] == "consumer" else "process_transaction"
+        latency = result["stages"][stage]
+        line = (
+            f"{result['target']:>9} {result['mode']:>7}: {result['tx_per_s']:8.0f} tx/s, "
+            f"{stage} p50/p99 = {latency['p50_ms']:.3f}/{latency['p99_ms']:.3f} ms, "
+            f"{result['allocations']['peak_bytes_per_tx_mean']:.0f} B allocated per tx, "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+        if previous := baseline_results.get((result["target"], result["mode"])):
+            change = result["tx_per_s"] / previous["tx_per_s"] - 1
+            result["tx_per_s_change"] = change
+            line += f" ({change:+.1%} tx/s)"
+        print(line, file=sys.stderr)
+
+
+def main(args):
+    scenarios = [(target, mode) for target in args.targets for mode in args.modes]
+    results = []
+    for target, mode in scenarios:
+        print(f"Running {target} {mode}...", file=sys.stderr)
+        # A new process for every scenario (separate peak RSS, no shared caches)
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            results.append(executor.submit(run_scenario, args, target, mode).result())
+
+    parameters = {
+        name: getattr(args, name)
+        for name in (
+            "n_transactions",
+            "n_alloc_transactions",
+            "n_consumers",
+            "node_latency",
+            "seed",
+            "start_block",
+            "txs_per_block",
+            "logs_per_tx",
+            "traces_per_tx",
+            "tracked_share",
+        )
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["parameters"] != parameters:
+            print(
+                f"Warning: the parameters of the baseline differ: {baseline['parameters']}",
+                file=sys.stderr,
+            )
+    print_summary(results, baseline)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    regressions = [
+        f"{r['target']} {r['mode']}"
+        for r in results
+        if r.get("tx_per_s_change", 0) < -args.max_regression
+    ]
+    if regressions:
+        print(
+            f"Throughput dropped by more than {args.max_regression:.0%}: {', '.join(regressions)}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput, stage latencies, allocations and peak RSS of the consumer "
+        "and the transaction processors with in-memory Kafka, Redis, PostgreSQL and node stand-ins"
+    )
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--n-transactions", type=int, default=5000)
+    parser.add_argument(
+        "--n-alloc-transactions",
+        type=int,
+        default=1000,
+        help="transactions of the (slower) allocation tracing run",
+    )
+    parser.add_argument(
+        "--n-consumers",
+        type=int,
+        default=4,
+        help="concurrent consumers (consumer target)",
+    )
+    parser.add_argument(
+        "--node-latency",
+        type=float,
+        default=0,
+        help="latency of every node request (s)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the synthetic chain"
+    )
+    parser.add_argument("--start-block", type=int, default=1_000_000)
+    parser.add_argument("--txs-per-block", type=int, default=200)
+    parser.add_argument("--logs-per-tx", type=int, default=3)
+    parser.add_argument("--traces-per-tx", type=int, default=2)
+    parser.add_argument(
+        "--tracked-share",
+        type=float,
+        default=0.1,
+        help="share of transactions and logs of tracked contracts (partial mode)",
+    )
+    parser.add_argument(
+        "--output", help="write the JSON results to this file (stdout by default)"
+    )
+    parser.add_argument(
+        "--baseline", help="JSON results (e.g. of another commit) to compare with"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="exit with code 1 if the throughput of a scenario dropped by more than this ratio (with --baseline)",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,209 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import requests
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3._utils.method_formatters import receipt_formatter
+
+# Use the data collection app (its decoders and mappers)
+DATA_COLLECTION_DIR = Path(__file__).parents[1] / "src" / "data_collection"
+sys.path.insert(0, str(DATA_COLLECTION_DIR))
+
+from app.model.contract import ContractCategory  # noqa: E402
+from app.web3.transaction_events import decorator  # noqa: E402
+from app.web3.transaction_events.decoders import (  # noqa: E402
+    compile_fast_decoder,
+    web3_decoder,
+)
+
+CATEGORY_ABI_KEYS = {
+    ContractCategory.ERC20: "erc20",
+    ContractCategory.ERC721: "erc721",
+    ContractCategory.UNI_SWAP_V2_FACTORY: "UniSwapV2Factory",
+    ContractCategory.UNI_SWAP_V2_PAIR: "UniSwapV2Pair",
+}
+
+
+def load_mapped_events(abi_file: str) -> Dict[bytes, List[Tuple[str, dict, list]]]:
+    """Load (name, ABI, mappers) of all the mapped events indexed by their topic0"""
+    contract_abi = json.loads(Path(abi_file).read_text())
+    mappers = decorator.__event_mappers
+    events = dict()
+    for category, abi_key in CATEGORY_ABI_KEYS.items():
+        for item in contract_abi[abi_key]:
+            if item["type"] != "event" or item["name"] not in mappers[category]:
+                continue
+            events.setdefault(event_abi_to_log_topic(item), []).append(
+                (f"{abi_key}.{item['name']}", item, mappers[category][item["name"]])
+            )
+    return events
+
+
+def record_receipts(node_url: str, block: int, n_blocks: int) -> List[dict]:
+    """Get the (raw JSON-RPC) receipts of all transactions in the given blocks"""
+
+    def rpc(method, params):
+        response = requests.post(
+            node_url,
+            json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
+            timeout=60,
+        )
+        return response.json()["result"]
+
+    receipts = []
+    for block_number in range(block, block + n_blocks):
+        block_data = rpc("eth_getBlockByNumber", [hex(block_number), False])
+        for tx_hash in block_data["transactions"]:
+            receipts.append(rpc("eth_getTransactionReceipt", [tx_hash]))
+    return receipts
+
+
+def synthetic_receipts(mapped_events, n_logs: int) -> List[dict]:
+    """Raw receipts with random logs of the mapped events (one log per receipt)"""
+    rng = random.Random(0)
+    event_abis = [abi for events in mapped_events.values() for _, abi, _ in events]
+
+    def random_value(abi_type):
+        if abi_type == "address":
+            return rng.choice(
+                [
+                    "0x0000000000000000000000000000000000000000",
+                    "0x" + rng.randbytes(20).hex(),
+                ]
+            )
+        return rng.randrange(2**112)
+
+    receipts = []
+    for i in range(n_logs):
+        event_abi = rng.choice(event_abis)
+        topics = ["0x" + event_abi_to_log_topic(event_abi).hex()]
+        data_types, data_values = [], []
+        for arg in event_abi["inputs"]:
+            value = random_value(arg["type"])
+            if arg["indexed"]:
+                topics.append("0x" + encode([arg["type"]], [value]).hex())
+            else:
+                data_types.append(arg["type"])
+                data_values.append(value)
+        receipts.append(
+            {
+                "logs": [
+                    {
+                        "address": "0x" + rng.randbytes(20).hex(),
+                        "topics": topics,
+                        "data": "0x" + encode(data_types, data_values).hex(),
+                        "logIndex": hex(0),
+                        "transactionIndex": hex(0),
+                        "transactionHash": "0x" + rng.randbytes(32).hex(),
+                        "blockHash": "0x" + rng.randbytes(32).hex(),
+                        "blockNumber": hex(i),
+                    }
+                ]
+            }
+        )
+    return receipts
+
+
+def main(args):
+    """Decode all the mapped event logs of the receipts with both decoders and compare them"""
+    mapped_events = load_mapped_events(args.abi)
+
+    if args.record:
+        receipts = record_receipts(args.record, args.block, args.n_blocks)
+        Path(args.receipts).write_text(json.dumps(receipts))
+        print(f"Recorded {len(receipts)} receipts to {args.receipts}")
+    elif args.receipts:
+        receipts = json.loads(Path(args.receipts).read_text())
+    else:
+        receipts = synthetic_receipts(mapped_events, args.n_logs)
+
+    # (event name, log) of each log with a mapped topic0
+    codec = Web3().codec
+    logs = [
+        (event, log)
+        for receipt in receipts
+        for log in receipt_formatter(receipt)["logs"]
+        if log["topics"]
+        for event in mapped_events.get(bytes(log["topics"][0]), [])
+    ]
+    print(f"Decoding {len(logs)} event logs from {len(receipts)} receipts")
+
+    decoders = {
+        "web3": {
+            name: web3_decoder(codec, abi)
+            for events in mapped_events.values()
+            for name, abi, _ in events
+        },
+        "fast": {
+            name: compile_fast_decoder(abi)
+            for events in mapped_events.values()
+            for name, abi, _ in events
+        },
+    }
+    results = dict()
+    for decoder_name, event_decoders in decoders.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            decoded = [event_decoders[name](log) for (name, _, _), log in logs]
+        duration = (time.perf_counter() - start) / args.repeat
+        print(
+            f"{decoder_name}: {duration * 1000:.3f} ms ({duration / max(len(logs), 1) * 1e6:.2f} µs per log)"
+        )
+        # Canonical events (ContractEvent) of each log
+        results[decoder_name] = [
+            list(event for mapper in mappers for event in mapper(event_data))
+            if event_data is not None
+            else None
+            for ((_, _, mappers), _), event_data in zip(logs, decoded)
+        ]
+
+    mismatches = [
+        (event_name, log)
+        for ((event_name, _, _), log), web3_events, fast_events in zip(
+            logs, results["web3"], results["fast"]
+        )
+        if web3_events != fast_events
+    ]
+    for event_name, log in mismatches[:10]:
+        print(f"Mismatch of {event_name} in {log['transactionHash'].hex()}")
+    print(f"{len(mismatches)} mismatches")
+    return int(bool(mismatches))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare and benchmark the fast and web3 event log decoders"
+    )
+    parser.add_argument(
+        "--abi",
+        default=str(DATA_COLLECTION_DIR / "etc" / "contract_abi.json"),
+        help="contract ABI file",
+    )
+    parser.add_argument(
+        "--receipts",
+        help="JSON file with recorded (eth_getTransactionReceipt) receipts, synthetic receipts are used if not set",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="NODE_URL",
+        help="record the receipts of --n-blocks blocks starting at --block to the --receipts file",
+    )
+    parser.add_argument("--block", type=int, default=15500000)
+    parser.add_argument("--n-blocks", type=int, default=10)
+    parser.add_argument(
+        "--n-logs", type=int, default=10000, help="number of synthetic logs"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of decoding rounds"
+    )
+    args = parser.parse_args()
+    if args.record and not args.receipts:
+        parser.error("--record requires --receipts")
+    sys.exit(main(args))
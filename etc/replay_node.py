@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+RECORDED_METHODS = {
+    "eth_blockNumber",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "trace_block",
+    "trace_replayTransaction",
+    "eth_call",
+    "eth_getLogs",
+    "eth_chainId",
+}
+"""Methods recorded in record mode (other requests are only forwarded)"""
+
+NOT_RECORDED = -32001
+"""JSON-RPC error code of requests without a recorded response"""
+
+
+def _open(path: str, mode: str):
+    """Open a recording (gzip compressed if it ends with .gz)"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def request_key(method: str, params: Any) -> Tuple[str, str]:
+    """Key of a request (the order of object keys and whitespace don't matter)"""
+    return method, json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def load_recording(path: str) -> Dict[Tuple[str, str], dict]:
+    """Load a recording: JSON lines of `{"method", "params", "result" | "error"}`"""
+    responses = dict()
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                response = {k: entry[k] for k in ("result", "error") if k in entry}
+                responses[request_key(entry["method"], entry["params"])] = response
+    return responses
+
+
+def latest_block_number(responses: Dict[Tuple[str, str], dict]) -> Optional[int]:
+    """The number of the latest recorded block"""
+    numbers = [
+        int(response["result"]["number"], 16)
+        for (method, _), response in responses.items()
+        if method in ("eth_getBlockByNumber", "eth_getBlockByHash")
+        and isinstance(response.get("result"), dict)
+    ]
+    return max(numbers, default=None)
+
+
+class ReplayNode:
+    """JSON-RPC server replaying recorded responses (or recording the responses of a node)
+
+    Faults can be injected: a latency of every request, HTTP 503 responses, JSON-RPC errors
+    and requests that never get a response (timeouts).
+    """
+
+    def __init__(
+        self,
+        responses: Dict[Tuple[str, str], dict],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rpc_error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        upstream: Optional[str] = None,
+        recording: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            responses: the recorded responses by their request key (see `request_key`)
+            latency: the latency added to every request (in seconds)
+            jitter: the maximum random latency added on top of `latency` (in seconds)
+            error_rate: the ratio of requests answered with HTTP 503
+            rpc_error_rate: the ratio of requests answered with a JSON-RPC error
+            timeout_rate: the ratio of requests that are never answered
+            upstream: the node whose responses are recorded (record mode)
+            recording: the file the responses of `upstream` are appended to (record mode)
+        """
+        self.responses = responses
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpc_error_rate = rpc_error_rate
+        self.timeout_rate = timeout_rate
+        self.upstream = upstream
+        self.recording = recording
+        self.rng = random.Random(seed)
+        self.latest_block_number = latest_block_number(responses)
+        self.n_requests = 0
+        self.n_missing = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._recording_file = None
+
+    async def _forward(self, method: str, params: Any) -> dict:
+        """Request the upstream node and record its response"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+            self._recording_file = _open(self.recording, "a")
+        payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        async with self._session.post(self.upstream, json=payload) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        body = {k: body[k] for k in ("result", "error") if k in body}
+        if method in RECORDED_METHODS:
+            self.responses[request_key(method, params)] = body
+            self._recording_file.write(
+                json.dumps({"method": method, "params": params, **body}) + "\n"
+            )
+        return body
+
+    def _replay(self, method: str, params: Any) -> dict:
+        if (response := self.responses.get(request_key(method, params))) is not None:
+            return response
+        if method == "eth_blockNumber" and self.latest_block_number is not None:
+            return {"result": hex(self.latest_block_number)}
+        self.n_missing += 1
+        if method == "eth_call":
+            # Empty return data (e.g. a contract without the function) instead of an error,
+            # calls of synthetic chains (etc/synthetic_chain.py) are never recorded
+            return {"result": "0x"}
+        return {
+            "error": {
+                "code": NOT_RECORDED,
+                "message": f"No recorded response of {method} {json.dumps(params)}",
+            }
+        }
+
+    async def _answer(self, request: dict) -> dict:
+        method, params = request.get("method"), request.get("params", [])
+        if self.rng.random() < self.rpc_error_rate:
+            body = {"error": {"code": -32000, "message": "Injected error"}}
+        elif self.upstream is not None:
+            body = await self._forward(method, params)
+        else:
+            body = self._replay(method, params)
+        return {"jsonrpc": "2.0", "id": request.get("id"), **body}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.n_requests += 1
+        latency = self.latency + self.rng.uniform(0, self.jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if self.rng.random() < self.timeout_rate:
+            # Never answer, the client times out
+            await asyncio.sleep(3600)
+        if self.rng.random() < self.error_rate:
+            return web.Response(status=503, text="Injected error")
+
+        payload = await request.json()
+        if isinstance(payload, list):
+            body = [await self._answer(item) for item in payload]
+        else:
+            body = await self._answer(payload)
+        return web.json_response(body)
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=2**26)
+        app.router.add_post("/", self.handle)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _close(self, app: web.Application):
+        if self._session is not None:
+            await self._session.close()
+            self._recording_file.close()
+
+
+def main(args):
+    if args.mode == "record":
+        responses = (
+            load_recording(args.recording) if Path(args.recording).exists() else {}
+        )
+        node = ReplayNode(responses, upstream=args.upstream, recording=args.recording)
+        print(f"Recording the responses of {args.upstream} to {args.recording}")
+    else:
+        responses = load_recording(args.recording)
+        node = ReplayNode(
+            responses,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rpc_error_rate=args.rpc_error_rate,
+            timeout_rate=args.timeout_rate,
+            seed=args.seed,
+        )
+        print(
+            f"Replaying {len(responses)} responses of {args.recording} "
+            f"(latest block: {node.latest_block_number})"
+        )
+
+    start = time.perf_counter()
+    try:
+        web.run_app(node.make_app(), host=args.host, port=args.port, print=print)
+    finally:
+        elapsed = time.perf_counter() - start
+        print(
+            f"Answered {node.n_requests} requests in {elapsed:.0f}s, "
+            f"{node.n_missing} without a recorded response"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="JSON-RPC stand-in node replaying recorded responses (or recording them)"
+    )
+    parser.add_argument("mode", choices=["replay", "record"])
+    parser.add_argument(
+        "--recording",
+        required=True,
+        help="JSON lines file of the recorded responses (gzip if it ends with .gz)",
+    )
+    parser.add_argument("--upstream", help="the node to record (record mode)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8547)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="latency of every request (s)"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0, help="maximum random extra latency (s)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="ratio of HTTP 503 responses"
+    )
+    parser.add_argument(
+        "--rpc-error-rate", type=float, default=0, help="ratio of JSON-RPC errors"
+    )
+    parser.add_argument(
+        "--timeout-rate", type=float, default=0, help="ratio of unanswered requests"
+    )
+    parser.add_argument("--seed", type=int, help="seed of the injected faults")
+    args = parser.parse_args()
+    if args.mode == "record" and not args.upstream:
+        parser.error("record mode requires --upstream")
+    main(args)
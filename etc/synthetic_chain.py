@@ -0,0 +1,465 @@
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from eth_utils import keccak
+
+ZERO_ADDRESS = "0x" + "00" * 20
+BLOCK_TIME = 3
+"""Seconds between two blocks (BSC)"""
+BLOCK_REWARD = hex(2 * 10**18)
+
+
+def _topic0(signature: str) -> str:
+    return "0x" + keccak(text=signature).hex()
+
+
+TRANSFER = _topic0("Transfer(address,address,uint256)")
+SWAP = _topic0("Swap(address,uint256,uint256,uint256,uint256,address)")
+SYNC = _topic0("Sync(uint112,uint112)")
+MINT = _topic0("Mint(address,uint256,uint256)")
+BURN = _topic0("Burn(address,uint256,uint256,address)")
+
+CATEGORIES = ("erc20", "erc721", "UniSwapV2Pair")
+CATEGORY_WEIGHTS = (0.6, 0.15, 0.25)
+CATEGORY_EVENTS = {
+    "erc20": ["TransferFungibleEvent"],
+    "erc721": ["TransferNonFungibleEvent"],
+    "UniSwapV2Pair": [
+        "TransferFungibleEvent",
+        "SwapPairEvent",
+        "MintPairEvent",
+        "BurnPairEvent",
+    ],
+}
+"""Events (`app.web3.transaction_events.types`) of the tracked contracts in the generated config"""
+
+
+def _word(value: int) -> str:
+    """ABI encoded uint256 (without 0x)"""
+    return f"{value:064x}"
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + "00" * 12 + address[2:]
+
+
+@dataclass
+class SyntheticTransaction:
+    """Raw JSON-RPC results of a transaction"""
+
+    tx: dict
+    """Result of `eth_getTransactionByHash`"""
+    receipt: dict
+    """Result of `eth_getTransactionReceipt`"""
+    traces: List[dict]
+    """Traces of `trace_replayTransaction` (`["trace"]`) and `trace_block`"""
+
+    @property
+    def hash(self) -> str:
+        return self.tx["hash"]
+
+    @property
+    def replayed_traces(self) -> dict:
+        """Result of `trace_replayTransaction` with `["trace"]`"""
+        return {
+            "output": "0x",
+            "stateDiff": None,
+            "trace": self.traces,
+            "vmTrace": None,
+        }
+
+
+@dataclass
+class SyntheticBlock:
+    """Raw JSON-RPC results of a block and its transactions"""
+
+    block: dict
+    """Result of `eth_getBlockByNumber` without full transactions"""
+    transactions: List[SyntheticTransaction] = field(default_factory=list)
+
+    @property
+    def number(self) -> int:
+        return int(self.block["number"], 16)
+
+    @property
+    def full_block(self) -> dict:
+        """Result of `eth_getBlockByNumber` with full transactions"""
+        return {**self.block, "transactions": [tx.tx for tx in self.transactions]}
+
+    @property
+    def block_traces(self) -> List[dict]:
+        """Result of `trace_block` (the traces of all transactions and the block reward)"""
+        traces = [
+            {
+                **trace,
+                "blockHash": self.block["hash"],
+                "blockNumber": self.number,
+                "transactionHash": tx.hash,
+                "transactionPosition": i,
+            }
+            for i, tx in enumerate(self.transactions)
+            for trace in tx.traces
+        ]
+        traces.append(
+            {
+                "action": {
+                    "author": self.block["miner"],
+                    "rewardType": "block",
+                    "value": BLOCK_REWARD,
+                },
+                "blockHash": self.block["hash"],
+                "blockNumber": self.number,
+                "result": None,
+                "subtraces": 0,
+                "traceAddress": [],
+                "type": "reward",
+            }
+        )
+        return traces
+
+
+class SyntheticChain:
+    """Deterministic synthetic blocks, transactions, receipts (ERC20, ERC721, UniswapV2 logs) and traces
+
+    Each block is generated from `seed` and its number only, so any block range can be generated
+    (again) independently. A share of the transactions and logs (`tracked_share`) involves the tracked
+    contracts (`tracked_contracts`), the others involve a large number of untracked contracts.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        txs_per_block: int = 200,
+        logs_per_tx: int = 3,
+        traces_per_tx: int = 2,
+        tracked_share: float = 0.1,
+        creation_share: float = 0.01,
+        n_tracked_contracts: int = 10,
+        n_contracts: int = 10_000,
+    ) -> None:
+        """
+        Args:
+            seed: the seed of the chain
+            txs_per_block: the average number of transactions per block
+            logs_per_tx: the average number of logs per transaction
+            traces_per_tx: the number of internal transactions per transaction
+            tracked_share: the share of transactions and logs involving tracked contracts
+            creation_share: the share of contract creations
+            n_tracked_contracts: the number of tracked contracts (of each category)
+            n_contracts: the number of untracked contracts (of each category)
+        """
+        self.seed = seed
+        self.txs_per_block = txs_per_block
+        self.logs_per_tx = logs_per_tx
+        self.traces_per_tx = traces_per_tx
+        self.tracked_share = tracked_share
+        self.creation_share = creation_share
+
+        rng = random.Random(f"{seed}:contracts")
+        self.tracked_contracts: Dict[str, List[str]] = {
+            category: [self._random_address(rng) for _ in range(n_tracked_contracts)]
+            for category in CATEGORIES
+        }
+        """Addresses of the tracked contracts by category"""
+        self.contracts: Dict[str, List[str]] = {
+            category: [self._random_address(rng) for _ in range(n_contracts)]
+            for category in CATEGORIES
+        }
+        """Addresses of the untracked contracts by category"""
+        self.accounts = [self._random_address(rng) for _ in range(n_contracts)]
+
+    @staticmethod
+    def _random_address(rng: random.Random) -> str:
+        return "0x" + rng.randbytes(20).hex()
+
+    def block_hash(self, number: int) -> str:
+        return "0x" + hashlib.sha256(f"{self.seed}:block:{number}".encode()).hexdigest()
+
+    def _contract(self, rng: random.Random, category: str) -> str:
+        if rng.random() < self.tracked_share:
+            return rng.choice(self.tracked_contracts[category])
+        return rng.choice(self.contracts[category])
+
+    def _log(self, rng: random.Random, address: str, category: str) -> dict:
+        account_topics = [_address_topic(rng.choice(self.accounts)) for _ in range(2)]
+        if category == "erc20":
+            topics, data = [TRANSFER, *account_topics], _word(rng.randrange(10**24))
+        elif category == "erc721":
+            token_id = _word(rng.randrange(10**5))
+            topics, data = [TRANSFER, *account_topics, "0x" + token_id], ""
+        else:
+            event = rng.choices((SWAP, SYNC, MINT, BURN), (0.6, 0.3, 0.05, 0.05))[0]
+            amounts = [rng.randrange(10**22) for _ in range(4)]
+            if event == SWAP:
+                topics = [SWAP, *account_topics]
+                data = "".join(map(_word, (amounts[0], 0, 0, amounts[1])))
+            elif event == SYNC:
+                topics, data = [SYNC], "".join(map(_word, amounts[:2]))
+            elif event == MINT:
+                topics, data = [MINT, account_topics[0]], "".join(
+                    map(_word, amounts[:2])
+                )
+            else:
+                topics, data = [BURN, *account_topics], "".join(map(_word, amounts[:2]))
+        return {"address": address, "topics": topics, "data": "0x" + data}
+
+    def _trace(
+        self, rng: random.Random, tx: dict, trace_address: List[int], n_subtraces: int
+    ) -> dict:
+        if not trace_address and tx["to"] is None:
+            return {
+                "action": {
+                    "from": tx["from"],
+                    "gas": tx["gas"],
+                    "init": tx["input"],
+                    "value": tx["value"],
+                },
+                "result": {
+                    "address": self._random_address(rng),
+                    "code": "0x" + rng.randbytes(64).hex(),
+                    "gasUsed": hex(rng.randrange(int(tx["gas"], 16) + 1)),
+                },
+                "subtraces": n_subtraces,
+                "traceAddress": trace_address,
+                "type": "create",
+            }
+        gas = int(tx["gas"], 16) if not trace_address else rng.randrange(10**5)
+        return {
+            "action": {
+                "callType": "call",
+                "from": tx["from"] if not trace_address else tx["to"],
+                "gas": hex(gas),
+                "input": "0x" + rng.randbytes(36).hex(),
+                "to": tx["to"] if not trace_address else self._contract(rng, "erc20"),
+                "value": tx["value"] if not trace_address else "0x0",
+            },
+            "result": {"gasUsed": hex(rng.randrange(gas + 1)), "output": "0x"},
+            "subtraces": n_subtraces,
+            "traceAddress": trace_address,
+            "type": "call",
+        }
+
+    def _transaction(
+        self, rng: random.Random, block: dict, index: int
+    ) -> SyntheticTransaction:
+        tx_hash = "0x" + rng.randbytes(32).hex()
+        is_creation = rng.random() < self.creation_share
+        category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+        to_address = None if is_creation else self._contract(rng, category)
+        tx = {
+            "blockHash": block["hash"],
+            "blockNumber": block["number"],
+            "chainId": "0x38",
+            "from": rng.choice(self.accounts),
+            "gas": hex(rng.randrange(21000, 10**6)),
+            "gasPrice": hex(rng.randrange(10**9, 10**11)),
+            "hash": tx_hash,
+            "input": "0x" + rng.randbytes(rng.choice((68, 68, 132, 1024))).hex(),
+            "nonce": hex(rng.randrange(10**4)),
+            "r": "0x" + rng.randbytes(32).hex(),
+            "s": "0x" + rng.randbytes(32).hex(),
+            "to": to_address,
+            "transactionIndex": hex(index),
+            "type": "0x0",
+            "v": "0x93",
+            "value": hex(rng.randrange(10**18)) if rng.random() < 0.3 else "0x0",
+        }
+
+        n_logs = rng.randint(0, 2 * self.logs_per_tx)
+        logs = []
+        for i in range(n_logs):
+            log_category = (
+                category if i == 0 else rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+            )
+            address = (
+                to_address
+                if i == 0 and to_address is not None
+                else self._contract(rng, log_category)
+            )
+            logs.append(
+                {
+                    **self._log(rng, address, log_category),
+                    "blockHash": block["hash"],
+                    "blockNumber": block["number"],
+                    "logIndex": hex(i),
+                    "removed": False,
+                    "transactionHash": tx_hash,
+                    "transactionIndex": hex(index),
+                }
+            )
+
+        traces = [self._trace(rng, tx, [], self.traces_per_tx)] + [
+            self._trace(rng, tx, [i], 0) for i in range(self.traces_per_tx)
+        ]
+        receipt = {
+            "blockHash": block["hash"],
+            "blockNumber": block["number"],
+            "contractAddress": traces[0]["result"]["address"] if is_creation else None,
+            "cumulativeGasUsed": hex(rng.randrange(10**7)),
+            "effectiveGasPrice": tx["gasPrice"],
+            "from": tx["from"],
+            "gasUsed": hex(rng.randrange(21000, int(tx["gas"], 16) + 1)),
+            "logs": logs,
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "to": to_address,
+            "transactionHash": tx_hash,
+            "transactionIndex": hex(index),
+            "type": "0x0",
+        }
+        return SyntheticTransaction(tx, receipt, traces)
+
+    def block(self, number: int) -> SyntheticBlock:
+        """Generate the block with the given number (always the same block for the same chain)"""
+        rng = random.Random(f"{self.seed}:{number}")
+        block = {
+            "difficulty": "0x2",
+            "extraData": "0x",
+            "gasLimit": hex(140_000_000),
+            "gasUsed": hex(rng.randrange(140_000_000)),
+            "hash": self.block_hash(number),
+            "logsBloom": "0x" + "00" * 256,
+            "miner": rng.choice(self.accounts),
+            "mixHash": "0x" + "00" * 32,
+            "nonce": "0x0000000000000000",
+            "number": hex(number),
+            "parentHash": self.block_hash(number - 1),
+            "receiptsRoot": "0x" + rng.randbytes(32).hex(),
+            "sha3Uncles": "0x" + rng.randbytes(32).hex(),
+            "size": hex(rng.randrange(10**5)),
+            "stateRoot": "0x" + rng.randbytes(32).hex(),
+            "timestamp": hex(1_600_000_000 + BLOCK_TIME * number),
+            "totalDifficulty": hex(2 * number),
+            "transactionsRoot": "0x" + rng.randbytes(32).hex(),
+            "uncles": [],
+        }
+        n_txs = rng.randint(self.txs_per_block // 2, self.txs_per_block * 3 // 2)
+        transactions = [self._transaction(rng, block, i) for i in range(n_txs)]
+        block["transactions"] = [tx.hash for tx in transactions]
+        return SyntheticBlock(block, transactions)
+
+    def blocks(self, start: int, n_blocks: int) -> Iterator[SyntheticBlock]:
+        for number in range(start, start + n_blocks):
+            yield self.block(number)
+
+    def contracts_config(self) -> List[dict]:
+        """The tracked contracts as the `contracts` of a data collection config"""
+        return [
+            {
+                "address": address,
+                "symbol": f"{category}-{i}",
+                "category": category,
+                "events": CATEGORY_EVENTS[category],
+            }
+            for category, addresses in self.tracked_contracts.items()
+            for i, address in enumerate(addresses)
+        ]
+
+
+def recording_entries(block: SyntheticBlock) -> Iterator[dict]:
+    """The JSON-RPC requests and results of a block (the recording format of `etc/replay_node.py`)"""
+    number = hex(block.number)
+    yield {
+        "method": "eth_getBlockByNumber",
+        "params": [number, False],
+        "result": block.block,
+    }
+    yield {
+        "method": "eth_getBlockByNumber",
+        "params": [number, True],
+        "result": block.full_block,
+    }
+    yield {
+        "method": "eth_getBlockByHash",
+        "params": [block.block["hash"], False],
+        "result": block.block,
+    }
+    block_traces = block.block_traces
+    for params in ([block.number], [number]):
+        yield {"method": "trace_block", "params": params, "result": block_traces}
+    for tx in block.transactions:
+        yield {
+            "method": "eth_getTransactionByHash",
+            "params": [tx.hash],
+            "result": tx.tx,
+        }
+        yield {
+            "method": "eth_getTransactionReceipt",
+            "params": [tx.hash],
+            "result": tx.receipt,
+        }
+        yield {
+            "method": "trace_replayTransaction",
+            "params": [tx.hash, ["trace"]],
+            "result": tx.replayed_traces,
+        }
+
+
+def main(args):
+    chain = SyntheticChain(
+        seed=args.seed,
+        txs_per_block=args.txs_per_block,
+        logs_per_tx=args.logs_per_tx,
+        traces_per_tx=args.traces_per_tx,
+        tracked_share=args.tracked_share,
+        creation_share=args.creation_share,
+        n_tracked_contracts=args.n_tracked_contracts,
+    )
+    start = time.perf_counter()
+    n_txs = 0
+    open_fn = gzip.open if args.output.endswith(".gz") else open
+    with open_fn(args.output, "wt") as f:
+        for block in chain.blocks(args.start_block, args.n_blocks):
+            n_txs += len(block.transactions)
+            for entry in recording_entries(block):
+                f.write(json.dumps(entry) + "\n")
+    print(
+        f"Generated {args.n_blocks} blocks with {n_txs} transactions "
+        f"in {time.perf_counter() - start:.1f}s to {args.output}"
+    )
+
+    if args.contracts:
+        with open(args.contracts, "w") as f:
+            json.dump(chain.contracts_config(), f, indent=4)
+        print(f"Wrote the tracked contracts to {args.contracts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a deterministic synthetic chain as a recording of etc/replay_node.py"
+    )
+    parser.add_argument(
+        "--output", required=True, help="the recording (.jsonl or .jsonl.gz)"
+    )
+    parser.add_argument(
+        "--contracts",
+        help="write the tracked contracts (data collection config) to this file",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-block", type=int, default=1_000_000)
+    parser.add_argument("--n-blocks", type=int, default=100)
+    parser.add_argument("--txs-per-block", type=int, default=200)
+    parser.add_argument("--logs-per-tx", type=int, default=3)
+    parser.add_argument("--traces-per-tx", type=int, default=2)
+    parser.add_argument(
+        "--tracked-share",
+        type=float,
+        default=0.1,
+        help="share of transactions and logs of tracked contracts",
+    )
+    parser.add_argument(
+        "--creation-share", type=float, default=0.01, help="share of contract creations"
+    )
+    parser.add_argument(
+        "--n-tracked-contracts",
+        type=int,
+        default=10,
+        help="number of tracked contracts of each category",
+    )
+    main(parser.parse_args())
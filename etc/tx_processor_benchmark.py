@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List
+
+# Use the data collection app (its node connector and transaction processors)
+DATA_COLLECTION_DIR = Path(__file__).parents[1] / "src" / "data_collection"
+sys.path.insert(0, str(DATA_COLLECTION_DIR))
+
+from synthetic_chain import SyntheticChain, SyntheticTransaction  # noqa: E402
+
+from app.consumer.tx_data_loader import TransactionDataLoader  # noqa: E402
+from app.consumer.tx_processor import FullTransactionProcessor  # noqa: E402
+from app.web3.node_connector import NodeConnector  # noqa: E402
+
+
+def fake_node_connector(transactions: List[SyntheticTransaction]) -> NodeConnector:
+    """Node connector answering with the (raw JSON-RPC) synthetic transactions"""
+    by_hash = {tx.hash: tx for tx in transactions}
+    results = {
+        "eth_getTransactionByHash": lambda tx: tx.tx,
+        "eth_getTransactionReceipt": lambda tx: tx.receipt,
+        "trace_replayTransaction": lambda tx: tx.replayed_traces,
+    }
+
+    async def make_request(method, params):
+        return {"result": results[method](by_hash[params[0]])}
+
+    node_connector = NodeConnector.__new__(NodeConnector)
+    node_connector._make_request = make_request
+    node_connector.response_cache = None
+    return node_connector
+
+
+class FakeDatabaseManager:
+    """Database manager discarding all the inserts"""
+
+    def __init__(self):
+        self.db = self
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def insert_transaction(self, **kwargs):
+        pass
+
+    async def insert_transaction_logs(self, **kwargs):
+        pass
+
+    async def insert_internal_transaction(self, **kwargs):
+        pass
+
+    async def delete_internal_transactions(self, transaction_hash):
+        pass
+
+
+async def process(processor: FullTransactionProcessor, tx_hashes):
+    for tx_hash in tx_hashes:
+        await processor.process_transaction(
+            TransactionDataLoader(tx_hash, processor.node_connector)
+        )
+
+
+async def main(args):
+    """Process synthetic transactions with FullTransactionProcessor (without a DB)"""
+    chain = SyntheticChain(logs_per_tx=args.n_logs, traces_per_tx=args.n_traces)
+    transactions = []
+    for block in chain.blocks(1_000_000, args.n_transactions):
+        transactions.extend(block.transactions)
+        if len(transactions) >= args.n_transactions:
+            break
+    transactions = transactions[: args.n_transactions]
+    tx_hashes = [tx.hash for tx in transactions]
+    node_connector = fake_node_connector(transactions)
+
+    processor = FullTransactionProcessor(FakeDatabaseManager(), node_connector, None)
+
+    # Warm-up
+    await process(processor, tx_hashes[:100])
+
+    start = time.process_time()
+    for _ in range(args.repeat):
+        await process(processor, tx_hashes)
+    cpu_time = (time.process_time() - start) / args.repeat / len(tx_hashes)
+
+    # Peak memory allocated while processing a single transaction
+    tracemalloc.start()
+    peaks = []
+    for tx_hash in tx_hashes:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        await processor.process_transaction(
+            TransactionDataLoader(tx_hash, processor.node_connector)
+        )
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    print(
+        f"FullTransactionProcessor: {len(tx_hashes)} transactions "
+        f"({args.n_logs} logs on average, {args.n_traces} internal transactions each)"
+    )
+    print(f"CPU time: {cpu_time * 1e6:.1f} µs per transaction")
+    print(f"Peak allocated memory: {sum(peaks) / len(peaks):.0f} B per transaction")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark CPU time and allocations of FullTransactionProcessor per transaction"
+    )
+    parser.add_argument("--n-transactions", type=int, default=2000)
+    parser.add_argument(
+        "--n-logs", type=int, default=5, help="average logs per transaction"
+    )
+    parser.add_argument(
+        "--n-traces", type=int, default=3, help="internal transactions per transaction"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -1,108 +1,314 @@
+import argparse
 import asyncio
-import statistics
-import time
-from datetime import datetime
-from typing import List
-
-from web3 import Web3
-from web3.eth import AsyncEth
-from web3.geth import AsyncGethAdmin, AsyncGethPersonal, AsyncGethTxPool, Geth
-from web3.net import AsyncNet
-
-node_url = "http://localhost:8547"
-
-headers = {
-    "Host": "localhost",
-    "Content-Type": "application/json",
-    "Cache-Control": "no-cache",
-}
-w3 = Web3(
-    provider=Web3.AsyncHTTPProvider(
-        endpoint_uri=node_url, request_kwargs={"headers": headers, "timeout": 300}
-    ),
-    modules={
-        "eth": (AsyncEth,),
-        "net": (AsyncNet,),
-        "geth": (
-            Geth,
-            {
-                "txpool": (AsyncGethTxPool,),
-                "perosnal": (AsyncGethPersonal,),
-                "admin": (AsyncGethAdmin,),
-            },
-        ),
-    },
-    middlewares=[],
-)
-
-N_REQUESTS = 100
-
-
-def print_method_response_time_statistics(method_name: str, request_times: List[float]):
-    min_r = min(request_times)
-    avg_r = sum(request_times) / len(request_times)
-    max_r = max(request_times)
-    stddev_r = statistics.stdev(request_times)
-    print(
-        f"Method '{method_name}' response times: min/avg/max/stddev = {min_r:.3f}/{avg_r:.3f}/{max_r:.3f}/{stddev_r:.3f} ms"
-    )
+import csv
+import itertools
+import json
+import math
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional
 
+import aiohttp
+
+DEFAULT_METHODS = [
+    "eth_blockNumber",
+    "eth_getBlockByNumber",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "trace_replayTransaction",
+    "trace_block",
+]
+"""The JSON-RPC methods requested by the data collection"""
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+
+HISTOGRAM_BOUNDS_MS = [0.25 * 2**i for i in range(18)]
+"""Upper bounds of the latency histogram buckets (0.25 ms to ~33 s, doubling)"""
+
+CSV_FIELDS = [
+    "method",
+    "batch_size",
+    "concurrency",
+    "n_requests",
+    "n_calls",
+    "n_errors",
+    "requests_per_s",
+    "calls_per_s",
+    "mean_ms",
+    *(f"{name}_ms" for name in PERCENTILES),
+    "max_ms",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
 
-async def main(block_number):
-    """
-    Args:
-        block_number: starting block number
-    """
-    print(f"Starting web3 method benchmark ({N_REQUESTS} requests per method)")
-    print(f"Current datetime (UTC): {datetime.utcnow().isoformat()}\n---")
-    request_times_getBlock = []
-    # keep a list of txs for later
-    tx_hashes = []
-    for i in range(N_REQUESTS):
-        start = time.perf_counter()
-        block_data = await w3.eth.get_block(block_number + i)
-        if len(block_data["transactions"]) > 1 and len(tx_hashes) < N_REQUESTS:
-            tx_hashes.append(block_data["transactions"][0])
-            tx_hashes.append(block_data["transactions"][1])
-        request_times_getBlock.append((time.perf_counter() - start) * 1000)
-        time.sleep(0.05)
-
-    # to ms divided by n_reqs
-    print_method_response_time_statistics("get_block", request_times_getBlock)
-
-    request_times_getTransaction = []
-    for i in range(N_REQUESTS):
-        start = time.perf_counter()
-        tx_data_dict = await w3.eth.get_transaction(tx_hashes[i])
-        request_times_getTransaction.append((time.perf_counter() - start) * 1000)
-        time.sleep(0.05)
-
-    print_method_response_time_statistics(
-        "get_transaction", request_times_getTransaction
-    )
 
-    request_times_internaltx = []
-    for i in range(N_REQUESTS):
-        """Get internal transaction data by hash"""
-        start = time.perf_counter()
-        data = await w3.provider.make_request(
-            "trace_replayTransaction", [tx_hashes[i].hex(), ["trace"]]
+def histogram(latencies_ms: List[float]) -> List[dict]:
+    """Number of latencies in each bucket (up to `le` ms), the last bucket has no upper bound"""
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies_ms:
+        i = next(
+            (i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if latency <= bound),
+            len(HISTOGRAM_BOUNDS_MS),
         )
-        request_times_internaltx.append((time.perf_counter() - start) * 1000)
-        time.sleep(0.05)
+        counts[i] += 1
+    return [
+        {"le_ms": bound, "count": count}
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS + [None], counts)
+    ]
+
+
+class RpcLoadGenerator:
+    """Closed-loop JSON-RPC load: `concurrency` workers each send a (batch) request and wait for it"""
+
+    def __init__(self, node_url: str, timeout: float, headers: Dict[str, str]) -> None:
+        self.node_url = node_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {"Content-Type": "application/json", **headers}
+        self._ids = itertools.count()
+
+    def _payload(self, method: str, params: Any) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params,
+        }
+
+    async def request(
+        self, session: aiohttp.ClientSession, method: str, params: Any
+    ) -> Any:
+        """A single request, raises `RuntimeError` on JSON-RPC errors"""
+        async with session.post(
+            self.node_url, json=self._payload(method, params)
+        ) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if "error" in body:
+            raise RuntimeError(f"{method} failed: {body['error']}")
+        return body["result"]
+
+    async def run(
+        self,
+        method: str,
+        next_params: Callable[[], Any],
+        concurrency: int,
+        batch_size: int,
+        duration: float,
+        warmup: float,
+    ) -> dict:
+        """Load the node for `warmup` + `duration` seconds, measure the requests after the warm-up"""
+        latencies_ms: List[float] = []
+        n_calls, n_errors = 0, 0
+        loop = asyncio.get_running_loop()
+        measure_from = loop.time() + warmup
+        end = measure_from + duration
+
+        async def worker(session: aiohttp.ClientSession):
+            nonlocal n_calls, n_errors
+            while (start := loop.time()) < end:
+                payload = [
+                    self._payload(method, next_params()) for _ in range(batch_size)
+                ]
+                errors = 0
+                try:
+                    async with session.post(
+                        self.node_url, json=payload if batch_size > 1 else payload[0]
+                    ) as response:
+                        response.raise_for_status()
+                        body = await response.json(content_type=None)
+                    responses = body if isinstance(body, list) else [body]
+                    errors = (
+                        sum("error" in r for r in responses)
+                        + batch_size
+                        - len(responses)
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    errors = batch_size
+                if start >= measure_from:
+                    latencies_ms.append(1e3 * (loop.time() - start))
+                    n_calls += batch_size
+                    n_errors += errors
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(
+            connector=connector, headers=self.headers, timeout=self.timeout
+        ) as session:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = loop.time() - measure_from
+
+        latencies_ms.sort()
+        result = {
+            "method": method,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "n_requests": len(latencies_ms),
+            "n_calls": n_calls,
+            "n_errors": n_errors,
+            "requests_per_s": len(latencies_ms) / elapsed,
+            "calls_per_s": (n_calls - n_errors) / elapsed,
+        }
+        if latencies_ms:
+            result["mean_ms"] = sum(latencies_ms) / len(latencies_ms)
+            for name, q in PERCENTILES.items():
+                result[f"{name}_ms"] = percentile(latencies_ms, q)
+            result["max_ms"] = latencies_ms[-1]
+        result["histogram"] = histogram(latencies_ms)
+        return result
+
 
-    print_method_response_time_statistics(
-        "trace_replayTransaction", request_times_internaltx
+async def sample_params(
+    generator: RpcLoadGenerator, start_block: Optional[int], n_blocks: int
+) -> Dict[str, List[Any]]:
+    """Params of each method from `n_blocks` consecutive blocks (their transactions)"""
+    async with aiohttp.ClientSession(
+        headers=generator.headers, timeout=generator.timeout
+    ) as session:
+        if start_block is None:
+            latest = int(await generator.request(session, "eth_blockNumber", []), 16)
+            start_block = max(latest - 1000 - n_blocks, 0)
+        blocks = await asyncio.gather(
+            *(
+                generator.request(session, "eth_getBlockByNumber", [hex(number), False])
+                for number in range(start_block, start_block + n_blocks)
+            )
+        )
+    block_numbers = [int(block["number"], 16) for block in blocks if block]
+    tx_hashes = [tx for block in blocks if block for tx in block["transactions"]]
+    if not tx_hashes:
+        raise SystemExit(
+            f"No transactions in blocks {start_block}-{start_block + n_blocks - 1}"
+        )
+    return {
+        "eth_blockNumber": [[]],
+        "eth_getBlockByNumber": [[hex(number), False] for number in block_numbers],
+        "eth_getTransactionByHash": [[tx_hash] for tx_hash in tx_hashes],
+        "eth_getTransactionReceipt": [[tx_hash] for tx_hash in tx_hashes],
+        "trace_replayTransaction": [[tx_hash, ["trace"]] for tx_hash in tx_hashes],
+        # Like `NodeConnector.get_block_reward`
+        "trace_block": [[number] for number in block_numbers],
+    }
+
+
+def saturation(results: List[dict]) -> List[dict]:
+    """The lowest concurrency reaching 95% of the maximum throughput of each method and batch size"""
+    summary = []
+    key = itemgetter("method", "batch_size")
+    for (method, batch_size), group in itertools.groupby(sorted(results, key=key), key):
+        group = sorted(group, key=lambda r: r["concurrency"])
+        max_throughput = max(r["calls_per_s"] for r in group)
+        saturated = next(r for r in group if r["calls_per_s"] >= 0.95 * max_throughput)
+        summary.append(
+            {
+                "method": method,
+                "batch_size": batch_size,
+                "max_calls_per_s": max_throughput,
+                "saturation_concurrency": saturated["concurrency"],
+                "saturation_p99_ms": saturated.get("p99_ms"),
+            }
+        )
+    return summary
+
+
+async def main(args):
+    generator = RpcLoadGenerator(
+        args.node_url,
+        args.timeout,
+        {"Host": args.host_header} if args.host_header else {},
     )
+    params = await sample_params(generator, args.start_block, args.n_blocks)
+    unknown = [method for method in args.methods if method not in params]
+    if unknown:
+        raise SystemExit(f"No params for the methods: {', '.join(unknown)}")
 
-    request_times_blockReward = []
-    for i in range(N_REQUESTS):
-        start = time.perf_counter()
-        data = await w3.provider.make_request("trace_block", [block_number + i])
-        request_times_blockReward.append((time.perf_counter() - start) * 1000)
-        time.sleep(0.05)
+    print(
+        f"Benchmarking {args.node_url}, {args.duration}s per level "
+        f"(UTC: {datetime.now(timezone.utc).isoformat()})"
+    )
+    results = []
+    for method in args.methods:
+        cycle = itertools.cycle(params[method])
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                result = await generator.run(
+                    method,
+                    lambda: next(cycle),
+                    concurrency,
+                    batch_size,
+                    args.duration,
+                    args.warmup,
+                )
+                results.append(result)
+                print(
+                    f"{method} batch={batch_size} concurrency={concurrency}: "
+                    f"{result['calls_per_s']:.0f} calls/s, p50/p90/p99/p999 = "
+                    + "/".join(
+                        f"{result.get(f'{name}_ms', math.nan):.1f}"
+                        for name in PERCENTILES
+                    )
+                    + f" ms, {result['n_errors']} errors"
+                )
 
-    print_method_response_time_statistics("trace_block", request_times_blockReward)
+    summary = saturation(results)
+    print("---")
+    for s in summary:
+        print(
+            f"{s['method']} batch={s['batch_size']}: max {s['max_calls_per_s']:.0f} calls/s, "
+            f"saturated at concurrency {s['saturation_concurrency']} (p99 {s['saturation_p99_ms']:.1f} ms)"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "node_url": args.node_url,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "duration_s": args.duration,
+                    "results": results,
+                    "saturation": summary,
+                },
+                f,
+                indent=2,
+            )
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
 
 
-asyncio.run(main(15500000))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput and latencies of JSON-RPC methods at increasing "
+        "concurrency levels and batch sizes (to find the saturation point of a node)"
+    )
+    parser.add_argument("--node-url", default="http://localhost:8547")
+    parser.add_argument(
+        "--host-header",
+        default="localhost",
+        help="Host header of the requests (the node only accepts localhost through an SSH tunnel), empty to disable",
+    )
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 10])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument(
+        "--warmup", type=float, default=1, help="unmeasured seconds before each level"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="timeout of a request (s)"
+    )
+    parser.add_argument(
+        "--start-block",
+        type=int,
+        help="first block whose transactions are requested (1000 blocks below the latest by default)",
+    )
+    parser.add_argument("--n-blocks", type=int, default=20)
+    parser.add_argument(
+        "--json", help="write the results (incl. latency histograms) to this JSON file"
+    )
+    parser.add_argument(
+        "--csv", help="write the results (without histograms) to this CSV file"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -1,24 +1,153 @@
 """App module"""
+import atexit
+import copy
 import logging
 import os
+import queue
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+LOG_FORMAT = "%(asctime)s.%(msecs)03d %(name)s %(levelname)-8s %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message"}
+"""The attributes of every log record, the other attributes are the `extra` fields"""
 
 loggers = dict()
+_handler: Optional[logging.Handler] = None
+
+
+class TextFormatter(logging.Formatter):
+    """The plain text format, with the number of suppressed records (see `RateLimitFilter`)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if suppressed := getattr(record, "suppressed", 0):
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including the `extra` fields of the record
+
+    Example:
+        `log.info("Scaling consumer tasks", extra={"n_tasks": 10})` is written as
+        `{"time":"...","level":"INFO","logger":"...","message":"Scaling consumer tasks","n_tasks":10}`
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `rate` records of each message pass per `interval` seconds
+
+    Note:
+        A message is identified by its call site (file and line), so messages formatted
+        with different values are limited together. The number of suppressed records
+        is added to the next record of the message that passes (`record.suppressed`).
+    """
+
+    def __init__(self, rate: int, interval: float = 1.0) -> None:
+        """
+        Args:
+            rate: the maximum number of records per message and interval, unlimited if 0
+            interval: the length (in seconds) of the intervals
+        """
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        # Call site -> [start of the interval, passed records, suppressed records]
+        self._windows: Dict[Tuple[str, int], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rate:
+            return True
+        key = (record.pathname, record.lineno)
+        window = self._windows.get(key)
+        if window is None or record.created - window[0] >= self.interval:
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [record.created, 1, 0]
+            return True
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class LocalQueueHandler(QueueHandler):
+    """Queue the records for the listener thread with their message, but not yet formatted"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message is merged now, the args may be changed before the listener gets to them.
+        # Unlike `QueueHandler`, the records don't leave the process, so the rest of the
+        # formatting (time, traceback, JSON) is left to the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _create_handler() -> logging.Handler:
+    """The handler shared by all loggers of the process
+
+    The records are written to stdout by a listener thread (started here and stopped at exit),
+    so writing them doesn't block the event loop.
+    """
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    handler = LocalQueueHandler(queue.SimpleQueue())
+    handler.addFilter(RateLimitFilter(int(os.getenv("LOG_RATE_LIMIT", "10"))))
+    listener = QueueListener(handler.queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
 
 
 def init_logger(name):
-    """Create and return a custom logger"""
+    """Create and return a custom logger
+
+    Note:
+        The shared handler is attached only to the top-level logger of `name` (e.g. `app`),
+        the records of its children (e.g. `app.consumer.tx_processor`) propagate to it,
+        so each record is handled once.
+    """
+    global _handler
     if existing_log := loggers.get(name, None):
         return existing_log
     else:
-        formatter = logging.Formatter(
-            fmt="%(asctime)s.%(msecs)03d %(name)s %(levelname)-8s %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(formatter)
+        if _handler is None:
+            _handler = _create_handler()
+        top_level_logger = logging.getLogger(name.partition(".")[0])
+        if _handler not in top_level_logger.handlers:
+            top_level_logger.addHandler(_handler)
         logger = logging.getLogger(name)
-        logger.addHandler(handler)
-        logger.setLevel(os.getenv("LOG_LEVEL", "DEBUG"))
+        logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
         loggers[name] = logger
         return logger
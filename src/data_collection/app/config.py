@@ -75,6 +75,23 @@ class ContractConfig(BaseModel):
         )
 
 
+class NodeEndpointConfig(BaseModel):
+    """Describe a blockchain node that JSON-RPC requests are spread over
+
+    For instance an archive node or an Erigon rpcdaemon
+    """
+
+    url: AnyUrl
+    """The RPC API URL of the node"""
+    methods: Optional[conlist(str, min_items=1)] = None
+    """Patterns of the JSON-RPC methods served by the node, all methods if not set.
+
+    Examples:
+        ``["eth_*"]`` (e.g. a full node, traces are then requested only from the other nodes)
+        ``["trace_*", "debug_*"]``
+    """
+
+
 class DataCollectionConfig(BaseSettings):
     """Store data collection configuration settings.
 
@@ -108,6 +125,14 @@ class DataCollectionConfig(BaseSettings):
         https://www.quicknode.com/docs/ethereum/eth_getLogs
     """
 
+    prefilter_transactions: bool = True
+    """Only used with DataCollectionMode.PARTIAL, the producer sends only transactions
+    that can be relevant for the contracts (based on the block's logsBloom and the `to` addresses)
+
+    Note:
+        See `app.web3.relevance_filter.BlockRelevanceFilter`
+    """
+
     @root_validator
     def block_order_correct(cls, values):
         """Check if start_block <= end_block"""
@@ -144,6 +169,15 @@ class Config(BaseSettings):
     node_url: AnyUrl
     """The blockchain node RPC API URL"""
 
+    node_endpoints: List[NodeEndpointConfig] = []
+    """The nodes that JSON-RPC requests (blocks, transactions, receipts, traces) are spread over.
+
+    Note:
+        If empty, all the requests are made to `node_url`. Otherwise `node_url` is only used
+        for contract calls, blocks with full transactions and `eth_getLogs`.
+        See `app.web3.load_balancer.NodeLoadBalancer`.
+    """
+
     db_dsn: PostgresDsn
     """DSN for PostgreSQL"""
 
@@ -164,14 +198,200 @@ class Config(BaseSettings):
     number_of_consumer_tasks: int = Field(..., env="N_CONSUMER_INSTANCES")
     """The number of consumer (`DataConsumer`) tasks that will be started"""
 
+    number_of_consumer_processes: int = Field(1, env="N_CONSUMER_PROCESSES", ge=1)
+    """The number of consumer worker processes, each running `number_of_consumer_tasks` tasks.
+
+    Note:
+        If larger than 1, the consumer is started in supervisor mode
+        (see `app.consumer.supervisor.ConsumerSupervisor`).
+    """
+
+    max_consumer_tasks: Optional[int] = Field(
+        None, env="N_CONSUMER_INSTANCES_MAX", ge=1
+    )
+    """The maximum number of consumer tasks (of each consumer worker process).
+
+    Note:
+        If larger than `number_of_consumer_tasks`, the number of consumer tasks is autoscaled
+        between `number_of_consumer_tasks` and this value (see `app.consumer.autoscaler.ConsumerAutoscaler`).
+    """
+
+    consumer_autoscaling_target_lag: int = Field(
+        1000, env="CONSUMER_AUTOSCALING_TARGET_LAG", ge=1
+    )
+    """The number of unconsumed events per consumer task above which a consumer task is added"""
+
+    consumer_autoscaling_max_rpc_latency: float = Field(
+        2.0, env="CONSUMER_AUTOSCALING_MAX_RPC_LATENCY", gt=0
+    )
+    """The average RPC request latency (in seconds) above which a consumer task is removed"""
+
+    consumer_process_max_restarts: int = Field(
+        3, env="CONSUMER_PROCESS_MAX_RESTARTS", ge=0
+    )
+    """The number of times a crashed consumer worker process is restarted by the supervisor"""
+
+    consumer_transaction_deadline: float = Field(
+        120, env="CONSUMER_TRANSACTION_DEADLINE", gt=0
+    )
+    """The time (in seconds) within which all the node requests of a transaction have to be made.
+
+    Note:
+        Requests (and retries) after the deadline fail right away, the event is then sent
+        to the retry topic instead of blocking the consumer.
+    """
+
+    stage_metrics_log_interval: int = Field(60, env="STAGE_METRICS_LOG_INTERVAL", ge=0)
+    """The interval (in seconds) of the log summaries of the consumer stage latencies, disabled if 0"""
+
+    metrics_port: Optional[int] = Field(None, env="METRICS_PORT", ge=1, le=65535)
+    """The port of the HTTP server of the consumer stage latencies (at `/metrics`, in the Prometheus format).
+
+    Note:
+        Disabled if `None`. In supervisor mode, worker process #i serves at port `metrics_port + i`.
+    """
+
+    @validator("metrics_port", pre=True)
+    def empty_metrics_port_is_none(cls, value):
+        """An empty METRICS_PORT (e.g. in the .env file) disables the metrics server"""
+        return None if value == "" else value
+
+    tracing_sample_rate: float = Field(0.01, env="TRACING_SAMPLE_RATE", ge=0, le=1)
+    """The share of the traces (blocks in the producer) that are sampled, if tracing is enabled"""
+
+    tracing_file: Optional[str] = Field(None, env="TRACING_FILE")
+    """The file the spans are appended to (OTLP/JSON lines), tracing is disabled if empty
+
+    Note:
+        Each container needs its own file, worker process #i appends to `<tracing_file>.<i>`.
+    """
+
+    tracing_otlp_endpoint: Optional[str] = Field(None, env="TRACING_OTLP_ENDPOINT")
+    """The URL of an OpenTelemetry collector the spans are sent to (OTLP/HTTP), e.g. `http://otel-collector:4318`
+
+    Note:
+        Takes precedence over `tracing_file`. Tracing is disabled if both are empty.
+    """
+
+    profile_duration: float = Field(30, env="PROFILE_DURATION", gt=0)
+    """The duration (in seconds) of a profile started with SIGUSR1 (see `app.utils.profiler`)"""
+
+    profile_dir: str = Field("etc/profiles", env="PROFILE_DIR")
+    """The directory the profiles are written to"""
+
     web3_requests_timeout: int = Field(..., env="WEB3_REQUESTS_TIMEOUT")
-    """Timeout for web3 requests in seconds"""
+    """Timeout for web3 requests in seconds.
+
+    Note:
+        JSON-RPC requests of blocks, transactions, receipts and traces use this timeout only until
+        there are enough latencies of the method, their timeout is then adapted to the latencies
+        (see `app.web3.timeouts.AdaptiveTimeouts`).
+    """
+
+    web3_requests_timeout_min: float = Field(1, env="WEB3_REQUESTS_TIMEOUT_MIN", gt=0)
+    """The minimum adaptive timeout of JSON-RPC requests in seconds"""
+
+    web3_requests_timeout_max: float = Field(120, env="WEB3_REQUESTS_TIMEOUT_MAX", gt=0)
+    """The maximum adaptive timeout of JSON-RPC requests in seconds"""
+
+    web3_requests_timeout_multiplier: float = Field(
+        3, env="WEB3_REQUESTS_TIMEOUT_MULTIPLIER", gt=0
+    )
+    """The adaptive timeout of a JSON-RPC method is the 99th percentile of its latencies
+    multiplied by this value"""
+
+    web3_response_cache_path: Optional[str] = Field(
+        None, env="WEB3_RESPONSE_CACHE_PATH"
+    )
+    """Path of the on-disk (SQLite) cache of JSON-RPC results of final blocks, no cache if not set.
+
+    Note:
+        Blocks, transactions, receipts and traces are read from the cache instead of the node
+        once they were requested (see `app.web3.response_cache.ResponseCache`).
+    """
+
+    web3_response_cache_max_size: int = Field(
+        10240, env="WEB3_RESPONSE_CACHE_MAX_SIZE", ge=1
+    )
+    """The maximum size of the response cache in MB, the least recently used results are evicted"""
+
+    web3_response_cache_finality_depth: int = Field(
+        64, env="WEB3_RESPONSE_CACHE_FINALITY_DEPTH", ge=0
+    )
+    """The number of blocks below the latest block after which results are cached (can't be reorged)"""
+
+    web3_concurrency_limit_initial: int = Field(
+        20, env="WEB3_CONCURRENCY_LIMIT_INITIAL", ge=1
+    )
+    """The initial number of concurrent JSON-RPC requests to a node endpoint (of a process).
+
+    Note:
+        The limit of each endpoint (and of its trace requests) is adapted to the node's throughput
+        between `web3_concurrency_limit_min` and `web3_concurrency_limit_max`
+        (see `app.web3.concurrency.AIMDLimit`).
+    """
+
+    web3_concurrency_limit_min: int = Field(1, env="WEB3_CONCURRENCY_LIMIT_MIN", ge=1)
+    """The minimum number of concurrent JSON-RPC requests to a node endpoint (of a process)"""
+
+    web3_concurrency_limit_max: int = Field(200, env="WEB3_CONCURRENCY_LIMIT_MAX", ge=1)
+    """The maximum number of concurrent JSON-RPC requests to a node endpoint (of a process)"""
 
     web3_requests_retry_limit: int = Field(..., env="WEB3_REQUESTS_RETRY_LIMIT")
     """The number of retries for web3 requests"""
 
     web3_requests_retry_delay: int = Field(..., env="WEB3_REQUESTS_RETRY_DELAY")
-    """The delay between retries for web3 requests in seconds"""
+    """The maximum delay before the first retry of web3 requests in seconds.
+
+    Note:
+        The delay is doubled for each next retry (up to `web3_requests_retry_max_delay`),
+        the actual delay is random between 0 and this delay (see `app.web3.retry.RetryPolicy`).
+    """
+
+    web3_requests_retry_max_delay: float = Field(
+        60, env="WEB3_REQUESTS_RETRY_MAX_DELAY", gt=0
+    )
+    """The maximum delay between retries for web3 requests in seconds"""
+
+    web3_requests_retry_budget: float = Field(
+        0.2, env="WEB3_REQUESTS_RETRY_BUDGET", ge=0
+    )
+    """The ratio of retries to web3 requests (of a process), retries above the budget fail right away"""
+
+    web3_circuit_breaker_threshold: int = Field(
+        20, env="WEB3_CIRCUIT_BREAKER_THRESHOLD", ge=1
+    )
+    """The number of failed web3 requests in a row (of a process) after which requests fail fast
+    until the node recovers (see `app.web3.retry.CircuitBreaker`)"""
+
+    web3_circuit_breaker_reset_timeout: float = Field(
+        30, env="WEB3_CIRCUIT_BREAKER_RESET_TIMEOUT", gt=0
+    )
+    """The time (in seconds) after which the node is probed while requests fail fast"""
 
     kafka_event_retrieval_timeout: int = Field(..., env="KAFKA_EVENT_RETRIEVAL_TIMEOUT")
     """Timeout for retrieving events from Kafka in seconds. After this time runs out, the consumers will shut down."""
+
+    kafka_retry_max_attempts: int = Field(5, env="KAFKA_RETRY_MAX_ATTEMPTS", ge=1)
+    """The number of processing attempts of an event before it is sent to the dead-letter topic"""
+
+    kafka_retry_backoff: int = Field(30, env="KAFKA_RETRY_BACKOFF", ge=0)
+    """The delay before the first retry of a failed event in seconds (doubled for each next retry)"""
+
+    kafka_retry_max_backoff: int = Field(600, env="KAFKA_RETRY_MAX_BACKOFF", ge=0)
+    """The maximum delay before a retry of a failed event in seconds"""
+
+    kafka_offsets_in_db: bool = Field(False, env="KAFKA_OFFSETS_IN_DB")
+    """Store consumer offsets in PostgreSQL (`<node>_kafka_offset` table), in the same
+    DB transaction as the data of each event (exactly-once processing).
+
+    Note:
+        On partition assignment the consumers seek to the offsets stored in the database,
+        offsets committed to Kafka are then only used for monitoring (consumer lag).
+    """
+
+    contract_metadata_refresh_interval: int = Field(
+        3600, env="CONTRACT_METADATA_REFRESH_INTERVAL", ge=0
+    )
+    """The time (in seconds) after which mutable contract metadata (total supply, reserves)
+    in the contract metadata cache is refreshed (see `app.web3.contract_cache.ContractMetadataCache`)"""
@@ -1,18 +1,33 @@
+from __future__ import annotations
+
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from aiokafka.structs import ConsumerRecord
 
 from app import init_logger
 from app.config import Config
+from app.consumer.tx_data_loader import TransactionDataLoader
 from app.consumer.tx_processor import (
     FullTransactionProcessor,
     LogFilterTransactionProcessor,
     PartialTransactionProcessor,
 )
+from app.db.redis import RedisManager
 from app.kafka.exceptions import KafkaConsumerPartitionsEmptyError
-from app.kafka.manager import KafkaConsumerManager
+from app.kafka.manager import KafkaConsumerManager, KafkaRetryProducerManager
 from app.model import DataCollectionMode
 from app.model.abi import ContractABI
 from app.utils.data_collector import DataCollector
+from app.utils.metrics import processor_context, stage_metrics
+from app.utils.tracing import SpanKind, tracer
+from app.web3.concurrency import ConcurrencyLimiter
+from app.web3.contract_cache import ContractMetadataCache
 from app.web3.parser import ContractParser
+from app.web3.retry import CircuitOpenError, RetryController
+from app.web3.timeouts import request_deadline
 
 log = init_logger(__name__)
 
@@ -26,20 +41,79 @@ def kafka_logs_filter(record) -> bool:
     return not should_filter
 
 
+def create_contract_metadata_cache(config: Config) -> ContractMetadataCache:
+    """Create a contract metadata cache backed by the Redis of the given config"""
+    return ContractMetadataCache(
+        redis_manager=RedisManager(
+            redis_url=config.redis_url, topic=config.kafka_topic
+        ),
+        refresh_interval=config.contract_metadata_refresh_interval,
+    )
+
+
 class DataConsumer(DataCollector):
     """
     Consume transaction hash from a given Kafka topic and save
     all required data to PostgreSQL.
+
+    Note:
+        Events that fail to be processed are sent to a retry topic (and eventually
+        to a dead-letter topic) so that a single bad transaction doesn't stop the consumer.
+
+        With `KAFKA_OFFSETS_IN_DB` the offset of each event is stored in the same
+        DB transaction as its data, so a crash never leads to reprocessing an event.
     """
 
-    def __init__(self, config: Config, contract_abi: ContractABI) -> None:
-        super().__init__(config)
-        self.kafka_manager: KafkaConsumerManager = KafkaConsumerManager(
+    def __init__(
+        self,
+        config: Config,
+        contract_abi: ContractABI,
+        consume_retries: bool = False,
+        contract_metadata_cache: Optional[ContractMetadataCache] = None,
+        retry_controller: Optional[RetryController] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        """
+        Args:
+            consume_retries: consume the retry topic instead of the main topic
+            contract_metadata_cache: the contract metadata cache shared by the consumers
+                                     of a process, a new one is created if `None`
+            retry_controller: the retry controller of node requests shared by the consumers
+                              of a process, a new one is created if `None`
+            concurrency_limiter: the concurrency limiter of node requests shared by the consumers
+                                 of a process, a new one is created if `None`
+        """
+        super().__init__(
+            config,
+            retry_controller=retry_controller,
+            concurrency_limiter=concurrency_limiter,
+        )
+        # Routes failed events to the retry / dead-letter topic
+        self.retry_manager = KafkaRetryProducerManager(
             kafka_url=config.kafka_url,
             redis_url=config.redis_url,
             topic=config.kafka_topic,
+            max_attempts=config.kafka_retry_max_attempts,
+            backoff=config.kafka_retry_backoff,
+            max_backoff=config.kafka_retry_max_backoff,
+        )
+        self.consume_retries = consume_retries
+        self.kafka_manager: KafkaConsumerManager = KafkaConsumerManager(
+            kafka_url=config.kafka_url,
+            redis_url=config.redis_url,
+            topic=self.retry_manager.retry_topic
+            if consume_retries
+            else config.kafka_topic,
             event_retrieval_timeout=config.kafka_event_retrieval_timeout,
+            count_transactions=not consume_retries,
+            get_stored_offsets=self.db_manager.get_kafka_offsets
+            if config.kafka_offsets_in_db
+            else None,
         )
+        # Commit offsets to PostgreSQL together with the data (exactly-once processing)
+        self.offsets_in_db = config.kafka_offsets_in_db
+        # Deadline of all the node requests of a transaction
+        self.transaction_deadline = config.consumer_transaction_deadline
         # Create a set from all the contracts (we want to save any of these transactions)
         contracts = set()
         for data_cfg in config.data_collection:
@@ -51,6 +125,8 @@ class DataConsumer(DataCollector):
             web3=self.node_connector.w3,
             contract_abi=contract_abi,
             contracts=contracts,
+            metadata_cache=contract_metadata_cache
+            or create_contract_metadata_cache(config),
         )
 
         _tx_processor_args = [
@@ -76,31 +152,126 @@ class DataConsumer(DataCollector):
         self._n_consumed_txs = 0
         # Number of processed transactions (saved to PostgreSQL or otherwise processed)
         self._n_processed_txs = 0
+        # Number of transactions that failed to be processed (sent to the retry / dead-letter topic)
+        self._n_failed_txs = 0
 
         # Apply kafka log filter to filter out some kafka logs
         kafka_logger = logging.getLogger("aiokafka.consumer.group_coordinator")
         kafka_logger.addFilter(kafka_logs_filter)
 
+    async def __aenter__(self) -> DataConsumer:
+        await self.retry_manager.connect()
+        return await super().__aenter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await super().__aexit__(exc_type, exc, tb)
+        await self.retry_manager.disconnect()
+
+    def stop(self):
+        """Stop consuming gracefully, after the currently processed event (if any)"""
+        self.kafka_manager.stop()
+
+    async def _store_offset(self, event: ConsumerRecord):
+        """Store the offset of the event following `event` in the database"""
+        await self.db_manager.upsert_kafka_offset(
+            event.topic, event.partition, event.offset + 1
+        )
+
+    @asynccontextmanager
+    async def _event_transaction(self, event: ConsumerRecord):
+        """DB transaction for all the writes of a single event, including its offset
+
+        Note:
+            Only used with `KAFKA_OFFSETS_IN_DB`, nested transactions of the
+            transaction processors become savepoints of this transaction.
+        """
+        if not self.offsets_in_db:
+            yield
+            return
+
+        async with self.db_manager.db.transaction():
+            yield
+            await self._store_offset(event)
+
+    async def _process_kafka_event(self, event):
+        """Process a Kafka event (within its DB transaction)
+
+        Note:
+            While the node is unavailable (the circuit breaker of the node requests is open), the
+            event is processed again once the node can be probed, instead of being sent to the retry topic.
+        """
+        while True:
+            try:
+                async with self._event_transaction(event):
+                    await self._on_kafka_event(event)
+                return
+            except CircuitOpenError as e:
+                await e.circuit_breaker.wait()
+
+    async def _on_kafka_event_with_retry(self, event):
+        """Process a Kafka event, send it to the retry (or dead-letter) topic if processing fails"""
+        if self.consume_retries:
+            # Respect the backoff of events from the retry topic
+            not_before = self.retry_manager.get_not_before(event)
+            if not_before is not None and not_before > time.time():
+                self.kafka_manager.defer_event(event, not_before)
+                return
+        try:
+            await self._process_kafka_event(event)
+        except Exception as e:
+            topic = await self.retry_manager.send_failed_event(event, e)
+            # Log an error only if the event won't be retried anymore
+            log_fn = (
+                log.error
+                if topic == self.retry_manager.dead_letter_topic
+                else log.warning
+            )
+            log_fn(
+                f"Caught exception during handling of {self._tx_hash}, sent it to '{topic}'",
+                exc_info=(type(e), e, e.__traceback__),
+            )
+            self._n_failed_txs += 1
+            if self.offsets_in_db:
+                # The event is handled by the retry topic from now on
+                await self._store_offset(event)
+
     async def _on_kafka_event(self, event):
         """Called when a new Kafka event is read from a topic"""
         # Get transaction hash and collection mode from Kafka event
         mode, self._tx_hash = self.decode_kafka_event(event.value.decode())
         # Increment number of consumed transactions
         self._n_consumed_txs += 1
-        # Get transaction data
-        tx_data, _ = await self.node_connector.get_transaction_data(self._tx_hash)
-        (
-            tx_receipt_data,
-            w3_tx_receipt,
-        ) = await self.node_connector.get_transaction_receipt_data(self._tx_hash)
+        # Transaction data is fetched lazily by the transaction processor
+        tx = TransactionDataLoader(self._tx_hash, self.node_connector)
 
         # Get the correct transaction processor for the given mode
         # otherwise use the default tx processor
         tx_processor = self.tx_processors.get(mode, self._default_tx_processor)
-        # Process the transaction
-        self._n_processed_txs += await tx_processor.process_transaction(
-            tx_data, tx_receipt_data, w3_tx_receipt
-        )
+        # Continue the trace of the producer (the block of the transaction) if it has one
+        parent = tracer.extract(event.headers) if tracer.enabled else None
+        # Process the transaction, its node requests (incl. retries) share a single deadline,
+        # the latencies of the processing stages are recorded per collection mode
+        with (
+            tracer.span(
+                "process_transaction", kind=SpanKind.CONSUMER, parent=parent, root=True
+            ) as span,
+            request_deadline(self.transaction_deadline),
+            processor_context(mode.value),
+            stage_metrics.timer("process_transaction"),
+        ):
+            if span is not None:
+                span.attributes.update(
+                    {
+                        "transaction.hash": self._tx_hash,
+                        "data_collection.mode": mode.value,
+                        "messaging.kafka.partition": event.partition,
+                        "messaging.kafka.offset": event.offset,
+                        # Time between producing and consuming the event
+                        "messaging.kafka.queue_time_ms": time.time() * 1e3
+                        - event.timestamp,
+                    }
+                )
+            self._n_processed_txs += await tx_processor.process_transaction(tx)
 
     async def start_consuming_data(self) -> int:
         """
@@ -114,7 +285,7 @@ class DataConsumer(DataCollector):
             # Start consuming events from a Kafka topic and
             # handle them in _on_kafka_event
             await self.kafka_manager.start_consuming(
-                on_event_callback=self._on_kafka_event
+                on_event_callback=self._on_kafka_event_with_retry
             )
         except KafkaConsumerPartitionsEmptyError:
             # Raised when a partition doesn't receive a new message for 120 seconds.
@@ -125,14 +296,15 @@ class DataConsumer(DataCollector):
             # and returns exit code 1
             tx_hash = self._tx_hash or "first transaction"
             log.error(
-                f"Caught exception during handling of {tx_hash}",
+                "Caught exception during handling of %s",
+                tx_hash,
                 exc_info=(type(e), e, e.__traceback__),
             )
             exit_code = 1
         finally:
             log.info(
-                "number of consumed transactions: {} | number of processed transactions: {}".format(
-                    self._n_consumed_txs, self._n_processed_txs
+                "number of consumed transactions: {} | number of processed transactions: {} | number of failed transactions: {}".format(
+                    self._n_consumed_txs, self._n_processed_txs, self._n_failed_txs
                 )
             )
             return exit_code
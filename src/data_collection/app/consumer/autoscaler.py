@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from app import init_logger
+from app.config import Config
+from app.consumer import DataConsumer, create_contract_metadata_cache
+from app.model.abi import ContractABI
+from app.utils.data_collector import create_concurrency_limiter, create_retry_controller
+from app.web3.concurrency import ConcurrencyLimiter
+
+log = init_logger(__name__)
+
+
+class ConsumerAutoscaler:
+    """Run a variable number of DataConsumer tasks, scaled by the consumer lag and RPC latency
+
+    Every `SCALING_INTERVAL` seconds the number of consumer tasks is changed by (at most) one:
+        * removed if the average RPC request latency exceeds `max_rpc_latency` (the node is flooded)
+        * added if the lag (unconsumed events of the assigned partitions) exceeds `target_lag` per task
+        * removed if the lag could be handled by a task less (with hysteresis)
+
+    Note:
+        Every added or removed consumer triggers a rebalance of the consumer group. aiokafka doesn't
+        support incremental cooperative rebalancing, so the rebalances are kept short instead: removed
+        consumers finish their current event and leave the group immediately and the number of
+        consumers changes by a single task per interval.
+    """
+
+    SCALING_INTERVAL = 30
+    """Time (in seconds) between two scaling decisions"""
+
+    def __init__(
+        self,
+        config: Config,
+        contract_abi: ContractABI,
+        consume_retries: bool = False,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        """
+        Args:
+            config: the app configuration, the bounds are `N_CONSUMER_INSTANCES` and `N_CONSUMER_INSTANCES_MAX`
+            consume_retries: consume (drain) the retry topic instead of the main topic
+            concurrency_limiter: the concurrency limiter of node requests shared by the consumer tasks,
+                                 a new one is created if `None`
+        """
+        self.config = config
+        self.contract_abi = contract_abi
+        self.consume_retries = consume_retries
+
+        self.min_tasks = config.number_of_consumer_tasks
+        self.max_tasks = max(config.max_consumer_tasks or 0, self.min_tasks)
+        self.target_lag = config.consumer_autoscaling_target_lag
+        self.max_rpc_latency = config.consumer_autoscaling_max_rpc_latency
+
+        # Contract metadata cache, retry controller and concurrency limiter shared by the consumer tasks
+        self._contract_metadata_cache = create_contract_metadata_cache(config)
+        self._retry_controller = create_retry_controller(config)
+        self._concurrency_limiter = concurrency_limiter or create_concurrency_limiter(
+            config
+        )
+
+        # Running consumer tasks and their consumers
+        self._consumers: Dict[asyncio.Task, DataConsumer] = dict()
+        # Consumer tasks that were asked to stop (scaled down) but didn't finish yet
+        self._stopping: Set[asyncio.Task] = set()
+        # Exit codes of the finished consumer tasks
+        self._exit_codes: List[int] = []
+
+    @property
+    def n_tasks(self) -> int:
+        """The number of running consumer tasks (excluding the stopping ones)"""
+        return len(self._consumers) - len(self._stopping)
+
+    def desired_number_of_tasks(self, lag: int, rpc_latency: Optional[float]) -> int:
+        """Return the number of consumer tasks for the given lag and RPC latency (within bounds)
+
+        Args:
+            lag: the number of unconsumed events of the running consumers
+            rpc_latency: the average RPC request latency in seconds
+        """
+        n_tasks = self.n_tasks
+        if rpc_latency is not None and rpc_latency > self.max_rpc_latency:
+            desired = n_tasks - 1
+        elif lag > self.target_lag * n_tasks:
+            desired = n_tasks + 1
+        elif lag < self.target_lag * (n_tasks - 1) / 2:
+            desired = n_tasks - 1
+        else:
+            desired = n_tasks
+        # Consumers that finished on their own (empty topic) aren't replaced to reach min_tasks
+        return max(min(self.min_tasks, n_tasks), min(self.max_tasks, desired))
+
+    async def _run_consumer(self, consumer: DataConsumer) -> int:
+        async with consumer:
+            return await consumer.start_consuming_data()
+
+    def _add_consumer(self):
+        consumer = DataConsumer(
+            self.config,
+            self.contract_abi,
+            consume_retries=self.consume_retries,
+            contract_metadata_cache=self._contract_metadata_cache,
+            retry_controller=self._retry_controller,
+            concurrency_limiter=self._concurrency_limiter,
+        )
+        task = asyncio.create_task(self._run_consumer(consumer))
+        self._consumers[task] = consumer
+
+    def _remove_consumer(self):
+        # Stop the most recently added running consumer
+        task = [t for t in self._consumers if t not in self._stopping][-1]
+        self._stopping.add(task)
+        self._consumers[task].stop()
+
+    async def get_lag(self) -> int:
+        """Return the total lag of the running consumers"""
+        lags = await asyncio.gather(
+            *[
+                consumer.kafka_manager.get_lag()
+                for task, consumer in self._consumers.items()
+                if task not in self._stopping
+            ]
+        )
+        return sum(lags)
+
+    def get_rpc_latency(self) -> Optional[float]:
+        """Return the average RPC request latency of the running consumers (`None` if unknown)"""
+        latencies = [
+            consumer.node_connector.latency_tracker.average
+            for consumer in self._consumers.values()
+            if consumer.node_connector.latency_tracker.average is not None
+        ]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    async def _scale(self):
+        """Add or remove a consumer task if needed"""
+        lag, rpc_latency = await self.get_lag(), self.get_rpc_latency()
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "Concurrency limits of node requests: %s",
+                self._concurrency_limiter.get_limits(),
+            )
+        desired = self.desired_number_of_tasks(lag, rpc_latency)
+        if desired == self.n_tasks:
+            return
+
+        latency_str = f"{rpc_latency:.3f}s" if rpc_latency is not None else "unknown"
+        log.info(
+            f"Scaling consumer tasks {self.n_tasks} -> {desired} (lag: {lag}, RPC latency: {latency_str})"
+        )
+        if desired > self.n_tasks:
+            self._add_consumer()
+        else:
+            self._remove_consumer()
+
+    async def run(self) -> int:
+        """Start `N_CONSUMER_INSTANCES` consumer tasks and scale them until they all finish
+
+        Returns:
+            exit_code: 0 if all the consumers finished without an exception, 1 otherwise
+        """
+        for _ in range(self.min_tasks):
+            self._add_consumer()
+
+        try:
+            while self._consumers:
+                done, _ = await asyncio.wait(
+                    self._consumers, timeout=self.SCALING_INTERVAL
+                )
+                for task in done:
+                    del self._consumers[task]
+                    self._stopping.discard(task)
+                    self._exit_codes.append(task.result())
+
+                if not done and self._consumers:
+                    await self._scale()
+        except asyncio.CancelledError:
+            for task in self._consumers:
+                task.cancel()
+            await asyncio.gather(*self._consumers, return_exceptions=True)
+            raise
+
+        return int(any(self._exit_codes))
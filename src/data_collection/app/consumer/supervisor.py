@@ -0,0 +1,298 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Dict
+
+import uvloop
+
+from app import init_logger
+from app.config import Config
+from app.consumer import DataConsumer, create_contract_metadata_cache
+from app.consumer.autoscaler import ConsumerAutoscaler
+from app.model.abi import ContractABI
+from app.utils import init_sentry
+from app.utils.data_collector import create_concurrency_limiter, create_retry_controller
+from app.utils.metrics import stage_metrics, stage_metrics_reporting
+from app.utils.profiler import PROFILE_SIGNAL, install_profiler_trigger
+from app.utils.tracing import tracing
+
+log = init_logger(__name__)
+
+
+async def run_consumer_tasks(
+    config: Config,
+    contract_abi: ContractABI,
+    consume_retries: bool = False,
+    worker_id: int = 0,
+) -> int:
+    """Start `N_CONSUMER_INSTANCES` DataConsumer tasks and wait until they all finish
+
+    Args:
+        consume_retries: consume (drain) the retry topic instead of the main topic
+        worker_id: the id of the consumer worker process (supervisor mode),
+                   its stage metrics are served at `METRICS_PORT + worker_id`
+
+    Returns:
+        exit_code: 0 if all the consumers finished without an exception, 1 otherwise
+
+    Note:
+        If `N_CONSUMER_INSTANCES_MAX` is larger than `N_CONSUMER_INSTANCES`,
+        the number of tasks is autoscaled (see `ConsumerAutoscaler`).
+    """
+    metrics_port = (
+        None if config.metrics_port is None else config.metrics_port + worker_id
+    )
+    # Concurrency limiter shared by the consumer tasks, its limits are served with the stage metrics
+    concurrency_limiter = create_concurrency_limiter(config)
+    async with stage_metrics_reporting(
+        stage_metrics,
+        config.stage_metrics_log_interval,
+        metrics_port,
+        collectors=[concurrency_limiter.prometheus_text],
+    ):
+        if (config.max_consumer_tasks or 0) > config.number_of_consumer_tasks:
+            autoscaler = ConsumerAutoscaler(
+                config,
+                contract_abi,
+                consume_retries=consume_retries,
+                concurrency_limiter=concurrency_limiter,
+            )
+            return await autoscaler.run()
+
+        # Contract metadata cache and retry controller shared by the consumer tasks
+        contract_metadata_cache = create_contract_metadata_cache(config)
+        retry_controller = create_retry_controller(config)
+
+        async def start_consumer() -> int:
+            async with DataConsumer(
+                config,
+                contract_abi,
+                consume_retries=consume_retries,
+                contract_metadata_cache=contract_metadata_cache,
+                retry_controller=retry_controller,
+                concurrency_limiter=concurrency_limiter,
+            ) as data_consumer:
+                return await data_consumer.start_consuming_data()
+
+        consumer_tasks = [
+            asyncio.create_task(start_consumer())
+            for _ in range(config.number_of_consumer_tasks)
+        ]
+        result = await asyncio.gather(*consumer_tasks)
+        # Return erroneous exit code if needed
+        return int(any(result))
+
+
+async def _run_consumer_worker(
+    worker_id: int, config: Config, contract_abi: ContractABI
+) -> int:
+    """Run the consumer tasks of a single worker process until they finish or a stop signal is received"""
+    # Export the spans of the traced transactions of this worker (if configured)
+    async with tracing(config, f"consumer-{config.kafka_topic}", worker_id=worker_id):
+        consumers_task = asyncio.create_task(
+            run_consumer_tasks(config, contract_abi, worker_id=worker_id)
+        )
+
+        # Stop the consumers gracefully (closes Kafka and DB connections) on SIGTERM / SIGINT
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, consumers_task.cancel)
+        # Profile the event loop on SIGUSR1 (forwarded by the supervisor)
+        install_profiler_trigger(
+            f"consumer-{config.kafka_topic}-worker-{worker_id}",
+            config.profile_dir,
+            config.profile_duration,
+        )
+
+        try:
+            return await consumers_task
+        except asyncio.CancelledError:
+            log.info(f"Consumer worker #{worker_id} received a stop signal")
+            return 0
+
+
+def _consumer_worker_main(worker_id: int, config: Config, abi_file: str):
+    """Entrypoint of a consumer worker process"""
+    # The supervisor forwards `PROFILE_SIGNAL` to the workers at any time, the default
+    # action would terminate a worker that is still starting (until the trigger is installed)
+    signal.signal(PROFILE_SIGNAL, signal.SIG_IGN)
+    # Sentry has to be initialized in every spawned process
+    init_sentry(config.sentry_dsn)
+    contract_abi = ContractABI.parse_file(abi_file)
+
+    log.info(f"Starting consumer worker #{worker_id}")
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        exit_code = runner.run(_run_consumer_worker(worker_id, config, contract_abi))
+
+    log.info(f"Exiting consumer worker #{worker_id} with code {exit_code}")
+    sys.exit(exit_code)
+
+
+class ConsumerSupervisor:
+    """Start and supervise multiple consumer worker processes
+
+    Each worker process runs its own (uvloop) event loop with `N_CONSUMER_INSTANCES`
+    DataConsumer tasks, which allows the CPU-bound parts of consuming (event decoding,
+    model validation) to use more than a single core per container.
+
+    Note:
+        A worker that exits with a non-zero exit code is restarted (after `RESTART_DELAY`
+        seconds) at most `max_restarts` times. A worker that exits with 0 (e.g. the topic is
+        empty) is not restarted. On SIGTERM / SIGINT all the workers are stopped gracefully.
+    """
+
+    RESTART_DELAY = 5
+    """Delay (in seconds) before a crashed worker process is restarted"""
+    SHUTDOWN_TIMEOUT = 30
+    """Time (in seconds) to wait for the workers to stop before killing them"""
+    MONITOR_INTERVAL = 1
+    """Maximum time (in seconds) between two checks of the workers' state"""
+
+    def __init__(
+        self, config: Config, abi_file: str, n_processes: int, max_restarts: int
+    ) -> None:
+        """
+        Args:
+            config: the app configuration passed to each worker process
+            abi_file: the path to the file with contract ABIs
+            n_processes: the number of worker processes
+            max_restarts: the maximum number of restarts of each worker process
+        """
+        self.config = config
+        self.abi_file = abi_file
+        self.n_processes = n_processes
+        self.max_restarts = max_restarts
+
+        # "spawn" gives every worker a clean interpreter (no inherited
+        # event loop, connections or sentry threads)
+        self._mp_context = multiprocessing.get_context("spawn")
+
+        # Running worker processes indexed by worker id
+        self._workers: Dict[int, BaseProcess] = dict()
+        # Monotonic time at which a crashed worker should be restarted, indexed by worker id
+        self._pending_restarts: Dict[int, float] = dict()
+        # Number of restarts of each worker, indexed by worker id
+        self._n_restarts: Dict[int, int] = {i: 0 for i in range(n_processes)}
+        # Final exit codes of the workers, indexed by worker id
+        self._exit_codes: Dict[int, int] = dict()
+
+        self._shutting_down = False
+
+    @property
+    def exit_code(self) -> int:
+        """Aggregated exit code: 0 if all workers finished successfully, 1 otherwise"""
+        return int(any(self._exit_codes.values()))
+
+    def _spawn_worker(self, worker_id: int) -> BaseProcess:
+        """Create and start a new consumer worker process"""
+        process = self._mp_context.Process(
+            target=_consumer_worker_main,
+            args=(worker_id, self.config, self.abi_file),
+            name=f"consumer-worker-{worker_id}",
+        )
+        process.start()
+        return process
+
+    def _handle_signal(self, signum, frame):
+        """Start a graceful shutdown on SIGTERM / SIGINT"""
+        if not self._shutting_down:
+            log.info(
+                f"Received {signal.Signals(signum).name}, stopping {len(self._workers)} consumer worker(s)"
+            )
+        self._shutting_down = True
+
+    def _forward_signal(self, signum, frame):
+        """Forward a signal (the profiler trigger) to all the workers"""
+        for process in self._workers.values():
+            if process.pid is not None:
+                os.kill(process.pid, signum)
+
+    def _on_worker_exit(self, worker_id: int):
+        """Handle an exited worker: schedule a restart or store its final exit code"""
+        process = self._workers.pop(worker_id)
+        process.join()
+        exit_code = process.exitcode
+
+        if exit_code == 0 or self._shutting_down:
+            self._exit_codes[worker_id] = exit_code
+        elif self._n_restarts[worker_id] < self.max_restarts:
+            self._n_restarts[worker_id] += 1
+            log.warning(
+                f"Consumer worker #{worker_id} exited with code {exit_code}, restarting in {self.RESTART_DELAY}s "
+                f"({self._n_restarts[worker_id]}/{self.max_restarts})"
+            )
+            self._pending_restarts[worker_id] = time.monotonic() + self.RESTART_DELAY
+        else:
+            log.error(
+                f"Consumer worker #{worker_id} exited with code {exit_code} after {self.max_restarts} restarts"
+            )
+            self._exit_codes[worker_id] = exit_code
+
+    def _restart_pending_workers(self):
+        """Restart the crashed workers whose restart delay has passed"""
+        now = time.monotonic()
+        for worker_id, restart_at in list(self._pending_restarts.items()):
+            if restart_at <= now:
+                del self._pending_restarts[worker_id]
+                self._workers[worker_id] = self._spawn_worker(worker_id)
+
+    def _shutdown(self):
+        """Stop all the workers (SIGTERM), kill the ones that don't stop within SHUTDOWN_TIMEOUT"""
+        # Workers waiting for a restart are not restarted anymore
+        self._pending_restarts.clear()
+
+        for process in self._workers.values():
+            process.terminate()
+
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        for worker_id, process in self._workers.items():
+            process.join(timeout=max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                log.warning(
+                    f"Consumer worker #{worker_id} didn't stop in {self.SHUTDOWN_TIMEOUT}s, killing it"
+                )
+                process.kill()
+                process.join()
+            self._exit_codes[worker_id] = process.exitcode
+        self._workers.clear()
+
+    def run(self) -> int:
+        """Start all the workers and supervise them until they finish
+
+        Returns:
+            exit_code: 0 if all the workers finished successfully, 1 otherwise
+        """
+        previous_handlers = {
+            sig: signal.signal(sig, self._handle_signal)
+            for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        previous_handlers[PROFILE_SIGNAL] = signal.signal(
+            PROFILE_SIGNAL, self._forward_signal
+        )
+        try:
+            log.info(f"Starting {self.n_processes} consumer worker processes")
+            for worker_id in range(self.n_processes):
+                self._workers[worker_id] = self._spawn_worker(worker_id)
+
+            while self._workers or self._pending_restarts:
+                if self._shutting_down:
+                    self._shutdown()
+                    break
+
+                # Wait for any of the workers to exit
+                sentinels = {p.sentinel: i for i, p in self._workers.items()}
+                for sentinel in wait(list(sentinels), timeout=self.MONITOR_INTERVAL):
+                    self._on_worker_exit(sentinels[sentinel])
+
+                self._restart_pending_workers()
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        log.info(f"All consumer workers finished with exit codes: {self._exit_codes}")
+        return self.exit_code
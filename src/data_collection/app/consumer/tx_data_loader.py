@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.model.transaction import (
+    InternalTransactionData,
+    TransactionData,
+    TransactionReceiptData,
+)
+from app.utils.metrics import stage_metrics
+from app.web3.node_connector import NodeConnector
+
+
+class TransactionDataLoader:
+    """Lazily load (and memoize) the data of a single transaction from the node
+
+    Transaction processors request only the data they need, in the order they need it,
+    so that an irrelevant transaction doesn't cost more than a single RPC call.
+
+    Note:
+        Each piece of data (transaction, receipt, internal transactions) is requested
+        from the node at most once per `TransactionDataLoader` instance.
+    """
+
+    def __init__(self, tx_hash: str, node_connector: NodeConnector) -> None:
+        """
+        Args:
+            tx_hash: the hash of the transaction
+            node_connector: the node connector used for fetching the data
+        """
+        self.tx_hash = tx_hash
+        self.node_connector = node_connector
+
+        self._tx_data: Optional[TransactionData] = None
+        self._tx_receipt: Optional[Tuple[TransactionReceiptData, Dict[str, Any]]] = None
+        self._internal_tx_data: Optional[List[InternalTransactionData]] = None
+
+    async def get_transaction_data(self) -> TransactionData:
+        """Get (`eth_getTransactionByHash`) transaction data"""
+        if self._tx_data is None:
+            with stage_metrics.timer("node.get_transaction_data"):
+                self._tx_data, _ = await self.node_connector.get_transaction_data(
+                    self.tx_hash
+                )
+        return self._tx_data
+
+    async def get_transaction_receipt_data(
+        self,
+    ) -> Tuple[TransactionReceiptData, Dict[str, Any]]:
+        """Get (`eth_getTransactionReceipt`) transaction receipt data
+
+        Returns:
+            tx_receipt_data (TransactionReceiptData)
+            tx_receipt_data_dict: the JSON-RPC result (raw receipt)
+        """
+        if self._tx_receipt is None:
+            with stage_metrics.timer("node.get_transaction_receipt_data"):
+                self._tx_receipt = (
+                    await self.node_connector.get_transaction_receipt_data(self.tx_hash)
+                )
+        return self._tx_receipt
+
+    async def get_internal_transactions(self) -> List[InternalTransactionData]:
+        """Get (`trace_replayTransaction`) internal transactions"""
+        if self._internal_tx_data is None:
+            with stage_metrics.timer("node.get_internal_transactions"):
+                self._internal_tx_data = (
+                    await self.node_connector.get_internal_transactions(self.tx_hash)
+                )
+        return self._internal_tx_data
@@ -1,11 +1,15 @@
+import asyncio
 from typing import Set, Tuple
 
 from web3.contract import Contract
 from web3.types import TxReceipt
 
 from app import init_logger
+from app.consumer.tx_data_loader import TransactionDataLoader
 from app.model.contract import ContractCategory
 from app.model.transaction import TransactionData, TransactionReceiptData
+from app.utils.metrics import stage_metrics
+from app.utils.tracing import tracer
 from app.web3.transaction_events import get_transaction_events
 from app.web3.transaction_events.types import (
     BurnFungibleEvent,
@@ -43,7 +47,10 @@ class TransactionProcessor:
         """Insert required contract data into the database depending on its category"""
         # Transaction is creating a contract if to_address is None
         log.info(
-            f"New contract ({contract.address}, {category}) creation in {tx_data.transaction_hash}"
+            "New contract (%s, %s) creation in %s",
+            contract.address,
+            category,
+            tx_data.transaction_hash,
         )
 
         if category.is_erc:
@@ -55,7 +62,7 @@ class TransactionProcessor:
 
             if not token_contract_data:
                 log.warning(
-                    f"Unknown token contract ABI at address: {contract.address}"
+                    "Unknown token contract ABI at address: %s", contract.address
                 )
                 return
 
@@ -78,7 +85,9 @@ class TransactionProcessor:
             )
 
             if not pair_contract_data:
-                log.warning(f"Unknown pair contract ABI at address: {contract.address}")
+                log.warning(
+                    "Unknown pair contract ABI at address: %s", contract.address
+                )
                 return
 
             # Insert pair contract data into _contract and _pair_contract table
@@ -113,7 +122,9 @@ class TransactionProcessor:
         amount_changed = 0
         pair_amount0_changed = 0
         pair_amount1_changed = 0
-        for event in get_transaction_events(category, contract, tx_receipt):
+        with stage_metrics.timer("decode_events"), tracer.span("decode_events"):
+            events = list(get_transaction_events(category, contract, tx_receipt))
+        for event in events:
             # Check if this event should be processed
             if (
                 not type(event).__name__ in allowed_events
@@ -178,11 +189,12 @@ class TransactionProcessor:
 
     async def _handle_transaction(
         self,
-        tx_data: TransactionData,
-        tx_receipt_data: TransactionReceiptData,
+        tx: TransactionDataLoader,
         log_indices_to_save: Set[int] = set([]),
     ) -> None:
         """Insert transaction data into the database"""
+        tx_data = await tx.get_transaction_data()
+        tx_receipt_data, _ = await tx.get_transaction_receipt_data()
         # Get the rest of transaction data - compute transaction fee
         # (according to etherscan): fee = gas price * gas used
         gas_used = tx_receipt_data.gas_used
@@ -205,28 +217,24 @@ class TransactionProcessor:
                 await self.db_manager.insert_transaction_logs(**tx_log.dict())
 
         # check for AND insert internal transactions if needed
-        internal_tx_data = await self.node_connector.get_internal_transactions(
-            tx_data.transaction_hash
-        )
+        internal_tx_data = await tx.get_internal_transactions()
         if internal_tx_data:
             async with self.db_manager.db.transaction():
+                # Replace (instead of duplicating) internal transactions of a reprocessed transaction
+                await self.db_manager.delete_internal_transactions(
+                    tx_data.transaction_hash
+                )
                 for internal_tx in internal_tx_data:
                     await self.db_manager.insert_internal_transaction(
                         **internal_tx.dict(), transaction_hash=tx_data.transaction_hash
                     )
 
-    async def process_transaction(
-        self,
-        tx_data: TransactionData,
-        tx_receipt_data: TransactionReceiptData,
-        w3_tx_receipt: TxReceipt,
-    ) -> bool:
+    async def process_transaction(self, tx: TransactionDataLoader) -> bool:
         """Process transaction data (implemented by subclasses)
 
         Args:
-            tx_data (TransactionData): Transaction data
-            tx_receipt_data (TransactionReceiptData): Transaction receipt data
-            w3_tx_receipt (TxReceipt): transaction receipt data in web3 format
+            tx (TransactionDataLoader): lazy loader of the transaction's data, processors
+                                        should request only the data they need
 
         Returns:
             bool: True if the transaction was processed, False otherwise
@@ -248,8 +256,22 @@ class PartialTransactionProcessor(TransactionProcessor):
 
         If one of the above cases is true, we save the transaction and its events
         (if event.address is in config).
+
+        The relevance of a transaction is decided from its receipt first (it contains `to`,
+        `contractAddress` and all log addresses), the transaction data and internal transactions
+        are fetched only for transactions that are relevant.
     """
 
+    def _is_relevant(self, tx_receipt_data: TransactionReceiptData) -> bool:
+        """Check if any of the addresses in the receipt (case 1., 2. or 3.) is a contract in the config"""
+        addresses = [tx_receipt_data.to_address, tx_receipt_data.contract_address]
+        addresses.extend(log.address for log in tx_receipt_data.logs or [])
+        return any(
+            self.contract_parser.is_known_contract_address(address)
+            for address in addresses
+            if address
+        )
+
     async def _process_regular_contract_interaction(
         self,
         tx_data: TransactionData,
@@ -337,14 +359,15 @@ class PartialTransactionProcessor(TransactionProcessor):
             return True, log_indices_to_save
         return False, set()
 
-    async def process_transaction(
-        self,
-        tx_data: TransactionData,
-        tx_receipt_data: TransactionReceiptData,
-        w3_tx_receipt: TxReceipt,
-    ) -> bool:
+    async def process_transaction(self, tx: TransactionDataLoader) -> bool:
         should_save_tx, log_indices_to_save = False, set()
 
+        # Decide the relevance from the receipt only (single RPC call)
+        tx_receipt_data, w3_tx_receipt = await tx.get_transaction_receipt_data()
+        if not self._is_relevant(tx_receipt_data):
+            return False
+
+        tx_data = await tx.get_transaction_data()
         if tx_data.to_address:
             # Case 1. Regular contract interaction or Case 3. Transaction event
             (
@@ -365,8 +388,7 @@ class PartialTransactionProcessor(TransactionProcessor):
         if should_save_tx:
             # Insert transaction + Internal transactions
             await self._handle_transaction(
-                tx_data=tx_data,
-                tx_receipt_data=tx_receipt_data,
+                tx=tx,
                 log_indices_to_save=log_indices_to_save,
             )
 
@@ -380,16 +402,16 @@ class FullTransactionProcessor(TransactionProcessor):
         Directly save every tx data to db without any further processing.
     """
 
-    async def process_transaction(
-        self,
-        tx_data: TransactionData,
-        tx_receipt_data: TransactionReceiptData,
-        w3_tx_receipt: TxReceipt,
-    ) -> bool:
+    async def process_transaction(self, tx: TransactionDataLoader) -> bool:
+        # Every transaction is saved, fetch all its data concurrently
+        _, (tx_receipt_data, _), _ = await asyncio.gather(
+            tx.get_transaction_data(),
+            tx.get_transaction_receipt_data(),
+            tx.get_internal_transactions(),
+        )
         # Insert transaction + Logs + Internal transactions
         await self._handle_transaction(
-            tx_data=tx_data,
-            tx_receipt_data=tx_receipt_data,
+            tx=tx,
             log_indices_to_save=set(map(lambda l: l.log_index, tx_receipt_data.logs)),
         )
         return True
@@ -1,10 +1,12 @@
 from datetime import datetime
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import asyncpg
 
 from app import init_logger
 from app.db.exceptions import UnknownBlockIdentifier
+from app.utils.metrics import stage_metrics
+from app.utils.tracing import SpanKind, tracer
 
 log = init_logger(__name__)
 
@@ -39,6 +41,8 @@ class DatabaseManager:
         await self.db.close()
         log.debug("Disconnected from PostgreSQL")
 
+    @tracer.traced("db.insert_block", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_block")
     async def insert_block(
         self,
         block_number: int,
@@ -78,6 +82,8 @@ class DatabaseManager:
             uncles,
         )
 
+    @tracer.traced("db.insert_transaction", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_transaction")
     async def insert_transaction(
         self,
         transaction_hash: str,
@@ -119,6 +125,8 @@ class DatabaseManager:
 
     # FIXME: not really sure about the data schema here, might be quite different
     # for example the gas stuff might not be needed
+    @tracer.traced("db.insert_internal_transaction", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_internal_transaction")
     async def insert_internal_transaction(
         self,
         transaction_hash: str,
@@ -150,6 +158,25 @@ class DatabaseManager:
             call_type,
         )
 
+    @tracer.traced("db.delete_internal_transactions", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.delete_internal_transactions")
+    async def delete_internal_transactions(self, transaction_hash: str):
+        """
+        Delete internal transactions of a transaction from <node>_internal_transaction table.
+
+        Note:
+            Internal transactions have no unique key, they are deleted before
+            being (re)inserted so that reprocessing a transaction doesn't duplicate them.
+        """
+        table = f"{self.node_name}_internal_transaction"
+
+        await self.db.execute(
+            f"DELETE FROM {table} WHERE transaction_hash = $1;",
+            transaction_hash,
+        )
+
+    @tracer.traced("db.insert_transaction_logs", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_transaction_logs")
     async def insert_transaction_logs(
         self,
         transaction_hash: str,
@@ -179,6 +206,8 @@ class DatabaseManager:
             topics,
         )
 
+    @tracer.traced("db.insert_nft_transfer", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_nft_transfer")
     async def insert_nft_transfer(
         self,
         transaction_hash: str,
@@ -208,6 +237,8 @@ class DatabaseManager:
             token_id,
         )
 
+    @tracer.traced("db.insert_contract", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_contract")
     async def insert_contract(
         self, address: str, transaction_hash: str, is_pair_contract: bool
     ):
@@ -227,6 +258,8 @@ class DatabaseManager:
             is_pair_contract,
         )
 
+    @tracer.traced("db.insert_token_contract", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_token_contract")
     async def insert_token_contract(
         self,
         address: str,
@@ -255,6 +288,8 @@ class DatabaseManager:
             token_category,
         )
 
+    @tracer.traced("db.insert_contract_supply_change", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_contract_supply_change")
     async def insert_contract_supply_change(
         self, address: str, amount_changed: int, transaction_hash: str
     ):
@@ -274,6 +309,8 @@ class DatabaseManager:
             transaction_hash,
         )
 
+    @tracer.traced("db.insert_pair_contract", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_pair_contract")
     async def insert_pair_contract(
         self,
         address: str,
@@ -302,6 +339,8 @@ class DatabaseManager:
             factory,
         )
 
+    @tracer.traced("db.insert_pair_liquidity_change", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.insert_pair_liquidity_change")
     async def insert_pair_liquidity_change(
         self, address: str, amount0: int, amount1: int, transaction_hash: str
     ):
@@ -322,6 +361,46 @@ class DatabaseManager:
             transaction_hash,
         )
 
+    @tracer.traced("db.upsert_kafka_offset", kind=SpanKind.CLIENT)
+    @stage_metrics.timed("db.upsert_kafka_offset")
+    async def upsert_kafka_offset(self, topic: str, partition: int, next_offset: int):
+        """
+        Insert or update the offset of the next event to consume from a Kafka
+        topic partition in <node>_kafka_offset table.
+        """
+        table = f"{self.node_name}_kafka_offset"
+
+        await self.db.execute(
+            f"""
+            INSERT INTO {table} (topic, partition, next_offset)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (topic, partition) DO UPDATE
+            SET next_offset = EXCLUDED.next_offset, updated_at = now() at time zone 'utc';
+            """,
+            topic,
+            partition,
+            next_offset,
+        )
+
+    async def get_kafka_offsets(
+        self, topic: str, partitions: List[int]
+    ) -> Dict[int, int]:
+        """
+        Get the offsets of the next events to consume from Kafka topic partitions.
+
+        Returns:
+            Dict[int, int]: next offsets indexed by partition, partitions without
+                            a stored offset are missing
+        """
+        table = f"{self.node_name}_kafka_offset"
+
+        rows = await self.db.fetch(
+            f"SELECT partition, next_offset FROM {table} WHERE topic = $1 AND partition = ANY($2::int[]);",
+            topic,
+            partitions,
+        )
+        return {row["partition"]: row["next_offset"] for row in rows}
+
     async def get_block(
         self, block_identifier: Optional[Union[str, int]] = None
     ) -> Optional[dict[str, Any]]:
@@ -11,6 +11,7 @@ class RedisManager:
     """Manage a Redis DB connection and CRUD operations
 
     Mainly used to keep the current number of messages (transaction hashes) in a given topic.
+    Also stores contract metadata shared by all the consumers (see `ContractMetadataCache`).
     """
 
     def __init__(self, redis_url: str, topic: str) -> None:
@@ -23,6 +24,8 @@ class RedisManager:
         self.redis = aioredis.from_url(redis_url, decode_responses=True)
         # The key used for storing the number of transactions per partition in Redis
         self._sorted_set_key = f"{topic}_n_transactions"
+        # The prefix of keys used for storing contract metadata
+        self._contract_metadata_key_prefix = f"{topic}_contract_metadata"
 
     async def get_n_transactions(self) -> int:
         """Return the total number of unprocessed transactions from all partitions"""
@@ -47,3 +50,11 @@ class RedisManager:
     async def incrby_n_transactions(self, partition: int, incr_by: int = 1):
         """Increment the number of transactions for a given partition"""
         await self.redis.zincrby(self._sorted_set_key, incr_by, partition)
+
+    async def get_contract_metadata(self, key: str) -> Optional[str]:
+        """Return the stored (serialized) metadata of a contract or `None` if missing"""
+        return await self.redis.get(f"{self._contract_metadata_key_prefix}:{key}")
+
+    async def set_contract_metadata(self, key: str, value: str):
+        """Store the (serialized) metadata of a contract"""
+        await self.redis.set(f"{self._contract_metadata_key_prefix}:{key}", value)
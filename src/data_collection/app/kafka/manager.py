@@ -1,15 +1,22 @@
 import asyncio
+import time
 from asyncio import TimeoutError
 from functools import wraps
-from typing import Awaitable, Callable, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
-from aiokafka.errors import KafkaConnectionError, KafkaError, KafkaTimeoutError
-from aiokafka.structs import RecordMetadata
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, ConsumerRebalanceListener
+from aiokafka.errors import (
+    IllegalStateError,
+    KafkaConnectionError,
+    KafkaError,
+    KafkaTimeoutError,
+)
+from aiokafka.structs import ConsumerRecord, RecordMetadata, TopicPartition
 
 from app import init_logger
 from app.db.redis import RedisManager
 from app.kafka.exceptions import KafkaConsumerPartitionsEmptyError, KafkaManagerError
+from app.utils.tracing import TRACEPARENT_HEADER
 
 log = init_logger(__name__)
 
@@ -196,8 +203,14 @@ class KafkaProducerManager(KafkaManager):
             raise err
 
     @limit_topic_capacity
-    async def send_batch(self, msgs: List[str]) -> List[RecordMetadata]:
-        """Send a batch of messages to a Kafka broker"""
+    async def send_batch(
+        self, msgs: List[str], headers: Optional[List[Tuple[str, bytes]]] = None
+    ) -> List[RecordMetadata]:
+        """Send a batch of messages to a Kafka broker
+
+        Args:
+            headers: the headers of every message (e.g. the trace context of their block)
+        """
         if not msgs:
             log.warning("Attempted to send an empty list of messages.")
             return []
@@ -219,7 +232,10 @@ class KafkaProducerManager(KafkaManager):
                 for msg in chunk:
                     # key and timestamp arguments are required
                     metadata = kafka_batch.append(
-                        value=msg.encode(), key=None, timestamp=None
+                        value=msg.encode(),
+                        key=None,
+                        timestamp=None,
+                        headers=headers or [],
                     )
                     if metadata:
                         # Increase the counter if a Metadata object is returned
@@ -227,12 +243,11 @@ class KafkaProducerManager(KafkaManager):
                     else:
                         # Otherwise log a warning that Kafka might be misconfigured
                         log.warning(
-                            (
-                                f"No metadata found for tx ({msg}) while inserting into a batch."
-                                f"This transaction has not been added to a kafka topic."
-                                f"Decrease the value of MESSAGES_PER_BATCH or increase `AIOKafkaProducer.max_batch_size`"
-                                f" to avoid losing further messages!"
-                            )
+                            "No metadata found for tx (%s) while inserting into a batch."
+                            "This transaction has not been added to a kafka topic."
+                            "Decrease the value of MESSAGES_PER_BATCH or increase `AIOKafkaProducer.max_batch_size`"
+                            " to avoid losing further messages!",
+                            msg,
                         )
 
                 kafka_batch.close()
@@ -270,22 +285,180 @@ class KafkaProducerManager(KafkaManager):
             log.error(f"KafkaTimeoutError on batch")
 
 
+class KafkaRetryProducerManager(KafkaManager):
+    """Route events that failed to be processed to a retry topic or a dead-letter topic
+
+    Each failed event is sent to the `<topic>_retry` topic with exponential backoff metadata
+    in the message headers (the attempt number and the earliest time of the next attempt).
+    After `max_attempts` failed attempts the event is sent to the `<topic>_dead_letter` topic.
+
+    Note:
+        The retry topic is consumed by a separate worker (`--worker-type retry_consumer`).
+    """
+
+    RETRY_TOPIC_SUFFIX = "_retry"
+    DEAD_LETTER_TOPIC_SUFFIX = "_dead_letter"
+
+    ATTEMPT_HEADER = "attempt"
+    """Header with the number of failed processing attempts of an event"""
+    NOT_BEFORE_HEADER = "not_before"
+    """Header with the (unix) time before which the event shouldn't be processed again"""
+    ERROR_HEADER = "error"
+    """Header with the description of the last processing error"""
+
+    def __init__(
+        self,
+        kafka_url: str,
+        redis_url: str,
+        topic: str,
+        max_attempts: int,
+        backoff: int,
+        max_backoff: int,
+    ) -> None:
+        """
+        Args:
+            topic: the main Kafka topic, the retry and dead-letter topics are derived from it
+            max_attempts: the number of failed attempts after which an event is dead-lettered
+            backoff: the delay (in seconds) before the first retry, doubled for each next retry
+            max_backoff: the maximum delay (in seconds) before a retry, the partition of
+                         a deferred event is paused that long at most
+        """
+        super().__init__(kafka_url=kafka_url, redis_url=redis_url, topic=topic)
+        self.retry_topic = f"{topic}{self.RETRY_TOPIC_SUFFIX}"
+        self.dead_letter_topic = f"{topic}{self.DEAD_LETTER_TOPIC_SUFFIX}"
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._client = AIOKafkaProducer(
+            bootstrap_servers=kafka_url,
+            enable_idempotence=True,
+        )
+
+    @staticmethod
+    def get_header(event: ConsumerRecord, key: str) -> Optional[str]:
+        """Return the decoded value of a Kafka message header or `None` if it is missing"""
+        for header_key, value in event.headers or []:
+            if header_key == key:
+                return value.decode()
+        return None
+
+    def get_attempt(self, event: ConsumerRecord) -> int:
+        """Return the number of failed processing attempts of an event (0 for events from the main topic)"""
+        return int(self.get_header(event, self.ATTEMPT_HEADER) or 0)
+
+    def get_backoff(self, attempt: int) -> int:
+        """Return the delay (in seconds) before the next attempt after `attempt` failed attempts"""
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def get_not_before(self, event: ConsumerRecord) -> Optional[float]:
+        """Return the (unix) time before which an event from the retry topic shouldn't be processed"""
+        if not_before := self.get_header(event, self.NOT_BEFORE_HEADER):
+            return float(not_before)
+        return None
+
+    async def send_failed_event(self, event: ConsumerRecord, error: Exception) -> str:
+        """Send an event that failed to be processed to the retry or the dead-letter topic
+
+        Returns:
+            the topic that the event was sent to
+        """
+        attempt = self.get_attempt(event) + 1
+        headers = [
+            (self.ATTEMPT_HEADER, str(attempt).encode()),
+            (self.ERROR_HEADER, repr(error).encode()),
+        ]
+        # Retries stay in the trace of the event
+        if traceparent := self.get_header(event, TRACEPARENT_HEADER):
+            headers.append((TRACEPARENT_HEADER, traceparent.encode()))
+
+        if attempt < self.max_attempts:
+            topic = self.retry_topic
+            not_before = time.time() + self.get_backoff(attempt)
+            headers.append((self.NOT_BEFORE_HEADER, str(not_before).encode()))
+        else:
+            topic = self.dead_letter_topic
+
+        await self._client.send_and_wait(topic, value=event.value, headers=headers)
+        return topic
+
+
+class StoredOffsetRebalanceListener(ConsumerRebalanceListener):
+    """Seek to externally stored offsets (e.g. in PostgreSQL) when partitions are assigned
+
+    Note:
+        Partitions without a stored offset keep the position committed in Kafka
+        (or `auto_offset_reset` if there is none).
+    """
+
+    def __init__(
+        self,
+        consumer: AIOKafkaConsumer,
+        get_offsets: Callable[[str, List[int]], Awaitable[Dict[int, int]]],
+    ) -> None:
+        """
+        Args:
+            consumer: the consumer whose partitions are assigned
+            get_offsets: async function returning the stored next offsets (indexed by partition)
+                         for a topic and a list of partitions
+        """
+        self.consumer = consumer
+        self.get_offsets = get_offsets
+
+    async def on_partitions_revoked(self, revoked: List[TopicPartition]):
+        # Offsets are stored together with the data, nothing to commit here
+        pass
+
+    async def on_partitions_assigned(self, assigned: List[TopicPartition]):
+        partitions_by_topic: Dict[str, List[int]] = dict()
+        for tp in assigned:
+            partitions_by_topic.setdefault(tp.topic, []).append(tp.partition)
+
+        for topic, partitions in partitions_by_topic.items():
+            offsets = await self.get_offsets(topic, partitions)
+            for partition, offset in offsets.items():
+                self.consumer.seek(TopicPartition(topic, partition), offset)
+            if offsets:
+                log.info(f"Resuming topic '{topic}' from stored offsets: {offsets}")
+
+
 class KafkaConsumerManager(KafkaManager):
     """Manage consuming events from a given Kafka topic"""
 
     def __init__(
-        self, kafka_url: str, redis_url: str, topic: str, event_retrieval_timeout: int
+        self,
+        kafka_url: str,
+        redis_url: str,
+        topic: str,
+        event_retrieval_timeout: int,
+        count_transactions: bool = True,
+        get_stored_offsets: Optional[
+            Callable[[str, List[int]], Awaitable[Dict[int, int]]]
+        ] = None,
     ) -> None:
+        """
+        Args:
+            count_transactions: whether to decrement the number of transactions
+                                in Redis for each consumed event
+            get_stored_offsets: if set, the consumer seeks to the offsets returned by this
+                                function on partition assignment (see `StoredOffsetRebalanceListener`)
+        """
         super().__init__(kafka_url=kafka_url, redis_url=redis_url, topic=topic)
         self._client = AIOKafkaConsumer(
-            topic,
             bootstrap_servers=kafka_url,
             group_id=topic,
             auto_offset_reset="earliest",
         )
+        listener = (
+            StoredOffsetRebalanceListener(self._client, get_stored_offsets)
+            if get_stored_offsets
+            else None
+        )
+        self._client.subscribe([topic], listener=listener)
         # How much time (in seconds) to wait for the next event / message
         # from a Kafka topic before timing out the consumer
         self.event_retrieval_timeout = event_retrieval_timeout
+        # Only the events of the main topic are counted by the producer
+        self.count_transactions = count_transactions
 
         ##  Events
         # asyncio Event that is used for timing out
@@ -296,14 +469,74 @@ class KafkaConsumerManager(KafkaManager):
         # consumer is consuming messages from Kafka
         self.kafka_consuming_event = asyncio.Event()
 
+        ## Graceful stop (see `stop`)
+        self._stop_requested = False
+        # Whether an event is currently being handled by the callback
+        self._processing_event = False
+        self._consume_task: Optional[asyncio.Task] = None
+        self._timeout_task: Optional[asyncio.Task] = None
+
+    def stop(self):
+        """Stop consuming gracefully, after the currently processed event (if any)"""
+        self._stop_requested = True
+        if not self._processing_event:
+            for task in (self._consume_task, self._timeout_task):
+                if task:
+                    task.cancel()
+
+    def defer_event(self, event: ConsumerRecord, not_before: float):
+        """Consume an event (and the following events of its partition) again at `not_before`
+
+        Note:
+            The partition is paused and the consumer seeks back to the event, so the other
+            partitions are consumed in the meantime. Sleeping in the poll loop instead would get
+            the consumer kicked from its group after `max_poll_interval_ms`.
+        """
+        tp = TopicPartition(event.topic, event.partition)
+        try:
+            self._client.pause(tp)
+            self._client.seek(tp, event.offset)
+        except IllegalStateError:
+            # The partition was revoked in the meantime, its new consumer gets the event
+            return
+        asyncio.get_running_loop().call_later(
+            max(not_before - time.time(), 0), self._resume_partition, tp
+        )
+
+    def _resume_partition(self, tp: TopicPartition):
+        if tp in self._client.assignment():
+            self._client.resume(tp)
+
+    async def get_lag(self) -> int:
+        """Return the number of unconsumed events in the partitions assigned to this consumer
+
+        Note:
+            Partitions that weren't fetched from yet (unknown highwater offset) are not counted.
+        """
+        lag = 0
+        for tp in self._client.assignment():
+            try:
+                if (highwater := self._client.highwater(tp)) is not None:
+                    lag += max(0, highwater - await self._client.position(tp))
+            except IllegalStateError:
+                # The partition was revoked in the meantime
+                continue
+        return lag
+
     async def _event_timeout_task(self):
         """Raise an exception if event.set() is not called for event_retrieval_timeout seconds"""
         try:
             while True:
                 # Wait for event.set() to be called for event_retrieval_timeout seconds
-                await asyncio.wait_for(
-                    self.kafka_timeout_event.wait(), self.event_retrieval_timeout
-                )
+                try:
+                    await asyncio.wait_for(
+                        self.kafka_timeout_event.wait(), self.event_retrieval_timeout
+                    )
+                except TimeoutError:
+                    # The deferred events of paused partitions (see `defer_event`) are still to be consumed
+                    if self._client.paused():
+                        continue
+                    raise
                 # Reset the event timeout to wait another event_retrieval_timeout seconds for a new Kafka event
                 self.kafka_timeout_event.clear()
                 # Wait for the consumer to finish consuming the event
@@ -323,15 +556,22 @@ class KafkaConsumerManager(KafkaManager):
         try:
             # Wait for new events from Kafka and call the callback
             async for event in self._client:
+                self._processing_event = True
                 # Notify the timeout task that we've received a new Kafka topic message
                 self.kafka_timeout_event.set()
                 # Decrement the amount of events / messages in the partition
                 # this message was retrieved from
-                await self.redis_manager.decr_transactions(event.partition)
+                if self.count_transactions:
+                    await self.redis_manager.decr_transactions(event.partition)
                 # Await the async callback
                 await on_event_callback(event)
                 # Notify the consuming event that we've finished consuming the Kafka message
                 self.kafka_consuming_event.set()
+                self._processing_event = False
+                if self._stop_requested:
+                    # Stop the timeout task as well, this ends `start_consuming`
+                    self._timeout_task.cancel()
+                    return
         except TimeoutError:
             log.warning("Timed out in the listening on topic task")
             raise
@@ -345,6 +585,9 @@ class KafkaConsumerManager(KafkaManager):
             on_event_callback: a callback function that is called when a new event is received from Kafka
         """
         try:
+            if self._stop_requested:
+                return
+
             # Log information about the partitions that this consumer is consuming from
             partitions = list(map(lambda p: p.partition, self._client.assignment()))
             log.info(
@@ -352,16 +595,21 @@ class KafkaConsumerManager(KafkaManager):
             )
 
             # Create a consume task
-            consume_task = asyncio.create_task(
+            self._consume_task = asyncio.create_task(
                 self._start_listening_on_topic_task(on_event_callback)
             )
 
             # Create a task for a timeout counter to run in the background
-            timeout_task = asyncio.create_task(self._event_timeout_task())
+            self._timeout_task = asyncio.create_task(self._event_timeout_task())
 
             # Wait for consuming to finish
             # (with a timeout task that can interrupt the consume task by raising an exception)
-            await asyncio.gather(timeout_task, consume_task)
+            try:
+                await asyncio.gather(self._timeout_task, self._consume_task)
+            except asyncio.CancelledError:
+                if not self._stop_requested:
+                    raise
+                log.info(f"Stopped consuming events in topic '{self.topic}'")
 
         except KafkaConsumerPartitionsEmptyError:
             # Raised when no message is received within the specified time
@@ -2,17 +2,18 @@ import argparse
 import asyncio
 import sys
 
-import sentry_sdk
 import uvloop
-from sentry_sdk.integrations.asyncio import AsyncioIntegration
 
 from app import init_logger
 from app.config import Config
-from app.consumer import DataConsumer
+from app.consumer.supervisor import ConsumerSupervisor, run_consumer_tasks
 from app.model import DataCollectionWorkerType
 from app.model.abi import ContractABI
 from app.producer import DataProducer
+from app.utils import init_sentry
 from app.utils.enum_action import EnumAction
+from app.utils.profiler import install_profiler_trigger
+from app.utils.tracing import tracing
 
 log = init_logger(__name__)
 
@@ -23,27 +24,29 @@ async def start(args: argparse.Namespace, config: Config):
     log.info(f"Starting {worker_name}")
     exit_code = 0
 
-    # Start the app in the correct mode
-    if args.worker_type == DataCollectionWorkerType.CONSUMER:
-        # Load the ABIs
-        contract_abi = ContractABI.parse_file(args.abi_file)
-        consumer_tasks = []
-
-        # Consumer
-        async def start_consumer() -> int:
-            async with DataConsumer(config, contract_abi) as data_consumer:
-                return await data_consumer.start_consuming_data()
-
-        # Start N_CONSUMER_INSTANCES asyncio tasks
-        for _ in range(config.number_of_consumer_tasks):
-            consumer_tasks.append(asyncio.create_task(start_consumer()))
-        result = await asyncio.gather(*consumer_tasks)
-        # Return erroneous exit code if needed
-        exit_code = int(any(result))
-    elif args.worker_type == DataCollectionWorkerType.PRODUCER:
-        # Producer
-        async with DataProducer(config) as data_producer:
-            exit_code = await data_producer.start_producing_data()
+    # Profile the event loop on SIGUSR1
+    install_profiler_trigger(worker_name, config.profile_dir, config.profile_duration)
+
+    # Export the spans of the traced blocks / transactions (if configured)
+    async with tracing(config, service_name=worker_name):
+        # Start the app in the correct mode
+        if args.worker_type in (
+            DataCollectionWorkerType.CONSUMER,
+            DataCollectionWorkerType.RETRY_CONSUMER,
+        ):
+            # Load the ABIs
+            contract_abi = ContractABI.parse_file(args.abi_file)
+            # Start N_CONSUMER_INSTANCES asyncio tasks
+            exit_code = await run_consumer_tasks(
+                config,
+                contract_abi,
+                consume_retries=args.worker_type
+                == DataCollectionWorkerType.RETRY_CONSUMER,
+            )
+        elif args.worker_type == DataCollectionWorkerType.PRODUCER:
+            # Producer
+            async with DataProducer(config) as data_producer:
+                exit_code = await data_producer.start_producing_data()
 
     log.info(f"Exiting {worker_name} with code {exit_code}")
     sys.exit(exit_code)
@@ -64,7 +67,7 @@ def main():
     )
     parser.add_argument(
         "--worker-type",
-        help="The data collection worker type (producing or consuming data)",
+        help="The data collection worker type (producing data, consuming data or consuming failed events from the retry topic)",
         type=DataCollectionWorkerType,
         action=EnumAction,
         required=True,
@@ -75,13 +78,25 @@ def main():
     config: Config = Config.parse_file(args.cfg)
 
     # Initialize Sentry if needed (env var SENTRY_DSN present)
-    if sentry_dsn := config.sentry_dsn:
-        sentry_sdk.init(
-            dsn=sentry_dsn,
-            integrations=[
-                AsyncioIntegration(),
-            ],
+    init_sentry(config.sentry_dsn)
+
+    if (
+        args.worker_type == DataCollectionWorkerType.CONSUMER
+        and config.number_of_consumer_processes > 1
+    ):
+        # Supervisor mode: start N_CONSUMER_PROCESSES worker processes,
+        # each with its own event loop and N_CONSUMER_INSTANCES consumer tasks
+        worker_name = f"{args.worker_type.value}-supervisor-{config.kafka_topic}"
+        log.info(f"Starting {worker_name}")
+        supervisor = ConsumerSupervisor(
+            config=config,
+            abi_file=args.abi_file,
+            n_processes=config.number_of_consumer_processes,
+            max_restarts=config.consumer_process_max_restarts,
         )
+        exit_code = supervisor.run()
+        log.info(f"Exiting {worker_name} with code {exit_code}")
+        sys.exit(exit_code)
 
     # Run the app
     with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
@@ -1,5 +1,6 @@
+import dataclasses
 from enum import Enum, StrEnum, auto
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from hexbytes import HexBytes
 from pydantic import BaseModel, root_validator
@@ -10,6 +11,8 @@ class DataCollectionWorkerType(Enum):
 
     PRODUCER = "producer"
     CONSUMER = "consumer"
+    RETRY_CONSUMER = "retry_consumer"
+    """Consumes (drains) events that failed to be processed from the retry topic"""
 
 
 class DataCollectionMode(StrEnum):
@@ -66,3 +69,36 @@ class Web3BaseModel(BaseModel):
                     map(lambda v: v.hex() if isinstance(v, HexBytes) else v, value)
                 )
         return values
+
+
+class Web3Record:
+    """Base class for lightweight records of web3 data used on the consumer's hot path
+
+    Subclasses are slotted dataclasses (`@dataclass(slots=True, kw_only=True)`) created from
+    JSON-RPC results by explicit converters (e.g. `from_rpc`), without any validation.
+
+    Note:
+        Pydantic models (`Web3BaseModel`) are kept for the config and other boundaries,
+        where validation matters more than the cost of creating a model.
+    """
+
+    __slots__ = ()
+
+    def dict(self) -> Dict[str, Any]:
+        """The fields of the record as a dict (including nested records), like `BaseModel.dict()`"""
+        return {
+            name: _record_value_to_dict(getattr(self, name))
+            for name in self.__dataclass_fields__
+        }
+
+    def copy(self, update: Optional[Dict[str, Any]] = None):
+        """A (shallow) copy of the record with updated fields, like `BaseModel.copy()`"""
+        return dataclasses.replace(self, **(update or {}))
+
+
+def _record_value_to_dict(value: Any) -> Any:
+    if isinstance(value, Web3Record):
+        return value.dict()
+    if isinstance(value, list):
+        return [_record_value_to_dict(v) for v in value]
+    return value
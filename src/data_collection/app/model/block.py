@@ -1,9 +1,11 @@
 from datetime import datetime
-from typing import List
+from typing import Any, List, Mapping
 
+from hexbytes import HexBytes
 from pydantic import Field, validator
 
 from app.model import Web3BaseModel
+from app.web3 import checksum_address
 
 
 class BlockData(Web3BaseModel):
@@ -25,3 +27,27 @@ class BlockData(Web3BaseModel):
     def timestamp_to_datetime(cls, v):
         """Integer timestamp to datetime.datetime validator"""
         return datetime.fromtimestamp(v)
+
+    @validator("transactions", pre=True)
+    def full_transactions_to_hashes(cls, v):
+        """Keep only transaction hashes for blocks fetched with full transactions"""
+        return [
+            HexBytes(tx["hash"]).hex() if isinstance(tx, Mapping) else tx for tx in v
+        ]
+
+    @classmethod
+    def from_rpc(cls, data: Mapping[str, Any]) -> "BlockData":
+        """Create from the (JSON-RPC) result of `eth_getBlockByNumber` / `eth_getBlockByHash`"""
+        return cls(
+            number=int(data["number"], 16),
+            hash=data["hash"],
+            nonce=data["nonce"],
+            difficulty=int(data["difficulty"], 16),
+            gasLimit=int(data["gasLimit"], 16),
+            gasUsed=int(data["gasUsed"], 16),
+            timestamp=int(data["timestamp"], 16),
+            transactions=data["transactions"],
+            miner=checksum_address(data["miner"]),
+            parentHash=data["parentHash"],
+            uncles=data["uncles"],
+        )
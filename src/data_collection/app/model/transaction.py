@@ -1,54 +1,125 @@
-from typing import List, Optional
+from __future__ import annotations
 
-from pydantic import Field, validator
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional
 
-from app.model import Web3BaseModel
+from app.model import Web3Record
+from app.web3 import checksum_address
 
 
-class TransactionData(Web3BaseModel):
+def _hex_to_int(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value, 16)
+
+
+def _hex_to_float(value: Optional[str]) -> Optional[float]:
+    return None if value is None else float.fromhex(value)
+
+
+def _to_checksum_address(value: Optional[str]) -> Optional[str]:
+    return None if value is None else checksum_address(value)
+
+
+@dataclass(slots=True, kw_only=True)
+class TransactionData(Web3Record):
     """Describes a transaction given by `get_transaction`"""
 
-    transaction_hash: Optional[str] = Field(None, alias="hash")
-    block_number: Optional[int] = Field(None, alias="blockNumber")
-    from_address: Optional[str] = Field(None, alias="from")
-    to_address: Optional[str] = Field(None, alias="to")
+    transaction_hash: Optional[str] = None
+    block_number: Optional[int] = None
+    from_address: Optional[str] = None
+    to_address: Optional[str] = None
     value: Optional[float] = None
-    gas_price: Optional[float] = Field(None, alias="gasPrice")
-    gas_limit: Optional[float] = Field(None, alias="gas")
-    input_data: Optional[str] = Field(None, alias="input")
+    gas_price: Optional[float] = None
+    gas_limit: Optional[float] = None
+    input_data: Optional[str] = None
+
+    @classmethod
+    def from_rpc(cls, data: Mapping[str, Any]) -> TransactionData:
+        """Create from the (JSON-RPC) result of `eth_getTransactionByHash`"""
+        return cls(
+            transaction_hash=data.get("hash"),
+            block_number=_hex_to_int(data.get("blockNumber")),
+            from_address=_to_checksum_address(data.get("from")),
+            to_address=_to_checksum_address(data.get("to")),
+            value=_hex_to_float(data.get("value")),
+            gas_price=_hex_to_float(data.get("gasPrice")),
+            gas_limit=_hex_to_float(data.get("gas")),
+            input_data=data.get("input"),
+        )
 
 
-class TransactionLogsData(Web3BaseModel):
+@dataclass(slots=True, kw_only=True)
+class TransactionLogsData(Web3Record):
     """Describes transaction receipt logs given by `get_transaction_receipt`"""
 
     address: Optional[str] = None
     data: Optional[str] = None
     removed: Optional[bool] = None
     topics: Optional[List[str]] = None
-    log_index: Optional[int] = Field(None, alias="logIndex")
-    transaction_hash: Optional[str] = Field(None, alias="transactionHash")
+    log_index: Optional[int] = None
+    transaction_hash: Optional[str] = None
+
+    @classmethod
+    def from_rpc(cls, data: Mapping[str, Any]) -> TransactionLogsData:
+        """Create from a (JSON-RPC) log of `eth_getTransactionReceipt`"""
+        return cls(
+            address=_to_checksum_address(data.get("address")),
+            data=data.get("data"),
+            removed=data.get("removed"),
+            topics=data.get("topics"),
+            log_index=_hex_to_int(data.get("logIndex")),
+            transaction_hash=data.get("transactionHash"),
+        )
 
 
-class TransactionReceiptData(Web3BaseModel):
+@dataclass(slots=True, kw_only=True)
+class TransactionReceiptData(Web3Record):
     """Describes a transaction receipt given by `get_transaction_receipt`"""
 
-    gas_used: Optional[float] = Field(None, alias="gasUsed")
+    gas_used: Optional[float] = None
+    to_address: Optional[str] = None
     logs: Optional[List[TransactionLogsData]] = None
-    transaction_type: str = Field(None, alias="type")
-    contract_address: Optional[str] = Field(None, alias="contractAddress")
+    transaction_type: Optional[str] = None
+    contract_address: Optional[str] = None
 
+    @classmethod
+    def from_rpc(cls, data: Mapping[str, Any]) -> TransactionReceiptData:
+        """Create from the (JSON-RPC) result of `eth_getTransactionReceipt`"""
+        logs = data.get("logs")
+        transaction_type = _hex_to_int(data.get("type"))
+        return cls(
+            gas_used=_hex_to_float(data.get("gasUsed")),
+            to_address=_to_checksum_address(data.get("to")),
+            logs=None
+            if logs is None
+            else [TransactionLogsData.from_rpc(log) for log in logs],
+            transaction_type=None
+            if transaction_type is None
+            else str(transaction_type),
+            contract_address=_to_checksum_address(data.get("contractAddress")),
+        )
 
-class InternalTransactionData(Web3BaseModel):
+
+@dataclass(slots=True, kw_only=True)
+class InternalTransactionData(Web3Record):
     """Describes an internal transaction given by `debug_traceTransaction`"""
 
-    from_address: Optional[str] = Field(None, alias="from")
-    to_address: Optional[str] = Field(None, alias="to")
+    from_address: Optional[str] = None
+    to_address: Optional[str] = None
     value: Optional[float] = None
-    gas_used: Optional[float] = Field(None, alias="gasUsed")
-    gas_limit: Optional[float] = Field(None, alias="gas")
-    input_data: Optional[str] = Field(None, alias="input")
-    call_type: Optional[str] = Field(None, alias="callType")
-
-    @validator("value", "gas_used", "gas_limit", pre=True)
-    def strings_to_float(cls, v):
-        return float.fromhex(v)
+    gas_used: Optional[float] = None
+    gas_limit: Optional[float] = None
+    input_data: Optional[str] = None
+    call_type: Optional[str] = None
+
+    @classmethod
+    def from_rpc(cls, data: Mapping[str, Any]) -> InternalTransactionData:
+        """Create from a trace (action merged with its result) of `trace_replayTransaction`"""
+        return cls(
+            from_address=data.get("from"),
+            to_address=data.get("to"),
+            value=_hex_to_float(data.get("value")),
+            gas_used=_hex_to_float(data.get("gasUsed")),
+            gas_limit=_hex_to_float(data.get("gas")),
+            input_data=data.get("input"),
+            call_type=data.get("callType"),
+        )
@@ -1,5 +1,6 @@
 import asyncio
 import time
+from typing import List, Optional, Tuple
 
 from web3.exceptions import BlockNotFound
 
@@ -10,7 +11,10 @@ from app.model import DataCollectionMode
 from app.model.block import BlockData
 from app.utils import log_producer_progress
 from app.utils.data_collector import DataCollector
+from app.utils.tracing import SpanKind, tracer
 from app.web3.block_explorer import BlockExplorer
+from app.web3.relevance_filter import BlockRelevanceFilter
+from app.web3.retry import CircuitOpenError
 
 log = init_logger(__name__)
 
@@ -89,6 +93,25 @@ class DataProducer(DataCollector):
         # 3. Iterate until the end
         raise NotImplementedError("Log filter producer is not implemented yet")
 
+    async def _get_block_transactions(
+        self, i_block: int, relevance_filter: Optional[BlockRelevanceFilter]
+    ) -> Tuple[BlockData, List[str]]:
+        """Get block data and the hashes of the transactions that should be sent to kafka
+
+        Note:
+            If a relevance filter is given, the block is fetched with full transactions
+            and only the relevant transactions are returned.
+        """
+        if relevance_filter is None:
+            block_data = await self.node_connector.get_block_data(i_block)
+            return block_data, block_data.transactions
+
+        (
+            block_data,
+            block_data_dict,
+        ) = await self.node_connector.get_block_data_with_transactions(i_block)
+        return block_data, relevance_filter.filter_transactions(block_data_dict)
+
     async def _start_producer(
         self, data_collection_cfg: DataCollectionConfig, get_block_reward: bool = False
     ):
@@ -98,6 +121,13 @@ class DataProducer(DataCollector):
             data_collection_cfg (DataCollectionConfig): the data collection config object
             get_block_reward (bool): whether to get the block reward or not
         """
+        # Pre-filter transactions that can't be relevant for the contracts in partial mode
+        relevance_filter = None
+        if (
+            data_collection_cfg.mode == DataCollectionMode.PARTIAL
+            and data_collection_cfg.prefilter_transactions
+        ):
+            relevance_filter = BlockRelevanceFilter(data_collection_cfg.contracts)
         # Initialize block variables
         (
             start_block,
@@ -108,55 +138,71 @@ class DataProducer(DataCollector):
         ) = await self._init_block_vars(data_collection_cfg=data_collection_cfg)
         # Start producing transactions
         try:
-            # Track the total amount of transactions produced
+            # Track the total amount of transactions produced (and skipped by the relevance filter)
             _total_transactions = 0
+            _total_skipped_transactions = 0
             # Timer to track the average time per block
             _initial_time_counter_stamp = time.perf_counter()
             while should_continue(i_block):
-                # query the node for current block data
-                block_data: BlockData = await self.node_connector.get_block_data(
-                    i_block
-                )
-
-                # Insert new block
-                block_reward = 0
-                if get_block_reward:
-                    block_reward = await self.node_connector.get_block_reward(i_block)
-                    
-
-                await self._insert_block(
-                    block_data=block_data, block_reward=block_reward
-                )
+                # Trace of the block (from the node through Kafka to the consumers)
+                with tracer.span(
+                    "produce_block", root=True, attributes={"block.number": i_block}
+                ):
+                    try:
+                        # query the node for current block data
+                        block_data, tx_hashes = await self._get_block_transactions(
+                            i_block, relevance_filter
+                        )
+                        block_reward = 0
+                        if get_block_reward:
+                            block_reward = await self.node_connector.get_block_reward(i_block)
+                    except CircuitOpenError as e:
+                        # The node is unavailable, get the block again once it (probably) recovered
+                        await e.circuit_breaker.wait()
+                        continue
+                    _total_skipped_transactions += len(block_data.transactions) - len(
+                        tx_hashes
+                    )
 
-                if block_data.transactions:
-                    messages = [
-                        self.encode_kafka_event(tx_hash, data_collection_cfg.mode)
-                        for tx_hash in block_data.transactions
-                    ]
-                    _total_transactions += len(messages)
-                    # Send all the transaction hashes to Kafka so consumers can process them
-                    await self.kafka_manager.send_batch(msgs=messages)
-                else:
-                    log.debug(
-                        f"Skipped sending block #{block_data.block_number} to kafka as it contains no transactions."
+                    # Insert new block
+                    await self._insert_block(
+                        block_data=block_data, block_reward=block_reward
                     )
 
-                # Update the processed block variable with current block index
-                i_processed_block = i_block
-
-                # Continue from the next block
-                i_block += 1
-
-                # Log a status message if needed
-                log_producer_progress(
-                    log=log,
-                    i_block=i_processed_block,
-                    start_block=start_block,
-                    end_block=end_block,
-                    progress_log_frequency=self.PROGRESS_LOG_FREQUENCY,
-                    initial_time_counter=_initial_time_counter_stamp,
-                    n_transactions=await self.kafka_manager.redis_manager.get_n_transactions(),
-                )
+                    if tx_hashes:
+                        messages = [
+                            self.encode_kafka_event(tx_hash, data_collection_cfg.mode)
+                            for tx_hash in tx_hashes
+                        ]
+                        _total_transactions += len(messages)
+                        # Send all the transaction hashes to Kafka so consumers can process them,
+                        # the consumers continue the trace of the block
+                        with tracer.span("send_transactions", kind=SpanKind.PRODUCER):
+                            await self.kafka_manager.send_batch(
+                                msgs=messages, headers=tracer.inject()
+                            )
+                    else:
+                        log.debug(
+                            "Skipped sending block #%s to kafka as it contains no (relevant) transactions.",
+                            block_data.block_number,
+                        )
+
+                    # Update the processed block variable with current block index
+                    i_processed_block = i_block
+
+                    # Continue from the next block
+                    i_block += 1
+
+                    # Log a status message if needed
+                    log_producer_progress(
+                        log=log,
+                        i_block=i_processed_block,
+                        start_block=start_block,
+                        end_block=end_block,
+                        progress_log_frequency=self.PROGRESS_LOG_FREQUENCY,
+                        initial_time_counter=_initial_time_counter_stamp,
+                        n_transactions=await self.kafka_manager.redis_manager.get_n_transactions(),
+                    )
         except BlockNotFound:
             # OK, BlockNotFound exception is raised when the latest block is reached
             log.info(
@@ -168,6 +214,7 @@ class DataProducer(DataCollector):
             else:
                 log.info(
                     f"Finished at block #{i_processed_block} | total produced transactions: {_total_transactions}"
+                    f" | total skipped (irrelevant) transactions: {_total_skipped_transactions}"
                 )
 
     async def _start_get_logs_producer(
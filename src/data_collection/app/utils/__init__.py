@@ -1,6 +1,21 @@
 import logging
 import time
 from datetime import timedelta
+from typing import Optional
+
+import sentry_sdk
+from sentry_sdk.integrations.asyncio import AsyncioIntegration
+
+
+def init_sentry(sentry_dsn: Optional[str]):
+    """Initialize Sentry if needed (env var SENTRY_DSN present)"""
+    if sentry_dsn:
+        sentry_sdk.init(
+            dsn=sentry_dsn,
+            integrations=[
+                AsyncioIntegration(),
+            ],
+        )
 
 
 def log_producer_progress(
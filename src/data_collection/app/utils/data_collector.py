@@ -1,12 +1,57 @@
 from __future__ import annotations
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 from app.config import Config
 from app.db.manager import DatabaseManager
 from app.kafka.manager import KafkaManager
 from app.model import DataCollectionMode
+from app.web3.concurrency import ConcurrencyLimiter
 from app.web3.node_connector import NodeConnector
+from app.web3.response_cache import ResponseCache
+from app.web3.retry import CircuitBreaker, RetryBudget, RetryController, RetryPolicy
+from app.web3.timeouts import AdaptiveTimeouts
+
+
+def create_retry_controller(config: Config) -> RetryController:
+    """Create a retry controller of node requests with the retry settings of the given config
+
+    Note:
+        Traces are expensive for the node, so failed trace requests back off from a 4x longer delay.
+    """
+    policy = RetryPolicy(
+        attempts=max(config.web3_requests_retry_limit, 1),
+        base_delay=config.web3_requests_retry_delay,
+        max_delay=config.web3_requests_retry_max_delay,
+    )
+    trace_policy = RetryPolicy(
+        attempts=policy.attempts,
+        base_delay=4 * policy.base_delay,
+        max_delay=policy.max_delay,
+    )
+    return RetryController(
+        policy=policy,
+        method_policies={"trace_*": trace_policy, "debug_*": trace_policy},
+        budget=RetryBudget(ratio=config.web3_requests_retry_budget),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=config.web3_circuit_breaker_threshold,
+            reset_timeout=config.web3_circuit_breaker_reset_timeout,
+        ),
+    )
+
+
+def create_concurrency_limiter(config: Config) -> ConcurrencyLimiter:
+    """Create a concurrency limiter of node requests with the limits of the given config
+
+    Note:
+        Traces (`trace_*`, `debug_*`) are much slower than other requests, so they have separate limits.
+    """
+    return ConcurrencyLimiter(
+        initial_limit=config.web3_concurrency_limit_initial,
+        min_limit=config.web3_concurrency_limit_min,
+        max_limit=config.web3_concurrency_limit_max,
+        method_classes={"trace_*": "trace", "debug_*": "trace"},
+    )
 
 
 class DataCollector:
@@ -18,7 +63,19 @@ class DataCollector:
 
     KAFKA_EVENT_SEPARATOR = ":"
 
-    def __init__(self, config: Config) -> None:
+    def __init__(
+        self,
+        config: Config,
+        retry_controller: Optional[RetryController] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        """
+        Args:
+            retry_controller: the retry controller of node requests shared by the data collectors
+                              of a process, a new one is created if `None`
+            concurrency_limiter: the concurrency limiter of node requests shared by the data collectors
+                                 of a process, a new one is created if `None`
+        """
         # Initialize the manager objects
         self.kafka_manager: KafkaManager = None
         self.node_connector = NodeConnector(
@@ -26,6 +83,25 @@ class DataCollector:
             timeout=config.web3_requests_timeout,
             retry_limit=config.web3_requests_retry_limit,
             retry_delay=config.web3_requests_retry_delay,
+            endpoints={
+                endpoint.url: endpoint.methods for endpoint in config.node_endpoints
+            },
+            retry_controller=retry_controller or create_retry_controller(config),
+            adaptive_timeouts=AdaptiveTimeouts(
+                default_timeout=config.web3_requests_timeout,
+                min_timeout=config.web3_requests_timeout_min,
+                max_timeout=config.web3_requests_timeout_max,
+                multiplier=config.web3_requests_timeout_multiplier,
+            ),
+            concurrency_limiter=concurrency_limiter
+            or create_concurrency_limiter(config),
+            response_cache=ResponseCache(
+                path=config.web3_response_cache_path,
+                max_size=config.web3_response_cache_max_size * 2**20,
+                finality_depth=config.web3_response_cache_finality_depth,
+            )
+            if config.web3_response_cache_path
+            else None,
         )
         self.db_manager = DatabaseManager(
             postgresql_dsn=config.db_dsn, node_name=config.kafka_topic
@@ -40,6 +116,7 @@ class DataCollector:
 
     async def __aexit__(self, exc_type, exc, tb):
         await self.kafka_manager.disconnect()
+        await self.node_connector.disconnect()
 
     def encode_kafka_event(self, tx_hash: str, mode: DataCollectionMode) -> str:
         """Create kafka event from a transaction hash and a data collection mode"""
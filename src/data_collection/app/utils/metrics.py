@@ -0,0 +1,293 @@
+"""
+Latency histograms of the stages of the consumer hot path (node requests, event decoding, DB writes),
+per stage and transaction processor. Summarized periodically in the logs and exposed
+(along with other metrics, e.g. the concurrency limits of node requests) in the Prometheus text format (see `stage_metrics_reporting`).
+"""
+import asyncio
+import functools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from aiohttp import web
+
+from app import init_logger
+
+log = init_logger(__name__)
+
+SUB_BUCKET_BITS = 5
+"""Each power of two is split into 2**SUB_BUCKET_BITS buckets (a relative error of ~3%)"""
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_EXACT_VALUES = 2 * _SUB_BUCKETS
+
+SUMMARY_QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+"""The quantiles of the log summaries and the Prometheus summaries"""
+
+DEFAULT_PROCESSOR = "other"
+"""The processor label of stages timed outside of `processor_context`"""
+
+_processor: ContextVar[str] = ContextVar("processor", default=DEFAULT_PROCESSOR)
+"""The transaction processor of the current context (task)"""
+
+
+def _bucket_index(value: int) -> int:
+    """The bucket of a (non-negative) value, values below 64 have their own bucket"""
+    if value < _EXACT_VALUES:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * _SUB_BUCKETS + (value >> shift) - _SUB_BUCKETS
+
+
+def _bucket_bounds(index: int) -> Tuple[int, int]:
+    """The lowest and the highest value of a bucket"""
+    if index < _EXACT_VALUES:
+        return index, index
+    shift = index // _SUB_BUCKETS - 1
+    lowest = (index % _SUB_BUCKETS + _SUB_BUCKETS) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies (in microseconds)
+
+    Values are counted in log-linear buckets: exact up to 64 µs, above that every power of two
+    is split into 32 buckets. Recording a value costs a few integer operations and the memory
+    doesn't grow with the number of values.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value: int):
+        """Record a latency (in microseconds)"""
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[int]:
+        """The q-th (0-1) percentile (the highest value of its bucket), `None` if there are no values"""
+        if not self.count:
+            return None
+        rank = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def copy(self) -> "LatencyHistogram":
+        histogram = LatencyHistogram()
+        histogram.merge(self)
+        return histogram
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add the values of another histogram"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def since(self, snapshot: "LatencyHistogram") -> "LatencyHistogram":
+        """The values recorded after `snapshot` (an earlier copy of this histogram)
+
+        Note:
+            The maximum of the interval is the highest value of its highest bucket.
+        """
+        histogram = LatencyHistogram()
+        for index, count in self.counts.items():
+            if count > snapshot.counts.get(index, 0):
+                histogram.counts[index] = count - snapshot.counts.get(index, 0)
+        histogram.count = self.count - snapshot.count
+        histogram.sum = self.sum - snapshot.sum
+        if histogram.counts:
+            histogram.max = min(_bucket_bounds(max(histogram.counts))[1], self.max)
+        return histogram
+
+
+@contextmanager
+def processor_context(processor: str) -> Iterator[None]:
+    """Set the processor label of the stages timed within the context (including its subtasks)"""
+    token = _processor.set(processor)
+    try:
+        yield
+    finally:
+        _processor.reset(token)
+
+
+class StageMetrics:
+    """Latency histograms of stages, per stage and processor (see `processor_context`)"""
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        # Copies of the histograms at the last log summary
+        self._logged: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def record(self, stage: str, latency: int, processor: Optional[str] = None):
+        """Record the latency (in microseconds) of a stage of the current (or the given) processor"""
+        key = (processor or _processor.get(), stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(latency)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Record the latency of the code within the context (also if it raises)"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter_ns() - start) // 1000)
+
+    def timed(self, stage: str):
+        """Decorator recording the latency of each call of a coroutine function"""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter_ns()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.record(stage, (time.perf_counter_ns() - start) // 1000)
+
+            return wrapper
+
+        return decorator
+
+    def summary(
+        self, since: Optional[Dict[Tuple[str, str], LatencyHistogram]] = None
+    ) -> List[dict]:
+        """Count, mean, percentiles and maximum (in ms) of each processor and stage
+
+        Args:
+            since: summarize only the values recorded after these copies of the histograms
+        """
+        rows = []
+        for (processor, stage), histogram in sorted(self.histograms.items()):
+            if since is not None and (processor, stage) in since:
+                histogram = histogram.since(since[(processor, stage)])
+            if not histogram.count:
+                continue
+            rows.append(
+                {
+                    "processor": processor,
+                    "stage": stage,
+                    "count": histogram.count,
+                    "mean_ms": histogram.mean() / 1e3,
+                    **{
+                        f"{name}_ms": histogram.percentile(q) / 1e3
+                        for name, q in SUMMARY_QUANTILES.items()
+                    },
+                    "max_ms": histogram.max / 1e3,
+                }
+            )
+        return rows
+
+    def log_summary(self):
+        """Log a summary of the values recorded since the last log summary"""
+        rows = self.summary(since=self._logged)
+        self._logged = {key: h.copy() for key, h in self.histograms.items()}
+        for row in rows:
+            log.info(
+                "Stage latency {processor}/{stage}: n={count} mean={mean_ms:.3f} "
+                "p50={p50_ms:.3f} p90={p90_ms:.3f} p99={p99_ms:.3f} p999={p999_ms:.3f} "
+                "max={max_ms:.3f} ms".format(**row)
+            )
+
+    def prometheus_text(self, prefix: str = "data_collection") -> str:
+        """The histograms as Prometheus summaries (in seconds), in the Prometheus text format"""
+        name = f"{prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of the stages of the consumers per transaction processor",
+            f"# TYPE {name} summary",
+        ]
+        for (processor, stage), histogram in sorted(self.histograms.items()):
+            labels = f'processor="{processor}",stage="{stage}"'
+            for q in SUMMARY_QUANTILES.values():
+                lines.append(
+                    f'{name}{{{labels},quantile="{q}"}} {histogram.percentile(q) / 1e6}'
+                )
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum / 1e6}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+"""The stage metrics of this process"""
+
+
+async def _log_periodically(metrics: StageMetrics, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        metrics.log_summary()
+
+
+@asynccontextmanager
+async def stage_metrics_reporting(
+    metrics: StageMetrics,
+    log_interval: float,
+    port: Optional[int],
+    collectors: Sequence[Callable[[], str]] = (),
+) -> AsyncIterator[None]:
+    """Log summaries of the stage metrics and serve them (at `/metrics`) while in the context
+
+    Args:
+        log_interval: the interval (in seconds) of the log summaries, disabled if 0
+        port: the port of the metrics HTTP server, disabled if `None`
+        collectors: functions returning further metrics (in the Prometheus text format)
+                    served along with the stage metrics, e.g. `ConcurrencyLimiter.prometheus_text`
+    """
+    log_task = None
+    if log_interval > 0:
+        log_task = asyncio.create_task(_log_periodically(metrics, log_interval))
+
+    runner = None
+    if port is not None:
+
+        async def handle_metrics(request: web.Request) -> web.Response:
+            return web.Response(
+                text="".join(
+                    [metrics.prometheus_text(), *(collect() for collect in collectors)]
+                )
+            )
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, port=port).start()
+        log.info(f"Serving the stage metrics at :{port}/metrics")
+
+    try:
+        yield
+    finally:
+        if log_task is not None:
+            log_task.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        if log_interval > 0:
+            metrics.log_summary()
@@ -0,0 +1,277 @@
+"""
+On-demand profiling of a running worker (triggered with SIGUSR1, see `install_profiler_trigger`).
+
+A profile samples the stacks of the event loop thread, the await stacks of the asyncio tasks and
+the event loop lag for `PROFILE_DURATION` seconds. The stacks are written in the collapsed
+("folded") format of flamegraph.pl / speedscope / inferno, the lag and a dump of the tasks
+in a JSON report.
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional
+
+from app import init_logger
+from app.utils.metrics import SUMMARY_QUANTILES, LatencyHistogram
+
+log = init_logger(__name__)
+
+PROFILE_SIGNAL = signal.SIGUSR1
+"""The signal that starts a profile"""
+
+LAG_INTERVAL = 0.05
+"""The interval (in seconds) of the event loop lag measurements"""
+
+TASK_SAMPLE_INTERVAL = 0.1
+"""The interval (in seconds) of sampling the await stacks of the asyncio tasks"""
+
+SAMPLING_INTERVAL = 0.005
+"""The interval (in seconds) of sampling the stack of the event loop thread"""
+
+
+_PATH_PREFIXES = sorted(
+    {
+        os.path.join(path, "")
+        for path in (
+            os.getcwd(),
+            sysconfig.get_path("purelib"),
+            sysconfig.get_path("platlib"),
+            sysconfig.get_path("stdlib"),
+        )
+    },
+    key=len,
+    reverse=True,
+)
+"""Prefixes removed from the file names in the stacks (the working directory, packages, stdlib)"""
+
+
+def _frame_name(code: CodeType) -> str:
+    """The name of a function in the collapsed stacks, e.g. `DataConsumer._on_kafka_event (app/consumer/__init__.py)`"""
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix) :]
+            break
+    return f"{code.co_qualname} ({filename})"
+
+
+def collapse_frames(frame: Optional[FrameType]) -> List[str]:
+    """The names of the functions of a stack, from the outermost to the innermost frame"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def collapse_task(task: asyncio.Task) -> List[str]:
+    """The await stack of a task, from its coroutine to the awaited future (innermost)"""
+    names = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        code = getattr(awaitable, "cr_code", None) or getattr(
+            awaitable, "gi_code", None
+        )
+        if code is None:
+            # A future (the one the task waits for), or an awaitable implemented in C
+            waiter = getattr(task, "_fut_waiter", None) or awaitable
+            names.append(f"[{type(waiter).__name__}]")
+            break
+        names.append(_frame_name(code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(
+            awaitable, "gi_yieldfrom", None
+        )
+    return names
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of a thread (the event loop thread) from a separate thread
+
+    Note:
+        Samples are taken when the sampled thread releases the GIL (at the latest every
+        `sys.getswitchinterval()`), so very short functions are underrepresented.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.n_samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[";".join(collapse_frames(frame))] += 1
+            self.n_samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def write_collapsed(path: Path, stacks: Counter):
+    """Write stacks in the collapsed format (`outer;inner count`), the most frequent first"""
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Time-boxed sampling profiles of the event loop of a worker"""
+
+    def __init__(
+        self,
+        name: str,
+        output_dir: str,
+        duration: float,
+        interval: float = SAMPLING_INTERVAL,
+    ) -> None:
+        """
+        Args:
+            name: the name of the worker (in the file names)
+            output_dir: the directory of the profiles
+            duration: the duration (in seconds) of a profile
+            interval: the interval (in seconds) of sampling the event loop thread
+        """
+        self.name = name
+        self.output_dir = Path(output_dir)
+        self.duration = duration
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def trigger(self):
+        """Start a profile in the background (unless one is running)"""
+        if self.running:
+            log.warning("A profile is already running, ignoring the trigger")
+            return
+        self._task = asyncio.get_running_loop().create_task(self.profile())
+        self._task.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and (e := task.exception()) is not None:
+            log.error("Profiling failed", exc_info=(type(e), e, e.__traceback__))
+
+    async def _sample_loop(
+        self, end: float, lag: LatencyHistogram, task_stacks: Counter
+    ) -> int:
+        """Measure the event loop lag and sample the task stacks until `end` (loop time)"""
+        loop = asyncio.get_running_loop()
+        current = asyncio.current_task()
+        next_task_sample = loop.time()
+        n_task_samples = 0
+        while loop.time() < end:
+            if loop.time() >= next_task_sample:
+                for task in asyncio.all_tasks(loop):
+                    if task is not current:
+                        task_stacks[";".join(collapse_task(task))] += 1
+                n_task_samples += 1
+                next_task_sample = loop.time() + TASK_SAMPLE_INTERVAL
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            # How much later than scheduled the loop resumed this coroutine
+            lag.record(int(max(loop.time() - start - LAG_INTERVAL, 0) * 1e6))
+        return n_task_samples
+
+    def _task_dump(self) -> List[Dict[str, object]]:
+        current = asyncio.current_task()
+        return [
+            {"name": task.get_name(), "stack": collapse_task(task)}
+            for task in asyncio.all_tasks()
+            if task is not current
+        ]
+
+    async def profile(self) -> Path:
+        """Profile the event loop for `duration` seconds
+
+        Returns:
+            the path of the report, next to it `<name>.stacks.folded` (the samples of the
+            event loop thread) and `<name>.tasks.folded` (the samples of the await stacks)
+        """
+        loop = asyncio.get_running_loop()
+        started_at = datetime.now(timezone.utc)
+        prefix = f"{self.name}-{os.getpid()}-{started_at:%Y%m%dT%H%M%S}"
+        log.info(f"Profiling the event loop for {self.duration}s ({prefix})")
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        lag = LatencyHistogram()
+        task_stacks: Counter = Counter()
+        start_cpu, start = time.process_time(), loop.time()
+        sampler.start()
+        try:
+            n_task_samples = await self._sample_loop(
+                start + self.duration, lag, task_stacks
+            )
+        finally:
+            sampler.stop()
+        elapsed = loop.time() - start
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stacks_path = self.output_dir / f"{prefix}.stacks.folded"
+        tasks_path = self.output_dir / f"{prefix}.tasks.folded"
+        report_path = self.output_dir / f"{prefix}.json"
+        write_collapsed(stacks_path, sampler.stacks)
+        write_collapsed(tasks_path, task_stacks)
+        lag_ms = {
+            "count": lag.count,
+            "mean": (lag.mean() or 0) / 1e3,
+            **{
+                name: (lag.percentile(q) or 0) / 1e3
+                for name, q in SUMMARY_QUANTILES.items()
+            },
+            "max": lag.max / 1e3,
+        }
+        with open(report_path, "w") as f:
+            json.dump(
+                {
+                    "worker": self.name,
+                    "pid": os.getpid(),
+                    "started_at": started_at.isoformat(),
+                    "duration_s": elapsed,
+                    "cpu_s": time.process_time() - start_cpu,
+                    "sampling_interval_ms": self.interval * 1e3,
+                    "n_stack_samples": sampler.n_samples,
+                    "n_task_samples": n_task_samples,
+                    "loop_lag_ms": lag_ms,
+                    "stacks": stacks_path.name,
+                    "task_stacks": tasks_path.name,
+                    "tasks": self._task_dump(),
+                },
+                f,
+                indent=2,
+            )
+        log.info(
+            f"Finished profiling ({sampler.n_samples} samples), event loop lag "
+            f"p50/p99/max = {lag_ms['p50']:.1f}/{lag_ms['p99']:.1f}/{lag_ms['max']:.1f} ms, "
+            f"written to {report_path}"
+        )
+        return report_path
+
+
+def install_profiler_trigger(name: str, output_dir: str, duration: float) -> Profiler:
+    """Start a profile of the running event loop whenever the process receives `PROFILE_SIGNAL`
+
+    Example:
+        `docker kill --signal=SIGUSR1 <container>` (the supervisor forwards it to its workers)
+    """
+    profiler = Profiler(name, output_dir, duration)
+    asyncio.get_running_loop().add_signal_handler(PROFILE_SIGNAL, profiler.trigger)
+    return profiler
@@ -0,0 +1,439 @@
+"""
+Distributed tracing of transactions from the producer through Kafka to the consumer writes.
+
+The trace context is propagated in the W3C `traceparent` format (in Kafka message headers)
+and the spans are exported in the OTLP/JSON format, either to a file (JSON lines) or to an
+OpenTelemetry collector (OTLP/HTTP), so any OpenTelemetry compatible backend can show them.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import (
+    Any,
+    AsyncIterator,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
+import orjson
+
+from app import init_logger
+from app.config import Config
+
+log = init_logger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+"""Kafka message header with the trace context of the message (W3C Trace Context)"""
+
+EXPORT_INTERVAL = 5
+"""The interval (in seconds) of exporting the finished spans"""
+
+
+class SpanKind(IntEnum):
+    """The kind of a span (values of the OTLP `Span.SpanKind`)"""
+
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+    PRODUCER = 4
+    CONSUMER = 5
+
+
+class SpanContext(NamedTuple):
+    """The identity of a span within its trace"""
+
+    trace_id: str
+    """32 hex characters"""
+    span_id: str
+    """16 hex characters"""
+    sampled: bool
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, traceparent: str) -> Optional[SpanContext]:
+        """Parse a `traceparent` header value, `None` if it is invalid"""
+        parts = traceparent.strip().split("-")
+        if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            flags = int(parts[3], 16)
+            int(parts[1], 16), int(parts[2], 16)
+        except ValueError:
+            return None
+        return cls(trace_id=parts[1], span_id=parts[2], sampled=bool(flags & 1))
+
+
+_current_context: ContextVar[Optional[SpanContext]] = ContextVar(
+    "span_context", default=None
+)
+"""The span context of the current context (task), also of unsampled traces"""
+
+_NO_SPAN = nullcontext(None)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+@dataclass(slots=True)
+class Span:
+    """A finished (or running) operation of a sampled trace"""
+
+    name: str
+    context: SpanContext
+    parent_span_id: Optional[str]
+    kind: SpanKind
+    start_time: int
+    """Unix time in nanoseconds"""
+    end_time: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        """The span in the OTLP/JSON format"""
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": int(self.kind),
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": _otlp_attributes(self.attributes),
+        }
+        if self.parent_span_id is not None:
+            span["parentSpanId"] = self.parent_span_id
+        if self.error is not None:
+            # STATUS_CODE_ERROR
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+
+class Tracer:
+    """Create spans of sampled traces and queue them for the export
+
+    Note:
+        Traces are started only by root spans (`root=True`), e.g. for a block in the producer
+        or for a transaction without a trace context in the consumer. A share of `sample_rate`
+        of the traces is sampled; spans of unsampled traces are not created at all, their
+        context is still propagated (so the consumers follow the decision of the producer).
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        enabled: bool = False,
+        max_queue_size: int = 10000,
+    ) -> None:
+        """
+        Args:
+            sample_rate: the share (0-1) of the traces that are sampled
+            enabled: whether spans are created at all (an exporter is configured)
+            max_queue_size: the maximum number of finished spans waiting for the export,
+                            further spans are dropped
+        """
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._queue: Deque[Span] = deque()
+        self.max_queue_size = max_queue_size
+        self.n_dropped_spans = 0
+
+    def configure(self, sample_rate: float, enabled: bool):
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+
+    def span(
+        self,
+        name: str,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+        root: bool = False,
+    ) -> ContextManager[Optional[Span]]:
+        """A span of the code within the context, `None` if its trace isn't sampled
+
+        Args:
+            parent: the parent span (e.g. from a Kafka message), the current span if `None`
+            root: start a new trace if there is no parent span
+        """
+        if not self.enabled:
+            # Tracing is off in the hot path by default, don't create a context manager
+            return _NO_SPAN
+        return self._span(name, kind, attributes, parent, root)
+
+    @contextmanager
+    def _span(
+        self,
+        name: str,
+        kind: SpanKind,
+        attributes: Optional[Dict[str, Any]],
+        parent: Optional[SpanContext],
+        root: bool,
+    ) -> Iterator[Optional[Span]]:
+        parent = parent or _current_context.get()
+        if parent is None:
+            if not root:
+                yield None
+                return
+            context = SpanContext(
+                trace_id=f"{random.getrandbits(128):032x}",
+                span_id=f"{random.getrandbits(64):016x}",
+                sampled=random.random() < self.sample_rate,
+            )
+        elif parent.sampled:
+            context = parent._replace(span_id=f"{random.getrandbits(64):016x}")
+        else:
+            context = parent
+
+        token = _current_context.set(context)
+        if not context.sampled:
+            try:
+                yield None
+            finally:
+                _current_context.reset(token)
+            return
+
+        span = Span(
+            name=name,
+            context=context,
+            parent_span_id=parent.span_id if parent is not None else None,
+            kind=kind,
+            start_time=time.time_ns(),
+            attributes=attributes or {},
+        )
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_time = time.time_ns()
+            _current_context.reset(token)
+            self._finish(span)
+
+    def traced(self, name: str, kind: SpanKind = SpanKind.INTERNAL):
+        """Decorator creating a span for each call of a coroutine function (within a trace)"""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name, kind=kind):
+                    return await fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _finish(self, span: Span):
+        if len(self._queue) >= self.max_queue_size:
+            self.n_dropped_spans += 1
+            return
+        self._queue.append(span)
+
+    def pop_finished_spans(self) -> List[Span]:
+        spans = list(self._queue)
+        self._queue.clear()
+        return spans
+
+    def inject(self) -> List[Tuple[str, bytes]]:
+        """The Kafka message headers with the current trace context (empty if there is none)"""
+        context = _current_context.get()
+        if context is None:
+            return []
+        return [(TRACEPARENT_HEADER, context.to_traceparent().encode())]
+
+    @staticmethod
+    def extract(headers: Optional[List[Tuple[str, bytes]]]) -> Optional[SpanContext]:
+        """The trace context of Kafka message headers, `None` if there is none"""
+        for key, value in headers or []:
+            if key == TRACEPARENT_HEADER:
+                return SpanContext.from_traceparent(value.decode())
+        return None
+
+
+tracer = Tracer()
+"""The tracer of this process"""
+
+
+def _export_request(spans: List[Span], service_name: str) -> dict:
+    """An OTLP `ExportTraceServiceRequest` (JSON) of the spans"""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes({"service.name": service_name})
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app"},
+                        "spans": [span.to_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter(ABC):
+    """Base class of the span exporters"""
+
+    def __init__(self, service_name: str) -> None:
+        self.service_name = service_name
+
+    @abstractmethod
+    async def export(self, spans: List[Span]):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FileSpanExporter(SpanExporter):
+    """Append the spans to a file, one OTLP/JSON export request per line"""
+
+    def __init__(self, service_name: str, path: str) -> None:
+        super().__init__(service_name)
+        self.path = path
+        self._file = open(path, "ab")
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+
+    async def export(self, spans: List[Span]):
+        data = orjson.dumps(_export_request(spans, self.service_name)) + b"\n"
+        # Don't block the event loop on a slow disk
+        await asyncio.to_thread(self._write, data)
+
+    async def close(self):
+        await asyncio.to_thread(self._file.close)
+
+
+class OtlpHttpSpanExporter(SpanExporter):
+    """Send the spans to an OpenTelemetry collector (OTLP/HTTP with JSON encoding)"""
+
+    def __init__(self, service_name: str, endpoint: str, timeout: float = 10) -> None:
+        """
+        Args:
+            endpoint: the collector URL, e.g. `http://otel-collector:4318`
+        """
+        super().__init__(service_name)
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def export(self, spans: List[Span]):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        try:
+            async with self._session.post(
+                self.url,
+                data=orjson.dumps(_export_request(spans, self.service_name)),
+                headers={"Content-Type": "application/json"},
+            ) as response:
+                response.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning(f"Dropped {len(spans)} spans, the export failed: {e!r}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def create_span_exporter(
+    config: Config, service_name: str, worker_id: Optional[int] = None
+) -> Optional[SpanExporter]:
+    """Create the span exporter of the given config, `None` if tracing is disabled
+
+    Args:
+        worker_id: the id of the consumer worker process (supervisor mode),
+                   its spans are written to `<TRACING_FILE>.<worker_id>`
+    """
+    if config.tracing_otlp_endpoint:
+        return OtlpHttpSpanExporter(service_name, config.tracing_otlp_endpoint)
+    if config.tracing_file:
+        path = config.tracing_file
+        if worker_id is not None:
+            path = f"{path}.{worker_id}"
+        return FileSpanExporter(service_name, path)
+    return None
+
+
+async def _export(exporter: SpanExporter):
+    if spans := tracer.pop_finished_spans():
+        await exporter.export(spans)
+
+
+async def _export_periodically(exporter: SpanExporter, stop: asyncio.Event):
+    """Export the finished spans every `EXPORT_INTERVAL` seconds and once more when `stop` is set"""
+    stopped = False
+    while not stopped:
+        try:
+            await asyncio.wait_for(stop.wait(), EXPORT_INTERVAL)
+            stopped = True
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await _export(exporter)
+        except Exception as e:
+            log.error("Exporting spans failed", exc_info=(type(e), e, e.__traceback__))
+
+
+@asynccontextmanager
+async def tracing(
+    config: Config, service_name: str, worker_id: Optional[int] = None
+) -> AsyncIterator[None]:
+    """Enable tracing (if configured) and export the spans while in the context
+
+    Args:
+        service_name: the name of the traced service (e.g. `consumer-eth`)
+        worker_id: the id of the consumer worker process (supervisor mode)
+    """
+    exporter = create_span_exporter(config, service_name, worker_id)
+    if exporter is None:
+        yield
+        return
+
+    tracer.configure(sample_rate=config.tracing_sample_rate, enabled=True)
+    stop = asyncio.Event()
+    export_task = asyncio.create_task(_export_periodically(exporter, stop))
+    try:
+        yield
+    finally:
+        tracer.configure(sample_rate=0.0, enabled=False)
+        # Let a running export finish, then export the remaining spans
+        stop.set()
+        await export_task
+        await exporter.close()
+        if tracer.n_dropped_spans:
+            log.warning(f"Dropped {tracer.n_dropped_spans} spans (full export queue)")
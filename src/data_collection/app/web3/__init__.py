@@ -0,0 +1,13 @@
+import functools
+
+from eth_utils import to_checksum_address
+
+
+@functools.lru_cache(maxsize=100_000)
+def checksum_address(address: str) -> str:
+    """Checksummed (EIP-55) address, the same as web3 returns
+
+    Note:
+        The same accounts appear in many transactions and logs, so the result (keccak) is cached.
+    """
+    return to_checksum_address(address)
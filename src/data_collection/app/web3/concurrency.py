@@ -0,0 +1,253 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fnmatch import fnmatchcase
+from typing import AsyncIterator, Deque, Dict, Mapping, Optional, Tuple
+
+import aiohttp
+
+from app import init_logger
+
+log = init_logger(__name__)
+
+OVERLOAD_HTTP_STATUSES = frozenset({429, 503})
+"""HTTP statuses of an overloaded node"""
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """Whether a failed request signals an overloaded node (timeouts, rate limiting)"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in OVERLOAD_HTTP_STATUSES
+    return isinstance(error, asyncio.TimeoutError)
+
+
+class AIMDLimit:
+    """Adaptive limit of concurrent requests (additive increase, multiplicative decrease)
+
+    The limit grows by one for every `limit` successful requests (i.e. by one per "round trip")
+    while the average latency stays below `latency_tolerance` times the no-load latency (the lowest
+    average latency during the previous `WINDOW_SIZE` requests). It's multiplied by `backoff_ratio`
+    when a request times out, is rate limited or the average latency exceeds the tolerance.
+    Requests above the limit wait.
+
+    Note:
+        Only requests started after the last decrease can decrease the limit again, so that
+        the requests that were already in flight during an overload decrease it only once.
+    """
+
+    WINDOW_SIZE = 100
+    """The number of requests after which the no-load latency is updated"""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        name: str = "",
+    ) -> None:
+        """
+        Args:
+            initial_limit: the initial number of concurrent requests
+            min_limit: the minimum limit
+            max_limit: the maximum limit
+            backoff_ratio: the ratio by which the limit is multiplied on an overload
+            latency_tolerance: the ratio of the average latency to the no-load latency considered an overload
+            name: the name of the limit in the logs
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.name = name
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        """Number of unfinished (not waiting) requests"""
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        # Exponentially weighted moving average of the latencies
+        self._average_latency: Optional[float] = None
+        # The no-load latency (the lowest average latency of the previous window) and of the current window
+        self._min_latency: Optional[float] = None
+        self._window_min_latency = math.inf
+        self._window_count = 0
+
+    @property
+    def limit(self) -> int:
+        """The current number of allowed concurrent requests"""
+        return int(self._limit)
+
+    def _wake_up_waiters(self):
+        for _ in range(self.limit - self.in_flight):
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    break
+
+    async def _acquire(self):
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the wake up on to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_up_waiters()
+                raise
+        self.in_flight += 1
+
+    def _add_latency(self, latency: float):
+        if self._average_latency is None:
+            self._average_latency = latency
+        else:
+            self._average_latency = 0.1 * latency + 0.9 * self._average_latency
+        self._window_min_latency = min(self._window_min_latency, self._average_latency)
+        self._window_count += 1
+        if self._min_latency is None or self._window_count >= self.WINDOW_SIZE:
+            self._min_latency = self._window_min_latency
+        if self._window_count >= self.WINDOW_SIZE:
+            self._window_min_latency = math.inf
+            self._window_count = 0
+
+    def _decrease(self, started_at: float, reason: str):
+        if started_at < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        previous_limit = self.limit
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        if self.limit < previous_limit:
+            log.info(
+                "Concurrency limit of %s decreased %s -> %s (%s)",
+                self.name,
+                previous_limit,
+                self.limit,
+                reason,
+            )
+
+    def _increase(self):
+        # Grow only while the limit is used, an idle limit would grow without bounds
+        if self.in_flight + 1 >= self._limit / 2:
+            previous_limit = self.limit
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            if self.limit > previous_limit:
+                log.debug(
+                    "Concurrency limit of %s increased %s -> %s",
+                    self.name,
+                    previous_limit,
+                    self.limit,
+                )
+
+    def _release(
+        self, started_at: float, latency: float, error: Optional[BaseException]
+    ):
+        self.in_flight -= 1
+        if error is not None:
+            if is_overload_error(error):
+                self._decrease(started_at, repr(error))
+        else:
+            self._add_latency(latency)
+            if self._average_latency > self.latency_tolerance * self._min_latency:
+                self._decrease(
+                    started_at,
+                    f"average latency {self._average_latency:.3f}s, "
+                    f"no-load latency {self._min_latency:.3f}s",
+                )
+            else:
+                self._increase()
+        self._wake_up_waiters()
+
+    @asynccontextmanager
+    async def request(self) -> AsyncIterator[None]:
+        """Wait until the request is within the limit, adapt the limit to its result"""
+        await self._acquire()
+        started_at = time.monotonic()
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.in_flight -= 1
+            self._wake_up_waiters()
+            raise
+        except Exception as e:
+            self._release(started_at, time.perf_counter() - start, e)
+            raise
+        self._release(started_at, time.perf_counter() - start, None)
+
+
+class ConcurrencyLimiter:
+    """Adaptive concurrency limits (`AIMDLimit`) of each node endpoint and method class
+
+    Note:
+        A single limiter is shared by all the node connectors of a process,
+        so that the limits cover all the requests to the nodes.
+    """
+
+    DEFAULT_METHOD_CLASS = "default"
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        method_classes: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """
+        Args:
+            initial_limit: the initial limit of each endpoint and method class
+            min_limit: the minimum limit of each endpoint and method class
+            max_limit: the maximum limit of each endpoint and method class
+            method_classes: classes of the methods matching the patterns (`fnmatch`, e.g. `"trace_*"`),
+                            methods of a class share a limit, other methods are in `DEFAULT_METHOD_CLASS`
+        """
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.method_classes = method_classes or {}
+        self._method_classes: Dict[str, str] = dict()
+        self._limits: Dict[Tuple[str, str], AIMDLimit] = dict()
+
+    def get_method_class(self, method: str) -> str:
+        if (method_class := self._method_classes.get(method)) is None:
+            method_class = next(
+                (
+                    name
+                    for pattern, name in self.method_classes.items()
+                    if fnmatchcase(method, pattern)
+                ),
+                self.DEFAULT_METHOD_CLASS,
+            )
+            self._method_classes[method] = method_class
+        return method_class
+
+    def get_limit(self, endpoint_url: str, method: str) -> AIMDLimit:
+        """The limit of the requests of the method to the endpoint"""
+        key = (endpoint_url, self.get_method_class(method))
+        if (limit := self._limits.get(key)) is None:
+            limit = self._limits[key] = AIMDLimit(
+                self.initial_limit,
+                self.min_limit,
+                self.max_limit,
+                name=f"{key[0]} ({key[1]})",
+            )
+        return limit
+
+    def get_limits(self) -> Dict[str, int]:
+        """The current limits (by their name), e.g. `{"http://node:8545 (trace)": 12}`"""
+        return {limit.name: limit.limit for limit in self._limits.values()}
+
+    def prometheus_text(self, prefix: str = "data_collection") -> str:
+        """The current limits as Prometheus gauges, in the Prometheus text format"""
+        name = f"{prefix}_node_concurrency_limit"
+        lines = [
+            f"# HELP {name} Adaptive limit of concurrent node requests per endpoint and method class",
+            f"# TYPE {name} gauge",
+        ]
+        for (endpoint, method_class), limit in sorted(self._limits.items()):
+            labels = f'endpoint="{endpoint}",method_class="{method_class}"'
+            lines.append(f"{name}{{{labels}}} {limit.limit}")
+        return "\n".join(lines) + "\n"
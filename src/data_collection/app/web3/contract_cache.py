@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Set, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app import init_logger
+from app.db.redis import RedisManager
+
+log = init_logger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class CachedContractMetadata(NamedTuple):
+    """Contract metadata with the (unix) time it was fetched from the node"""
+
+    fetched_at: float
+    data: BaseModel
+
+
+class ContractMetadataCache:
+    """Two-tier cache of contract metadata (e.g. `TokenContractData`, `PairContractData`)
+
+    1. an in-process LRU cache, shared by all the consumer tasks of a process
+    2. Redis, shared by all the consumers and persisted across restarts
+
+    Note:
+        Metadata older than `refresh_interval` seconds is fetched again, but only its
+        mutable fields (e.g. total supply, reserves) are updated. Concurrent lookups of
+        the same contract are deduplicated into a single fetch.
+    """
+
+    MAX_SIZE = 10_000
+    """Maximum number of contracts in the in-process cache"""
+
+    def __init__(self, redis_manager: RedisManager, refresh_interval: int) -> None:
+        """
+        Args:
+            redis_manager: the Redis manager used as the second tier
+            refresh_interval: the time (in seconds) after which mutable fields are refreshed
+        """
+        self.redis_manager = redis_manager
+        self.refresh_interval = refresh_interval
+
+        self._lru: OrderedDict[str, CachedContractMetadata] = OrderedDict()
+        # Running lookups indexed by key
+        self._in_flight: Dict[str, asyncio.Task] = dict()
+
+    def _is_fresh(self, entry: CachedContractMetadata) -> bool:
+        return time.time() - entry.fetched_at < self.refresh_interval
+
+    def _get_local(self, key: str) -> Optional[CachedContractMetadata]:
+        if entry := self._lru.get(key):
+            self._lru.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, entry: CachedContractMetadata):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.MAX_SIZE:
+            self._lru.popitem(last=False)
+
+    async def _get_redis(
+        self, key: str, model: Type[ModelT]
+    ) -> Optional[CachedContractMetadata]:
+        if value := await self.redis_manager.get_contract_metadata(key):
+            stored = json.loads(value)
+            return CachedContractMetadata(
+                fetched_at=stored["fetched_at"], data=model.parse_obj(stored["data"])
+            )
+        return None
+
+    async def _set_redis(self, key: str, entry: CachedContractMetadata):
+        value = json.dumps({"fetched_at": entry.fetched_at, "data": entry.data.dict()})
+        await self.redis_manager.set_contract_metadata(key, value)
+
+    async def _load(
+        self,
+        key: str,
+        model: Type[ModelT],
+        fetch: Callable[[], Awaitable[Optional[ModelT]]],
+        mutable_fields: Set[str],
+    ) -> Optional[ModelT]:
+        """Load the metadata from Redis or fetch it from the node, store it in both tiers"""
+        entry = self._get_local(key) or await self._get_redis(key, model)
+        if entry and self._is_fresh(entry):
+            self._set_local(key, entry)
+            return entry.data
+
+        fetched_at = time.time()
+        data = await fetch()
+        if data is None:
+            return entry.data if entry else None
+        if entry:
+            # Immutable fields are kept, only the (not missing) mutable fields are updated
+            data = entry.data.copy(
+                update={
+                    field: value
+                    for field, value in data.dict(include=mutable_fields).items()
+                    if value is not None
+                }
+            )
+
+        entry = CachedContractMetadata(fetched_at=fetched_at, data=data)
+        self._set_local(key, entry)
+        await self._set_redis(key, entry)
+        return data
+
+    async def get(
+        self,
+        kind: str,
+        address: str,
+        model: Type[ModelT],
+        fetch: Callable[[], Awaitable[Optional[ModelT]]],
+        mutable_fields: Set[str] = set(),
+    ) -> Optional[ModelT]:
+        """Return cached metadata of a contract, fetch it if it is missing or stale
+
+        Args:
+            kind: the kind of the metadata (e.g. "token", "pair"), part of the cache key
+            address: the contract address
+            model: the model class of the metadata
+            fetch: async function fetching the metadata from the node
+            mutable_fields: fields of the model that are updated when the metadata is stale
+
+        Returns:
+            the metadata or `None` if it couldn't be fetched
+        """
+        key = f"{kind}:{address.lower()}"
+        if (entry := self._get_local(key)) and self._is_fresh(entry):
+            return entry.data
+
+        if not (task := self._in_flight.get(key)):
+            task = asyncio.create_task(self._load(key, model, fetch, mutable_fields))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # A cancelled caller doesn't cancel the lookup of the other callers
+        return await asyncio.shield(task)
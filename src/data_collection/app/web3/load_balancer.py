@@ -0,0 +1,285 @@
+import asyncio
+import random
+import time
+from fnmatch import fnmatchcase
+from typing import Any, Collection, Dict, List, Mapping, Optional, Tuple
+
+import aiohttp
+
+from app import init_logger
+from app.web3.concurrency import ConcurrencyLimiter
+from app.web3.rpc_client import JsonRpcClient
+from app.web3.timeouts import AdaptiveTimeouts, DeadlineExceededError, remaining_time
+
+log = init_logger(__name__)
+
+
+class RequestLatencyTracker:
+    """Track the exponentially weighted moving average of request latencies"""
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        """
+        Args:
+            alpha: the weight of the latest latency in the average
+        """
+        self.alpha = alpha
+        self.average: Optional[float] = None
+        """The average request latency in seconds (`None` until the first request is made)"""
+
+    def add(self, latency: float):
+        """Add the latency (in seconds) of a finished request to the average"""
+        if self.average is None:
+            self.average = latency
+        else:
+            self.average = self.alpha * latency + (1 - self.alpha) * self.average
+
+
+class NodeEndpoint:
+    """A node (JSON-RPC API) of the load balancer and its health
+
+    The endpoint is ejected (not used while there are other endpoints for the method)
+    after `MAX_CONSECUTIVE_FAILURES` failed requests in a row, the ejection time is doubled
+    each time the endpoint fails again right after its ejection ended.
+    """
+
+    MAX_CONSECUTIVE_FAILURES = 3
+    """Number of failed requests in a row after which the endpoint is ejected"""
+    EJECTION_TIME = 10.0
+    """The time (in seconds) for which the endpoint is ejected the first time"""
+    MAX_EJECTION_TIME = 300.0
+    """The maximum time (in seconds) for which the endpoint is ejected"""
+
+    def __init__(
+        self,
+        client: JsonRpcClient,
+        methods: Optional[Collection[str]] = None,
+    ) -> None:
+        """
+        Args:
+            client: the JSON-RPC client of the node
+            methods: patterns (`fnmatch`, e.g. `"trace_*"`) of the methods served by the node,
+                     all methods if `None`
+        """
+        self.client = client
+        self.methods = methods
+        self.latency_tracker = RequestLatencyTracker()
+        self.in_flight = 0
+        """Number of unfinished requests"""
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        """`time.monotonic()` until which the endpoint is ejected"""
+        self._ejection_time = self.EJECTION_TIME
+
+    @property
+    def url(self) -> str:
+        return self.client.node_url
+
+    def serves(self, method: str) -> bool:
+        """Whether the node serves requests of the given method"""
+        return self.methods is None or any(
+            fnmatchcase(method, pattern) for pattern in self.methods
+        )
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def record_success(self, latency: float):
+        self.latency_tracker.add(latency)
+        if self.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES:
+            log.info(f"Node endpoint {self.url} recovered")
+        self.consecutive_failures = 0
+        self._ejection_time = self.EJECTION_TIME
+
+    def record_failure(self, latency: float, error: BaseException):
+        # A failure (e.g. a timeout) counts as a slow request
+        self.latency_tracker.add(latency)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES:
+            self.ejected_until = time.monotonic() + self._ejection_time
+            log.warning(
+                "Ejecting node endpoint %s for %.0fs after %s failed requests in a row: %r",
+                self.url,
+                self._ejection_time,
+                self.consecutive_failures,
+                error,
+            )
+            self._ejection_time = min(2 * self._ejection_time, self.MAX_EJECTION_TIME)
+
+
+class NodeLoadBalancer:
+    """Spread JSON-RPC requests over multiple nodes
+
+    Each request is sent to the healthy (not ejected) endpoint serving the method with the lowest
+    expected latency, i.e. its average latency multiplied by the number of its unfinished requests
+    (plus the new one). Endpoints without a finished request yet are assumed to be as fast as the
+    fastest endpoint.
+
+    With a concurrency limiter, requests above the limit of the selected endpoint wait
+    (see `ConcurrencyLimiter`), waiting requests count as unfinished requests of the endpoint.
+    The timeout (cut by the deadline of the current context, see `request_deadline`) and the
+    latency of a request don't include the wait.
+
+    Note:
+        Has the same interface as `JsonRpcClient` (`make_request`, `close`).
+    """
+
+    FAILURES = (aiohttp.ClientError, asyncio.TimeoutError)
+    """Errors counted as failures of an endpoint (connection errors, timeouts, HTTP errors)"""
+
+    def __init__(
+        self,
+        endpoints: Mapping[str, Optional[Collection[str]]],
+        timeout: float,
+        headers: Optional[Dict[str, str]] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+        adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+        latency_tracker: Optional[RequestLatencyTracker] = None,
+    ) -> None:
+        """
+        Args:
+            endpoints: the RPC API URLs of the nodes and the patterns of the methods they serve
+                       (`None` for all methods), e.g. `{"http://archive:8545": None, "http://node:8545": ["eth_*"]}`
+            timeout: the timeout of a single request in seconds
+            headers: additional HTTP headers of every request
+            concurrency_limiter: the adaptive concurrency limits of the endpoints, unlimited if `None`
+            adaptive_timeouts: the timeouts of each method, adapted to the latencies of its requests,
+                               `timeout` if `None`
+            latency_tracker: tracks the latencies of the requests to all the endpoints
+        """
+        if not endpoints:
+            raise ValueError("At least one node endpoint is required")
+        self.endpoints = [
+            NodeEndpoint(JsonRpcClient(url, timeout, headers), methods)
+            for url, methods in endpoints.items()
+        ]
+        self._routes: Dict[str, List[NodeEndpoint]] = dict()
+        self.concurrency_limiter = concurrency_limiter
+        self.timeouts = adaptive_timeouts
+        self.latency_tracker = latency_tracker
+
+    def _get_route(self, method: str) -> List[NodeEndpoint]:
+        """The endpoints serving the method"""
+        if (route := self._routes.get(method)) is None:
+            route = [endpoint for endpoint in self.endpoints if endpoint.serves(method)]
+            if not route:
+                raise ValueError(f"No node endpoint serves the method '{method}'")
+            self._routes[method] = route
+        return route
+
+    def select_endpoint(self, method: str) -> NodeEndpoint:
+        """Select the endpoint for a request of the given method"""
+        route = self._get_route(method)
+        if len(route) == 1:
+            return route[0]
+
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in route if not endpoint.is_ejected(now)]
+        if not healthy:
+            # All the endpoints are ejected, try the one that will be re-admitted first
+            return min(route, key=lambda endpoint: endpoint.ejected_until)
+
+        known_latencies = [
+            endpoint.latency_tracker.average
+            for endpoint in healthy
+            if endpoint.latency_tracker.average is not None
+        ]
+        default_latency = min(known_latencies, default=1.0)
+
+        def expected_latency(endpoint: NodeEndpoint) -> float:
+            latency = endpoint.latency_tracker.average
+            if latency is None:
+                latency = default_latency
+            return latency * (endpoint.in_flight + 1)
+
+        # Shuffle to break ties randomly
+        random.shuffle(healthy)
+        return min(healthy, key=expected_latency)
+
+    async def make_request(
+        self, method: str, params: Any, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Make a request to the selected endpoint and return the whole JSON-RPC response
+
+        Args:
+            timeout: the timeout of the request in seconds, the method's adaptive timeout
+                     (or the clients' timeout) if `None`
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: on connection errors and timeouts
+            DeadlineExceededError: if the deadline of the current context has passed
+        """
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(method)
+
+        endpoint = self.select_endpoint(method)
+        endpoint.in_flight += 1
+        try:
+            if self.concurrency_limiter is None:
+                return await self._make_endpoint_request(
+                    endpoint, method, params, timeout
+                )
+            limit = self.concurrency_limiter.get_limit(endpoint.url, method)
+            async with limit.request():
+                return await self._make_endpoint_request(
+                    endpoint, method, params, timeout
+                )
+        finally:
+            endpoint.in_flight -= 1
+
+    async def _make_endpoint_request(
+        self,
+        endpoint: NodeEndpoint,
+        method: str,
+        params: Any,
+        timeout: Optional[float],
+    ) -> Dict[str, Any]:
+        # Within the concurrency limit, the wait for it isn't part of the timeout and latency
+        timeout, cut_by_deadline = self._get_timeout(method, timeout)
+        start = time.perf_counter()
+        try:
+            response = await endpoint.client.make_request(method, params, timeout)
+        except self.FAILURES as e:
+            latency = time.perf_counter() - start
+            endpoint.record_failure(latency, e)
+            self._add_latency(latency)
+            # The request took at least the timeout (unless it was shortened by the deadline)
+            if (
+                isinstance(e, asyncio.TimeoutError)
+                and self.timeouts is not None
+                and not cut_by_deadline
+            ):
+                self.timeouts.add(method, timeout)
+            raise
+        latency = time.perf_counter() - start
+        endpoint.record_success(latency)
+        self._add_latency(latency)
+        if self.timeouts is not None:
+            self.timeouts.add(method, latency)
+        return response
+
+    def _get_timeout(
+        self, method: str, timeout: Optional[float]
+    ) -> Tuple[Optional[float], bool]:
+        """The timeout of a request and whether it was cut by the deadline of the current context
+
+        Raises:
+            DeadlineExceededError: if the deadline of the current context has passed
+        """
+        if timeout is None and self.timeouts is not None:
+            timeout = self.timeouts.get(method)
+        remaining = remaining_time()
+        if remaining is None or (timeout is not None and timeout <= remaining):
+            return timeout, False
+        if remaining <= 0:
+            raise DeadlineExceededError(method)
+        return remaining, True
+
+    def _add_latency(self, latency: float):
+        if self.latency_tracker is not None:
+            self.latency_tracker.add(latency)
+
+    async def close(self):
+        """Close the sessions of all the endpoints"""
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
@@ -0,0 +1,175 @@
+import asyncio
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from eth_abi.exceptions import DecodingError
+from eth_utils.abi import collapse_if_tuple
+from web3 import AsyncWeb3
+from web3.contract import Contract
+from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+from web3.types import BlockIdentifier
+
+from app import init_logger
+
+log = init_logger(__name__)
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+"""Address of the Multicall3 contract (same on Ethereum, Ethereum Classic and BSC)
+
+Note:
+    https://github.com/mds1/multicall
+"""
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
+]
+
+
+class ContractCall(NamedTuple):
+    """A single view call of a contract function"""
+
+    contract: Contract
+    """The contract (with an ABI containing `fn_name`)"""
+    fn_name: str
+    """The name of the view function"""
+    args: Tuple[Any, ...] = ()
+    """Arguments of the function"""
+
+
+class Multicall:
+    """Aggregate view calls of any number of contracts into a single `eth_call`
+
+    The calls are executed by the `aggregate3` function of the Multicall3 contract with
+    `allowFailure` set, so a failing (reverting or undecodable) call results in `None`
+    instead of failing all the other calls.
+
+    Note:
+        If the Multicall3 contract isn't deployed on the chain (or at the requested block),
+        the calls are made one by one instead.
+    """
+
+    MAX_CALLS_PER_REQUEST = 500
+    """Maximum number of calls aggregated into a single `eth_call`"""
+
+    def __init__(self, w3: AsyncWeb3, address: str = MULTICALL3_ADDRESS) -> None:
+        """
+        Args:
+            w3: the web3 instance used for the `eth_call`s
+            address: the address of the Multicall3 contract
+        """
+        self.w3 = w3
+        self._multicall = w3.eth.contract(address=address, abi=MULTICALL3_ABI)
+
+    @staticmethod
+    def _encode_call(call: ContractCall) -> str:
+        return call.contract.encodeABI(fn_name=call.fn_name, args=call.args)
+
+    def _decode_result(self, call: ContractCall, data: bytes) -> Any:
+        """Decode the return data of a call, `None` if it can't be decoded
+
+        Returns:
+            a single value for functions with a single output, a tuple otherwise
+        """
+        fn_abi = call.contract.get_function_by_name(call.fn_name).abi
+        output_types = [collapse_if_tuple(output) for output in fn_abi["outputs"]]
+        try:
+            values = self.w3.codec.decode(output_types, data)
+        except (DecodingError, OverflowError) as e:
+            log.debug(
+                "Couldn't decode %s() of %s: %r", call.fn_name, call.contract.address, e
+            )
+            return None
+        return values[0] if len(values) == 1 else tuple(values)
+
+    async def _call_one_by_one(
+        self, calls: Sequence[ContractCall], block_identifier: BlockIdentifier
+    ) -> List[Any]:
+        """Make each call separately (fallback without the Multicall3 contract)"""
+
+        async def _call(call: ContractCall) -> Any:
+            try:
+                data = await self.w3.eth.call(
+                    {"to": call.contract.address, "data": self._encode_call(call)},
+                    block_identifier,
+                )
+            except (ContractLogicError, ValueError):
+                return None
+            return self._decode_result(call, data)
+
+        return await asyncio.gather(*[_call(call) for call in calls])
+
+    async def _aggregate(
+        self, calls: Sequence[ContractCall], block_identifier: BlockIdentifier
+    ) -> List[Any]:
+        """Make the calls in a single `aggregate3` call"""
+        aggregate_calls = [
+            (call.contract.address, True, self._encode_call(call)) for call in calls
+        ]
+        try:
+            results = await self._multicall.functions.aggregate3(aggregate_calls).call(
+                block_identifier=block_identifier
+            )
+        except BadFunctionCallOutput:
+            # Empty return data - the Multicall3 contract isn't deployed
+            log.debug(
+                "Multicall3 not available at block %s, calling one by one",
+                block_identifier,
+            )
+            return await self._call_one_by_one(calls, block_identifier)
+
+        return [
+            self._decode_result(call, data) if success else None
+            for call, (success, data) in zip(calls, results)
+        ]
+
+    async def call(
+        self,
+        calls: Sequence[ContractCall],
+        block_identifier: BlockIdentifier = "latest",
+    ) -> List[Optional[Any]]:
+        """Make all the view calls (in as few `eth_call`s as possible)
+
+        Args:
+            calls: the calls to make
+            block_identifier: the block (number, hash or tag) at which the calls are made
+
+        Returns:
+            the results in the same order as `calls`, `None` for each failed call
+        """
+        if not calls:
+            return []
+
+        chunks = [
+            calls[i : i + self.MAX_CALLS_PER_REQUEST]
+            for i in range(0, len(calls), self.MAX_CALLS_PER_REQUEST)
+        ]
+        results = await asyncio.gather(
+            *[self._aggregate(chunk, block_identifier) for chunk in chunks]
+        )
+        return [result for chunk_results in results for result in chunk_results]
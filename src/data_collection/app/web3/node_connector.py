@@ -1,14 +1,13 @@
-import asyncio
-from typing import Any, Callable, Collection, List, Tuple, Type
+import time
+from typing import Any, Callable, Collection, Dict, List, Mapping, Optional, Tuple
 
-from aiohttp.client_exceptions import ClientConnectorError
 from web3 import AsyncHTTPProvider, AsyncWeb3
+from web3.exceptions import BlockNotFound, TransactionNotFound
 from web3.types import (
     AsyncMiddlewareCoroutine,
+    BlockIdentifier,
     RPCEndpoint,
     RPCResponse,
-    TxData,
-    TxReceipt,
 )
 
 from app import init_logger
@@ -18,51 +17,29 @@ from app.model.transaction import (
     TransactionData,
     TransactionReceiptData,
 )
+from app.utils.tracing import SpanKind, tracer
+from app.web3.concurrency import ConcurrencyLimiter
+from app.web3.load_balancer import NodeLoadBalancer, RequestLatencyTracker
+from app.web3.response_cache import CACHEABLE_METHODS, ResponseCache
+from app.web3.retry import RetryController, RetryPolicy
+from app.web3.rpc_client import JsonRpcError
+from app.web3.timeouts import AdaptiveTimeouts
 
 log = init_logger(__name__)
 
 
-def async_exception_retry_middleware(
-    make_request: Callable[[RPCEndpoint, Any], RPCResponse],
-    w3: AsyncWeb3,
-    errors: Collection[Type[BaseException]],
-    retries: int,
-    delay: int,
+def async_latency_tracking_middleware(
+    latency_tracker: RequestLatencyTracker,
 ) -> AsyncMiddlewareCoroutine:
-    async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
-        for i in range(retries):
+    async def inner(make_request: Callable[[RPCEndpoint, Any], Any], w3: AsyncWeb3):
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            start = time.perf_counter()
             try:
                 return await make_request(method, params)
-            except errors as e:
-                request_details_str = f"(method='{method}',params={params})"
-                if i < retries - 1:
-                    log.debug(
-                        f"Request {request_details_str} failed: {repr(e)}. Retrying after {delay}s ({i+1})"
-                    )
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    log.error(
-                        f"Failed to make request {request_details_str} after {retries} retries. {repr(e)}"
-                    )
-                    raise
-        return None
-
-    return middleware
-
-
-def async_http_retry_request_middleware(
-    retries: int = 10,
-    delay: int = 5,
-) -> AsyncMiddlewareCoroutine:
-    async def inner(make_request: Callable[[RPCEndpoint, Any], Any], w3: AsyncWeb3):
-        return async_exception_retry_middleware(
-            make_request,
-            w3,
-            (asyncio.TimeoutError, ClientConnectorError, TimeoutError),
-            retries=retries,
-            delay=delay,
-        )
+            finally:
+                latency_tracker.add(time.perf_counter() - start)
+
+        return middleware
 
     return inner
 
@@ -72,15 +49,45 @@ class NodeConnector:
 
     This class is responsible for all the web3 operations that
     are required by this app.
+
+    Note:
+        Blocks, transactions, receipts and traces are requested with a lean JSON-RPC
+        client (`self.rpc`) and converted directly into the app's records, the requests
+        are spread over all the node endpoints (see `NodeLoadBalancer`).
+        The web3 instance (`self.w3`) is used for contract (ABI) calls and filters.
+
+        With a response cache, results of final blocks are read from the cache instead of the node
+        (see `ResponseCache`).
     """
 
+    LATEST_BLOCK_REFRESH_INTERVAL = 60
+    """Time (in seconds) after which the latest block number is requested again (for the response cache)"""
+
     def __init__(
-        self, node_url: str, timeout: int, retry_limit: int, retry_delay: int
+        self,
+        node_url: str,
+        timeout: int,
+        retry_limit: int,
+        retry_delay: int,
+        endpoints: Optional[Mapping[str, Optional[Collection[str]]]] = None,
+        retry_controller: Optional[RetryController] = None,
+        adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+        response_cache: Optional[ResponseCache] = None,
     ) -> None:
         """
         Args:
             node_url: the RPC API URL for connecting
                         to an EVM node
+            endpoints: the RPC API URLs of the nodes used for JSON-RPC requests and the patterns of
+                       the methods they serve (see `NodeLoadBalancer`), `{node_url: None}` if not set
+            retry_controller: the retry controller (shared by the node connectors of a process),
+                              by default `retry_limit` attempts with exponential backoff from `retry_delay`
+            adaptive_timeouts: the timeouts of the JSON-RPC requests of each method,
+                               by default adapted to the latencies up to `timeout`
+            concurrency_limiter: the adaptive concurrency limits of the JSON-RPC requests of each
+                                 endpoint (shared by the node connectors of a process), unlimited if `None`
+            response_cache: the on-disk cache of the results of final blocks, no cache if `None`
         """
         # Initialize an async web3 instance
         # Workaround with headers allows to connect to the Abacus
@@ -95,62 +102,174 @@ class NodeConnector:
             ),
         )
         # Add retry middleware for timeouts and other connection errors
-        self._retry_middleware = async_http_retry_request_middleware(
-            retries=retry_limit, delay=retry_delay
+        self.retry_controller = retry_controller or RetryController(
+            RetryPolicy(
+                attempts=max(retry_limit, 1),
+                base_delay=retry_delay,
+                max_delay=max(retry_delay, 1) * 2**4,
+            )
         )
+        self._retry_middleware = self.retry_controller.middleware()
         self.w3.middleware_onion.add(self._retry_middleware)
+        # Track the latency of each request (used by the consumer autoscaler)
+        self.latency_tracker = RequestLatencyTracker()
+        self._latency_middleware = async_latency_tracking_middleware(
+            self.latency_tracker
+        )
+        self.w3.middleware_onion.inject(self._latency_middleware, layer=0)
+        self.timeouts = adaptive_timeouts or AdaptiveTimeouts(
+            default_timeout=timeout, min_timeout=min(timeout, 1), max_timeout=timeout
+        )
+        # JSON-RPC client (of all the nodes) for requests whose results are converted into records,
+        # it tracks their latencies and timeouts itself (without the wait for the concurrency limit)
+        self.rpc = NodeLoadBalancer(
+            endpoints=endpoints or {node_url: None},
+            timeout=timeout,
+            headers={"Host": "localhost"},
+            concurrency_limiter=concurrency_limiter,
+            adaptive_timeouts=self.timeouts,
+            latency_tracker=self.latency_tracker,
+        )
+        self.response_cache = response_cache
+        self._latest_block_number = 0
+        self._latest_block_number_updated_at: Optional[float] = None
+
+    async def disconnect(self):
+        """Close the connections of the JSON-RPC clients (and the response cache)"""
+        await self.rpc.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
 
     async def _make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
-        """Make a web3 request for non standard JSON RPC methods
+        """Make a JSON-RPC request (with retries, adaptive timeouts and latency tracking)
 
         Note:
-            E.g. trace_block, trace_replayTransaction
+            Also used for non standard JSON RPC methods, e.g. trace_block, trace_replayTransaction
         """
-        make_req = await self._retry_middleware(self.w3.provider.make_request, self.w3)
+        make_req = await self._retry_middleware(self.rpc.make_request, self.w3)
         return await make_req(method, params)
 
-    async def get_block_data(self, block_id: str = "latest") -> BlockData:
+    async def _request(self, method: RPCEndpoint, params: Any) -> Any:
+        """Make a JSON-RPC request and return its (raw JSON) result
+
+        Raises:
+            JsonRpcError: if the node returned an error
+        """
+        # A span of the request (incl. retries) within the trace of the current block / transaction
+        with tracer.span(
+            method,
+            kind=SpanKind.CLIENT,
+            attributes={"rpc.system": "jsonrpc", "rpc.method": method},
+        ) as span:
+            use_cache = self.response_cache is not None and method in CACHEABLE_METHODS
+            if use_cache:
+                result = await self.response_cache.get(method, params)
+                if result is not None:
+                    if span is not None:
+                        span.set_attribute("rpc.cached", True)
+                    return result
+
+            response = await self._make_request(method, params)
+            if "error" in response:
+                raise JsonRpcError(method, response["error"])
+            result = response.get("result")
+
+            if use_cache and result is not None:
+                await self.response_cache.put(
+                    method, params, result, await self._get_recent_block_number()
+                )
+            return result
+
+    async def _get_recent_block_number(self) -> int:
+        """The latest block number, requested at most every `LATEST_BLOCK_REFRESH_INTERVAL` seconds"""
+        now = time.monotonic()
+        if (
+            self._latest_block_number_updated_at is None
+            or now - self._latest_block_number_updated_at
+            >= self.LATEST_BLOCK_REFRESH_INTERVAL
+        ):
+            self._latest_block_number_updated_at = now
+            self._latest_block_number = await self.get_latest_block_number()
+        return self._latest_block_number
+
+    async def _get_block(
+        self, block_id: BlockIdentifier, full_transactions: bool
+    ) -> Dict[str, Any]:
+        """The JSON-RPC result of `eth_getBlockByNumber` / `eth_getBlockByHash`"""
+        if isinstance(block_id, int):
+            method, params = "eth_getBlockByNumber", [hex(block_id), full_transactions]
+        elif isinstance(block_id, str) and len(block_id) == 66:
+            method, params = "eth_getBlockByHash", [block_id, full_transactions]
+        else:
+            method, params = "eth_getBlockByNumber", [block_id, full_transactions]
+
+        block_data_dict = await self._request(method, params)
+        if block_data_dict is None:
+            raise BlockNotFound(f"Block with id: '{block_id}' not found.")
+        return block_data_dict
+
+    async def get_block_data(self, block_id: BlockIdentifier = "latest") -> BlockData:
         """Get block data by number/hash"""
-        block_data_dict = await self.w3.eth.get_block(block_id)
-        block_data = BlockData(**block_data_dict, w3_data=block_data_dict)
-        return block_data
+        return BlockData.from_rpc(await self._get_block(block_id, False))
+
+    async def get_block_data_with_transactions(
+        self, block_id: BlockIdentifier = "latest"
+    ) -> Tuple[BlockData, Dict[str, Any]]:
+        """Get block data by number/hash including full transaction objects
+
+        Returns:
+            block_data (BlockData)
+            block_data_dict: the JSON-RPC result with full transactions
+                             (hex values, see `BlockRelevanceFilter.filter_transactions`)
+        """
+        block_data_dict = await self._get_block(block_id, True)
+        return BlockData.from_rpc(block_data_dict), block_data_dict
 
     async def get_latest_block_number(self) -> int:
         """Get latest block number"""
-        return await self.w3.eth.block_number
+        return int(await self._request("eth_blockNumber", []), 16)
 
     async def get_transaction_data(
         self, tx_hash: str
-    ) -> Tuple[TransactionData, TxData]:
+    ) -> Tuple[TransactionData, Dict[str, Any]]:
         """Get transaction data by hash
 
         Returns:
             tx_data (TransactionData)
-            tx_data_dict (web3.TxData)
+            tx_data_dict: the JSON-RPC result of `eth_getTransactionByHash`
         """
-        tx_data_dict = await self.w3.eth.get_transaction(tx_hash)
-        tx_data = TransactionData(**tx_data_dict)
+        tx_data_dict = await self._request("eth_getTransactionByHash", [tx_hash])
+        if tx_data_dict is None:
+            raise TransactionNotFound(f"Transaction with hash: '{tx_hash}' not found.")
+        tx_data = TransactionData.from_rpc(tx_data_dict)
         return tx_data, tx_data_dict
 
     async def get_transaction_receipt_data(
         self, tx_hash: str
-    ) -> Tuple[TransactionReceiptData, TxReceipt]:
+    ) -> Tuple[TransactionReceiptData, Dict[str, Any]]:
         """Get transaction receipt data by hash
 
         Returns:
             tx_receipt_data (TransactionReceiptData)
-            tx_receipt_data_dict (web3.TxReceipt)
+            tx_receipt_data_dict: the JSON-RPC result of `eth_getTransactionReceipt`
+                                  (its logs can be decoded by `get_transaction_events`)
         """
-        tx_receipt_data_dict = await self.w3.eth.get_transaction_receipt(tx_hash)
-        tx_receipt_data = TransactionReceiptData(**tx_receipt_data_dict)
+        tx_receipt_data_dict = await self._request(
+            "eth_getTransactionReceipt", [tx_hash]
+        )
+        if tx_receipt_data_dict is None:
+            raise TransactionNotFound(f"Transaction with hash: '{tx_hash}' not found.")
+        tx_receipt_data = TransactionReceiptData.from_rpc(tx_receipt_data_dict)
         return tx_receipt_data, tx_receipt_data_dict
 
-    async def get_block_reward(self, block_id="latest") -> dict[str, Any]:
+    async def get_block_reward(self, block_id="latest") -> int:
         """Get block reward of a specific block"""
-        data = await self._make_request("trace_block", [block_id])
+        data = await self._request("trace_block", [block_id])
+        if data is None:
+            raise BlockNotFound(f"Block with id: '{block_id}' not found.")
 
-        blockReward = 0
-        for i in data["result"]:
+        blockReward = "0x0"
+        for i in data:
             if i["type"] == "reward":
                 blockReward = i["action"]["value"]
                 break
@@ -161,16 +280,14 @@ class NodeConnector:
         self, tx_hash: str
     ) -> List[InternalTransactionData]:
         """Get internal transaction data by hash"""
-        data = await self._make_request("trace_replayTransaction", [tx_hash, ["trace"]])
+        data = await self._request("trace_replayTransaction", [tx_hash, ["trace"]])
 
         data_dict = []
-        for i in data["result"]["trace"]:
+        for i in data["trace"]:
             tx_data = i["action"]
             if result := i.get("result"):
                 tx_data = tx_data | result
             data_dict.append(tx_data)
 
-        internal_tx_data = list(
-            map(lambda data: InternalTransactionData(**data), data_dict)
-        )
+        internal_tx_data = list(map(InternalTransactionData.from_rpc, data_dict))
         return internal_tx_data
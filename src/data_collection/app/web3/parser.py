@@ -1,23 +1,41 @@
 import collections
+from functools import partial
 from typing import Any, Dict, List, Optional
 
 from eth_hash.auto import keccak
 from web3 import Web3
 from web3.contract import Contract
+from web3.types import BlockIdentifier
 
 from app.config import ContractConfig
 from app.model.abi import ContractABI
 from app.model.contract import ContractCategory, PairContractData, TokenContractData
+from app.web3.contract_cache import ContractMetadataCache
+from app.web3.multicall import ContractCall, Multicall
 
 
 class ContractParser:
     """Parse contract data"""
 
+    TOKEN_MUTABLE_FIELDS = {"total_supply"}
+    """Fields of `TokenContractData` that are refreshed by the metadata cache"""
+    PAIR_MUTABLE_FIELDS = {"reserve0", "reserve1"}
+    """Fields of `PairContractData` that are refreshed by the metadata cache"""
+
     def __init__(
-        self, web3: Web3, contracts: List[ContractConfig], contract_abi: ContractABI
+        self,
+        web3: Web3,
+        contracts: List[ContractConfig],
+        contract_abi: ContractABI,
+        metadata_cache: Optional[ContractMetadataCache] = None,
     ) -> None:
+        """
+        Args:
+            metadata_cache: cache for token and pair contract data (only used for the latest block)
+        """
         self.w3 = web3
         self.contract_abi = contract_abi
+        self.metadata_cache = metadata_cache
 
         # Load contract categories dict (cache)
         # Cache for 'ContractConfig' indexed by address
@@ -28,6 +46,9 @@ class ContractParser:
         # Cache for 'Contract' instances indexed by address
         self._contracts_cache: Dict[str, Contract] = dict()
 
+        # Aggregates the view calls of contract data into a single eth_call
+        self.multicall = Multicall(web3)
+
     def get_contract_category(
         self, contract_address: str
     ) -> Optional[ContractCategory]:
@@ -106,20 +127,74 @@ class ContractParser:
 
         return contract
 
+    async def _call_view_functions(
+        self,
+        contract: Contract,
+        fn_names: List[str],
+        block_identifier: BlockIdentifier,
+    ) -> List[Any]:
+        """Call view functions (without arguments) of a contract in a single multicall
+
+        Returns:
+            results of the calls, `None` for functions missing in the contract ABI or failed calls
+        """
+        abi_fn_names = {
+            fn["name"] for fn in contract.abi if fn.get("type") == "function"
+        }
+        calls = [
+            ContractCall(contract, fn_name)
+            for fn_name in fn_names
+            if fn_name in abi_fn_names
+        ]
+        results = dict(
+            zip(
+                [call.fn_name for call in calls],
+                await self.multicall.call(calls, block_identifier=block_identifier),
+            )
+        )
+        return [results.get(fn_name) for fn_name in fn_names]
+
     async def get_token_contract_data(
-        self, contract: Contract, category: ContractCategory
+        self,
+        contract: Contract,
+        category: ContractCategory,
+        block_identifier: BlockIdentifier = "latest",
     ) -> Optional[TokenContractData]:
-        """Obtain required data for a token contract (ERC20, ERC721, ERC1155) from web3
-        and return a TokenContractData instance
+        """Obtain required data for a token contract (ERC20, ERC721, ERC1155) from
+        the metadata cache or from web3 and return a TokenContractData instance
+
+        Args:
+            block_identifier: the block at which the data is read
 
         Returns:
             a ContractData instance or `None`
         """
+        fetch = partial(
+            self._fetch_token_contract_data, contract, category, block_identifier
+        )
+        if self.metadata_cache is None or block_identifier != "latest":
+            return await fetch()
+        return await self.metadata_cache.get(
+            kind="token",
+            address=contract.address,
+            model=TokenContractData,
+            fetch=fetch,
+            mutable_fields=self.TOKEN_MUTABLE_FIELDS,
+        )
+
+    async def _fetch_token_contract_data(
+        self,
+        contract: Contract,
+        category: ContractCategory,
+        block_identifier: BlockIdentifier,
+    ) -> Optional[TokenContractData]:
+        """Obtain required data for a token contract from web3"""
         if category == ContractCategory.ERC20 or category == ContractCategory.ERC721:
-            symbol = await contract.functions.symbol().call()
-            name = await contract.functions.name().call()
-            decimals = await contract.functions.decimals().call()
-            total_supply = await contract.functions.totalSupply().call()
+            symbol, name, decimals, total_supply = await self._call_view_functions(
+                contract,
+                ["symbol", "name", "decimals", "totalSupply"],
+                block_identifier,
+            )
         elif category == ContractCategory.ERC1155:
             # ERC1155 doesn't have any values
             symbol, name, decimals, total_supply = None, None, None, None
@@ -137,19 +212,48 @@ class ContractParser:
         )
 
     async def get_pair_contract_data(
-        self, contract: Contract, category: ContractCategory
+        self,
+        contract: Contract,
+        category: ContractCategory,
+        block_identifier: BlockIdentifier = "latest",
     ) -> Optional[PairContractData]:
-        """Obtain required data for a (uniswap) pair contract from web3 and return a PairContractData instance
+        """Obtain required data for a (uniswap) pair contract from the metadata cache
+        or from web3 and return a PairContractData instance
+
+        Args:
+            block_identifier: the block at which the data is read
 
         Returns:
             a ContractData instance or `None`
         """
+        fetch = partial(
+            self._fetch_pair_contract_data, contract, category, block_identifier
+        )
+        if self.metadata_cache is None or block_identifier != "latest":
+            return await fetch()
+        return await self.metadata_cache.get(
+            kind="pair",
+            address=contract.address,
+            model=PairContractData,
+            fetch=fetch,
+            mutable_fields=self.PAIR_MUTABLE_FIELDS,
+        )
+
+    async def _fetch_pair_contract_data(
+        self,
+        contract: Contract,
+        category: ContractCategory,
+        block_identifier: BlockIdentifier,
+    ) -> Optional[PairContractData]:
+        """Obtain required data for a (uniswap) pair contract from web3"""
         if category == ContractCategory.UNI_SWAP_V2_PAIR:
-            token0 = await contract.functions.token0.call()
-            token1 = await contract.functions.token1.call()
-            reserve0 = await contract.functions.reserve0.call()
-            reserve1 = await contract.functions.reserve1.call()
-            factory = await contract.functions.factory.call()
+            token0, token1, reserves, factory = await self._call_view_functions(
+                contract,
+                ["token0", "token1", "getReserves", "factory"],
+                block_identifier,
+            )
+            # getReserves returns (reserve0, reserve1, blockTimestampLast)
+            reserve0, reserve1 = reserves[:2] if reserves else (None, None)
         else:
             # Return None if the contract has unknown category
             return None
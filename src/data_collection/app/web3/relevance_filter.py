@@ -0,0 +1,129 @@
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Set
+
+import rlp
+from eth_hash.auto import keccak
+from hexbytes import HexBytes
+
+from app.config import ContractConfig
+
+EVENT_SIGNATURES: Dict[str, List[str]] = {
+    "TransferFungibleEvent": ["Transfer(address,address,uint256)"],
+    # Mints and burns are either transfers from/to a burn address or USDT-like Issue/Redeem events
+    "MintFungibleEvent": ["Transfer(address,address,uint256)", "Issue(uint256)"],
+    "BurnFungibleEvent": ["Transfer(address,address,uint256)", "Redeem(uint256)"],
+    # ERC721 Transfer has the same signature (topic0) as ERC20 Transfer (tokenId is indexed)
+    "TransferNonFungibleEvent": ["Transfer(address,address,uint256)"],
+    "MintNonFungibleEvent": ["Transfer(address,address,uint256)"],
+    "BurnNonFungibleEvent": ["Transfer(address,address,uint256)"],
+    "MintPairEvent": ["Mint(address,uint256,uint256)"],
+    "BurnPairEvent": ["Burn(address,uint256,uint256,address)"],
+    "SwapPairEvent": ["Swap(address,uint256,uint256,uint256,uint256,address)"],
+    "PairCreatedEvent": ["PairCreated(address,address,address,uint256)"],
+}
+"""Solidity event signatures that can result in a given `ContractEvent` (indexed by its class name)"""
+
+BLOOM_BITS = 2048
+"""Size of a block's logsBloom in bits"""
+
+
+def event_topics(event_names: Iterable[str]) -> Set[bytes]:
+    """Return the topic0 (keccak of the event signature) of all events that result in the given ContractEvents"""
+    return {
+        keccak(signature.encode())
+        for event_name in event_names
+        for signature in EVENT_SIGNATURES.get(event_name, [])
+    }
+
+
+def bloom_contains(bloom: int, item: bytes) -> bool:
+    """Check if an item (log address or topic) might be present in a logsBloom
+
+    Note:
+        The bloom filter can return false positives but never false negatives.
+        https://ethereum.github.io/yellowpaper/paper.pdf (4.3.1 Transaction Receipt, M3:2048)
+
+    Args:
+        bloom: the logsBloom as a (big endian) integer
+        item: the raw bytes of an address or a topic
+    """
+    item_hash = keccak(item)
+    for i in range(0, 6, 2):
+        bit = int.from_bytes(item_hash[i : i + 2], "big") % BLOOM_BITS
+        if not (bloom >> bit) & 1:
+            return False
+    return True
+
+
+def contract_creation_address(sender: str, nonce: int) -> str:
+    """Compute the address of a contract created by a transaction (CREATE opcode)
+
+    Returns:
+        the lowercase hex address of the created contract
+    """
+    address = keccak(rlp.encode([HexBytes(sender), nonce]))[12:]
+    return "0x" + address.hex()
+
+
+class BlockRelevanceFilter:
+    """Select block transactions that can be relevant for the contracts in a (partial) data collection config
+
+    A transaction is relevant (the same 3 cases as in `PartialTransactionProcessor`) if:
+        1. its `to` address is one of the contract addresses
+        2. it creates a contract with one of the contract addresses
+        3. it emits an event (that should be saved) from one of the contract addresses
+
+    Case 3. can't be decided without the transaction receipt, so the block's logsBloom is used instead.
+    If the bloom filter matches any of the contracts' (address, events) pairs, all the transactions
+    of the block are relevant. Otherwise only transactions matching case 1. or 2. are relevant.
+    """
+
+    def __init__(self, contracts: Iterable[ContractConfig]) -> None:
+        """
+        Args:
+            contracts: the contracts from a data collection config
+        """
+        contracts = list(contracts)
+        self.addresses: FrozenSet[str] = frozenset(c.address.lower() for c in contracts)
+
+        # Raw address bytes and event topics (topic0) for the logsBloom check,
+        # contracts without any events can't result in a saved event (case 3.)
+        self._bloom_items = [
+            (HexBytes(c.address), event_topics(c.events)) for c in contracts if c.events
+        ]
+
+    def is_bloom_relevant(self, logs_bloom: str) -> bool:
+        """Check if the logsBloom (hex) of a block might contain events of the contracts"""
+        bloom = int(logs_bloom, 16)
+        if not bloom:
+            # Blocks without any logs
+            return False
+        return any(
+            bloom_contains(bloom, address)
+            and any(bloom_contains(bloom, topic) for topic in topics)
+            for address, topics in self._bloom_items
+        )
+
+    def is_transaction_relevant(self, tx: Mapping[str, Any]) -> bool:
+        """Check if a transaction (JSON-RPC result) is relevant based on its `to` address (case 1. and 2.)"""
+        if to_address := tx.get("to"):
+            return to_address.lower() in self.addresses
+        created_address = contract_creation_address(tx["from"], int(tx["nonce"], 16))
+        return created_address in self.addresses
+
+    def filter_transactions(self, block_data_dict: Mapping[str, Any]) -> List[str]:
+        """Return the hashes of the relevant transactions in a block
+
+        Args:
+            block_data_dict: the JSON-RPC result of `eth_getBlockByNumber` with full transactions,
+                             only `logsBloom` and the `hash`, `to`, `from` and `nonce` of the
+                             transactions are read (as hex strings, without converting the block)
+
+        Returns:
+            a list of transaction hashes (can be empty if no transaction is relevant)
+        """
+        transactions = block_data_dict["transactions"]
+        if self.is_bloom_relevant(block_data_dict["logsBloom"]):
+            relevant_transactions = transactions
+        else:
+            relevant_transactions = filter(self.is_transaction_relevant, transactions)
+        return [tx["hash"] for tx in relevant_transactions]
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Optional, Tuple
+
+import orjson
+
+from app import init_logger
+
+log = init_logger(__name__)
+
+CACHEABLE_METHODS = frozenset(
+    {
+        "eth_getBlockByNumber",
+        "eth_getBlockByHash",
+        "eth_getTransactionByHash",
+        "eth_getTransactionReceipt",
+        "trace_block",
+        "trace_replayTransaction",
+    }
+)
+"""Methods whose results never change once their block is final"""
+
+
+def _to_block_number(value: Any) -> Optional[int]:
+    """Block number of an int or a hex string, `None` for block tags (e.g. "latest")"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith("0x"):
+        return int(value, 16)
+    return None
+
+
+class ResponseCache:
+    """On-disk cache (SQLite) of JSON-RPC results of final blocks
+
+    Results are stored compressed under the hash of their method and params. Only results
+    of blocks at least `finality_depth` blocks below the latest block are stored, as they
+    can't change anymore (no reorgs). The least recently used results are evicted once
+    the cache exceeds `max_size`.
+
+    Note:
+        The SQLite database can be shared by multiple processes (WAL mode),
+        its (blocking) queries are run in a thread.
+    """
+
+    ACCESS_UPDATE_INTERVAL = 3600
+    """Time (in seconds) after which the access time of a read result is updated (for LRU eviction)"""
+    SIZE_CHECK_INTERVAL = 1000
+    """Number of stored results after which the size of the whole database is checked
+    (it's also written by other processes)"""
+
+    def __init__(self, path: str, max_size: int, finality_depth: int) -> None:
+        """
+        Args:
+            path: the path of the SQLite database file
+            max_size: the maximum size of the stored (compressed) results in bytes
+            finality_depth: the number of blocks after which a block is final
+        """
+        self.path = path
+        self.max_size = max_size
+        self.finality_depth = finality_depth
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS response ("
+            "key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS response_accessed_at ON response (accessed_at)"
+        )
+        self._db.commit()
+        self._size = self._get_size()
+        self._n_puts = 0
+
+    @staticmethod
+    def _key(method: str, params: Any) -> bytes:
+        return hashlib.sha256(orjson.dumps([method, params])).digest()
+
+    def _get_size(self) -> int:
+        return int(self._db.execute("SELECT total(size) FROM response").fetchone()[0])
+
+    def _get(self, key: bytes) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, accessed_at FROM response WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and time.time() - row[1] > self.ACCESS_UPDATE_INTERVAL:
+                self._db.execute(
+                    "UPDATE response SET accessed_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._db.commit()
+        return row
+
+    def _put(self, key: bytes, value: bytes):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._db.commit()
+            self._size += len(value)
+            self._n_puts += 1
+            if self._n_puts % self.SIZE_CHECK_INTERVAL == 0:
+                self._size = self._get_size()
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Delete the least recently used results until the cache is below 90% of its maximum size"""
+        self._size = self._get_size()
+        excess = self._size - 0.9 * self.max_size
+        keys = []
+        for key, size in self._db.execute(
+            "SELECT key, size FROM response ORDER BY accessed_at"
+        ):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self._size -= size
+        self._db.executemany("DELETE FROM response WHERE key = ?", keys)
+        self._db.commit()
+        log.info(
+            "Evicted %s results from the response cache, size: %s bytes",
+            len(keys),
+            self._size,
+        )
+
+    def _get_block_number(self, method: str, params: Any, result: Any) -> Optional[int]:
+        """The number of the block of a result, `None` if unknown"""
+        if method in ("eth_getBlockByNumber", "trace_block"):
+            # Results of block tags ("latest", "finalized" etc.) change
+            return _to_block_number(params[0])
+        if method == "eth_getBlockByHash":
+            return _to_block_number(result.get("number"))
+        if method in ("eth_getTransactionByHash", "eth_getTransactionReceipt"):
+            return _to_block_number(result.get("blockNumber"))
+        if method == "trace_replayTransaction":
+            # The transaction is final if its receipt was cached
+            receipt = self._get(self._key("eth_getTransactionReceipt", [params[0]]))
+            if receipt is not None:
+                return _to_block_number(
+                    orjson.loads(zlib.decompress(receipt[0])).get("blockNumber")
+                )
+        return None
+
+    async def get(self, method: str, params: Any) -> Optional[Any]:
+        """The cached result of the request, `None` if it isn't cached"""
+        if method not in CACHEABLE_METHODS:
+            return None
+        row = await asyncio.to_thread(self._get, self._key(method, params))
+        if row is None:
+            return None
+        return orjson.loads(zlib.decompress(row[0]))
+
+    def _put_if_final(
+        self, method: str, params: Any, result: Any, latest_block_number: int
+    ) -> bool:
+        block_number = self._get_block_number(method, params, result)
+        if (
+            block_number is None
+            or latest_block_number - block_number < self.finality_depth
+        ):
+            return False
+        self._put(self._key(method, params), zlib.compress(orjson.dumps(result)))
+        return True
+
+    async def put(
+        self, method: str, params: Any, result: Any, latest_block_number: int
+    ) -> bool:
+        """Store the result of the request if its block is final
+
+        Args:
+            latest_block_number: the number of the latest block (or a lower one)
+
+        Returns:
+            whether the result was stored
+        """
+        if method not in CACHEABLE_METHODS or result is None:
+            return False
+        return await asyncio.to_thread(
+            self._put_if_final, method, params, result, latest_block_number
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,348 @@
+import asyncio
+import random
+import reprlib
+import time
+from dataclasses import dataclass
+from enum import StrEnum, auto
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import aiohttp
+from web3 import AsyncWeb3
+from web3.types import AsyncMiddlewareCoroutine, RPCEndpoint, RPCResponse
+
+from app import init_logger
+from app.web3.timeouts import remaining_time
+
+log = init_logger(__name__)
+
+RETRYABLE_HTTP_STATUSES = frozenset({429, 502, 503, 504})
+"""HTTP statuses of (overloaded / unavailable) nodes that are retried"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether a failed request should be retried (connection errors, timeouts, overloaded node)"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRYABLE_HTTP_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError))
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retries of a failed request with exponential backoff and full jitter"""
+
+    attempts: int
+    """The maximum number of attempts (including the first request)"""
+    base_delay: float
+    """The maximum delay (in seconds) before the first retry, doubled for each next retry"""
+    max_delay: float
+    """The maximum delay (in seconds) before any retry"""
+
+    def backoff(self, retry: int) -> float:
+        """The delay (in seconds) before the given retry (0 = first retry)
+
+        Note:
+            The delay is random between 0 and the exponential delay ("full jitter"),
+            so that requests that failed at the same time aren't retried at the same time.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class RetryBudget:
+    """Limit retries to a ratio of the requests (token bucket)
+
+    Each request adds `ratio` tokens, each retry takes one token, at least `min_per_second`
+    retries per second are always allowed. When the node is overloaded, the retries of all the
+    requests sharing the budget can't multiply the load on the node.
+    """
+
+    def __init__(
+        self,
+        ratio: float,
+        min_per_second: float = 1.0,
+        max_tokens: float = 100.0,
+    ) -> None:
+        """
+        Args:
+            ratio: the number of allowed retries per request
+            min_per_second: the number of retries per second allowed regardless of the requests
+            max_tokens: the maximum number of saved up retries
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated_at = time.monotonic()
+
+    def _add_tokens(self, tokens: float):
+        self._tokens = min(self.max_tokens, self._tokens + tokens)
+
+    def record_request(self):
+        """Add the tokens of a new request"""
+        self._add_tokens(self.ratio)
+
+    def try_acquire(self) -> bool:
+        """Take a token for a retry, `False` if the budget is exhausted"""
+        now = time.monotonic()
+        self._add_tokens((now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request while the circuit breaker is open"""
+
+    def __init__(self, circuit_breaker: "CircuitBreaker") -> None:
+        self.circuit_breaker = circuit_breaker
+        super().__init__(
+            f"The node is unavailable (circuit breaker opened after "
+            f"{circuit_breaker.failure_threshold} failed requests in a row)"
+        )
+
+
+class CircuitState(StrEnum):
+    CLOSED = auto()
+    """Requests are made"""
+    OPEN = auto()
+    """Requests fail fast (`CircuitOpenError`) until the reset timeout"""
+    HALF_OPEN = auto()
+    """A single probe request is made, other requests fail fast"""
+
+
+class CircuitBreaker:
+    """Fail fast while the node is unavailable and probe for its recovery
+
+    The circuit opens after `failure_threshold` failed requests in a row. After `reset_timeout`
+    a single probe request is let through: the circuit closes if it succeeds, otherwise it opens
+    again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        """
+        Args:
+            failure_threshold: the number of failed requests in a row that opens the circuit
+            reset_timeout: the time (in seconds) after which a probe request is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        # Set while the circuit is closed
+        self._closed = asyncio.Event()
+        self._closed.set()
+
+    def acquire(self) -> bool:
+        """Check if a request can be made
+
+        Returns:
+            whether the request is the probe of a half-open circuit
+
+        Raises:
+            CircuitOpenError: if the request has to fail fast
+        """
+        if self.state == CircuitState.CLOSED:
+            return False
+        if (
+            self.state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(self)
+
+    def record_success(self):
+        self._consecutive_failures = 0
+        self._probing = False
+        if self.state != CircuitState.CLOSED:
+            log.info("Node recovered, closing the circuit breaker")
+            self.state = CircuitState.CLOSED
+            self._closed.set()
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        self._probing = False
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self._consecutive_failures >= self.failure_threshold
+        ):
+            if self.state == CircuitState.CLOSED:
+                log.warning(
+                    "Opening the circuit breaker after %s failed requests in a row, "
+                    "probing the node every %ss",
+                    self._consecutive_failures,
+                    self.reset_timeout,
+                )
+            self.state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self._closed.clear()
+
+    def release_probe(self):
+        """Let another request probe the node (the probe ended without a result, e.g. cancelled)"""
+        self._probing = False
+
+    async def wait(self):
+        """Wait until the circuit closes or a probe request can be made
+
+        Note:
+            The waiting requests are resumed at random times within 10% of `reset_timeout`,
+            so that a recovered node isn't hit by all of them at once.
+        """
+        while self.state != CircuitState.CLOSED:
+            if self.state == CircuitState.OPEN:
+                timeout = self.reset_timeout - (time.monotonic() - self._opened_at)
+            else:
+                # Wait for the result of the running probe
+                timeout = self.reset_timeout
+            try:
+                await asyncio.wait_for(self._closed.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                if self.state == CircuitState.HALF_OPEN and self._probing:
+                    continue
+            break
+        await asyncio.sleep(random.uniform(0, 0.1 * self.reset_timeout))
+
+
+class RetryController:
+    """Retry failed requests (per method policies) within a retry budget, behind a circuit breaker
+
+    Note:
+        A single controller is shared by all the node connectors of a process,
+        so that the budget and the circuit breaker cover all the requests to the node.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        method_policies: Optional[Mapping[str, RetryPolicy]] = None,
+        budget: Optional[RetryBudget] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """
+        Args:
+            policy: the default retry policy
+            method_policies: retry policies of methods matching the patterns (`fnmatch`, e.g. `"trace_*"`)
+            budget: the retry budget, unlimited retries if `None`
+            circuit_breaker: the circuit breaker, never fails fast if `None`
+        """
+        self.policy = policy
+        self.method_policies = method_policies or {}
+        self.budget = budget
+        self.circuit_breaker = circuit_breaker
+        self._policies: Dict[str, RetryPolicy] = dict()
+
+    def get_policy(self, method: str) -> RetryPolicy:
+        """The retry policy of the method (the first matching method policy or the default one)"""
+        if (policy := self._policies.get(method)) is None:
+            policy = next(
+                (
+                    method_policy
+                    for pattern, method_policy in self.method_policies.items()
+                    if fnmatchcase(method, pattern)
+                ),
+                self.policy,
+            )
+            self._policies[method] = policy
+        return policy
+
+    async def _attempt(
+        self,
+        make_request: Callable[[RPCEndpoint, Any], Any],
+        method: RPCEndpoint,
+        params: Any,
+    ) -> RPCResponse:
+        """Make a single attempt and record its result in the circuit breaker"""
+        if self.circuit_breaker is None:
+            return await make_request(method, params)
+
+        is_probe = self.circuit_breaker.acquire()
+        try:
+            response = await make_request(method, params)
+        except Exception as e:
+            if is_retryable_error(e):
+                self.circuit_breaker.record_failure()
+            else:
+                # The node is available, the request itself failed
+                self.circuit_breaker.record_success()
+            raise
+        finally:
+            if is_probe:
+                self.circuit_breaker.release_probe()
+        self.circuit_breaker.record_success()
+        return response
+
+    async def request(
+        self,
+        make_request: Callable[[RPCEndpoint, Any], Any],
+        method: RPCEndpoint,
+        params: Any,
+    ) -> RPCResponse:
+        """Make a request, retry it if it fails with a retryable error
+
+        Note:
+            A request isn't retried if the backoff delay exceeds the deadline of the current
+            context (see `request_deadline`).
+
+        Raises:
+            CircuitOpenError: if the circuit breaker is open
+        """
+        policy = self.get_policy(method)
+        if self.budget is not None:
+            self.budget.record_request()
+
+        for retry in range(policy.attempts):
+            try:
+                return await self._attempt(make_request, method, params)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                if retry + 1 >= policy.attempts:
+                    log.error(
+                        "Request %s %s failed after %s attempts: %r",
+                        method,
+                        reprlib.repr(params),
+                        policy.attempts,
+                        e,
+                    )
+                    raise
+                delay = policy.backoff(retry)
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    log.warning(
+                        "Request %s failed, not retried (deadline exceeded): %r",
+                        method,
+                        e,
+                    )
+                    raise
+                if self.budget is not None and not self.budget.try_acquire():
+                    log.warning(
+                        "Request %s failed, not retried (retry budget exhausted): %r",
+                        method,
+                        e,
+                    )
+                    raise
+                log.debug(
+                    "Request %s failed: %r. Retrying after %.2fs (%s)",
+                    method,
+                    e,
+                    delay,
+                    retry + 1,
+                )
+                await asyncio.sleep(delay)
+
+    def middleware(self) -> AsyncMiddlewareCoroutine:
+        """web3 middleware retrying the requests"""
+
+        async def inner(make_request: Callable[[RPCEndpoint, Any], Any], w3: AsyncWeb3):
+            async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+                return await self.request(make_request, method, params)
+
+            return middleware
+
+        return inner
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+try:
+    import orjson
+
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover
+    import json
+
+    def _json_dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    _json_loads = json.loads
+
+from app import init_logger
+
+log = init_logger(__name__)
+
+
+class JsonRpcError(Exception):
+    """Error response of a JSON-RPC request"""
+
+    def __init__(self, method: str, error: Dict[str, Any]) -> None:
+        self.method = method
+        self.code: Optional[int] = error.get("code")
+        self.message: str = error.get("message", "")
+        super().__init__(f"{method} failed: {self.message} (code={self.code})")
+
+
+class JsonRpcClient:
+    """Minimal JSON-RPC client over a pooled aiohttp session
+
+    Results are returned as parsed JSON (hex strings and quantities), without any of the
+    web3 request / result formatters, and are converted directly into the app's records.
+
+    Note:
+        Uses `orjson` for (de)serialization if it's installed.
+    """
+
+    MAX_CONNECTIONS = 100
+    """Maximum number of simultaneous connections to the node"""
+
+    def __init__(
+        self,
+        node_url: str,
+        timeout: float,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Args:
+            node_url: the RPC API URL of the node
+            timeout: the timeout of a single request in seconds
+            headers: additional HTTP headers of every request
+        """
+        self.node_url = node_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._request_ids = itertools.count()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The shared session (created lazily, inside the running event loop)"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS),
+                headers=self.headers,
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def make_request(
+        self, method: str, params: Any, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Make a request and return the whole JSON-RPC response (like `web3` providers)
+
+        Args:
+            timeout: the timeout of the request in seconds, the client's timeout if `None`
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: on connection errors and timeouts
+        """
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": next(self._request_ids),
+        }
+        async with self._get_session().post(
+            self.node_url,
+            data=_json_dumps(payload),
+            timeout=self.timeout
+            if timeout is None
+            else aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            response.raise_for_status()
+            return _json_loads(await response.read())
+
+    async def close(self):
+        """Close the session (and its connections)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Give the connections time to close
+            # https://docs.aiohttp.org/en/stable/client_advanced.html#graceful-shutdown
+            await asyncio.sleep(0)
+        self._session = None
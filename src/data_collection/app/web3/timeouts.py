@@ -0,0 +1,135 @@
+"""
+Request timeouts derived from the latencies of each RPC method, and deadlines of a group of requests
+(e.g. of all the requests of a single transaction, see `request_deadline`).
+"""
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+"""`time.monotonic()` deadline of the requests of the current context (task)"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised instead of making a request after the deadline of the current context"""
+
+    def __init__(self, method: str) -> None:
+        self.method = method
+        super().__init__(f"Deadline exceeded before the request {method}")
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Set the deadline of all the requests made within the context (including its subtasks)
+
+    Note:
+        A nested deadline can't extend the deadline of the outer context.
+
+    Args:
+        seconds: the time (from now) in seconds, no deadline if `None`
+    """
+    deadline = _deadline.get()
+    if seconds is not None:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """The time (in seconds) until the deadline of the current context, `None` if there is no deadline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class LatencyWindow:
+    """Percentiles of the latest request latencies"""
+
+    def __init__(self, size: int = 1000) -> None:
+        """
+        Args:
+            size: the number of latest latencies in the window
+        """
+        self._latencies: Deque[float] = deque(maxlen=size)
+        # The latencies are sorted again once 5% of them are new
+        self._n_new = 0
+        self._sorted = []
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def add(self, latency: float):
+        self._latencies.append(latency)
+        self._n_new += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th (0-1) percentile of the latencies, `None` if there are none"""
+        if not self._latencies:
+            return None
+        if 20 * self._n_new >= len(self._latencies):
+            self._sorted = sorted(self._latencies)
+            self._n_new = 0
+        index = min(math.ceil(q * len(self._sorted)) - 1, len(self._sorted) - 1)
+        return self._sorted[max(index, 0)]
+
+
+class AdaptiveTimeouts:
+    """Timeouts of each RPC method derived from its latencies
+
+    The timeout of a method is its latency percentile (p99) multiplied by `multiplier`,
+    bounded by `min_timeout` and `max_timeout`. Until there are `min_samples` latencies
+    of a method, its timeout is `default_timeout`.
+
+    Note:
+        Timed out requests count with their timeout as the latency, so that the timeout of
+        a method whose requests become slower grows.
+    """
+
+    def __init__(
+        self,
+        default_timeout: float,
+        min_timeout: float,
+        max_timeout: float,
+        multiplier: float = 3.0,
+        percentile: float = 0.99,
+        min_samples: int = 50,
+        window_size: int = 1000,
+    ) -> None:
+        """
+        Args:
+            default_timeout: the timeout (in seconds) of methods without enough latencies
+            min_timeout: the minimal timeout (in seconds)
+            max_timeout: the maximal timeout (in seconds)
+            multiplier: the multiplier of the latency percentile
+            percentile: the latency percentile (0-1)
+            min_samples: the number of latencies of a method needed for its adaptive timeout
+            window_size: the number of latest latencies of each method
+        """
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self._latencies: Dict[str, LatencyWindow] = dict()
+
+    def add(self, method: str, latency: float):
+        """Add the latency (in seconds) of a finished (or timed out) request of the method"""
+        if (window := self._latencies.get(method)) is None:
+            window = self._latencies[method] = LatencyWindow(self.window_size)
+        window.add(latency)
+
+    def get(self, method: str) -> float:
+        """The timeout (in seconds) of a request of the method"""
+        window = self._latencies.get(method)
+        if window is None or len(window) < self.min_samples:
+            return self.default_timeout
+        timeout = self.multiplier * window.percentile(self.percentile)
+        return min(max(timeout, self.min_timeout), self.max_timeout)
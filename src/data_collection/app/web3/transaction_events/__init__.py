@@ -1,27 +1,95 @@
-from typing import Type, Union
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Type, Union
 
-from hexbytes import HexBytes
+from eth_utils import event_abi_to_log_topic
+from web3._utils.method_formatters import log_entry_formatter
 from web3.contract import Contract
-from web3.types import TxReceipt
+from web3.types import EventData, TxReceipt
 
 from app.model.contract import ContractCategory
 
 from . import decorator, erc20, erc721, uniswap_pair, uniswapv2_factory
+from .decoders import EventDecoder, get_event_decoder
 from .types import EventsGenerator
 
 
+class _EventDecoder(NamedTuple):
+    """Decodes the logs of a single contract event and maps them to canonical events"""
+
+    decode: EventDecoder
+    """Decoder of the log (see `decoders.get_event_decoder`)"""
+    mappers: List[Callable[[EventData], EventsGenerator]]
+    """Mappers of the decoded event"""
+
+
+# Event decoders of each contract (category, address),
+# indexed by (0x-prefixed hex topic0, lowercase log address)
+_event_indexes: Dict[
+    Tuple[ContractCategory, str], Dict[Tuple[str, str], _EventDecoder]
+] = dict()
+
+
+def _build_event_index(
+    contract_category: ContractCategory,
+    contract: Union[Type[Contract], Contract],
+) -> Dict[Tuple[str, str], _EventDecoder]:
+    """Index the event decoders of a contract by (topic0, log address)
+
+    Only the events with a mapper for the contract category are indexed.
+    """
+    mappers = decorator.__event_mappers.get(contract_category, {})
+    event_index = dict()
+    for abi_item in contract.abi:
+        if abi_item.get("type") != "event" or abi_item.get("anonymous"):
+            continue
+        if event_mappers := mappers.get(abi_item["name"]):
+            topic0 = "0x" + event_abi_to_log_topic(abi_item).hex()
+            event_index[(topic0, contract.address.lower())] = _EventDecoder(
+                decode=get_event_decoder(contract.w3.codec, abi_item),
+                mappers=event_mappers,
+            )
+    return event_index
+
+
 def get_transaction_events(
     contract_category: ContractCategory,
     contract: Union[Type[Contract], Contract],
-    receipt: TxReceipt,
+    receipt: Union[TxReceipt, Dict[str, Any]],
 ) -> EventsGenerator:
     """
     It returns all the contract events found in the given contract with the given receipt.
+
+    Args:
+        receipt: either a web3 `TxReceipt` or the raw JSON-RPC result of `eth_getTransactionReceipt`
+
+    Note:
+        The logs of the receipt are scanned only once, a log is decoded only if its
+        (topic0, address) belongs to an event of the contract with a mapper.
+        Only the matching raw logs are formatted (web3 `LogReceipt`) before decoding.
     """
-    # FIXME: types are broken, but we ignore mypy
-    # if not isinstance(contract, Contract):
-    #    logger.error(f"{contract} is not of type Contract!")
-    #    return None
-    # assert isinstance(contract, Contract)
-    for mapper in decorator.__event_mappers[contract_category]:
-        yield from mapper(contract, receipt)
+    key = (contract_category, contract.address)
+    if (event_index := _event_indexes.get(key)) is None:
+        event_index = _event_indexes[key] = _build_event_index(
+            contract_category, contract
+        )
+    if not event_index:
+        return
+
+    for log in receipt["logs"]:
+        if not log["topics"]:
+            # Anonymous event
+            continue
+        topic0 = log["topics"][0]
+        is_raw_log = isinstance(topic0, str)
+        if not is_raw_log:
+            topic0 = "0x" + bytes.hex(topic0)
+        decoder = event_index.get((topic0.lower(), log["address"].lower()))
+        if decoder is None:
+            continue
+        if is_raw_log:
+            log = log_entry_formatter(log)
+        event_log = decoder.decode(log)
+        if event_log is None:
+            # The log doesn't match the event (e.g. an ERC721 transfer of an ERC20 contract)
+            continue
+        for mapper in decoder.mappers:
+            yield from mapper(event_log)
@@ -0,0 +1,163 @@
+"""
+Decoders of contract event logs (see `get_event_decoder`).
+
+Most of the tracked events (Transfer, Issue, Redeem, Mint, Burn, Swap, PairCreated) only have static
+32-byte arguments, so each of them is decoded directly from the topics and data words of the log
+instead of going through the generic web3 (eth_abi) decoding.
+"""
+import re
+from typing import Callable, List, Optional, Tuple
+
+from eth_abi.codec import ABICodec
+from eth_abi.exceptions import DecodingError
+from eth_utils import event_abi_to_log_topic, to_bytes
+from web3._utils.events import get_event_data
+from web3.exceptions import InvalidEventABI, LogTopicError, MismatchedABI
+from web3.types import ABIEvent, EventData, LogReceipt
+
+from app.web3 import checksum_address
+
+EventDecoder = Callable[[LogReceipt], Optional[EventData]]
+"""Decodes a log of a single event, returns `None` if the log doesn't match the event"""
+
+WORD_SIZE = 32
+"""Size of an ABI word (static argument) in bytes"""
+
+_INT_TYPE = re.compile(r"^(u?)int(\d*)$")
+_BYTES_TYPE = re.compile(r"^bytes(\d+)$")
+
+
+def _decode_address(word: bytes) -> str:
+    if any(word[:12]):
+        raise ValueError("Non-empty padding of an address")
+    # bytes.hex() also for HexBytes topics (HexBytes.hex() is 0x-prefixed)
+    return checksum_address("0x" + bytes.hex(word[12:]))
+
+
+def _int_decoder(signed: bool, bits: int) -> Callable[[bytes], int]:
+    if signed:
+        min_value, max_value = -(2 ** (bits - 1)), 2 ** (bits - 1) - 1
+    else:
+        min_value, max_value = 0, 2**bits - 1
+
+    def _decode_int(word: bytes) -> int:
+        value = int.from_bytes(word, "big", signed=signed)
+        if not min_value <= value <= max_value:
+            raise ValueError(f"Value {value} out of bounds of {bits} bits")
+        return value
+
+    return _decode_int
+
+
+def _decode_bool(word: bytes) -> bool:
+    value = int.from_bytes(word, "big")
+    if value > 1:
+        raise ValueError(f"Invalid boolean value {value}")
+    return bool(value)
+
+
+def _bytes_decoder(size: int) -> Callable[[bytes], bytes]:
+    def _decode_bytes(word: bytes) -> bytes:
+        if any(word[size:]):
+            raise ValueError(f"Non-empty padding of bytes{size}")
+        return word[:size]
+
+    return _decode_bytes
+
+
+def _word_decoder(abi_type: str) -> Optional[Callable[[bytes], object]]:
+    """Decoder of a single 32-byte word of a static ABI type, `None` for other types"""
+    if abi_type == "address":
+        return _decode_address
+    if abi_type == "bool":
+        return _decode_bool
+    if match := _INT_TYPE.match(abi_type):
+        return _int_decoder(signed=not match[1], bits=int(match[2] or 256))
+    if (match := _BYTES_TYPE.match(abi_type)) and 0 < int(match[1]) <= WORD_SIZE:
+        return _bytes_decoder(int(match[1]))
+    return None
+
+
+def compile_fast_decoder(event_abi: ABIEvent) -> Optional[EventDecoder]:
+    """Compile a decoder reading the arguments directly from the topics and data words of a log
+
+    The result is the same as `web3._utils.events.get_event_data` (except that the `EventData`
+    is a plain dict), a log with an unexpected number of topics or too short data is discarded.
+
+    Returns:
+        the decoder, `None` if the event has a non-static argument (e.g. `string`, arrays)
+    """
+    if event_abi.get("anonymous"):
+        return None
+
+    topic0 = event_abi_to_log_topic(event_abi)
+    event_name = event_abi["name"]
+    # (name, decoder) of the indexed arguments (topics[1:]) and non-indexed arguments (data words)
+    topic_args: List[Tuple[str, Callable[[bytes], object]]] = []
+    data_args: List[Tuple[str, Callable[[bytes], object]]] = []
+    for arg in event_abi["inputs"]:
+        decoder = _word_decoder(arg["type"])
+        if decoder is None:
+            return None
+        (topic_args if arg["indexed"] else data_args).append((arg["name"], decoder))
+
+    n_topics = len(topic_args) + 1
+    data_size = len(data_args) * WORD_SIZE
+
+    def _decode(log: LogReceipt) -> Optional[EventData]:
+        topics = log["topics"]
+        if len(topics) != n_topics or topics[0] != topic0:
+            return None
+        data = log["data"]
+        if isinstance(data, str):
+            data = to_bytes(hexstr=data)
+        if len(data) < data_size:
+            return None
+
+        try:
+            args = {
+                name: decoder(topic)
+                for (name, decoder), topic in zip(topic_args, topics[1:])
+            }
+            for i, (name, decoder) in enumerate(data_args):
+                args[name] = decoder(data[i * WORD_SIZE : (i + 1) * WORD_SIZE])
+        except ValueError:
+            return None
+
+        return EventData(
+            args=args,
+            event=event_name,
+            logIndex=log["logIndex"],
+            transactionIndex=log["transactionIndex"],
+            transactionHash=log["transactionHash"],
+            address=log["address"],
+            blockHash=log["blockHash"],
+            blockNumber=log["blockNumber"],
+        )
+
+    return _decode
+
+
+def web3_decoder(codec: ABICodec, event_abi: ABIEvent) -> EventDecoder:
+    """Decoder using the generic web3 decoding (`get_event_data`)"""
+
+    def _decode(log: LogReceipt) -> Optional[EventData]:
+        try:
+            return get_event_data(codec, event_abi, log)
+        # Discarding errors on filtered events is expected (e.g. ERC20 and ERC721 transfers
+        # share the same topic0), https://github.com/oceanprotocol/ocean.py/issues/348#issuecomment-875128102
+        except (
+            MismatchedABI,
+            LogTopicError,
+            InvalidEventABI,
+            TypeError,
+            DecodingError,
+        ):
+            return None
+
+    return _decode
+
+
+def get_event_decoder(codec: ABICodec, event_abi: ABIEvent) -> EventDecoder:
+    """The fast decoder of an event if all its arguments are static, the web3 decoder otherwise"""
+    return compile_fast_decoder(event_abi) or web3_decoder(codec, event_abi)
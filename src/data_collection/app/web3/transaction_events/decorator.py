@@ -3,19 +3,20 @@ import collections
 from app.model.contract import ContractCategory
 
 """
-Holds a list of all the mappers that apply to a given contract category as well as a decorator to add them
+Holds the mappers that apply to a given contract category, indexed by the name of the event they map,
+as well as a decorator to add them
 for ex:
-@_event_mapper(ERC20)
-def my_fun():
+@_event_mapper(ERC20, "Transfer")
+def my_fun(eventLog):
   pass
-will attach my_fun to the ERC20 mappers.
+will attach my_fun to the mappers of the Transfer event of ERC20 contracts.
 """
-__event_mappers = collections.defaultdict(list)
+__event_mappers = collections.defaultdict(lambda: collections.defaultdict(list))
 
 
-def _event_mapper(contract_category: ContractCategory):
+def _event_mapper(contract_category: ContractCategory, event_name: str):
     def inner(func):
-        __event_mappers[contract_category].append(func)
+        __event_mappers[contract_category][event_name].append(func)
         return func
 
     return inner
@@ -1,10 +1,13 @@
+from dataclasses import dataclass
 from typing import Generator, List, Optional, Tuple
 
-from pydantic import BaseModel
 from web3.types import EventData
 
+from app.model import Web3Record
 
-class ContractEvent(BaseModel):
+
+@dataclass(slots=True, kw_only=True)
+class ContractEvent(Web3Record):
     """
     Contract events are the emitted events by the contract included in the transaction receipt (output of the
     interaction with a smart contract).
@@ -14,6 +17,7 @@ class ContractEvent(BaseModel):
     log_index: int
 
 
+@dataclass(slots=True, kw_only=True)
 class MintFungibleEvent(ContractEvent):
     """
     This represents mint event.
@@ -22,6 +26,7 @@ class MintFungibleEvent(ContractEvent):
     value: int
 
 
+@dataclass(slots=True, kw_only=True)
 class BurnFungibleEvent(ContractEvent):
     """
     This represents burn event.
@@ -30,6 +35,7 @@ class BurnFungibleEvent(ContractEvent):
     value: int
 
 
+@dataclass(slots=True, kw_only=True)
 class TransferFungibleEvent(ContractEvent):
     """
     This represents transfer event between two addreses.
@@ -40,6 +46,7 @@ class TransferFungibleEvent(ContractEvent):
     value: int
 
 
+@dataclass(slots=True, kw_only=True)
 class PairCreatedEvent(ContractEvent):
     """
     This represents the creation a contract for trading the token pair.
@@ -51,12 +58,14 @@ class PairCreatedEvent(ContractEvent):
 
 
 # https://ethereum.org/en/developers/tutorials/uniswap-v2-annotated-code/#pair-events
+@dataclass(slots=True, kw_only=True)
 class MintPairEvent(ContractEvent):
     sender: str
     amount0: int
     amount1: int
 
 
+@dataclass(slots=True, kw_only=True)
 class BurnPairEvent(ContractEvent):
     src: str
     dst: str
@@ -64,6 +73,7 @@ class BurnPairEvent(ContractEvent):
     amount1: int
 
 
+@dataclass(slots=True, kw_only=True)
 class SwapPairEvent(ContractEvent):
     src: str
     dst: str
@@ -73,14 +83,16 @@ class SwapPairEvent(ContractEvent):
     out1: int
 
 
+@dataclass(slots=True, kw_only=True)
 class MintNonFungibleEvent(ContractEvent):
     """
     This represents mint event.
     """
 
-    tokenId: str
+    tokenId: int
 
 
+@dataclass(slots=True, kw_only=True)
 class BurnNonFungibleEvent(ContractEvent):
     """
     This represents burn event.
@@ -93,6 +105,7 @@ class BurnNonFungibleEvent(ContractEvent):
     tokenId: int
 
 
+@dataclass(slots=True, kw_only=True)
 class TransferNonFungibleEvent(ContractEvent):
     """
     This represents transfer event of NFTs between two addresses.
@@ -139,3 +139,33 @@ class TestInsert:
         await db_manager.db.execute(f"UPDATE {table_name} SET block_number = 2")
 
         assert initial_updated_at < await fetch_updated_at()
+
+
+class TestKafkaOffset:
+    """Tests for consumer offsets stored in the database"""
+
+    @pytest.mark.usefixtures("clean_db")
+    async def test_upsert_kafka_offset(self, db_manager):
+        """Test that the stored offset is inserted and then updated"""
+        await db_manager.upsert_kafka_offset("eth", 0, 10)
+        await db_manager.upsert_kafka_offset("eth", 0, 11)
+        await db_manager.upsert_kafka_offset("eth", 1, 5)
+
+        offsets = await db_manager.get_kafka_offsets("eth", [0, 1, 2])
+        assert offsets == {0: 11, 1: 5}
+
+    @pytest.mark.usefixtures("clean_db")
+    async def test_reinsert_internal_transactions(
+        self, db_manager, internal_transaction_data
+    ):
+        """Test that deleting before reinserting internal transactions doesn't duplicate them"""
+        tx_hash = internal_transaction_data["transaction_hash"]
+        for _ in range(2):
+            await db_manager.delete_internal_transactions(tx_hash)
+            await db_manager.insert_internal_transaction(**internal_transaction_data)
+
+        rows = await db_manager.db.fetch(
+            f"SELECT * FROM {db_manager.node_name}_internal_transaction WHERE transaction_hash = $1",
+            tx_hash,
+        )
+        assert len(rows) == 1
@@ -30,38 +30,34 @@ def dead_address(request) -> str:
 @pytest.fixture
 def transaction_data() -> TransactionData:
     return TransactionData(
-        **{
-            "hash": shared_tx_hash,
-            "blockNumber": 1337,
-            "from": "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
-            "to": "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
-            "value": 42,
-            "gasPrice": 135,
-            "gas": 44423,
-            "input": "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
-        }
+        transaction_hash=shared_tx_hash,
+        block_number=1337,
+        from_address="0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
+        to_address="0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
+        value=42.0,
+        gas_price=135.0,
+        gas_limit=44423.0,
+        input_data="0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822",
     )
 
 
 @pytest.fixture
 def transaction_receipt_data() -> TransactionReceiptData:
     return TransactionReceiptData(
-        **{
-            "gasUsed": 1337,
-            "logs": [],
-            "type": "call",
-            "contractAddress": "0xdAC17F958D2ee523a2206206994597C13D831ec7",
-        }
+        gas_used=1337.0,
+        logs=[],
+        transaction_type="call",
+        contract_address="0xdAC17F958D2ee523a2206206994597C13D831ec7",
     )
 
 
 @pytest.fixture
 def transaction_logs_data() -> TransactionLogsData:
     return TransactionLogsData(
-        transactionHash=shared_tx_hash,
+        transaction_hash=shared_tx_hash,
         address="0xf76de79a8cb78158f22dc8e0f3b6f3f6b9cd97d8",
-        logIndex=1337,
-        data="|Â¦E<",
+        log_index=1337,
+        data="|Â¦E<",
         removed=False,
         topics=[
             "0x940c4b3549ef0aaff95807dc27f62d88ca15532d1bf535d7d63800f40395d16c",
@@ -223,10 +219,12 @@ def default_config(
 
 @pytest.fixture
 def consumer_factory():
-    def _consumer(config: Config, contract_abi: ContractABI):
+    def _consumer(
+        config: Config, contract_abi: ContractABI, consume_retries: bool = False
+    ):
         from app.consumer import DataConsumer
 
-        consumer = DataConsumer(config, contract_abi)
+        consumer = DataConsumer(config, contract_abi, consume_retries=consume_retries)
         consumer.kafka_manager = MagicMock()
         consumer.db_manager = MagicMock()
         consumer.node_connector = MagicMock()
@@ -268,7 +266,6 @@ def mint_fungible_event(contract_config_usdt):
     return MintFungibleEvent(
         address=contract_config_usdt.address,
         log_index=1337,
-        account="0x71C7656EC7ab88b098defB751B7401B5f6d8976F",
         value=1500,
     )
 
@@ -278,7 +275,6 @@ def burn_fungible_event(contract_config_usdt):
     return BurnFungibleEvent(
         address=contract_config_usdt.address,
         log_index=1337,
-        account="0x71C7656EC7ab88b098defB751B7401B5f6d8976F",
         value=1500,
     )
 
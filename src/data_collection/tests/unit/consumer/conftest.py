@@ -2,6 +2,7 @@ from unittest.mock import AsyncMock, MagicMock, Mock
 
 import pytest
 
+from app.consumer.tx_data_loader import TransactionDataLoader
 from app.consumer.tx_processor import (
     FullTransactionProcessor,
     PartialTransactionProcessor,
@@ -16,6 +17,7 @@ def _tx_processor_factory(
     processor.db_manager.insert_transaction = AsyncMock()
     processor.db_manager.insert_transaction_logs = AsyncMock()
     processor.db_manager.insert_internal_transaction = AsyncMock()
+    processor.db_manager.delete_internal_transactions = AsyncMock()
     return processor
 
 
@@ -32,3 +34,22 @@ def partial_transaction_processor() -> PartialTransactionProcessor:
 @pytest.fixture
 def full_transaction_processor() -> FullTransactionProcessor:
     return _tx_processor_factory(FullTransactionProcessor)
+
+
+@pytest.fixture
+def tx_data_loader_factory():
+    def _tx_data_loader(
+        tx_data, tx_receipt_data, w3_tx_receipt=None, internal_tx_data=None
+    ) -> TransactionDataLoader:
+        loader = Mock(spec=TransactionDataLoader)
+        loader.tx_hash = tx_data.transaction_hash
+        loader.get_transaction_data = AsyncMock(return_value=tx_data)
+        loader.get_transaction_receipt_data = AsyncMock(
+            return_value=(tx_receipt_data, w3_tx_receipt or Mock())
+        )
+        loader.get_internal_transactions = AsyncMock(
+            return_value=internal_tx_data or []
+        )
+        return loader
+
+    return _tx_data_loader
@@ -0,0 +1,99 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from app.consumer.autoscaler import ConsumerAutoscaler
+
+
+def _autoscaler_factory(
+    default_config, min_tasks: int = 1, max_tasks: int = 4
+) -> ConsumerAutoscaler:
+    default_config.number_of_consumer_tasks = min_tasks
+    default_config.max_consumer_tasks = max_tasks
+    default_config.consumer_autoscaling_target_lag = 100
+    default_config.consumer_autoscaling_max_rpc_latency = 1.0
+    return ConsumerAutoscaler(default_config, contract_abi=Mock())
+
+
+def _add_consumer_mock(autoscaler: ConsumerAutoscaler, lag: int = 0, latency=None):
+    """Add a running consumer mock (a pending future instead of a consumer task)"""
+    consumer = Mock()
+    consumer.kafka_manager.get_lag = AsyncMock(return_value=lag)
+    consumer.node_connector.latency_tracker.average = latency
+    autoscaler._consumers[asyncio.get_running_loop().create_future()] = consumer
+    return consumer
+
+
+class TestConsumerAutoscaler:
+    """Tests for the ConsumerAutoscaler scaling decisions"""
+
+    @pytest.mark.parametrize(
+        "n_tasks,lag,rpc_latency,expected",
+        [
+            # Lag above target -> scale up
+            (2, 250, 0.1, 3),
+            # Lag above target but the node is slow -> scale down
+            (2, 250, 1.5, 1),
+            # Lag within target -> no change
+            (2, 150, 0.1, 2),
+            # Lag could be handled by fewer tasks -> scale down
+            (3, 50, 0.1, 2),
+            # Unknown latency (no requests yet)
+            (2, 250, None, 3),
+            # Bounds
+            (4, 1000, 0.1, 4),
+            (1, 0, 5.0, 1),
+        ],
+    )
+    async def test_desired_number_of_tasks(
+        self, default_config, n_tasks, lag, rpc_latency, expected
+    ):
+        autoscaler = _autoscaler_factory(default_config)
+        for _ in range(n_tasks):
+            _add_consumer_mock(autoscaler)
+
+        assert autoscaler.desired_number_of_tasks(lag, rpc_latency) == expected
+
+    async def test_finished_consumers_not_replaced(self, default_config):
+        """Test that the minimum isn't restored when consumers finish on their own"""
+        autoscaler = _autoscaler_factory(default_config, min_tasks=3)
+        _add_consumer_mock(autoscaler)
+
+        assert autoscaler.desired_number_of_tasks(0, 0.1) == 1
+
+    async def test_scale_down_stops_consumer(self, default_config):
+        """Test that scaling down stops the last consumer gracefully"""
+        autoscaler = _autoscaler_factory(default_config)
+        first = _add_consumer_mock(autoscaler, lag=0, latency=2.0)
+        last = _add_consumer_mock(autoscaler, lag=0, latency=2.0)
+
+        await autoscaler._scale()
+
+        last.stop.assert_called_once()
+        first.stop.assert_not_called()
+        assert autoscaler.n_tasks == 1
+        assert autoscaler.get_rpc_latency() == 2.0
+
+    async def test_scale_up_adds_consumer(self, default_config):
+        """Test that scaling up adds a consumer"""
+        autoscaler = _autoscaler_factory(default_config)
+        _add_consumer_mock(autoscaler, lag=500, latency=0.1)
+        autoscaler._add_consumer = Mock()
+
+        await autoscaler._scale()
+
+        autoscaler._add_consumer.assert_called_once()
+
+    async def test_run_returns_exit_code(self, default_config):
+        """Test that run finishes with the aggregated exit code of all consumers"""
+        autoscaler = _autoscaler_factory(default_config, min_tasks=2)
+        exit_codes = iter([0, 1])
+
+        def _add_consumer():
+            task = asyncio.create_task(asyncio.sleep(0, result=next(exit_codes)))
+            autoscaler._consumers[task] = Mock()
+
+        autoscaler._add_consumer = _add_consumer
+
+        assert await autoscaler.run() == 1
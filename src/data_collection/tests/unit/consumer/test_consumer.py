@@ -1,9 +1,12 @@
+import time
 from unittest.mock import AsyncMock, Mock
 
 import pytest
 
 from app.consumer import kafka_logs_filter
+from app.consumer.tx_data_loader import TransactionDataLoader
 from app.model import DataCollectionMode
+from app.web3.retry import CircuitOpenError
 
 
 class TestKafkaLogsFilter:
@@ -74,8 +77,12 @@ class TestDataConsumer:
         await consumer._on_kafka_event(event=kafka_event)
 
         # Assert
-        consumer.tx_processors[mode].process_transaction.assert_awaited_once_with(
-            transaction_data,
+        consumer.tx_processors[mode].process_transaction.assert_awaited_once()
+        (tx,) = consumer.tx_processors[mode].process_transaction.await_args.args
+        assert isinstance(tx, TransactionDataLoader)
+        assert tx.tx_hash == "0x1234"
+        assert await tx.get_transaction_data() == transaction_data
+        assert await tx.get_transaction_receipt_data() == (
             transaction_receipt_data,
             w3_tx_receipt_mock,
         )
@@ -131,9 +138,130 @@ class TestDataConsumer:
         await consumer._on_kafka_event(event=kafka_event)
 
         # Assert
-        consumer.tx_processors[mode].process_transaction.assert_awaited_once_with(
-            transaction_data,
-            transaction_receipt_data,
-            w3_tx_receipt_mock,
-        )
+        consumer.tx_processors[mode].process_transaction.assert_awaited_once()
         assert consumer._n_processed_txs == 0
+
+    async def test_on_kafka_event_failure_sent_to_retry_topic(self, default_consumer):
+        """Test that an exception during event processing doesn't stop the consumer and the event is retried"""
+        # Arrange
+        error = ValueError("malformed receipt")
+        default_consumer._on_kafka_event = AsyncMock(side_effect=error)
+        default_consumer.retry_manager = Mock()
+        default_consumer.retry_manager.send_failed_event = AsyncMock(
+            return_value="reeee_retry"
+        )
+        default_consumer.kafka_manager.defer_event = Mock()
+        kafka_event = Mock()
+
+        # Act
+        await default_consumer._on_kafka_event_with_retry(kafka_event)
+
+        # Assert
+        default_consumer.retry_manager.send_failed_event.assert_awaited_once_with(
+            kafka_event, error
+        )
+        default_consumer.retry_manager.get_not_before.assert_not_called()
+        default_consumer.kafka_manager.defer_event.assert_not_called()
+        assert default_consumer._n_failed_txs == 1
+
+    async def test_on_kafka_event_node_unavailable(self, default_consumer):
+        """Test that an event isn't sent to the retry topic while the node is unavailable"""
+        # Arrange
+        circuit_breaker = Mock()
+        circuit_breaker.wait = AsyncMock()
+        default_consumer._on_kafka_event = AsyncMock(
+            side_effect=[CircuitOpenError(circuit_breaker), None]
+        )
+        default_consumer.retry_manager = Mock()
+        default_consumer.retry_manager.send_failed_event = AsyncMock()
+        kafka_event = Mock()
+
+        # Act
+        await default_consumer._on_kafka_event_with_retry(kafka_event)
+
+        # Assert
+        circuit_breaker.wait.assert_awaited_once()
+        assert default_consumer._on_kafka_event.await_count == 2
+        default_consumer.retry_manager.send_failed_event.assert_not_awaited()
+        assert default_consumer._n_failed_txs == 0
+
+    @pytest.mark.parametrize(
+        "backoff,deferred", [(None, False), (-5, False), (5, True)]
+    )
+    async def test_retry_consumer_respects_backoff(
+        self, consumer_factory, default_config, contract_abi, backoff, deferred
+    ):
+        """Test that the retry consumer defers events whose backoff didn't pass yet"""
+        # Arrange
+        consumer = consumer_factory(default_config, contract_abi, consume_retries=True)
+        consumer._on_kafka_event = AsyncMock()
+        consumer.retry_manager = Mock()
+        not_before = time.time() + backoff if backoff is not None else None
+        consumer.retry_manager.get_not_before.return_value = not_before
+        consumer.retry_manager.send_failed_event = AsyncMock()
+        consumer.kafka_manager.defer_event = Mock()
+        kafka_event = Mock()
+
+        # Act
+        await consumer._on_kafka_event_with_retry(kafka_event)
+
+        # Assert
+        consumer.retry_manager.get_not_before.assert_called_once_with(kafka_event)
+        if deferred:
+            consumer.kafka_manager.defer_event.assert_called_once_with(
+                kafka_event, not_before
+            )
+            consumer._on_kafka_event.assert_not_awaited()
+        else:
+            consumer.kafka_manager.defer_event.assert_not_called()
+            consumer._on_kafka_event.assert_awaited_once_with(kafka_event)
+        consumer.retry_manager.send_failed_event.assert_not_awaited()
+        assert consumer._n_failed_txs == 0
+
+    async def test_offset_stored_in_event_transaction(
+        self, consumer_factory, default_config, contract_abi
+    ):
+        """Test that with offsets in the db the next offset is stored after processing the event"""
+        # Arrange
+        default_config.kafka_offsets_in_db = True
+        consumer = consumer_factory(default_config, contract_abi)
+        consumer.db_manager.upsert_kafka_offset = AsyncMock()
+        consumer._on_kafka_event = AsyncMock()
+        kafka_event = Mock(topic="eth", partition=2, offset=41)
+
+        # Act
+        await consumer._on_kafka_event_with_retry(kafka_event)
+
+        # Assert
+        consumer.db_manager.db.transaction.assert_called_once()
+        consumer.db_manager.upsert_kafka_offset.assert_awaited_once_with("eth", 2, 42)
+
+    async def test_offset_stored_after_failure(
+        self, consumer_factory, default_config, contract_abi
+    ):
+        """Test that the offset of a failed event is stored once it is sent to the retry topic"""
+        # Arrange
+        default_config.kafka_offsets_in_db = True
+        consumer = consumer_factory(default_config, contract_abi)
+        consumer.db_manager.upsert_kafka_offset = AsyncMock()
+        consumer._on_kafka_event = AsyncMock(side_effect=ValueError("kek"))
+        consumer.retry_manager = Mock()
+        consumer.retry_manager.send_failed_event = AsyncMock(return_value="eth_retry")
+        kafka_event = Mock(topic="eth", partition=0, offset=0)
+
+        # Act
+        await consumer._on_kafka_event_with_retry(kafka_event)
+
+        # Assert
+        consumer.retry_manager.send_failed_event.assert_awaited_once()
+        consumer.db_manager.upsert_kafka_offset.assert_awaited_once_with("eth", 0, 1)
+
+    async def test_offset_not_stored_by_default(self, default_consumer):
+        """Test that offsets aren't stored in the db unless enabled"""
+        default_consumer.db_manager.upsert_kafka_offset = AsyncMock()
+        default_consumer._on_kafka_event = AsyncMock()
+
+        await default_consumer._on_kafka_event_with_retry(Mock())
+
+        default_consumer.db_manager.db.transaction.assert_not_called()
+        default_consumer.db_manager.upsert_kafka_offset.assert_not_awaited()
@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from unittest.mock import Mock, call, patch
+
+import pytest
+
+from app.consumer.supervisor import ConsumerSupervisor, _consumer_worker_main
+from app.utils.profiler import PROFILE_SIGNAL
+
+
+def _supervisor_factory(
+    default_config, n_processes: int = 2, max_restarts: int = 1
+) -> ConsumerSupervisor:
+    supervisor = ConsumerSupervisor(
+        config=default_config,
+        abi_file="etc/contract_abi.json",
+        n_processes=n_processes,
+        max_restarts=max_restarts,
+    )
+    supervisor.RESTART_DELAY = 0
+    supervisor.MONITOR_INTERVAL = 0.05
+    return supervisor
+
+
+def _exiting_process(exit_code: int):
+    """Return a started process that exits immediately with the given exit code"""
+    process = multiprocessing.get_context("fork").Process(
+        target=sys.exit, args=(exit_code,)
+    )
+    process.start()
+    return process
+
+
+def _wait_for_ignored(pid: int, sig: int, timeout: float = 30) -> bool:
+    """Wait until the process ignores the signal (from the `SigIgn` mask of its status)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if (
+                    line.startswith("SigIgn:")
+                    and int(line.split()[1], 16) >> (sig - 1) & 1
+                ):
+                    return True
+        time.sleep(0.01)
+    return False
+
+
+class TestConsumerSupervisor:
+    """Tests for the ConsumerSupervisor restart and exit code logic"""
+
+    def test_worker_exit_success_not_restarted(self, default_config):
+        """Test that a worker exiting with 0 is not restarted"""
+        supervisor = _supervisor_factory(default_config)
+        supervisor._workers[0] = Mock(exitcode=0)
+
+        supervisor._on_worker_exit(0)
+
+        assert supervisor._pending_restarts == {}
+        assert supervisor._exit_codes == {0: 0}
+        assert supervisor.exit_code == 0
+
+    def test_worker_crash_restarted(self, default_config):
+        """Test that a crashed worker is scheduled for a restart"""
+        supervisor = _supervisor_factory(default_config)
+        supervisor._workers[0] = Mock(exitcode=1)
+
+        supervisor._on_worker_exit(0)
+
+        assert 0 in supervisor._pending_restarts
+        assert supervisor._n_restarts[0] == 1
+        assert supervisor._exit_codes == {}
+
+    def test_worker_crash_not_restarted_after_max_restarts(self, default_config):
+        """Test that a crashed worker isn't restarted more than max_restarts times"""
+        supervisor = _supervisor_factory(default_config, max_restarts=1)
+        supervisor._n_restarts[0] = 1
+        supervisor._workers[0] = Mock(exitcode=1)
+
+        supervisor._on_worker_exit(0)
+
+        assert supervisor._pending_restarts == {}
+        assert supervisor._exit_codes == {0: 1}
+        assert supervisor.exit_code == 1
+
+    def test_worker_crash_not_restarted_while_shutting_down(self, default_config):
+        """Test that a worker isn't restarted during shutdown"""
+        supervisor = _supervisor_factory(default_config)
+        supervisor._shutting_down = True
+        supervisor._workers[0] = Mock(exitcode=-15)
+
+        supervisor._on_worker_exit(0)
+
+        assert supervisor._pending_restarts == {}
+        assert supervisor.exit_code == 1
+
+    @patch("app.consumer.supervisor.os.kill")
+    def test_profiler_signal_forwarded(self, kill_mock, default_config):
+        """Test that the profiler trigger is forwarded to all the workers"""
+        supervisor = _supervisor_factory(default_config)
+        supervisor._workers = {0: Mock(pid=101), 1: Mock(pid=102)}
+
+        supervisor._forward_signal(signal.SIGUSR1, None)
+
+        assert kill_mock.call_args_list == [
+            call(101, signal.SIGUSR1),
+            call(102, signal.SIGUSR1),
+        ]
+
+    def test_profiler_signal_ignored_while_worker_starting(
+        self, default_config, tmp_path
+    ):
+        """Test that a worker that is still starting isn't terminated by the profiler trigger"""
+        config = default_config.copy(update={"sentry_dsn": None})
+        # The worker blocks on reading the ABI file until it is written
+        abi_file = tmp_path / "contract_abi.json"
+        os.mkfifo(abi_file)
+        abi_fd = os.open(abi_file, os.O_RDWR)
+        process = multiprocessing.get_context("spawn").Process(
+            target=_consumer_worker_main, args=(0, config, str(abi_file))
+        )
+        process.start()
+        try:
+            assert _wait_for_ignored(process.pid, PROFILE_SIGNAL)
+            os.kill(process.pid, PROFILE_SIGNAL)
+            time.sleep(0.1)
+            assert process.is_alive()
+        finally:
+            # An invalid ABI makes the worker exit
+            os.write(abi_fd, b"[]")
+            os.close(abi_fd)
+            process.join(timeout=30)
+        assert process.exitcode == 1
+
+    @pytest.mark.parametrize(
+        "exit_codes,expected_exit_code,expected_n_spawns",
+        [
+            # All workers succeed
+            ([0, 0], 0, 2),
+            # Worker 1 crashes once and succeeds after the restart
+            ([0, 1, 0], 0, 3),
+            # Worker 1 crashes twice (max_restarts=1)
+            ([0, 1, 1], 1, 3),
+        ],
+    )
+    def test_run_aggregates_exit_codes(
+        self, default_config, exit_codes, expected_exit_code, expected_n_spawns
+    ):
+        """Test that run() restarts crashed workers and aggregates their exit codes"""
+        supervisor = _supervisor_factory(default_config, n_processes=2, max_restarts=1)
+        remaining_exit_codes = list(exit_codes)
+        supervisor._spawn_worker = Mock(
+            side_effect=lambda worker_id: _exiting_process(remaining_exit_codes.pop(0))
+        )
+
+        exit_code = supervisor.run()
+
+        assert exit_code == expected_exit_code
+        assert supervisor._spawn_worker.call_count == expected_n_spawns
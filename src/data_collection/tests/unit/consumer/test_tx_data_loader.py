@@ -0,0 +1,45 @@
+from unittest.mock import AsyncMock, Mock
+
+from app.consumer.tx_data_loader import TransactionDataLoader
+
+
+class TestTransactionDataLoader:
+    """Tests for the lazy transaction data loader"""
+
+    async def test_nothing_fetched_on_init(self):
+        """Test that no data is fetched before it's requested"""
+        node_connector = Mock()
+        node_connector.get_transaction_data = AsyncMock()
+        node_connector.get_transaction_receipt_data = AsyncMock()
+        node_connector.get_internal_transactions = AsyncMock()
+
+        TransactionDataLoader("0x1234", node_connector)
+
+        node_connector.get_transaction_data.assert_not_awaited()
+        node_connector.get_transaction_receipt_data.assert_not_awaited()
+        node_connector.get_internal_transactions.assert_not_awaited()
+
+    async def test_data_is_memoized(self, transaction_data, transaction_receipt_data):
+        """Test that each piece of data is fetched from the node only once"""
+        node_connector = Mock()
+        w3_tx_receipt = Mock()
+        node_connector.get_transaction_data = AsyncMock(
+            return_value=(transaction_data, Mock())
+        )
+        node_connector.get_transaction_receipt_data = AsyncMock(
+            return_value=(transaction_receipt_data, w3_tx_receipt)
+        )
+        node_connector.get_internal_transactions = AsyncMock(return_value=[])
+        tx = TransactionDataLoader("0x1234", node_connector)
+
+        for _ in range(2):
+            assert await tx.get_transaction_data() == transaction_data
+            assert await tx.get_transaction_receipt_data() == (
+                transaction_receipt_data,
+                w3_tx_receipt,
+            )
+            assert await tx.get_internal_transactions() == []
+
+        node_connector.get_transaction_data.assert_awaited_once_with("0x1234")
+        node_connector.get_transaction_receipt_data.assert_awaited_once_with("0x1234")
+        node_connector.get_internal_transactions.assert_awaited_once_with("0x1234")
@@ -28,18 +28,19 @@ class TestTransactionProcessor:
         pass
 
     async def test_handle_transaction_without_internal_txs(
-        self, transaction_data, transaction_receipt_data, transaction_processor
+        self,
+        transaction_data,
+        transaction_receipt_data,
+        transaction_processor,
+        tx_data_loader_factory,
     ):
         """Test that in _handle_transaction insert to db is called once for a transaction without internal transactions"""
         # Arrange
-        get_internal_transactions_mock = AsyncMock()
-        get_internal_transactions_mock.return_value = []
-        transaction_processor.node_connector.get_internal_transactions = AsyncMock()
+        tx = tx_data_loader_factory(transaction_data, transaction_receipt_data)
 
         # Act
         await transaction_processor._handle_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set([]),
         )
 
@@ -59,11 +60,12 @@ class TestTransactionProcessor:
         transaction_processor,
         transaction_data,
         transaction_receipt_data,
+        tx_data_loader_factory,
     ):
         """Test that insert to db is called once for a transaction and all internal transactions"""
         # Arrange
-        internal_tx_data = InternalTransactionData(
-            **{
+        internal_tx_data = InternalTransactionData.from_rpc(
+            {
                 "from": "0x0000000",
                 "to": "0x0000000",
                 "value": "0x1337",
@@ -73,19 +75,15 @@ class TestTransactionProcessor:
                 "callType": "call",
             }
         )
-        get_internal_transactions_mock = AsyncMock()
-        get_internal_transactions_mock.return_value = [
-            internal_tx_data,
-            internal_tx_data,
-        ]
-        transaction_processor.node_connector.get_internal_transactions = (
-            get_internal_transactions_mock
+        tx = tx_data_loader_factory(
+            transaction_data,
+            transaction_receipt_data,
+            internal_tx_data=[internal_tx_data, internal_tx_data],
         )
 
         # Act
         await transaction_processor._handle_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set([]),
         )
 
@@ -97,9 +95,7 @@ class TestTransactionProcessor:
             transaction_fee=transaction_data.gas_price
             * transaction_receipt_data.gas_used,
         )
-        transaction_processor.node_connector.get_internal_transactions.assert_awaited_once_with(
-            transaction_data.transaction_hash
-        )
+        tx.get_internal_transactions.assert_awaited_once()
         assert (
             transaction_processor.db_manager.insert_internal_transaction.await_count
             == 2
@@ -116,18 +112,18 @@ class TestTransactionProcessor:
         transaction_data,
         transaction_receipt_data,
         transaction_logs_data,
+        tx_data_loader_factory,
     ):
         """Test that insert to db is called once for a transaction and all logs"""
         # Arrange
         transaction_receipt_data.logs = [transaction_logs_data, transaction_logs_data]
         transaction_receipt_data.logs[0].log_index = 230
         transaction_receipt_data.logs[1].log_index = 231
-        transaction_processor.node_connector.get_internal_transactions = AsyncMock()
+        tx = tx_data_loader_factory(transaction_data, transaction_receipt_data)
 
         # Act
         await transaction_processor._handle_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set([230, 231]),
         )
 
@@ -856,7 +852,11 @@ class TestPartialTransactionProcessor:
     """Tests for PartialTransactionProcessor methods"""
 
     async def test_process_transaction_case1_and_case3(
-        self, partial_transaction_processor, transaction_data, transaction_receipt_data
+        self,
+        partial_transaction_processor,
+        transaction_data,
+        transaction_receipt_data,
+        tx_data_loader_factory,
     ):
         """Test case 1. (Regular contract interaction) and case 3. (Transaction event)
         in process_transaction gets saved into db
@@ -869,14 +869,13 @@ class TestPartialTransactionProcessor:
         )
         partial_transaction_processor._process_contract_creation = AsyncMock()
         w3_tx_receipt_mock = Mock()
+        tx = tx_data_loader_factory(
+            transaction_data, transaction_receipt_data, w3_tx_receipt_mock
+        )
         partial_transaction_processor._handle_transaction = AsyncMock()
 
         # Act
-        saved = await partial_transaction_processor.process_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
-            w3_tx_receipt=w3_tx_receipt_mock,
-        )
+        saved = await partial_transaction_processor.process_transaction(tx)
 
         # Assert
         partial_transaction_processor._process_regular_contract_interaction.assert_awaited_once_with(
@@ -884,8 +883,7 @@ class TestPartialTransactionProcessor:
         )
         partial_transaction_processor._process_contract_creation.assert_not_awaited()
         partial_transaction_processor._handle_transaction.assert_awaited_once_with(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set(),
         )
         assert saved is True
@@ -896,6 +894,7 @@ class TestPartialTransactionProcessor:
         transaction_data,
         transaction_receipt_data,
         transaction_logs_data,
+        tx_data_loader_factory,
     ):
         """Test case 2. (Contract creation) in process_transaction gets saved into db"""
         # Arrange
@@ -911,14 +910,13 @@ class TestPartialTransactionProcessor:
             AsyncMock()
         )
         w3_tx_receipt_mock = Mock()
+        tx = tx_data_loader_factory(
+            transaction_data, transaction_receipt_data, w3_tx_receipt_mock
+        )
         partial_transaction_processor._handle_transaction = AsyncMock()
 
         # Act
-        saved = await partial_transaction_processor.process_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
-            w3_tx_receipt=w3_tx_receipt_mock,
-        )
+        saved = await partial_transaction_processor.process_transaction(tx)
 
         # Assert
         partial_transaction_processor._process_regular_contract_interaction.assert_not_awaited()
@@ -926,8 +924,7 @@ class TestPartialTransactionProcessor:
             transaction_data, transaction_receipt_data, w3_tx_receipt_mock
         )
         partial_transaction_processor._handle_transaction.assert_awaited_once_with(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set([1337]),
         )
         assert saved is True
@@ -937,21 +934,47 @@ class TestPartialTransactionProcessor:
         partial_transaction_processor,
         transaction_data,
         transaction_receipt_data,
+        tx_data_loader_factory,
     ):
         """Test that process_transaction doesn't save transaction if should_save_tx is False"""
         partial_transaction_processor._handle_transaction = AsyncMock()
         transaction_data.to_address = None
         transaction_receipt_data.contract_address = None
+        tx = tx_data_loader_factory(transaction_data, transaction_receipt_data)
 
-        saved = await partial_transaction_processor.process_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
-            w3_tx_receipt=Mock(),
-        )
+        saved = await partial_transaction_processor.process_transaction(tx)
 
         partial_transaction_processor._handle_transaction.assert_not_awaited()
         assert saved is False
 
+    async def test_process_transaction_irrelevant_tx_fetches_only_receipt(
+        self,
+        partial_transaction_processor,
+        transaction_data,
+        transaction_receipt_data,
+        transaction_logs_data,
+        tx_data_loader_factory,
+    ):
+        """Test that only the receipt is fetched for a transaction without any address from the config"""
+        partial_transaction_processor._handle_transaction = AsyncMock()
+        partial_transaction_processor.contract_parser.is_known_contract_address.return_value = (
+            False
+        )
+        transaction_receipt_data.to_address = "0x1234"
+        transaction_receipt_data.logs = [transaction_logs_data]
+        tx = tx_data_loader_factory(transaction_data, transaction_receipt_data)
+
+        saved = await partial_transaction_processor.process_transaction(tx)
+
+        assert saved is False
+        tx.get_transaction_receipt_data.assert_awaited_once()
+        tx.get_transaction_data.assert_not_awaited()
+        tx.get_internal_transactions.assert_not_awaited()
+        partial_transaction_processor._handle_transaction.assert_not_awaited()
+        partial_transaction_processor.contract_parser.is_known_contract_address.assert_any_call(
+            transaction_logs_data.address
+        )
+
     async def test_process_regular_contract_interaction_unknown_contract_flow(
         self, partial_transaction_processor, transaction_data, transaction_receipt_data
     ):
@@ -1181,6 +1204,7 @@ class TestFullTransactionProcessor:
         transaction_data,
         transaction_receipt_data,
         transaction_logs_data,
+        tx_data_loader_factory,
     ):
         """Test process_transaction flow"""
         full_transaction_processor._handle_transaction = AsyncMock()
@@ -1189,19 +1213,16 @@ class TestFullTransactionProcessor:
         _handle_tx_events_mock.return_value = set([1337])
         full_transaction_processor._handle_transaction_events = _handle_tx_events_mock
         transaction_receipt_data.logs = [transaction_logs_data]
+        tx = tx_data_loader_factory(transaction_data, transaction_receipt_data)
 
-        saved = await full_transaction_processor.process_transaction(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
-            w3_tx_receipt=Mock(),
-        )
+        saved = await full_transaction_processor.process_transaction(tx)
 
         # Assert
         full_transaction_processor._handle_transaction.assert_awaited_once_with(
-            tx_data=transaction_data,
-            tx_receipt_data=transaction_receipt_data,
+            tx=tx,
             log_indices_to_save=set([1337]),
         )
+        tx.get_internal_transactions.assert_awaited_once()
         assert saved is True
 
 
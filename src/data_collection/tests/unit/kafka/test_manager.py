@@ -0,0 +1,234 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from aiokafka.errors import IllegalStateError
+from aiokafka.structs import TopicPartition
+
+from app.kafka.exceptions import KafkaConsumerPartitionsEmptyError
+from app.kafka.manager import (
+    KafkaConsumerManager,
+    KafkaRetryProducerManager,
+    StoredOffsetRebalanceListener,
+)
+
+
+def _event(headers=None):
+    event = Mock()
+    event.value = b"partial:0x1234"
+    event.headers = headers or []
+    return event
+
+
+@pytest.fixture
+async def retry_manager() -> KafkaRetryProducerManager:
+    manager = KafkaRetryProducerManager(
+        kafka_url="nvm123",
+        redis_url="redis://kek:1337",
+        topic="eth",
+        max_attempts=3,
+        backoff=10,
+        max_backoff=60,
+    )
+    manager._client = Mock()
+    manager._client.send_and_wait = AsyncMock()
+    return manager
+
+
+class TestKafkaRetryProducerManager:
+    """Tests for routing failed events to the retry and dead-letter topics"""
+
+    def test_topic_names(self, retry_manager):
+        assert retry_manager.retry_topic == "eth_retry"
+        assert retry_manager.dead_letter_topic == "eth_dead_letter"
+
+    @pytest.mark.parametrize(
+        "attempt,expected_backoff", [(1, 10), (2, 20), (3, 40), (4, 60), (100, 60)]
+    )
+    def test_exponential_backoff(self, retry_manager, attempt, expected_backoff):
+        assert retry_manager.get_backoff(attempt) == expected_backoff
+
+    async def test_first_failure_sent_to_retry_topic(self, retry_manager):
+        """Test that an event from the main topic is sent to the retry topic with backoff metadata"""
+        now = time.time()
+
+        topic = await retry_manager.send_failed_event(_event(), ValueError("oops"))
+
+        assert topic == "eth_retry"
+        args, kwargs = retry_manager._client.send_and_wait.await_args
+        assert args == ("eth_retry",)
+        assert kwargs["value"] == b"partial:0x1234"
+        headers = dict(kwargs["headers"])
+        assert headers["attempt"] == b"1"
+        assert headers["error"] == b"ValueError('oops')"
+        assert float(headers["not_before"]) == pytest.approx(now + 10, abs=1)
+
+    async def test_last_failure_sent_to_dead_letter_topic(self, retry_manager):
+        """Test that an event is dead-lettered after max_attempts attempts"""
+        event = _event(headers=[("attempt", b"2")])
+
+        topic = await retry_manager.send_failed_event(event, ValueError("oops"))
+
+        assert topic == "eth_dead_letter"
+        _, kwargs = retry_manager._client.send_and_wait.await_args
+        headers = dict(kwargs["headers"])
+        assert headers["attempt"] == b"3"
+        assert "not_before" not in headers
+
+    async def test_trace_context_kept(self, retry_manager):
+        """Test that a retried event stays in the trace of the original event"""
+        traceparent = b"00-" + b"a" * 32 + b"-" + b"b" * 16 + b"-01"
+        event = _event(headers=[("traceparent", traceparent)])
+
+        await retry_manager.send_failed_event(event, ValueError("oops"))
+
+        _, kwargs = retry_manager._client.send_and_wait.await_args
+        assert dict(kwargs["headers"])["traceparent"] == traceparent
+
+    def test_get_not_before(self, retry_manager):
+        assert retry_manager.get_not_before(_event()) is None
+        assert (
+            retry_manager.get_not_before(_event(headers=[("not_before", b"1337.5")]))
+            == 1337.5
+        )
+
+
+class TestStoredOffsetRebalanceListener:
+    """Tests for seeking to offsets stored in the database"""
+
+    async def test_seek_to_stored_offsets(self):
+        """Test that assigned partitions with a stored offset are seeked to it"""
+        consumer = Mock()
+        get_offsets = AsyncMock(return_value={0: 1337})
+        listener = StoredOffsetRebalanceListener(consumer, get_offsets)
+
+        await listener.on_partitions_assigned(
+            [TopicPartition("eth", 0), TopicPartition("eth", 1)]
+        )
+
+        get_offsets.assert_awaited_once_with("eth", [0, 1])
+        consumer.seek.assert_called_once_with(TopicPartition("eth", 0), 1337)
+
+    async def test_no_stored_offsets(self):
+        """Test that nothing is seeked if there are no stored offsets"""
+        consumer = Mock()
+        listener = StoredOffsetRebalanceListener(consumer, AsyncMock(return_value={}))
+
+        await listener.on_partitions_assigned([TopicPartition("eth", 0)])
+
+        consumer.seek.assert_not_called()
+
+
+class _FakeConsumerClient:
+    """Async iterable of events in place of an AIOKafkaConsumer"""
+
+    def __init__(self, events, block=False):
+        self.events = events
+        self.block = block
+
+    def assignment(self):
+        return set()
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+        if self.block:
+            await asyncio.Event().wait()
+
+
+@pytest.fixture
+async def consumer_manager() -> KafkaConsumerManager:
+    manager = KafkaConsumerManager(
+        kafka_url="nvm123",
+        redis_url="redis://kek:1337",
+        topic="eth",
+        event_retrieval_timeout=1337,
+        count_transactions=False,
+    )
+    manager._client = Mock()
+    manager.disconnect = AsyncMock()
+    return manager
+
+
+class TestKafkaConsumerManager:
+    """Tests for consumer lag and graceful stopping"""
+
+    async def test_get_lag(self, consumer_manager):
+        """Test that the lag is summed over the assigned partitions with a known highwater"""
+        highwaters = {0: 100, 1: None, 2: 50}
+        positions = {0: 40, 1: 0, 2: 50}
+        consumer_manager._client.assignment.return_value = {
+            TopicPartition("eth", p) for p in highwaters
+        }
+        consumer_manager._client.highwater = lambda tp: highwaters[tp.partition]
+        consumer_manager._client.position = AsyncMock(
+            side_effect=lambda tp: positions[tp.partition]
+        )
+
+        assert await consumer_manager.get_lag() == 60
+
+    async def test_stop_after_current_event(self, consumer_manager):
+        """Test that stopping during the processing of an event finishes the event first"""
+        processed = []
+
+        async def _on_event(event):
+            processed.append(event)
+            consumer_manager.stop()
+
+        consumer_manager._client = _FakeConsumerClient([0, 1, 2])
+
+        await consumer_manager.start_consuming(_on_event)
+
+        assert processed == [0]
+        consumer_manager.disconnect.assert_awaited_once()
+
+    async def test_stop_while_waiting_for_events(self, consumer_manager):
+        """Test that stopping an idle consumer ends consuming immediately"""
+        consumer_manager._client = _FakeConsumerClient([], block=True)
+        consume_task = asyncio.create_task(
+            consumer_manager.start_consuming(AsyncMock())
+        )
+        await asyncio.sleep(0.01)
+
+        consumer_manager.stop()
+        await asyncio.wait_for(consume_task, 1)
+
+        consumer_manager.disconnect.assert_awaited_once()
+
+    async def test_defer_event(self, consumer_manager):
+        """Test that the partition of a deferred event is paused, seeked back and resumed later"""
+        tp = TopicPartition("eth_retry", 3)
+        consumer_manager._client.assignment.return_value = {tp}
+        event = Mock(topic="eth_retry", partition=3, offset=42)
+
+        consumer_manager.defer_event(event, time.time() + 0.05)
+
+        consumer_manager._client.pause.assert_called_once_with(tp)
+        consumer_manager._client.seek.assert_called_once_with(tp, 42)
+        consumer_manager._client.resume.assert_not_called()
+        await asyncio.sleep(0.1)
+        consumer_manager._client.resume.assert_called_once_with(tp)
+
+    async def test_defer_event_revoked_partition(self, consumer_manager):
+        """Test that an event of a revoked partition isn't deferred (its new consumer gets it)"""
+        consumer_manager._client.pause.side_effect = IllegalStateError()
+        event = Mock(topic="eth_retry", partition=3, offset=42)
+
+        consumer_manager.defer_event(event, time.time())
+        await asyncio.sleep(0.01)
+
+        consumer_manager._client.seek.assert_not_called()
+        consumer_manager._client.resume.assert_not_called()
+
+    async def test_no_timeout_while_partitions_paused(self, consumer_manager):
+        """Test that the consumer doesn't time out while deferred events are waiting"""
+        consumer_manager.event_retrieval_timeout = 0.01
+        consumer_manager._client.paused.return_value = {TopicPartition("eth", 0)}
+        timeout_task = asyncio.create_task(consumer_manager._event_timeout_task())
+        await asyncio.sleep(0.05)
+        assert not timeout_task.done()
+
+        consumer_manager._client.paused.return_value = set()
+        with pytest.raises(KafkaConsumerPartitionsEmptyError):
+            await asyncio.wait_for(timeout_task, 1)
@@ -0,0 +1,145 @@
+import io
+import logging
+import queue
+from logging.handlers import QueueListener
+
+import orjson
+
+import app
+from app import (
+    LOG_DATE_FORMAT,
+    LOG_FORMAT,
+    JsonFormatter,
+    LocalQueueHandler,
+    RateLimitFilter,
+    TextFormatter,
+    init_logger,
+)
+
+
+def make_record(msg="Request %s failed", args=("eth_call",), lineno=10, created=0.0):
+    record = logging.makeLogRecord(
+        {
+            "name": "app.test",
+            "msg": msg,
+            "args": args,
+            "levelname": "WARNING",
+            "levelno": logging.WARNING,
+            "pathname": "app/test.py",
+            "lineno": lineno,
+        }
+    )
+    record.created = created
+    return record
+
+
+class TestRateLimitFilter:
+    def test_rate_limit(self):
+        """Test that records of a message over the rate are suppressed and counted"""
+        rate_limit = RateLimitFilter(rate=3, interval=1.0)
+        passed = [rate_limit.filter(make_record(created=0.1 * i)) for i in range(5)]
+        assert passed == [True, True, True, False, False]
+
+        # Another call site isn't limited
+        assert rate_limit.filter(make_record(lineno=20, created=0.5))
+
+        record = make_record(created=1.5)
+        assert rate_limit.filter(record)
+        assert record.suppressed == 2
+        record = make_record(created=1.6)
+        assert rate_limit.filter(record)
+        assert not hasattr(record, "suppressed")
+
+    def test_disabled(self):
+        rate_limit = RateLimitFilter(rate=0)
+        assert all(rate_limit.filter(make_record()) for _ in range(100))
+
+
+class TestFormatters:
+    def test_text(self):
+        formatter = TextFormatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        record = make_record()
+        assert formatter.format(record).endswith(
+            "app.test WARNING  Request eth_call failed"
+        )
+        record.suppressed = 5
+        assert formatter.format(record).endswith(
+            "Request eth_call failed (5 similar messages suppressed)"
+        )
+
+    def test_json(self):
+        record = make_record(created=1700000000.5)
+        record.block_number = 123
+        try:
+            raise ValueError("invalid")
+        except ValueError as e:
+            record.exc_info = (type(e), e, e.__traceback__)
+
+        entry = orjson.loads(JsonFormatter().format(record))
+        assert entry.pop("exception").endswith("ValueError: invalid")
+        assert entry == {
+            "time": "2023-11-14T22:13:20.500+00:00",
+            "level": "WARNING",
+            "logger": "app.test",
+            "message": "Request eth_call failed",
+            "block_number": 123,
+        }
+
+
+def test_local_queue_handler():
+    """Test that the records are formatted and written by the listener"""
+    stream = io.StringIO()
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    handler = LocalQueueHandler(queue.SimpleQueue())
+    listener = QueueListener(handler.queue, stream_handler)
+    listener.start()
+
+    record = make_record()
+    handler.handle(record)
+    listener.stop()
+
+    assert stream.getvalue() == "WARNING Request eth_call failed\n"
+    # The record of the other handlers is unchanged
+    assert record.args == ("eth_call",)
+
+
+def test_local_queue_handler_merges_message():
+    """Test that the message has the values of the args when the record was logged"""
+    stream = io.StringIO()
+    handler = LocalQueueHandler(queue.SimpleQueue())
+    listener = QueueListener(handler.queue, logging.StreamHandler(stream))
+
+    params = ["0x1"]
+    handler.handle(make_record(msg="Request eth_call %s failed", args=(params,)))
+    params.append("latest")
+    listener.start()
+    listener.stop()
+
+    assert stream.getvalue() == "Request eth_call ['0x1'] failed\n"
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+
+def test_child_logger_handled_once(monkeypatch):
+    """Test that a record of a child logger is handled once, not by each of its parents"""
+    handler = ListHandler()
+    monkeypatch.setattr(app, "_handler", handler)
+    try:
+        child = init_logger("logging_test.consumer.tx_processor")
+        init_logger("logging_test.consumer")
+        init_logger("logging_test")
+        child.warning("New contract")
+        assert [record.getMessage() for record in handler.records] == ["New contract"]
+    finally:
+        logging.getLogger("logging_test").removeHandler(handler)
+        for name in list(app.loggers):
+            if name.startswith("logging_test"):
+                del app.loggers[name]
@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from app.model.block import BlockData
+from app.model.transaction import (
+    InternalTransactionData,
+    TransactionData,
+    TransactionReceiptData,
+)
+from app.web3.transaction_events.types import MintPairEvent
+
+TX_HASH = "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822"
+
+
+def test_transaction_data_from_rpc():
+    tx_data = TransactionData.from_rpc(
+        {
+            "hash": TX_HASH,
+            "blockNumber": "0x539",
+            "from": "0xdac17f958d2ee523a2206206994597c13d831ec7",
+            "to": None,
+            "value": "0x2a",
+            "gasPrice": "0x87",
+            "gas": "0xad87",
+            "input": "0x1234",
+            "nonce": "0x1",
+        }
+    )
+
+    assert tx_data.dict() == {
+        "transaction_hash": TX_HASH,
+        "block_number": 1337,
+        "from_address": "0xdAC17F958D2ee523a2206206994597C13D831ec7",
+        "to_address": None,
+        "value": 42.0,
+        "gas_price": 135.0,
+        "gas_limit": 44423.0,
+        "input_data": "0x1234",
+    }
+
+
+def test_transaction_data_from_rpc_large_value():
+    # 10^30 wei doesn't fit into a 64-bit integer
+    tx_data = TransactionData.from_rpc({"value": hex(10**30)})
+
+    assert tx_data.value == float(10**30)
+
+
+def test_transaction_receipt_data_from_rpc():
+    receipt_data = TransactionReceiptData.from_rpc(
+        {
+            "gasUsed": "0x5208",
+            "to": "0xdac17f958d2ee523a2206206994597c13d831ec7",
+            "type": "0x2",
+            "contractAddress": None,
+            "logs": [
+                {
+                    "address": "0x0000000000000000000000000000000000000002",
+                    "data": "0x2a",
+                    "removed": False,
+                    "topics": [TX_HASH],
+                    "logIndex": "0x3",
+                    "transactionHash": TX_HASH,
+                }
+            ],
+        }
+    )
+
+    assert receipt_data.gas_used == 21000.0
+    assert receipt_data.to_address == "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+    assert receipt_data.transaction_type == "2"
+    assert receipt_data.logs[0].topics == [TX_HASH]
+    # Nested records are converted to dicts as well
+    assert receipt_data.dict()["logs"] == [
+        {
+            "address": "0x0000000000000000000000000000000000000002",
+            "data": "0x2a",
+            "removed": False,
+            "topics": [TX_HASH],
+            "log_index": 3,
+            "transaction_hash": TX_HASH,
+        }
+    ]
+
+
+def test_internal_transaction_data_from_rpc():
+    internal_tx_data = InternalTransactionData.from_rpc(
+        {"from": "0x01", "to": "0x02", "value": "0x10", "gas": "0x20"}
+    )
+
+    assert internal_tx_data.value == 16.0
+    assert internal_tx_data.gas_limit == 32.0
+    assert internal_tx_data.gas_used is None
+
+
+def test_block_data_from_rpc():
+    block_data = BlockData.from_rpc(
+        {
+            "number": "0x539",
+            "hash": TX_HASH,
+            "parentHash": TX_HASH,
+            "nonce": "0x0000000000000000",
+            "miner": "0xdac17f958d2ee523a2206206994597c13d831ec7",
+            "difficulty": "0x0",
+            "gasLimit": "0x1c9c380",
+            "gasUsed": "0x5208",
+            "timestamp": "0x64000000",
+            "transactions": [TX_HASH],
+            "uncles": [],
+        }
+    )
+
+    assert block_data.block_number == 1337
+    assert block_data.miner == "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+    assert block_data.gas_limit == 30_000_000
+    assert block_data.timestamp == datetime.fromtimestamp(0x64000000)
+    assert block_data.transactions == [TX_HASH]
+
+
+def test_record_copy():
+    event = MintPairEvent(
+        address="0x01", log_index=1, sender="0x02", amount0=2, amount1=3
+    )
+
+    copy = event.copy(update={"amount0": 4})
+
+    assert copy == MintPairEvent(
+        address="0x01", log_index=1, sender="0x02", amount0=4, amount1=3
+    )
+    assert event.amount0 == 2
+    assert not hasattr(event, "__dict__")
@@ -2,6 +2,7 @@ from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
+from app.config import NodeEndpointConfig
 from app.model import DataCollectionMode
 from app.utils.data_collector import DataCollector
 
@@ -59,13 +60,45 @@ class TestContextManager:
         data_collector.db_manager.connect.assert_awaited_once()
 
     async def test_aexit(self, default_config):
-        """Test __aexit__ method calls disconnect on kafka manager"""
+        """Test __aexit__ method calls disconnect on kafka manager and node connector"""
         data_collector = DataCollector(config=default_config)
         data_collector.kafka_manager = AsyncMock()
         data_collector.db_manager = AsyncMock()
+        data_collector.node_connector = AsyncMock()
 
         data_collector.kafka_manager.disconnect.assert_not_awaited()
 
         await data_collector.__aexit__(None, None, None)
 
         data_collector.kafka_manager.disconnect.assert_awaited_once()
+        data_collector.node_connector.disconnect.assert_awaited_once()
+
+
+class TestNodeEndpoints:
+    """Test node endpoints of the data collector's node connector"""
+
+    def test_node_url_endpoint(self, default_config):
+        data_collector = DataCollector(config=default_config)
+
+        endpoints = data_collector.node_connector.rpc.endpoints
+        assert [(e.url, e.methods) for e in endpoints] == [
+            (default_config.node_url, None)
+        ]
+
+    def test_node_endpoints(self, default_config):
+        config = default_config.copy(
+            update={
+                "node_endpoints": [
+                    NodeEndpointConfig(url="http://archive:8545"),
+                    NodeEndpointConfig(url="http://node:8545", methods=["eth_*"]),
+                ]
+            }
+        )
+
+        data_collector = DataCollector(config=config)
+
+        endpoints = data_collector.node_connector.rpc.endpoints
+        assert [(e.url, e.methods) for e in endpoints] == [
+            ("http://archive:8545", None),
+            ("http://node:8545", ["eth_*"]),
+        ]
@@ -0,0 +1,171 @@
+import asyncio
+import random
+
+import aiohttp
+import pytest
+
+from app.utils.metrics import (
+    DEFAULT_PROCESSOR,
+    LatencyHistogram,
+    StageMetrics,
+    _bucket_bounds,
+    _bucket_index,
+    processor_context,
+    stage_metrics_reporting,
+)
+from app.web3.concurrency import ConcurrencyLimiter
+
+
+class TestLatencyHistogram:
+    def test_buckets(self):
+        """Test that the buckets are contiguous and contain their values"""
+        previous_highest = -1
+        for index in range(_bucket_index(10**9) + 1):
+            lowest, highest = _bucket_bounds(index)
+            assert lowest == previous_highest + 1
+            assert _bucket_index(lowest) == index
+            assert _bucket_index(highest) == index
+            previous_highest = highest
+
+    def test_percentiles(self):
+        """Test that the percentiles are within the relative error of the buckets"""
+        rng = random.Random(0)
+        values = [int(rng.lognormvariate(8, 2)) for _ in range(10000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        assert histogram.count == len(values)
+        assert histogram.sum == sum(values)
+        assert histogram.max == values[-1]
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = values[int(q * len(values)) - 1]
+            assert histogram.percentile(q) == pytest.approx(exact, rel=1 / 32)
+        assert histogram.percentile(1) == values[-1]
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        assert histogram.percentile(0.5) is None
+        assert histogram.mean() is None
+
+    def test_since(self):
+        """Test the histogram of the values recorded after a snapshot"""
+        histogram = LatencyHistogram()
+        for value in (10, 20, 5000):
+            histogram.record(value)
+        snapshot = histogram.copy()
+        for value in (30, 40):
+            histogram.record(value)
+
+        interval = histogram.since(snapshot)
+        assert interval.count == 2
+        assert interval.sum == 70
+        assert interval.max == 40
+        assert interval.percentile(1) == 40
+        # The snapshot is unchanged
+        assert snapshot.count == 3
+
+
+class TestStageMetrics:
+    async def test_processor_context(self):
+        """Test that stages are recorded per processor, also in subtasks"""
+        metrics = StageMetrics()
+
+        @metrics.timed("db.insert")
+        async def insert():
+            pass
+
+        with processor_context("full"):
+            with metrics.timer("process_transaction"):
+                await asyncio.create_task(insert())
+        await insert()
+
+        assert {
+            key: histogram.count for key, histogram in metrics.histograms.items()
+        } == {
+            ("full", "process_transaction"): 1,
+            ("full", "db.insert"): 1,
+            (DEFAULT_PROCESSOR, "db.insert"): 1,
+        }
+
+    async def test_timed_records_exceptions(self):
+        metrics = StageMetrics()
+
+        @metrics.timed("db.insert")
+        async def insert():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            await insert()
+        assert metrics.histograms[(DEFAULT_PROCESSOR, "db.insert")].count == 1
+
+    def test_log_summary(self, caplog):
+        """Test that the log summary contains only the latencies since the last one"""
+        metrics = StageMetrics()
+        metrics.record("decode_events", 100, processor="full")
+        metrics.log_summary()
+        metrics.record("decode_events", 2000, processor="full")
+        metrics.record("decode_events", 3000, processor="partial")
+        caplog.clear()
+        metrics.log_summary()
+
+        messages = [record.getMessage() for record in caplog.records]
+        assert len(messages) == 2
+        assert messages[0].startswith("Stage latency full/decode_events: n=1 ")
+        assert "max=2.000 ms" in messages[0]
+        assert messages[1].startswith("Stage latency partial/decode_events: n=1 ")
+
+    def test_prometheus_text(self):
+        metrics = StageMetrics()
+        metrics.record("db.insert_transaction", 1500, processor="full")
+        metrics.record("db.insert_transaction", 2500, processor="full")
+
+        lines = metrics.prometheus_text().splitlines()
+        labels = 'processor="full",stage="db.insert_transaction"'
+        assert "# TYPE data_collection_stage_latency_seconds summary" in lines
+        assert (
+            f'data_collection_stage_latency_seconds{{{labels},quantile="0.999"}} 0.0025'
+            in lines
+        )
+        assert f"data_collection_stage_latency_seconds_sum{{{labels}}} 0.004" in lines
+        assert f"data_collection_stage_latency_seconds_count{{{labels}}} 2" in lines
+
+    async def test_metrics_server(self, unused_tcp_port):
+        metrics = StageMetrics()
+        metrics.record("decode_events", 100, processor="full")
+
+        async with stage_metrics_reporting(metrics, 0, unused_tcp_port):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"http://localhost:{unused_tcp_port}/metrics"
+                ) as response:
+                    text = await response.text()
+        assert text == metrics.prometheus_text()
+
+    async def test_concurrency_limits_served(self, unused_tcp_port):
+        """Test that the concurrency limits of node requests are served as gauges"""
+        limiter = ConcurrencyLimiter(
+            initial_limit=8,
+            min_limit=1,
+            max_limit=100,
+            method_classes={"trace_*": "trace"},
+        )
+        limiter.get_limit("http://node:8545", "eth_getTransactionReceipt")
+        limiter.get_limit("http://node:8545", "trace_replayTransaction")._limit = 3
+
+        async with stage_metrics_reporting(
+            StageMetrics(), 0, unused_tcp_port, collectors=[limiter.prometheus_text]
+        ):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"http://localhost:{unused_tcp_port}/metrics"
+                ) as response:
+                    lines = (await response.text()).splitlines()
+
+        name = "data_collection_node_concurrency_limit"
+        assert f"# TYPE {name} gauge" in lines
+        assert (
+            f'{name}{{endpoint="http://node:8545",method_class="default"}} 8' in lines
+        )
+        assert f'{name}{{endpoint="http://node:8545",method_class="trace"}} 3' in lines
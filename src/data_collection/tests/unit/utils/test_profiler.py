@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import signal
+import time
+
+from app.utils.profiler import Profiler, collapse_task, install_profiler_trigger
+
+
+async def _waiting():
+    await asyncio.sleep(10)
+
+
+def _busy():
+    time.sleep(0.15)
+
+
+async def _blocking():
+    """Blocks the event loop a few times"""
+    for _ in range(3):
+        await asyncio.sleep(0.05)
+        _busy()
+
+
+def _read_collapsed(path):
+    stacks = {}
+    for line in path.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        stacks[stack] = int(count)
+    return stacks
+
+
+class TestProfiler:
+    async def test_collapse_task(self):
+        task = asyncio.create_task(_waiting())
+        await asyncio.sleep(0)
+        assert collapse_task(task) == [
+            "_waiting (tests/unit/utils/test_profiler.py)",
+            "sleep (asyncio/tasks.py)",
+            "[Future]",
+        ]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def test_profile(self, tmp_path):
+        """Test that the stacks, the task stacks and the event loop lag are recorded"""
+        profiler = Profiler("consumer-test", str(tmp_path), duration=0.6)
+        waiting_task = asyncio.create_task(_waiting(), name="waiting")
+        blocking_task = asyncio.create_task(_blocking())
+
+        report_path = await profiler.profile()
+        await blocking_task
+        waiting_task.cancel()
+        await asyncio.gather(waiting_task, return_exceptions=True)
+
+        report = json.loads(report_path.read_text())
+        assert report["worker"] == "consumer-test"
+        assert report["n_stack_samples"] > 0
+        # The loop was blocked for 150 ms
+        assert report["loop_lag_ms"]["max"] >= 100
+        assert {
+            "name": "waiting",
+            "stack": [
+                "_waiting (tests/unit/utils/test_profiler.py)",
+                "sleep (asyncio/tasks.py)",
+                "[Future]",
+            ],
+        } in report["tasks"]
+
+        stacks = _read_collapsed(tmp_path / report["stacks"])
+        assert any(
+            stack.endswith("_busy (tests/unit/utils/test_profiler.py)")
+            for stack in stacks
+        )
+        task_stacks = _read_collapsed(tmp_path / report["task_stacks"])
+        assert any(
+            stack.startswith("_waiting (tests/unit/utils/test_profiler.py)")
+            for stack in task_stacks
+        )
+
+    async def test_signal_trigger(self, tmp_path):
+        profiler = install_profiler_trigger("producer-test", str(tmp_path), 0.1)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            await asyncio.sleep(0.05)
+            assert profiler.running
+            # A second trigger doesn't start another profile
+            task = profiler._task
+            profiler.trigger()
+            assert profiler._task is task
+            await task
+        finally:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+        assert len(list(tmp_path.glob("producer-test-*.json"))) == 1
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.utils.tracing import (
+    FileSpanExporter,
+    SpanContext,
+    SpanExporter,
+    SpanKind,
+    Tracer,
+    create_span_exporter,
+    tracer,
+    tracing,
+)
+
+
+@pytest.fixture
+def enabled_tracer() -> Tracer:
+    return Tracer(sample_rate=1.0, enabled=True)
+
+
+class TestSpanContext:
+    def test_traceparent(self):
+        context = SpanContext(trace_id="a" * 32, span_id="b" * 16, sampled=True)
+        traceparent = context.to_traceparent()
+        assert traceparent == f"00-{'a' * 32}-{'b' * 16}-01"
+        assert SpanContext.from_traceparent(traceparent) == context
+        assert SpanContext.from_traceparent(
+            f"00-{'a' * 32}-{'b' * 16}-00"
+        ) == context._replace(sampled=False)
+
+    @pytest.mark.parametrize(
+        "traceparent", ["", "00-abc-def-01", f"00-{'x' * 32}-{'b' * 16}-01"]
+    )
+    def test_invalid_traceparent(self, traceparent):
+        assert SpanContext.from_traceparent(traceparent) is None
+
+
+class TestTracer:
+    def test_disabled(self):
+        tracer = Tracer(sample_rate=1.0, enabled=False)
+        with tracer.span("process_transaction", root=True) as span:
+            assert span is None
+            assert tracer.inject() == []
+        assert tracer.pop_finished_spans() == []
+
+    def test_nested_spans(self, enabled_tracer):
+        with enabled_tracer.span("produce_block", root=True) as root:
+            with enabled_tracer.span("eth_getBlockByNumber", kind=SpanKind.CLIENT):
+                pass
+        child, parent = enabled_tracer.pop_finished_spans()
+
+        assert parent is root
+        assert parent.parent_span_id is None
+        assert child.context.trace_id == parent.context.trace_id
+        assert child.parent_span_id == parent.context.span_id
+        assert parent.start_time <= child.start_time <= child.end_time
+        assert child.end_time <= parent.end_time
+
+    def test_no_span_outside_of_a_trace(self, enabled_tracer):
+        """Test that only root spans start a trace"""
+        with enabled_tracer.span("eth_blockNumber") as span:
+            assert span is None
+        assert enabled_tracer.pop_finished_spans() == []
+
+    def test_unsampled_trace_propagated(self):
+        """Test that spans of an unsampled trace aren't created, but the decision is propagated"""
+        tracer = Tracer(sample_rate=0.0, enabled=True)
+        with tracer.span("produce_block", root=True) as span:
+            assert span is None
+            with tracer.span("send_transactions") as child:
+                assert child is None
+                headers = tracer.inject()
+        assert tracer.pop_finished_spans() == []
+        assert SpanContext.from_traceparent(headers[0][1].decode()).sampled is False
+
+    def test_kafka_propagation(self, enabled_tracer):
+        """Test that a consumer span continues the trace of the producer span"""
+        with enabled_tracer.span("send_transactions", root=True) as producer_span:
+            headers = enabled_tracer.inject()
+
+        # An unsampled consumer follows the decision of the producer
+        consumer_tracer = Tracer(sample_rate=0.0, enabled=True)
+        parent = consumer_tracer.extract(headers)
+        with consumer_tracer.span("process_transaction", parent=parent, root=True):
+            pass
+        (consumer_span,) = consumer_tracer.pop_finished_spans()
+        assert consumer_span.context.trace_id == producer_span.context.trace_id
+        assert consumer_span.parent_span_id == producer_span.context.span_id
+
+    def test_error(self, enabled_tracer):
+        with pytest.raises(ValueError):
+            with enabled_tracer.span("db.insert_transaction", root=True):
+                raise ValueError("oops")
+        (span,) = enabled_tracer.pop_finished_spans()
+        assert span.to_otlp()["status"] == {"code": 2, "message": "ValueError('oops')"}
+
+    def test_queue_size(self):
+        tracer = Tracer(sample_rate=1.0, enabled=True, max_queue_size=2)
+        for _ in range(3):
+            with tracer.span("produce_block", root=True):
+                pass
+        assert len(tracer.pop_finished_spans()) == 2
+        assert tracer.n_dropped_spans == 1
+
+
+class TestExport:
+    def test_disabled_by_default(self, default_config):
+        assert create_span_exporter(default_config, "consumer-eth") is None
+
+    async def test_file_export(self, default_config, tmp_path):
+        path = tmp_path / "spans.jsonl"
+        config = default_config.copy(
+            update={"tracing_file": str(path), "tracing_sample_rate": 1.0}
+        )
+
+        async with tracing(config, "consumer-eth"):
+            with tracer.span(
+                "process_transaction",
+                kind=SpanKind.CONSUMER,
+                attributes={"transaction.hash": "0x1234", "messaging.kafka.offset": 3},
+                root=True,
+            ):
+                pass
+        assert not tracer.enabled
+
+        (line,) = path.read_text().splitlines()
+        (resource_spans,) = json.loads(line)["resourceSpans"]
+        assert resource_spans["resource"]["attributes"] == [
+            {"key": "service.name", "value": {"stringValue": "consumer-eth"}}
+        ]
+        (span,) = resource_spans["scopeSpans"][0]["spans"]
+        assert span["name"] == "process_transaction"
+        assert span["kind"] == SpanKind.CONSUMER
+        assert "parentSpanId" not in span
+        assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+        assert span["attributes"] == [
+            {"key": "transaction.hash", "value": {"stringValue": "0x1234"}},
+            {"key": "messaging.kafka.offset", "value": {"intValue": "3"}},
+        ]
+
+    async def test_file_export_off_the_event_loop(self, tmp_path, monkeypatch):
+        """Test that the spans are written by a worker thread, not the event loop thread"""
+        exporter = FileSpanExporter("consumer-eth", str(tmp_path / "spans.jsonl"))
+        write = exporter._write
+        threads = []
+
+        def _write(data: bytes):
+            threads.append(threading.get_ident())
+            write(data)
+
+        monkeypatch.setattr(exporter, "_write", _write)
+        tracer = Tracer(sample_rate=1.0, enabled=True)
+        with tracer.span("produce_block", root=True):
+            pass
+
+        await exporter.export(tracer.pop_finished_spans())
+        await exporter.close()
+
+        assert threads and threads[0] != threading.get_ident()
+        assert len((tmp_path / "spans.jsonl").read_text().splitlines()) == 1
+
+    def test_incomplete_exporter(self):
+        """Test that an exporter without `export` can't be created"""
+
+        class IncompleteExporter(SpanExporter):
+            pass
+
+        with pytest.raises(TypeError):
+            IncompleteExporter("consumer-eth")
+
+    async def test_export_finished_on_exit(self, default_config, monkeypatch):
+        """Test that an export running at the exit finishes and the remaining spans are exported"""
+
+        class SlowExporter(SpanExporter):
+            def __init__(self) -> None:
+                super().__init__("consumer-eth")
+                self.exported = []
+                self.closed = False
+
+            async def export(self, spans):
+                await asyncio.sleep(0.05)
+                self.exported.extend(span.name for span in spans)
+
+            async def close(self):
+                self.closed = True
+
+        exporter = SlowExporter()
+        monkeypatch.setattr(
+            "app.utils.tracing.create_span_exporter", lambda *args: exporter
+        )
+        monkeypatch.setattr("app.utils.tracing.EXPORT_INTERVAL", 0.01)
+        config = default_config.copy(update={"tracing_sample_rate": 1.0})
+
+        async with tracing(config, "consumer-eth"):
+            with tracer.span("first", root=True):
+                pass
+            # The export of the first span is running
+            await asyncio.sleep(0.02)
+            with tracer.span("second", root=True):
+                pass
+
+        assert exporter.exported == ["first", "second"]
+        assert exporter.closed
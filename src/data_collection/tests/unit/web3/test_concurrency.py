@@ -0,0 +1,162 @@
+import asyncio
+import math
+
+import aiohttp
+import pytest
+
+from app.web3.concurrency import AIMDLimit, ConcurrencyLimiter, is_overload_error
+
+
+async def _request(limit: AIMDLimit, error: BaseException = None):
+    async with limit.request():
+        if error is not None:
+            raise error
+
+
+async def _concurrent_requests(limit: AIMDLimit, n: int):
+    """Make `n` requests, as many at once as the limit allows"""
+
+    async def request():
+        async with limit.request():
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*[request() for _ in range(n)])
+
+
+@pytest.mark.parametrize(
+    "error,overload",
+    [
+        (asyncio.TimeoutError(), True),
+        (aiohttp.ClientResponseError(None, (), status=429), True),
+        (aiohttp.ClientResponseError(None, (), status=500), False),
+        (aiohttp.ClientConnectionError(), False),
+    ],
+)
+def test_is_overload_error(error, overload):
+    assert is_overload_error(error) == overload
+
+
+class TestAIMDLimit:
+    async def test_waits_above_limit(self):
+        limit = AIMDLimit(initial_limit=2, min_limit=1, max_limit=2)
+        release = asyncio.Event()
+
+        async def request():
+            async with limit.request():
+                await release.wait()
+
+        tasks = [asyncio.create_task(request()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert limit.in_flight == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert limit.in_flight == 0
+
+    async def test_additive_increase(self):
+        # Latencies within the event loop aren't flat
+        limit = AIMDLimit(
+            initial_limit=2, min_limit=1, max_limit=10, latency_tolerance=math.inf
+        )
+
+        await _concurrent_requests(limit, 10)
+        assert 2 < limit.limit < 10
+
+        await _concurrent_requests(limit, 200)
+        assert limit.limit == 10
+
+    async def test_idle_limit_doesnt_grow(self):
+        limit = AIMDLimit(
+            initial_limit=8, min_limit=1, max_limit=10, latency_tolerance=math.inf
+        )
+
+        # A single request at a time uses less than half of the limit
+        for _ in range(100):
+            await _request(limit)
+
+        assert limit.limit == 8
+
+    async def test_multiplicative_decrease_on_timeout(self):
+        limit = AIMDLimit(initial_limit=8, min_limit=3, max_limit=10)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await _request(limit, asyncio.TimeoutError())
+        assert limit.limit == 4
+
+        with pytest.raises(asyncio.TimeoutError):
+            await _request(limit, asyncio.TimeoutError())
+        assert limit.limit == 3
+
+    async def test_other_errors_dont_decrease(self):
+        limit = AIMDLimit(initial_limit=8, min_limit=1, max_limit=10)
+
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await _request(limit, aiohttp.ClientConnectionError())
+
+        assert limit.limit == 8
+        assert limit.in_flight == 0
+
+    async def test_in_flight_requests_decrease_once(self):
+        limit = AIMDLimit(initial_limit=8, min_limit=1, max_limit=10)
+        timeout = asyncio.Event()
+
+        async def request():
+            async with limit.request():
+                await timeout.wait()
+                raise asyncio.TimeoutError
+
+        tasks = [asyncio.create_task(request()) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        timeout.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert limit.limit == 4
+
+    async def test_decrease_on_rising_latency(self):
+        limit = AIMDLimit(initial_limit=8, min_limit=1, max_limit=10)
+        for _ in range(10):
+            await _request(limit)
+
+        # The average latency rises above twice the no-load latency
+        async with limit.request():
+            await asyncio.sleep(0.05)
+
+        assert limit.limit == 4
+
+    async def test_cancelled_waiter(self):
+        limit = AIMDLimit(initial_limit=1, min_limit=1, max_limit=1)
+        release = asyncio.Event()
+
+        async def request():
+            async with limit.request():
+                await release.wait()
+
+        running = asyncio.create_task(request())
+        cancelled = asyncio.create_task(request())
+        waiting = asyncio.create_task(request())
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        release.set()
+
+        await asyncio.wait_for(asyncio.gather(running, waiting), 1)
+        assert limit.in_flight == 0
+
+
+class TestConcurrencyLimiter:
+    def test_limits_per_endpoint_and_method_class(self):
+        limiter = ConcurrencyLimiter(
+            initial_limit=5,
+            min_limit=1,
+            max_limit=10,
+            method_classes={"trace_*": "trace"},
+        )
+
+        eth_limit = limiter.get_limit("http://node", "eth_getTransactionReceipt")
+        assert limiter.get_limit("http://node", "eth_getBlockByNumber") is eth_limit
+        assert limiter.get_limit("http://node", "trace_block") is not eth_limit
+        assert limiter.get_limit("http://archive", "eth_blockNumber") is not eth_limit
+        assert limiter.get_limits() == {
+            "http://node (default)": 5,
+            "http://node (trace)": 5,
+            "http://archive (default)": 5,
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from fakeredis import aioredis as fakeaioredis
+
+from app.db.redis import RedisManager
+from app.model.contract import TokenContractData
+from app.web3.contract_cache import ContractMetadataCache
+
+ADDRESS = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+
+
+@pytest.fixture
+def redis_manager() -> RedisManager:
+    redis_manager = RedisManager(redis_url="redis://localhost", topic="eth")
+    redis_manager.redis = fakeaioredis.FakeRedis(decode_responses=True)
+    return redis_manager
+
+
+@pytest.fixture
+def metadata_cache(redis_manager) -> ContractMetadataCache:
+    return ContractMetadataCache(redis_manager, refresh_interval=60)
+
+
+def _token_data(total_supply=1337, name="Tether USD") -> TokenContractData:
+    return TokenContractData(
+        address=ADDRESS,
+        symbol="USDT",
+        name=name,
+        decimals=6,
+        total_supply=total_supply,
+        token_category="erc20",
+    )
+
+
+async def _get(cache: ContractMetadataCache, fetch) -> TokenContractData:
+    return await cache.get(
+        "token", ADDRESS, TokenContractData, fetch, mutable_fields={"total_supply"}
+    )
+
+
+class TestContractMetadataCache:
+    async def test_fetched_once(self, metadata_cache):
+        """Test that cached metadata isn't fetched again"""
+        fetch = AsyncMock(return_value=_token_data())
+
+        assert await _get(metadata_cache, fetch) == _token_data()
+        assert await _get(metadata_cache, fetch) == _token_data()
+        fetch.assert_awaited_once()
+
+    async def test_shared_through_redis(self, metadata_cache, redis_manager):
+        """Test that a second cache (e.g. another process) reads the metadata from Redis"""
+        await _get(metadata_cache, AsyncMock(return_value=_token_data()))
+        other_cache = ContractMetadataCache(redis_manager, refresh_interval=60)
+        fetch = AsyncMock()
+
+        assert await _get(other_cache, fetch) == _token_data()
+        fetch.assert_not_awaited()
+
+    async def test_concurrent_lookups_deduplicated(self, metadata_cache):
+        """Test that concurrent lookups of the same contract fetch it only once"""
+
+        async def _slow_fetch():
+            await asyncio.sleep(0.01)
+            return _token_data()
+
+        fetch = AsyncMock(side_effect=_slow_fetch)
+
+        results = await asyncio.gather(*[_get(metadata_cache, fetch) for _ in range(5)])
+
+        assert results == [_token_data()] * 5
+        fetch.assert_awaited_once()
+        assert not metadata_cache._in_flight
+
+    async def test_stale_refreshes_mutable_fields_only(self, metadata_cache):
+        """Test that only mutable fields of stale metadata are updated"""
+        await _get(metadata_cache, AsyncMock(return_value=_token_data()))
+        # Make the entry stale
+        key = f"token:{ADDRESS.lower()}"
+        entry = metadata_cache._lru[key]
+        metadata_cache._lru[key] = entry._replace(fetched_at=time.time() - 120)
+        fetch = AsyncMock(return_value=_token_data(total_supply=42, name=None))
+
+        data = await _get(metadata_cache, fetch)
+
+        fetch.assert_awaited_once()
+        assert data.total_supply == 42
+        assert data.name == "Tether USD"
+
+    async def test_failed_fetch_not_cached(self, metadata_cache):
+        """Test that missing metadata (failed fetch) is fetched again next time"""
+        fetch = AsyncMock(return_value=None)
+
+        assert await _get(metadata_cache, fetch) is None
+        assert await _get(metadata_cache, fetch) is None
+        assert fetch.await_count == 2
+
+    async def test_lru_eviction(self, metadata_cache):
+        """Test that the least recently used contract is evicted from the in-process cache"""
+        metadata_cache.MAX_SIZE = 2
+        for address in ("0x01", "0x02", "0x03"):
+            await metadata_cache.get(
+                "token",
+                address,
+                TokenContractData,
+                AsyncMock(return_value=_token_data()),
+            )
+
+        assert list(metadata_cache._lru) == ["token:0x02", "token:0x03"]
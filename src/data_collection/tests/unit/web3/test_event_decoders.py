@@ -0,0 +1,152 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.types import LogReceipt
+
+from app.web3.transaction_events.decoders import (
+    compile_fast_decoder,
+    get_event_decoder,
+    web3_decoder,
+)
+
+CONTRACT_ABI = json.loads(
+    (Path(__file__).parents[3] / "etc" / "contract_abi.json").read_text()
+)
+# Events with only static arguments (all the mapped events)
+EVENT_ABIS = {
+    f"{abi_key}.{item['name']}": item
+    for abi_key, abi in CONTRACT_ABI.items()
+    for item in abi
+    if item["type"] == "event" and compile_fast_decoder(item) is not None
+}
+CODEC = Web3().codec
+
+
+def _random_value(rng: random.Random, abi_type: str):
+    if abi_type == "address":
+        # Mix of special (burn) addresses and random ones
+        return rng.choice(
+            [
+                "0x0000000000000000000000000000000000000000",
+                "0x000000000000000000000000000000000000dead",
+                "0x" + rng.randbytes(20).hex(),
+            ]
+        )
+    if abi_type == "bool":
+        return rng.random() < 0.5
+    if abi_type.startswith("uint"):
+        return rng.randrange(2 ** int(abi_type[4:] or 256))
+    if abi_type.startswith("int"):
+        bits = int(abi_type[3:] or 256)
+        return rng.randrange(-(2 ** (bits - 1)), 2 ** (bits - 1))
+    return rng.randbytes(int(abi_type[5:]))
+
+
+def _random_log(rng: random.Random, event_abi) -> LogReceipt:
+    topics = [HexBytes(event_abi_to_log_topic(event_abi))]
+    data_types, data_values = [], []
+    for arg in event_abi["inputs"]:
+        value = _random_value(rng, arg["type"])
+        if arg["indexed"]:
+            topics.append(HexBytes(encode([arg["type"]], [value])))
+        else:
+            data_types.append(arg["type"])
+            data_values.append(value)
+    return LogReceipt(
+        address=Web3.to_checksum_address("0x" + rng.randbytes(20).hex()),
+        topics=topics,
+        data=HexBytes(encode(data_types, data_values)),
+        logIndex=rng.randrange(1000),
+        transactionIndex=rng.randrange(1000),
+        transactionHash=HexBytes(rng.randbytes(32)),
+        blockHash=HexBytes(rng.randbytes(32)),
+        blockNumber=rng.randrange(20_000_000),
+    )
+
+
+def _assert_same_decoding(event_abi, log: LogReceipt):
+    fast_decoder = compile_fast_decoder(event_abi)
+    expected = web3_decoder(CODEC, event_abi)(log)
+    decoded = fast_decoder(log)
+    if expected is None:
+        assert decoded is None
+    else:
+        assert decoded == {**expected, "args": dict(expected["args"])}
+
+
+def test_fast_decoders_of_mapped_events():
+    assert {
+        "erc20.Transfer",
+        "erc20.Issue",
+        "erc20.Redeem",
+        "erc721.Transfer",
+        "UniSwapV2Factory.PairCreated",
+        "UniSwapV2Pair.Mint",
+        "UniSwapV2Pair.Burn",
+        "UniSwapV2Pair.Swap",
+    } <= EVENT_ABIS.keys()
+
+
+@pytest.mark.parametrize("event", sorted(EVENT_ABIS))
+def test_fast_decoder_matches_web3(event):
+    event_abi = EVENT_ABIS[event]
+    rng = random.Random(event)
+    for _ in range(50):
+        _assert_same_decoding(event_abi, _random_log(rng, event_abi))
+
+
+@pytest.mark.parametrize("event", sorted(EVENT_ABIS))
+def test_fast_decoder_matches_web3_invalid_logs(event):
+    event_abi = EVENT_ABIS[event]
+    log = _random_log(random.Random(event), event_abi)
+
+    # Missing / extra topic (e.g. ERC20 vs. ERC721 transfer)
+    _assert_same_decoding(event_abi, {**log, "topics": log["topics"][:-1]})
+    _assert_same_decoding(event_abi, {**log, "topics": log["topics"] + [HexBytes(32)]})
+    # Other event
+    _assert_same_decoding(
+        event_abi, {**log, "topics": [HexBytes(32)] + log["topics"][1:]}
+    )
+    # Truncated data
+    if log["data"]:
+        _assert_same_decoding(event_abi, {**log, "data": log["data"][:-1]})
+    # Hex string data
+    _assert_same_decoding(event_abi, {**log, "data": log["data"].hex()})
+
+
+def test_fast_decoder_invalid_address_padding():
+    event_abi = EVENT_ABIS["erc20.Transfer"]
+    log = _random_log(random.Random(0), event_abi)
+    log["topics"][1] = HexBytes(b"\x01" * 32)
+
+    assert compile_fast_decoder(event_abi)(log) is None
+    assert web3_decoder(CODEC, event_abi)(log) is None
+
+
+def test_fast_decoder_not_compiled_for_dynamic_arguments():
+    event_abi = {
+        "anonymous": False,
+        "inputs": [{"indexed": False, "name": "name", "type": "string"}],
+        "name": "NameChanged",
+        "type": "event",
+    }
+
+    assert compile_fast_decoder(event_abi) is None
+    # Falls back to the web3 decoder
+    log = LogReceipt(
+        address="0x000000000000000000000000000000000000aaaa",
+        topics=[HexBytes(event_abi_to_log_topic(event_abi))],
+        data=HexBytes(encode(["string"], ["name"])),
+        logIndex=0,
+        transactionIndex=0,
+        transactionHash=HexBytes(32),
+        blockHash=HexBytes(32),
+        blockNumber=0,
+    )
+    assert get_event_decoder(CODEC, event_abi)(log)["args"]["name"] == "name"
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import aiohttp
+import pytest
+
+from app.web3.concurrency import ConcurrencyLimiter
+from app.web3.load_balancer import NodeEndpoint, NodeLoadBalancer, RequestLatencyTracker
+from app.web3.timeouts import AdaptiveTimeouts, request_deadline
+
+
+class TestRequestLatencyTracker:
+    def test_first_latency_is_the_average(self):
+        tracker = RequestLatencyTracker(alpha=0.5)
+        assert tracker.average is None
+
+        tracker.add(2.0)
+        assert tracker.average == 2.0
+
+    def test_moving_average(self):
+        """Test that newer latencies are weighted by alpha"""
+        tracker = RequestLatencyTracker(alpha=0.5)
+        for latency in (2.0, 4.0, 0.0):
+            tracker.add(latency)
+
+        assert tracker.average == pytest.approx(1.5)
+
+
+def _load_balancer(*endpoints, **kwargs) -> NodeLoadBalancer:
+    """Load balancer of the given endpoints (url or (url, methods)) with mocked clients"""
+    load_balancer = NodeLoadBalancer(
+        dict(e if isinstance(e, tuple) else (e, None) for e in endpoints),
+        timeout=1,
+        **kwargs,
+    )
+    for endpoint in load_balancer.endpoints:
+        endpoint.client.make_request = AsyncMock(return_value={"result": endpoint.url})
+    return load_balancer
+
+
+def _endpoint(load_balancer: NodeLoadBalancer, url: str) -> NodeEndpoint:
+    return next(e for e in load_balancer.endpoints if e.url == url)
+
+
+class TestNodeLoadBalancer:
+    def test_requires_endpoints(self):
+        with pytest.raises(ValueError):
+            NodeLoadBalancer({}, timeout=1)
+
+    def test_routes_methods(self):
+        load_balancer = _load_balancer(
+            ("http://archive", ["trace_*", "eth_*"]),
+            ("http://node", ["eth_*"]),
+        )
+
+        for _ in range(10):
+            assert load_balancer.select_endpoint("trace_block").url == "http://archive"
+        assert {
+            load_balancer.select_endpoint("eth_getTransactionReceipt").url
+            for _ in range(50)
+        } == {"http://archive", "http://node"}
+        with pytest.raises(ValueError):
+            load_balancer.select_endpoint("debug_traceTransaction")
+
+    def test_selects_lowest_latency(self):
+        load_balancer = _load_balancer("http://fast", "http://slow")
+        _endpoint(load_balancer, "http://fast").latency_tracker.add(0.1)
+        _endpoint(load_balancer, "http://slow").latency_tracker.add(1.0)
+
+        assert load_balancer.select_endpoint("eth_blockNumber").url == "http://fast"
+
+    def test_selects_by_in_flight_requests(self):
+        load_balancer = _load_balancer("http://fast", "http://slow")
+        fast = _endpoint(load_balancer, "http://fast")
+        fast.latency_tracker.add(0.1)
+        _endpoint(load_balancer, "http://slow").latency_tracker.add(1.0)
+
+        # 0.1s * (10 + 1) > 1s * (0 + 1)
+        fast.in_flight = 10
+        assert load_balancer.select_endpoint("eth_blockNumber").url == "http://slow"
+
+    def test_tries_new_endpoints(self):
+        load_balancer = _load_balancer("http://known", "http://new")
+        _endpoint(load_balancer, "http://known").latency_tracker.add(0.1)
+
+        # Unknown latency is assumed to be the lowest known latency
+        assert {
+            load_balancer.select_endpoint("eth_blockNumber").url for _ in range(50)
+        } == {"http://known", "http://new"}
+
+    async def test_make_request(self):
+        load_balancer = _load_balancer("http://node")
+        endpoint = load_balancer.endpoints[0]
+
+        response = await load_balancer.make_request("eth_blockNumber", [])
+
+        assert response == {"result": "http://node"}
+        endpoint.client.make_request.assert_awaited_once_with(
+            "eth_blockNumber", [], None
+        )
+        assert endpoint.in_flight == 0
+
+    async def test_concurrency_limit(self):
+        limiter = ConcurrencyLimiter(initial_limit=1, min_limit=1, max_limit=1)
+        load_balancer = _load_balancer("http://node", concurrency_limiter=limiter)
+        endpoint = load_balancer.endpoints[0]
+        release = asyncio.Event()
+
+        async def make_request(*args):
+            await release.wait()
+            return {"result": 1}
+
+        endpoint.client.make_request.side_effect = make_request
+        requests = [
+            asyncio.create_task(load_balancer.make_request("eth_blockNumber", []))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.01)
+
+        # The waiting request counts as an unfinished request of the endpoint
+        assert endpoint.in_flight == 2
+        assert endpoint.client.make_request.await_count == 1
+        release.set()
+        await asyncio.gather(*requests)
+        assert endpoint.client.make_request.await_count == 2
+        assert endpoint.in_flight == 0
+        assert endpoint.latency_tracker.average is not None
+
+    async def test_latency_without_concurrency_limit_wait(self):
+        """Test that the latency and the timeout of a request don't include the wait for the limit"""
+        limiter = ConcurrencyLimiter(initial_limit=1, min_limit=1, max_limit=1)
+        timeouts = AdaptiveTimeouts(default_timeout=1, min_timeout=1, max_timeout=1)
+        latency_tracker = RequestLatencyTracker(alpha=1.0)
+        load_balancer = _load_balancer(
+            "http://node",
+            concurrency_limiter=limiter,
+            adaptive_timeouts=timeouts,
+            latency_tracker=latency_tracker,
+        )
+        client = load_balancer.endpoints[0].client
+        release = asyncio.Event()
+
+        async def make_request(method, params, timeout):
+            if method == "trace_block":
+                await release.wait()
+            return {"result": 1}
+
+        client.make_request.side_effect = make_request
+        # A request holds the limit
+        slow_request = asyncio.create_task(
+            load_balancer.make_request("trace_block", [])
+        )
+        await asyncio.sleep(0.01)
+        with request_deadline(0.5):
+            request = asyncio.create_task(
+                load_balancer.make_request("eth_blockNumber", [])
+            )
+            await asyncio.sleep(0.2)
+            release.set()
+            await asyncio.gather(slow_request, request)
+
+        latency = timeouts._latencies["eth_blockNumber"].percentile(1)
+        assert latency < 0.1
+        assert latency_tracker.average == latency
+        # The timeout is cut by the remaining time after the wait
+        timeout = client.make_request.await_args_list[1].args[2]
+        assert timeout < 0.31
+
+    async def test_ejects_failing_endpoint(self):
+        load_balancer = _load_balancer("http://failing", "http://healthy")
+        failing = _endpoint(load_balancer, "http://failing")
+        failing.client.make_request.side_effect = asyncio.TimeoutError
+        # Route all the requests to the failing endpoint until it's ejected
+        failing.latency_tracker.add(0.0)
+        _endpoint(load_balancer, "http://healthy").latency_tracker.add(10.0)
+
+        for _ in range(NodeEndpoint.MAX_CONSECUTIVE_FAILURES):
+            with pytest.raises(asyncio.TimeoutError):
+                await load_balancer.make_request("eth_blockNumber", [])
+
+        assert failing.in_flight == 0
+        assert failing.is_ejected(time.monotonic())
+        for _ in range(10):
+            response = await load_balancer.make_request("eth_blockNumber", [])
+            assert response == {"result": "http://healthy"}
+
+    async def test_readmits_ejected_endpoint(self):
+        load_balancer = _load_balancer("http://node", "http://other")
+        endpoint = _endpoint(load_balancer, "http://node")
+        endpoint.client.make_request.side_effect = aiohttp.ClientConnectionError
+        _endpoint(load_balancer, "http://other").latency_tracker.add(10.0)
+        for _ in range(NodeEndpoint.MAX_CONSECUTIVE_FAILURES):
+            endpoint.latency_tracker.average = 0.0
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await load_balancer.make_request("eth_blockNumber", [])
+
+        # Ejection time ended, but the endpoint fails again
+        endpoint.ejected_until = 0.0
+        endpoint.latency_tracker.average = 0.0
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await load_balancer.make_request("eth_blockNumber", [])
+        # Ejected for twice as long
+        assert endpoint.ejected_until - time.monotonic() == pytest.approx(
+            2 * NodeEndpoint.EJECTION_TIME, abs=1
+        )
+
+        # Ejection time ended, the endpoint recovered
+        endpoint.ejected_until = 0.0
+        endpoint.latency_tracker.average = 0.0
+        endpoint.client.make_request.side_effect = None
+        await load_balancer.make_request("eth_blockNumber", [])
+        assert endpoint.consecutive_failures == 0
+
+    def test_all_endpoints_ejected(self):
+        load_balancer = _load_balancer("http://first", "http://second")
+        now = time.monotonic()
+        _endpoint(load_balancer, "http://first").ejected_until = now + 20
+        _endpoint(load_balancer, "http://second").ejected_until = now + 10
+
+        assert load_balancer.select_endpoint("eth_blockNumber").url == "http://second"
+
+    async def test_json_rpc_errors_are_not_failures(self):
+        load_balancer = _load_balancer("http://node")
+        endpoint = load_balancer.endpoints[0]
+        endpoint.client.make_request.return_value = {
+            "error": {"code": -32000, "message": "execution reverted"}
+        }
+
+        for _ in range(NodeEndpoint.MAX_CONSECUTIVE_FAILURES):
+            await load_balancer.make_request("eth_call", [])
+
+        assert endpoint.consecutive_failures == 0
@@ -0,0 +1,158 @@
+from typing import Any, Dict, List
+
+import pytest
+from web3 import AsyncWeb3
+from web3.providers.async_base import AsyncBaseProvider
+
+from app.model.contract import ContractCategory
+from app.web3.multicall import MULTICALL3_ADDRESS, ContractCall, Multicall
+from app.web3.parser import ContractParser
+
+TOKEN_ADDRESS = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+
+
+class FakeEthCallProvider(AsyncBaseProvider):
+    """Answer `eth_call`s with the results of functions indexed by (address, selector)"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.w3 = AsyncWeb3(self)
+        self.results: Dict[tuple, Any] = dict()
+        self.multicall = True
+        self.requests: List[dict] = []
+
+    def _call(self, to: str, data: str):
+        return self.results.get((to.lower(), data[:10]))
+
+    async def make_request(self, method, params):
+        if method == "eth_chainId":
+            # Requested by the web3 validation middleware
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+        if method == "eth_getCode":
+            # Requested by web3 to explain an empty eth_call result
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x"}
+        assert method == "eth_call"
+        tx, _ = params
+        self.requests.append(tx)
+        if tx["to"].lower() == MULTICALL3_ADDRESS.lower():
+            if not self.multicall:
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x"}
+            (calls,) = self.w3.codec.decode(
+                ["(address,bool,bytes)[]"], bytes.fromhex(tx["data"][10:])
+            )
+            results = [
+                (result is not None, result or b"")
+                for result in [
+                    self._call(to, "0x" + data.hex()) for to, _, data in calls
+                ]
+            ]
+            encoded = self.w3.codec.encode(["(bool,bytes)[]"], [results])
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x" + encoded.hex()}
+
+        if (result := self._call(tx["to"], tx["data"])) is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "error": {"code": -32000, "message": "reverted"},
+            }
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x" + result.hex()}
+
+
+@pytest.fixture
+def provider() -> FakeEthCallProvider:
+    return FakeEthCallProvider()
+
+
+@pytest.fixture
+def w3(provider) -> AsyncWeb3:
+    return provider.w3
+
+
+def _token_results(w3: AsyncWeb3, token) -> Dict[tuple, Any]:
+    address = token.address.lower()
+    encode = w3.codec.encode
+    return {
+        (address, token.encodeABI("symbol")): encode(["string"], ["USDT"]),
+        (address, token.encodeABI("name")): encode(["string"], ["Tether USD"]),
+        (address, token.encodeABI("totalSupply")): encode(["uint256"], [1337]),
+        # decimals() reverts
+    }
+
+
+class TestMulticall:
+    @pytest.mark.parametrize("multicall_deployed", [True, False])
+    async def test_call_failure_tolerant(
+        self, w3, provider, contract_abi, multicall_deployed
+    ):
+        """Test that the calls are aggregated and a failed call doesn't fail the others"""
+        token = w3.eth.contract(address=TOKEN_ADDRESS, abi=contract_abi.erc20)
+        provider.results = _token_results(w3, token)
+        provider.multicall = multicall_deployed
+        multicall = Multicall(w3)
+
+        results = await multicall.call(
+            [
+                ContractCall(token, "symbol"),
+                ContractCall(token, "decimals"),
+                ContractCall(token, "totalSupply"),
+            ],
+            block_identifier=17000000,
+        )
+
+        assert results == ["USDT", None, 1337]
+        # Single eth_call if the Multicall3 contract is deployed
+        assert len(provider.requests) == (1 if multicall_deployed else 4)
+
+    async def test_calls_split_into_chunks(self, w3, provider, contract_abi):
+        """Test that more than MAX_CALLS_PER_REQUEST calls are split into multiple eth_calls"""
+        token = w3.eth.contract(address=TOKEN_ADDRESS, abi=contract_abi.erc20)
+        provider.results = _token_results(w3, token)
+        multicall = Multicall(w3)
+        multicall.MAX_CALLS_PER_REQUEST = 2
+
+        results = await multicall.call([ContractCall(token, "symbol")] * 5)
+
+        assert results == ["USDT"] * 5
+        assert len(provider.requests) == 3
+
+    async def test_no_calls(self, w3):
+        assert await Multicall(w3).call([]) == []
+
+
+class TestContractParserMulticall:
+    async def test_get_token_contract_data(self, w3, provider, contract_abi):
+        """Test that token contract data is read in a single eth_call, missing values are None"""
+        parser = ContractParser(w3, contracts=[], contract_abi=contract_abi)
+        token = parser.get_contract(TOKEN_ADDRESS, ContractCategory.ERC20)
+        provider.results = _token_results(w3, token)
+
+        data = await parser.get_token_contract_data(token, ContractCategory.ERC20)
+
+        assert data.symbol == "USDT"
+        assert data.name == "Tether USD"
+        assert data.decimals is None
+        assert data.total_supply == 1337
+        assert len(provider.requests) == 1
+
+    async def test_get_pair_contract_data(self, w3, provider, contract_abi):
+        """Test that the pair reserves are read from getReserves"""
+        parser = ContractParser(w3, contracts=[], contract_abi=contract_abi)
+        pair = parser.get_contract(TOKEN_ADDRESS, ContractCategory.UNI_SWAP_V2_PAIR)
+        token0, token1 = "0x" + "11" * 20, "0x" + "22" * 20
+        address, encode = pair.address.lower(), w3.codec.encode
+        provider.results = {
+            (address, pair.encodeABI("token0")): encode(["address"], [token0]),
+            (address, pair.encodeABI("token1")): encode(["address"], [token1]),
+            (address, pair.encodeABI("getReserves")): encode(
+                ["uint112", "uint112", "uint32"], [10, 20, 1337]
+            ),
+        }
+
+        data = await parser.get_pair_contract_data(
+            pair, ContractCategory.UNI_SWAP_V2_PAIR
+        )
+
+        assert data.token0.lower() == token0
+        assert data.token1.lower() == token1
+        assert (data.reserve0, data.reserve1) == (10, 20)
+        assert data.factory is None
@@ -0,0 +1,129 @@
+from eth_hash.auto import keccak
+from hexbytes import HexBytes
+
+from app.web3.relevance_filter import (
+    BlockRelevanceFilter,
+    bloom_contains,
+    contract_creation_address,
+    event_topics,
+)
+
+TRANSFER_TOPIC = keccak(b"Transfer(address,address,uint256)")
+SWAP_TOPIC = keccak(b"Swap(address,uint256,uint256,uint256,uint256,address)")
+OTHER_ADDRESS = "0x000000000000000000000000000000000000AAAA"
+
+
+def _bloom(*items: bytes) -> str:
+    """Create a 256 byte logsBloom (hex) containing the given items"""
+    bloom = 0
+    for item in items:
+        item_hash = keccak(item)
+        for i in range(0, 6, 2):
+            bloom |= 1 << (int.from_bytes(item_hash[i : i + 2], "big") & 2047)
+    return "0x" + bloom.to_bytes(256, "big").hex()
+
+
+def _tx(tx_hash: str, to_address=None, from_address=OTHER_ADDRESS, nonce=0) -> dict:
+    return {
+        "hash": tx_hash,
+        "to": to_address,
+        "from": from_address,
+        "nonce": hex(nonce),
+    }
+
+
+class TestBloom:
+    def test_bloom_contains_added_items(self):
+        """Test that items added to a bloom are found in it"""
+        bloom = int(_bloom(HexBytes(OTHER_ADDRESS), TRANSFER_TOPIC), 16)
+
+        assert bloom_contains(bloom, HexBytes(OTHER_ADDRESS))
+        assert bloom_contains(bloom, TRANSFER_TOPIC)
+        assert not bloom_contains(bloom, SWAP_TOPIC)
+
+    def test_event_topics(self):
+        """Test that the topics of all events resulting in a ContractEvent are returned"""
+        assert event_topics(["TransferFungibleEvent"]) == {TRANSFER_TOPIC}
+        assert event_topics(["MintFungibleEvent"]) == {
+            TRANSFER_TOPIC,
+            keccak(b"Issue(uint256)"),
+        }
+        assert event_topics([]) == set()
+
+    def test_contract_creation_address(self):
+        """Test the address of a contract created with the CREATE opcode"""
+        assert (
+            contract_creation_address("0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 0)
+            == "0xcd234a471b72ba2f1ccf0a70fcaba648a5eecd8d"
+        )
+
+
+class TestBlockRelevanceFilter:
+    def test_to_address_relevant(self, contract_config_usdt):
+        """Test that only transactions to a contract in the config are sent if the bloom doesn't match"""
+        relevance_filter = BlockRelevanceFilter([contract_config_usdt])
+        block = {
+            "logsBloom": _bloom(HexBytes(OTHER_ADDRESS), TRANSFER_TOPIC),
+            "transactions": [
+                _tx("0x01", to_address=contract_config_usdt.address),
+                _tx("0x02", to_address=OTHER_ADDRESS),
+            ],
+        }
+
+        assert relevance_filter.filter_transactions(block) == ["0x01"]
+
+    def test_contract_creation_relevant(self, contract_config_usdt):
+        """Test that a transaction creating a contract in the config is sent"""
+        config_address = "0xcd234a471b72ba2f1ccf0a70fcaba648a5eecd8d"
+        contract_config_usdt.address = config_address
+        relevance_filter = BlockRelevanceFilter([contract_config_usdt])
+        block = {
+            "logsBloom": "0x" + bytes(256).hex(),
+            "transactions": [
+                _tx("0x01", from_address="0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0"),
+                _tx("0x02", from_address=OTHER_ADDRESS),
+            ],
+        }
+
+        assert relevance_filter.filter_transactions(block) == ["0x01"]
+
+    def test_bloom_match_sends_whole_block(self, contract_config_usdt):
+        """Test that all transactions are sent if the bloom contains a contract event"""
+        relevance_filter = BlockRelevanceFilter([contract_config_usdt])
+        block = {
+            "logsBloom": _bloom(HexBytes(contract_config_usdt.address), TRANSFER_TOPIC),
+            "transactions": [
+                _tx("0x01", to_address=OTHER_ADDRESS),
+                _tx("0x02", to_address=OTHER_ADDRESS),
+            ],
+        }
+
+        assert relevance_filter.filter_transactions(block) == ["0x01", "0x02"]
+
+    def test_bloom_address_without_event_not_relevant(
+        self, contract_config_pair_usdc_weth
+    ):
+        """Test that a contract address in the bloom without any of its events doesn't match"""
+        relevance_filter = BlockRelevanceFilter([contract_config_pair_usdc_weth])
+        block = {
+            "logsBloom": _bloom(
+                HexBytes(contract_config_pair_usdc_weth.address), TRANSFER_TOPIC
+            ),
+            "transactions": [_tx("0x01", to_address=OTHER_ADDRESS)],
+        }
+
+        assert relevance_filter.filter_transactions(block) == []
+        block["logsBloom"] = _bloom(
+            HexBytes(contract_config_pair_usdc_weth.address), SWAP_TOPIC
+        )
+        assert relevance_filter.filter_transactions(block) == ["0x01"]
+
+    def test_contract_without_events_ignores_bloom(
+        self, contract_config_uniswapfactory
+    ):
+        """Test that contracts without events are only matched by to addresses"""
+        relevance_filter = BlockRelevanceFilter([contract_config_uniswapfactory])
+
+        assert not relevance_filter.is_bloom_relevant(
+            _bloom(HexBytes(contract_config_uniswapfactory.address), TRANSFER_TOPIC)
+        )
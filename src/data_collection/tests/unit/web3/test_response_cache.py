@@ -0,0 +1,85 @@
+from secrets import token_hex
+
+import pytest
+
+from app.web3.response_cache import ResponseCache
+
+TX_HASH = "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822"
+RECEIPT = {"transactionHash": TX_HASH, "blockNumber": "0x64", "logs": []}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(
+        str(tmp_path / "cache.sqlite"), max_size=2**20, finality_depth=10
+    )
+    yield cache
+    cache.close()
+
+
+class TestResponseCache:
+    async def test_final_results_are_cached(self, cache):
+        params = [TX_HASH]
+        assert await cache.get("eth_getTransactionReceipt", params) is None
+
+        assert await cache.put("eth_getTransactionReceipt", params, RECEIPT, 110)
+
+        assert await cache.get("eth_getTransactionReceipt", params) == RECEIPT
+        assert await cache.get("eth_getTransactionByHash", params) is None
+
+    async def test_recent_results_arent_cached(self, cache):
+        assert not await cache.put("eth_getTransactionReceipt", [TX_HASH], RECEIPT, 109)
+        assert await cache.get("eth_getTransactionReceipt", [TX_HASH]) is None
+
+    @pytest.mark.parametrize(
+        "method,params,result,cached",
+        [
+            ("eth_getBlockByNumber", ["0x64", False], {"number": "0x64"}, True),
+            ("eth_getBlockByNumber", ["latest", False], {"number": "0x64"}, False),
+            ("eth_getBlockByHash", ["0x01", False], {"number": "0x64"}, True),
+            ("trace_block", [100], [], True),
+            ("trace_block", ["0x6e"], [], False),
+            ("eth_blockNumber", [], "0x64", False),
+            ("eth_call", [{}, "0x64"], "0x", False),
+        ],
+    )
+    async def test_cacheable_requests(self, cache, method, params, result, cached):
+        assert await cache.put(method, params, result, 110) == cached
+        assert (await cache.get(method, params) is not None) == cached
+
+    async def test_traces_of_cached_receipts(self, cache):
+        params = [TX_HASH, ["trace"]]
+        trace = {"trace": []}
+        assert not await cache.put("trace_replayTransaction", params, trace, 110)
+
+        await cache.put("eth_getTransactionReceipt", [TX_HASH], RECEIPT, 110)
+
+        assert await cache.put("trace_replayTransaction", params, trace, 110)
+        assert await cache.get("trace_replayTransaction", params) == trace
+
+    async def test_persistent(self, cache):
+        await cache.put("eth_getTransactionReceipt", [TX_HASH], RECEIPT, 110)
+        cache.close()
+
+        cache = ResponseCache(cache.path, max_size=2**20, finality_depth=10)
+        assert await cache.get("eth_getTransactionReceipt", [TX_HASH]) == RECEIPT
+        cache.close()
+
+    async def test_evicts_least_recently_used(self, tmp_path):
+        cache = ResponseCache(
+            str(tmp_path / "cache.sqlite"), max_size=2000, finality_depth=0
+        )
+        # Results of ~600 bytes (compressed)
+        for block in range(3):
+            await cache.put("trace_block", [block], [block, token_hex(550)], 100)
+        # The first result is used again
+        cache.ACCESS_UPDATE_INTERVAL = -1
+        assert await cache.get("trace_block", [0]) is not None
+
+        await cache.put("trace_block", [3], [3, token_hex(550)], 100)
+
+        assert cache._size <= 1800
+        assert await cache.get("trace_block", [0]) is not None
+        assert await cache.get("trace_block", [1]) is None
+        assert await cache.get("trace_block", [3]) is not None
+        cache.close()
@@ -0,0 +1,258 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import aiohttp
+import pytest
+
+from app.web3.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    RetryBudget,
+    RetryController,
+    RetryPolicy,
+    is_retryable_error,
+)
+from app.web3.timeouts import request_deadline
+
+POLICY = RetryPolicy(attempts=3, base_delay=1, max_delay=3)
+
+
+@pytest.fixture
+def no_sleep():
+    """Don't wait for the backoff delays"""
+    with patch("app.web3.retry.asyncio.sleep", new=AsyncMock()) as sleep:
+        yield sleep
+
+
+def _response_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(request_info=None, history=(), status=status)
+
+
+@pytest.mark.parametrize(
+    "error,retryable",
+    [
+        (asyncio.TimeoutError(), True),
+        (aiohttp.ClientConnectionError(), True),
+        (aiohttp.ServerDisconnectedError(), True),
+        (_response_error(503), True),
+        (_response_error(429), True),
+        (_response_error(400), False),
+        (ValueError(), False),
+    ],
+)
+def test_is_retryable_error(error, retryable):
+    assert is_retryable_error(error) == retryable
+
+
+class TestRetryPolicy:
+    def test_backoff_full_jitter(self):
+        delays = [POLICY.backoff(0) for _ in range(100)]
+
+        assert all(0 <= delay <= 1 for delay in delays)
+        # Not the same delay for all the requests
+        assert len(set(delays)) > 1
+
+    def test_backoff_exponential_capped(self):
+        assert max(POLICY.backoff(1) for _ in range(100)) <= 2
+        assert max(POLICY.backoff(10) for _ in range(100)) <= 3
+
+
+class TestRetryBudget:
+    def test_exhausted(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+
+        assert budget.try_acquire()
+        assert budget.try_acquire()
+        assert not budget.try_acquire()
+
+        # Two requests allow one retry
+        budget.record_request()
+        assert not budget.try_acquire()
+        budget.record_request()
+        assert budget.try_acquire()
+
+    def test_min_retries_per_second(self):
+        budget = RetryBudget(ratio=0, min_per_second=1, max_tokens=1)
+        with patch("app.web3.retry.time.monotonic", return_value=100.0):
+            budget._updated_at = 100.0
+            assert budget.try_acquire()
+            assert not budget.try_acquire()
+        with patch("app.web3.retry.time.monotonic", return_value=101.0):
+            assert budget.try_acquire()
+
+
+class TestCircuitBreaker:
+    def _open(self, circuit_breaker: CircuitBreaker):
+        for _ in range(circuit_breaker.failure_threshold):
+            circuit_breaker.acquire()
+            circuit_breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CircuitState.CLOSED
+
+        circuit_breaker.record_failure()
+
+        assert circuit_breaker.state == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError):
+            circuit_breaker.acquire()
+
+    def test_single_probe_after_reset_timeout(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        self._open(circuit_breaker)
+
+        circuit_breaker._opened_at -= 10
+        assert circuit_breaker.acquire() is True
+        assert circuit_breaker.state == CircuitState.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            circuit_breaker.acquire()
+
+        circuit_breaker.record_success()
+        assert circuit_breaker.state == CircuitState.CLOSED
+        assert circuit_breaker.acquire() is False
+
+    def test_failed_probe_opens_circuit(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+        self._open(circuit_breaker)
+        circuit_breaker._opened_at -= 10
+
+        circuit_breaker.acquire()
+        circuit_breaker.record_failure()
+
+        assert circuit_breaker.state == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError):
+            circuit_breaker.acquire()
+
+    def test_released_probe(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        self._open(circuit_breaker)
+        circuit_breaker._opened_at -= 10
+        circuit_breaker.acquire()
+
+        circuit_breaker.release_probe()
+
+        assert circuit_breaker.acquire() is True
+
+    async def test_wait_until_closed(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.5)
+        self._open(circuit_breaker)
+
+        waiter = asyncio.create_task(circuit_breaker.wait())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        circuit_breaker.record_success()
+
+        # Resumed within 10% of the reset timeout
+        await asyncio.wait_for(waiter, 0.1)
+
+    async def test_wait_until_probe(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        self._open(circuit_breaker)
+
+        await asyncio.wait_for(circuit_breaker.wait(), 1)
+
+        assert circuit_breaker.acquire() is True
+
+
+@pytest.mark.usefixtures("no_sleep")
+class TestRetryController:
+    async def test_retries_failed_request(self, no_sleep):
+        controller = RetryController(POLICY)
+        make_request = AsyncMock(
+            side_effect=[asyncio.TimeoutError, aiohttp.ClientConnectionError, "ok"]
+        )
+
+        response = await controller.request(make_request, "eth_blockNumber", [])
+
+        assert response == "ok"
+        assert make_request.await_count == 3
+        assert no_sleep.await_count == 2
+
+    async def test_gives_up_after_attempts(self):
+        controller = RetryController(POLICY)
+        make_request = AsyncMock(side_effect=asyncio.TimeoutError)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.request(make_request, "eth_blockNumber", [])
+
+        assert make_request.await_count == 3
+
+    async def test_does_not_retry_other_errors(self):
+        controller = RetryController(POLICY)
+        make_request = AsyncMock(side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            await controller.request(make_request, "eth_blockNumber", [])
+
+        make_request.assert_awaited_once()
+
+    async def test_method_policies(self):
+        trace_policy = RetryPolicy(attempts=1, base_delay=1, max_delay=1)
+        controller = RetryController(POLICY, method_policies={"trace_*": trace_policy})
+        make_request = AsyncMock(side_effect=asyncio.TimeoutError)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.request(make_request, "trace_block", [])
+
+        make_request.assert_awaited_once()
+        assert controller.get_policy("eth_getTransactionReceipt") == POLICY
+
+    async def test_retry_budget(self):
+        controller = RetryController(
+            POLICY, budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=1)
+        )
+        make_request = AsyncMock(side_effect=asyncio.TimeoutError)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.request(make_request, "eth_blockNumber", [])
+
+        # A single retry within the budget
+        assert make_request.await_count == 2
+
+    async def test_circuit_breaker_fails_fast(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        controller = RetryController(POLICY, circuit_breaker=circuit_breaker)
+        make_request = AsyncMock(side_effect=asyncio.TimeoutError)
+
+        with pytest.raises(CircuitOpenError):
+            await controller.request(make_request, "eth_blockNumber", [])
+        assert make_request.await_count == 2
+
+        with pytest.raises(CircuitOpenError):
+            await controller.request(make_request, "eth_blockNumber", [])
+        assert make_request.await_count == 2
+
+    async def test_other_errors_dont_open_circuit(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        controller = RetryController(POLICY, circuit_breaker=circuit_breaker)
+        make_request = AsyncMock(side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            await controller.request(make_request, "eth_blockNumber", [])
+
+        assert circuit_breaker.state == CircuitState.CLOSED
+
+    async def test_middleware(self):
+        controller = RetryController(POLICY)
+        make_request = AsyncMock(side_effect=[asyncio.TimeoutError, "ok"])
+
+        middleware = await controller.middleware()(make_request, None)
+
+        assert await middleware("eth_blockNumber", []) == "ok"
+
+    async def test_not_retried_after_deadline(self, no_sleep):
+        controller = RetryController(POLICY)
+        make_request = AsyncMock(side_effect=asyncio.TimeoutError)
+
+        with request_deadline(0):
+            with pytest.raises(asyncio.TimeoutError):
+                await controller.request(make_request, "eth_blockNumber", [])
+
+        make_request.assert_awaited_once()
+        no_sleep.assert_not_awaited()
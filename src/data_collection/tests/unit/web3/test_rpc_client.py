@@ -0,0 +1,226 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientResponseError, web
+from aiohttp.test_utils import TestServer
+from web3.exceptions import BlockNotFound, TransactionNotFound
+
+from app.web3.node_connector import NodeConnector
+from app.web3.response_cache import ResponseCache
+from app.web3.rpc_client import JsonRpcClient, JsonRpcError
+from app.web3.timeouts import DeadlineExceededError, request_deadline
+
+TX_HASH = "0xa76bef720a7093e99ce5532988623aaf62b490ecba52d1a94cb6e118ccb56822"
+ADDRESS = "0xdac17f958d2ee523a2206206994597c13d831ec7"
+
+RESULTS = {
+    "eth_blockNumber": "0x539",
+    "eth_getTransactionByHash": {
+        "hash": TX_HASH,
+        "blockNumber": "0x539",
+        "from": ADDRESS,
+        "to": ADDRESS,
+        "value": "0x2a",
+        "gasPrice": "0x87",
+        "gas": "0xad87",
+        "input": "0x",
+    },
+    "eth_getTransactionReceipt": {
+        "transactionHash": TX_HASH,
+        "blockNumber": "0x539",
+        "gasUsed": "0x5208",
+        "to": ADDRESS,
+        "type": "0x2",
+        "contractAddress": None,
+        "logs": [],
+    },
+    "trace_block": [
+        {"type": "call", "action": {"value": "0x2a"}},
+        {"type": "reward", "action": {"value": "0x1bc16d674ec80000"}},
+    ],
+}
+
+
+@pytest_asyncio.fixture
+async def node():
+    """JSON-RPC node answering with `RESULTS`, records the received requests"""
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        payload = await request.json()
+        requests.append((request.headers, payload))
+        if payload["method"] == "http_error":
+            return web.Response(status=503)
+        if payload["method"] == "slow":
+            await asyncio.sleep(1)
+        if payload["params"] == ["missing"]:
+            result = None
+        elif payload["method"] not in RESULTS:
+            return web.json_response(
+                {
+                    "jsonrpc": "2.0",
+                    "id": payload["id"],
+                    "error": {"code": -32601, "message": "Method not found"},
+                }
+            )
+        else:
+            result = RESULTS[payload["method"]]
+        return web.json_response(
+            {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+        )
+
+    app = web.Application()
+    app.router.add_post("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    server.requests = requests
+    yield server
+    await server.close()
+
+
+@pytest_asyncio.fixture
+async def rpc_client(node):
+    client = JsonRpcClient(str(node.make_url("/")), timeout=5, headers={"X-Test": "1"})
+    yield client
+    await client.close()
+
+
+@pytest_asyncio.fixture
+async def node_connector(node):
+    node_connector = NodeConnector(
+        str(node.make_url("/")), timeout=5, retry_limit=1, retry_delay=0
+    )
+    yield node_connector
+    await node_connector.disconnect()
+
+
+class TestJsonRpcClient:
+    async def test_make_request(self, node, rpc_client):
+        response = await rpc_client.make_request("eth_blockNumber", [])
+
+        assert response["result"] == "0x539"
+        headers, payload = node.requests[0]
+        assert payload["jsonrpc"] == "2.0"
+        assert payload["method"] == "eth_blockNumber"
+        assert payload["params"] == []
+        assert headers["Content-Type"] == "application/json"
+        assert headers["X-Test"] == "1"
+
+    async def test_unique_request_ids(self, node, rpc_client):
+        await rpc_client.make_request("eth_blockNumber", [])
+        await rpc_client.make_request("eth_blockNumber", [])
+
+        assert len({payload["id"] for _, payload in node.requests}) == 2
+
+    async def test_error_response(self, rpc_client):
+        response = await rpc_client.make_request("eth_unknown", [])
+
+        assert response["error"]["code"] == -32601
+
+    async def test_http_error(self, rpc_client):
+        with pytest.raises(ClientResponseError):
+            await rpc_client.make_request("http_error", [])
+
+    async def test_request_timeout(self, rpc_client):
+        with pytest.raises(asyncio.TimeoutError):
+            await rpc_client.make_request("slow", [], timeout=0.05)
+
+    async def test_close(self, rpc_client):
+        await rpc_client.make_request("eth_blockNumber", [])
+        await rpc_client.close()
+
+        # A new session is created after closing
+        response = await rpc_client.make_request("eth_blockNumber", [])
+        assert response["result"] == "0x539"
+
+
+class TestNodeConnectorRawRequests:
+    async def test_get_latest_block_number(self, node_connector):
+        assert await node_connector.get_latest_block_number() == 1337
+
+    async def test_get_transaction_data(self, node_connector):
+        tx_data, tx_data_dict = await node_connector.get_transaction_data(TX_HASH)
+
+        assert tx_data_dict == RESULTS["eth_getTransactionByHash"]
+        assert tx_data.transaction_hash == TX_HASH
+        assert tx_data.block_number == 1337
+        assert tx_data.from_address == "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+        assert tx_data.value == 42.0
+
+    async def test_get_transaction_not_found(self, node_connector):
+        with pytest.raises(TransactionNotFound):
+            await node_connector.get_transaction_data("missing")
+
+    async def test_get_transaction_receipt_data(self, node_connector):
+        (
+            receipt_data,
+            receipt_dict,
+        ) = await node_connector.get_transaction_receipt_data(TX_HASH)
+
+        assert receipt_dict == RESULTS["eth_getTransactionReceipt"]
+        assert receipt_data.gas_used == 21000.0
+        assert receipt_data.transaction_type == "2"
+        assert receipt_data.logs == []
+
+    async def test_get_block_reward(self, node_connector):
+        assert await node_connector.get_block_reward("0x539") == 2 * 10**18
+
+    async def test_get_block_reward_not_found(self, node_connector):
+        """Test that a block without traces (e.g. pruned) raises `BlockNotFound`"""
+        with pytest.raises(BlockNotFound):
+            await node_connector.get_block_reward("missing")
+
+    async def test_error_response(self, node_connector):
+        with pytest.raises(JsonRpcError) as error:
+            await node_connector._request("eth_unknown", [])
+
+        assert error.value.code == -32601
+        assert error.value.message == "Method not found"
+
+    async def test_tracks_latency(self, node_connector):
+        assert node_connector.latency_tracker.average is None
+
+        await node_connector.get_latest_block_number()
+
+        assert node_connector.latency_tracker.average is not None
+
+    async def test_adaptive_timeout(self, node_connector):
+        node_connector.timeouts.min_samples = 1
+        node_connector.timeouts.min_timeout = 0.05
+        # Previous requests of the method were fast
+        node_connector.timeouts.add("slow", 0.01)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await node_connector._request("slow", [])
+
+        # The timed out request counts with its timeout as the latency
+        assert node_connector.timeouts._latencies["slow"].percentile(1) == 0.05
+
+    async def test_deadline_exceeded(self, node, node_connector):
+        with request_deadline(0):
+            with pytest.raises(DeadlineExceededError):
+                await node_connector.get_latest_block_number()
+
+        assert node.requests == []
+
+    async def test_request_cut_by_deadline(self, node_connector):
+        with request_deadline(0.05):
+            with pytest.raises(asyncio.TimeoutError):
+                await node_connector._request("slow", [])
+
+        # The timeout caused by the deadline isn't a latency of the method
+        assert "slow" not in node_connector.timeouts._latencies
+
+    async def test_response_cache(self, node, node_connector, tmp_path):
+        node_connector.response_cache = ResponseCache(
+            str(tmp_path / "cache.sqlite"), max_size=2**20, finality_depth=0
+        )
+
+        await node_connector.get_transaction_receipt_data(TX_HASH)
+        receipt_data, _ = await node_connector.get_transaction_receipt_data(TX_HASH)
+
+        assert receipt_data.gas_used == 21000.0
+        methods = [payload["method"] for _, payload in node.requests]
+        # The second receipt is read from the cache
+        assert methods == ["eth_getTransactionReceipt", "eth_blockNumber"]
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.web3.timeouts import (
+    AdaptiveTimeouts,
+    LatencyWindow,
+    remaining_time,
+    request_deadline,
+)
+
+
+class TestRequestDeadline:
+    def test_no_deadline(self):
+        assert remaining_time() is None
+        with request_deadline(None):
+            assert remaining_time() is None
+
+    def test_remaining_time(self):
+        with request_deadline(10):
+            assert 9 < remaining_time() <= 10
+        assert remaining_time() is None
+
+    def test_nested_deadline_cant_extend(self):
+        with request_deadline(1):
+            with request_deadline(10):
+                assert remaining_time() <= 1
+            with request_deadline(0.5):
+                assert remaining_time() <= 0.5
+
+    async def test_propagates_to_subtasks(self):
+        async def get_remaining_time():
+            return remaining_time()
+
+        with request_deadline(10):
+            remaining = await asyncio.create_task(get_remaining_time())
+
+        assert 9 < remaining <= 10
+
+
+class TestLatencyWindow:
+    def test_percentile(self):
+        window = LatencyWindow(size=100)
+        assert window.percentile(0.99) is None
+
+        for latency in range(1, 101):
+            window.add(latency)
+
+        assert window.percentile(0.5) == 50
+        assert window.percentile(0.99) == 99
+        assert window.percentile(1) == 100
+
+    def test_keeps_latest_latencies(self):
+        window = LatencyWindow(size=10)
+        for latency in range(100):
+            window.add(latency)
+
+        assert len(window) == 10
+        assert window.percentile(0) == 90
+
+
+class TestAdaptiveTimeouts:
+    @pytest.fixture
+    def timeouts(self):
+        return AdaptiveTimeouts(
+            default_timeout=30, min_timeout=1, max_timeout=60, min_samples=10
+        )
+
+    def test_default_timeout_without_enough_latencies(self, timeouts):
+        for _ in range(9):
+            timeouts.add("eth_getTransactionReceipt", 0.1)
+
+        assert timeouts.get("eth_getTransactionReceipt") == 30
+        assert timeouts.get("eth_blockNumber") == 30
+
+    def test_timeout_from_latencies(self, timeouts):
+        for _ in range(100):
+            timeouts.add("eth_getTransactionReceipt", 0.5)
+            timeouts.add("trace_replayTransaction", 2)
+
+        assert timeouts.get("eth_getTransactionReceipt") == 1.5
+        assert timeouts.get("trace_replayTransaction") == 6
+
+    def test_timeout_bounds(self, timeouts):
+        for _ in range(100):
+            timeouts.add("eth_blockNumber", 0.01)
+            timeouts.add("trace_block", 100)
+
+        assert timeouts.get("eth_blockNumber") == 1
+        assert timeouts.get("trace_block") == 60
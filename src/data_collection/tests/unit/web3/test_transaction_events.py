@@ -1,15 +1,15 @@
+import json
 import unittest
-from unittest.mock import MagicMock
+from pathlib import Path
+from typing import Any, Dict, Optional
+from unittest.mock import Mock, patch
 
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
 from hexbytes import HexBytes
+from web3 import Web3
 from web3.contract import Contract
-from web3.contract.contract import (
-    ContractEvent,
-    ContractEvents,
-    ContractFunction,
-    ContractFunctions,
-)
-from web3.types import EventData, TxReceipt
+from web3.types import EventData, LogReceipt, TxReceipt
 
 from app.model.contract import ContractCategory
 from app.web3 import transaction_events as te
@@ -26,50 +26,239 @@ from app.web3.transaction_events.types import (
     TransferNonFungibleEvent,
 )
 
+CONTRACT_ABI = json.loads(
+    (Path(__file__).parents[3] / "etc" / "contract_abi.json").read_text()
+)
+CATEGORY_ABI_KEYS = {
+    ContractCategory.ERC20: "erc20",
+    ContractCategory.ERC721: "erc721",
+    ContractCategory.UNI_SWAP_V2_FACTORY: "UniSwapV2Factory",
+    ContractCategory.UNI_SWAP_V2_PAIR: "UniSwapV2Pair",
+}
+CONTRACT_ADDRESS = "0x000000000000000000000000000000000000aaaa"
+OTHER_ADDRESS = "0x000000000000000000000000000000000000bbbb"
+
+
+def _contract(category: ContractCategory, abi_key: Optional[str] = None) -> Contract:
+    abi = CONTRACT_ABI[abi_key or CATEGORY_ABI_KEYS.get(category, "erc20")]
+    return Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+
+
+def _log(
+    contract: Contract,
+    event_name: str,
+    args: Optional[Dict[str, Any]] = None,
+    address: str = CONTRACT_ADDRESS,
+    log_index: int = 1337,
+) -> LogReceipt:
+    """Encode a log of the given contract event (with zero values for missing args)"""
+    event_abi = next(
+        abi
+        for abi in contract.abi
+        if abi["type"] == "event" and abi["name"] == event_name
+    )
+    args = args or {}
+    topics = [HexBytes(event_abi_to_log_topic(event_abi))]
+    data_types, data_values = [], []
+    for arg in event_abi["inputs"]:
+        value = args.get(arg["name"], 0 if arg["type"] != "address" else OTHER_ADDRESS)
+        if arg["indexed"]:
+            topics.append(HexBytes(encode([arg["type"]], [value])))
+        else:
+            data_types.append(arg["type"])
+            data_values.append(value)
+    return LogReceipt(
+        address=Web3.to_checksum_address(address),
+        topics=topics,
+        data=HexBytes(encode(data_types, data_values)),
+        logIndex=log_index,
+        transactionIndex=0,
+        transactionHash=HexBytes("0x01"),
+        blockHash=HexBytes("0x02"),
+        blockNumber=1,
+    )
+
+
+def _get_events(category: ContractCategory, *event_data: EventData):
+    """Get the events of a receipt with the given (already decoded) contract events"""
+    contract = _contract(category)
+    receipt = TxReceipt(logs=[_log(contract, data["event"]) for data in event_data])
+    decode = Mock(side_effect=event_data)
+    with patch.dict(te._event_indexes, clear=True), patch.object(
+        te, "get_event_decoder", return_value=decode
+    ):
+        return list(te.get_transaction_events(category, contract, receipt))
+
 
 class CommonTest(unittest.TestCase):
     def test_unknown_category_no_events(self):
-        contract = MagicMock(spec=Contract)
-        receipt = MagicMock(spec=TxReceipt)
+        contract = _contract(ContractCategory.UNKNOWN)
+        receipt = TxReceipt(logs=[_log(contract, "Transfer")])
 
-        events = te.get_transaction_events(ContractCategory.UNKNOWN, contract, receipt)
-        events = list(events)
+        with patch.object(te, "get_event_decoder") as get_event_decoder:
+            events = te.get_transaction_events(
+                ContractCategory.UNKNOWN, contract, receipt
+            )
+            events = list(events)
 
-        contract.events.assert_not_called()
+        get_event_decoder.assert_not_called()
         self.assertEqual(len(events), 0)
 
 
-class ERC20Tests(unittest.TestCase):
-    def test_erc20_mint_transfer0x000(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x0000000000000000000000000000000000000000",
-                        "to": "0x000000000000000000000000000000000000BABA",
-                        "value": 42,
-                    },
-                    logIndex=1337,
+class EventDispatchTests(unittest.TestCase):
+    def test_decodes_log(self):
+        contract = _contract(ContractCategory.ERC20)
+        receipt = TxReceipt(
+            logs=[
+                _log(
+                    contract,
+                    "Transfer",
+                    {"from": OTHER_ADDRESS, "to": CONTRACT_ADDRESS, "value": 42},
                 )
             ]
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
 
         events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
         events = list(events)
 
+        self.assertEqual(
+            [
+                TransferFungibleEvent(
+                    address=contract.address,
+                    log_index=1337,
+                    src=Web3.to_checksum_address(OTHER_ADDRESS),
+                    dst=Web3.to_checksum_address(CONTRACT_ADDRESS),
+                    value=42,
+                )
+            ],
+            events,
+        )
+
+    def test_decodes_raw_log(self):
+        """Logs of a raw (JSON-RPC) receipt: hex strings and lowercase addresses"""
+        contract = _contract(ContractCategory.ERC20)
+        log = _log(
+            contract,
+            "Transfer",
+            {"from": OTHER_ADDRESS, "to": CONTRACT_ADDRESS, "value": 42},
+        )
+        raw_log = {
+            **log,
+            "address": log["address"].lower(),
+            "topics": [topic.hex() for topic in log["topics"]],
+            "data": log["data"].hex(),
+            "logIndex": hex(log["logIndex"]),
+            "transactionIndex": hex(log["transactionIndex"]),
+            "transactionHash": log["transactionHash"].hex(),
+            "blockHash": log["blockHash"].hex(),
+            "blockNumber": hex(log["blockNumber"]),
+        }
+
+        events = te.get_transaction_events(
+            ContractCategory.ERC20, contract, {"logs": [raw_log]}
+        )
+        events = list(events)
+
+        self.assertEqual(
+            [
+                TransferFungibleEvent(
+                    address=contract.address,
+                    log_index=1337,
+                    src=Web3.to_checksum_address(OTHER_ADDRESS),
+                    dst=Web3.to_checksum_address(CONTRACT_ADDRESS),
+                    value=42,
+                )
+            ],
+            events,
+        )
+
+    def test_decodes_each_log_once(self):
+        contract = _contract(ContractCategory.UNI_SWAP_V2_PAIR)
+        receipt = TxReceipt(
+            logs=[
+                _log(contract, "Mint", log_index=1),
+                _log(contract, "Swap", log_index=2),
+                _log(contract, "Sync", log_index=3),
+            ]
+        )
+
+        decoders = []
+        _get_event_decoder = te.get_event_decoder
+
+        def get_event_decoder(codec, event_abi):
+            decoders.append(Mock(wraps=_get_event_decoder(codec, event_abi)))
+            return decoders[-1]
+
+        with patch.dict(te._event_indexes, clear=True), patch.object(
+            te, "get_event_decoder", side_effect=get_event_decoder
+        ):
+            events = te.get_transaction_events(
+                ContractCategory.UNI_SWAP_V2_PAIR, contract, receipt
+            )
+            events = list(events)
+
+        # Sync has no mapper, so it's not decoded at all
+        self.assertEqual(2, sum(decoder.call_count for decoder in decoders))
+        self.assertEqual(
+            [MintPairEvent, SwapPairEvent], [type(event) for event in events]
+        )
+        self.assertEqual([1, 2], [event.log_index for event in events])
+
+    def test_skips_logs_of_other_addresses(self):
+        contract = _contract(ContractCategory.ERC20)
+        receipt = TxReceipt(logs=[_log(contract, "Transfer", address=OTHER_ADDRESS)])
+
+        decode = Mock()
+        with patch.dict(te._event_indexes, clear=True), patch.object(
+            te, "get_event_decoder", return_value=decode
+        ):
+            events = te.get_transaction_events(
+                ContractCategory.ERC20, contract, receipt
+            )
+            events = list(events)
+
+        decode.assert_not_called()
+        self.assertEqual([], events)
+
+    def test_skips_logs_without_topics(self):
+        contract = _contract(ContractCategory.ERC20)
+        log = _log(contract, "Transfer")
+        log["topics"] = []
+
+        events = te.get_transaction_events(
+            ContractCategory.ERC20, contract, TxReceipt(logs=[log])
+        )
+
+        self.assertEqual([], list(events))
+
+    def test_discards_undecodable_logs(self):
+        # ERC721 Transfer has the same topic0 as ERC20 Transfer, but an indexed tokenId
+        erc721_contract = _contract(ContractCategory.ERC721)
+        receipt = TxReceipt(logs=[_log(erc721_contract, "Transfer", {"tokenId": 1})])
+
+        events = te.get_transaction_events(
+            ContractCategory.ERC20, _contract(ContractCategory.ERC20), receipt
+        )
+
+        self.assertEqual([], list(events))
+
+
+class ERC20Tests(unittest.TestCase):
+    def test_erc20_mint_transfer0x000(self):
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x0000000000000000000000000000000000000000",
+                    "to": "0x000000000000000000000000000000000000BABA",
+                    "value": 42,
+                },
+                logIndex=1337,
+            ),
+        )
+
         self.assertEqual(
             [
                 MintFungibleEvent(
@@ -89,34 +278,19 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_mint_transfer0xdead(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000dead",
-                        "to": "0x000000000000000000000000000000000000BABA",
-                        "value": 42,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000dead",
+                    "to": "0x000000000000000000000000000000000000BABA",
+                    "value": 42,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -137,30 +311,15 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_usdt_mint_issue(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Issue",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={"amount": 42},
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Issue",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={"amount": 42},
+                logIndex=1337,
+            ),
         )
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -174,34 +333,19 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_burn_transfer0x000(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000BABA",
-                        "to": "0x0000000000000000000000000000000000000000",
-                        "value": 42,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000BABA",
+                    "to": "0x0000000000000000000000000000000000000000",
+                    "value": 42,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -222,34 +366,19 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_burn_transfer0xdead(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000BABA",
-                        "to": "0x000000000000000000000000000000000000dead",
-                        "value": 42,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000BABA",
+                    "to": "0x000000000000000000000000000000000000dead",
+                    "value": 42,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -270,30 +399,15 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_burn_redeem(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Redeem",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={"amount": 42},
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Redeem",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={"amount": 42},
+                logIndex=1337,
+            ),
         )
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -307,34 +421,19 @@ class ERC20Tests(unittest.TestCase):
         )
 
     def test_erc20_transfer(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000ABAB",
-                        "to": "0x000000000000000000000000000000000000BABA",
-                        "value": 42,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC20,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000ABAB",
+                    "to": "0x000000000000000000000000000000000000BABA",
+                    "value": 42,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC20, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -352,28 +451,19 @@ class ERC20Tests(unittest.TestCase):
 
 class ERC721Tests(unittest.TestCase):
     def test_erc721_mint_transfer0x000(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x0000000000000000000000000000000000000000",
-                        "to": "0x000000000000000000000000000000000000BABA",
-                        "tokenId": 4,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC721,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x0000000000000000000000000000000000000000",
+                    "to": "0x000000000000000000000000000000000000BABA",
+                    "tokenId": 4,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC721, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -394,34 +484,19 @@ class ERC721Tests(unittest.TestCase):
         )
 
     def test_erc721_mint_transfer0xdead(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000dead",
-                        "to": "0x000000000000000000000000000000000000BABA",
-                        "tokenId": 4,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC721,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000dead",
+                    "to": "0x000000000000000000000000000000000000BABA",
+                    "tokenId": 4,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC721, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -442,34 +517,19 @@ class ERC721Tests(unittest.TestCase):
         )
 
     def test_erc721_burn_transfer0x00(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000BABA",
-                        "to": "0x0000000000000000000000000000000000000000",
-                        "tokenId": 4,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC721,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000BABA",
+                    "to": "0x0000000000000000000000000000000000000000",
+                    "tokenId": 4,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC721, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -490,34 +550,19 @@ class ERC721Tests(unittest.TestCase):
         )
 
     def test_erc721_burn_transfer0xdead(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000BABA",
-                        "to": "0x000000000000000000000000000000000000dead",
-                        "tokenId": 4,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC721,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000BABA",
+                    "to": "0x000000000000000000000000000000000000dead",
+                    "tokenId": 4,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC721, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -538,34 +583,19 @@ class ERC721Tests(unittest.TestCase):
         )
 
     def test_erc721_transfer(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        transfer_event = MagicMock(spec=ContractEvent)
-        transfer_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Transfer",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "from": "0x000000000000000000000000000000000000BABA",
-                        "to": "0x000000000000000000000000000000000000ABAB",
-                        "tokenId": "5",
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.ERC721,
+            EventData(
+                event="Transfer",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "from": "0x000000000000000000000000000000000000BABA",
+                    "to": "0x000000000000000000000000000000000000ABAB",
+                    "tokenId": "5",
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Transfer = MagicMock(return_value=transfer_event)
-        issue_event = MagicMock(spec=ContractEvent)
-        issue_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Issue = MagicMock(return_value=issue_event)
-        redeem_event = MagicMock(spec=ContractEvent)
-        redeem_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Redeem = MagicMock(return_value=redeem_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(ContractCategory.ERC721, contract, receipt)
-        events = list(events)
 
         self.assertEqual(
             [
@@ -583,30 +613,19 @@ class ERC721Tests(unittest.TestCase):
 
 class UniSwapV2Tests(unittest.TestCase):
     def test_uniSwapV2_newPair(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        pairCreated_event = MagicMock(spec=ContractEvent)
-        pairCreated_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="PairCreated",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "token0": "0x0000000000000000000000000000000000000001",
-                        "token1": "0x0000000000000000000000000000000000000002",
-                        "pair": "0x0000000000000000000000000000000000000003",
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.UNI_SWAP_V2_FACTORY,
+            EventData(
+                event="PairCreated",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "token0": "0x0000000000000000000000000000000000000001",
+                    "token1": "0x0000000000000000000000000000000000000002",
+                    "pair": "0x0000000000000000000000000000000000000003",
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.PairCreated = MagicMock(return_value=pairCreated_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(
-            ContractCategory.UNI_SWAP_V2_FACTORY, contract, receipt
-        )
-        events = list(events)
 
         self.assertEqual(
             [
@@ -622,36 +641,19 @@ class UniSwapV2Tests(unittest.TestCase):
         )
 
     def test_uniSwapV2Pair_mint(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        Mint_event = MagicMock(spec=ContractEvent)
-        Mint_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Mint",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "sender": "0x0000000000000000000000000000000000000001",
-                        "amount0": 2,
-                        "amount1": 3,
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.UNI_SWAP_V2_PAIR,
+            EventData(
+                event="Mint",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "sender": "0x0000000000000000000000000000000000000001",
+                    "amount0": 2,
+                    "amount1": 3,
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Mint = MagicMock(return_value=Mint_event)
-        Burn_event = MagicMock(spec=ContractEvent)
-        Burn_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Burn = MagicMock(return_value=Burn_event)
-        Swap_event = MagicMock(spec=ContractEvent)
-        Swap_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Swap = MagicMock(return_value=Swap_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(
-            ContractCategory.UNI_SWAP_V2_PAIR, contract, receipt
-        )
-        events = list(events)
 
         self.assertEqual(
             [
@@ -667,37 +669,20 @@ class UniSwapV2Tests(unittest.TestCase):
         )
 
     def test_uniSwapV2Pair_burn(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        Burn_event = MagicMock(spec=ContractEvent)
-        Burn_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Burn",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "sender": "0x0000000000000000000000000000000000000001",
-                        "amount0": 2,
-                        "amount1": 3,
-                        "to": "0x0000000000000000000000000000000000000002",
-                    },
-                    logIndex=1337,
-                )
-            ]
-        )
-        contract.events.Burn = MagicMock(return_value=Burn_event)
-        Mint_event = MagicMock(spec=ContractEvent)
-        Mint_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Mint = MagicMock(return_value=Mint_event)
-        Swap_event = MagicMock(spec=ContractEvent)
-        Swap_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Swap = MagicMock(return_value=Swap_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(
-            ContractCategory.UNI_SWAP_V2_PAIR, contract, receipt
+        events = _get_events(
+            ContractCategory.UNI_SWAP_V2_PAIR,
+            EventData(
+                event="Burn",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "sender": "0x0000000000000000000000000000000000000001",
+                    "amount0": 2,
+                    "amount1": 3,
+                    "to": "0x0000000000000000000000000000000000000002",
+                },
+                logIndex=1337,
+            ),
         )
-        events = list(events)
 
         self.assertEqual(
             [
@@ -714,39 +699,22 @@ class UniSwapV2Tests(unittest.TestCase):
         )
 
     def test_uniSwapV2Pair_swap(self):
-        contract = MagicMock(spec=Contract)
-        contract.events = MagicMock(spec=ContractEvents)
-        Burn_event = MagicMock(spec=ContractEvent)
-        Burn_event.process_receipt = MagicMock(spec=ContractEvent)
-        contract.events.Burn = MagicMock(return_value=Burn_event)
-        Mint_event = MagicMock(spec=ContractEvent)
-        Mint_event.process_receipt = MagicMock(return_value=[])
-        contract.events.Mint = MagicMock(return_value=Mint_event)
-        Swap_event = MagicMock(spec=ContractEvent)
-        Swap_event.process_receipt = MagicMock(
-            return_value=[
-                EventData(
-                    event="Swap",
-                    address="0x000000000000000000000000000000000000AAAA",
-                    args={
-                        "sender": "0x0000000000000000000000000000000000000001",
-                        "amount0In": 2,
-                        "amount1In": 3,
-                        "amount0Out": 4,
-                        "amount1Out": 5,
-                        "to": "0x0000000000000000000000000000000000000002",
-                    },
-                    logIndex=1337,
-                )
-            ]
+        events = _get_events(
+            ContractCategory.UNI_SWAP_V2_PAIR,
+            EventData(
+                event="Swap",
+                address="0x000000000000000000000000000000000000AAAA",
+                args={
+                    "sender": "0x0000000000000000000000000000000000000001",
+                    "amount0In": 2,
+                    "amount1In": 3,
+                    "amount0Out": 4,
+                    "amount1Out": 5,
+                    "to": "0x0000000000000000000000000000000000000002",
+                },
+                logIndex=1337,
+            ),
         )
-        contract.events.Swap = MagicMock(return_value=Swap_event)
-        receipt = MagicMock(spec=TxReceipt)
-
-        events = te.get_transaction_events(
-            ContractCategory.UNI_SWAP_V2_PAIR, contract, receipt
-        )
-        events = list(events)
 
         self.assertEqual(
             [
@@ -0,0 +1,27 @@
+--KAFKA OFFSET TABLE--
+-- Consumer offsets stored alongside the data (KAFKA_OFFSETS_IN_DB=true),
+-- updated in the same transaction as the data of each consumed event
+CREATE OR REPLACE FUNCTION create_table_kafka_offset(node_name varchar(3))
+  RETURNS VOID
+  LANGUAGE plpgsql
+  AS $func$
+BEGIN
+  EXECUTE format('
+    CREATE TABLE IF NOT EXISTS %I (
+      topic varchar,
+      partition int,
+      next_offset bigint NOT NULL,
+      updated_at TIMESTAMP DEFAULT (now() at time zone ''utc''),
+      PRIMARY KEY (topic, partition)
+    )', node_name || '_kafka_offset');
+END
+$func$;
+
+SELECT
+  create_table_kafka_offset('eth');
+
+SELECT
+  create_table_kafka_offset('etc');
+
+SELECT
+  create_table_kafka_offset('bsc');